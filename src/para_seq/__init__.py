@@ -6,6 +6,54 @@ MAX_DISPLAYED_SEQ_LEN        = 50
 MAX_DISPLAYED_ALIGNMENTS     = 10
 SCORE_MATRIX_SHMEM_NAME = "score_matrix"
 DIRS_MATRIX_SHMEM_NAME  = "directions_matrix"
+DEFAULT_TILE_SIZE       = 256
+AUTOTUNE_FILE_NAME      = "autotune.json"
+AUTOTUNE_TILE_SIZES     = (64, 128, 256, 512)
+MEMORY_USE_RATIO        = 0.8 # Share of the available memory the matrices are allowed to take
+SHARED_MEMORY_DIR       = "/dev/shm"
+RESULT_CACHE_FILE_NAME  = "results.sqlite"
+DEFAULT_CACHE_SIZE      = 2**30
+OUTPUT_CHUNK_SIZE       = 2**20
+TRACEBACK_TASKS_PER_WORKER = 8  # More tasks than workers, so that no worker waits on another
+MIN_TRACEBACK_BATCH_SIZE   = 64 # Paths enumerated by each task at least, to amortize its overhead
+PENDING_TASKS_PER_WORKER   = 2  # Tasks submitted ahead of the consumer, so finished results don't pile up
+CHECKPOINT_CACHE_BLOCKS    = 8  # Recomputed blocks of rows kept by the checkpointed traceback
+FILL_STATES_DIR_NAME       = "fills"
+FILL_CHECKPOINT_INTERVAL   = 60 # Seconds between checkpoints of a resumable fill
+CHECKPOINTED_WINDOW_SIZE   = -1 # Window size of the run configurations of the checkpointed mode
+FASTA_INDEXES_DIR_NAME     = "fasta_indexes"
+JOB_SERVER_HOST            = "127.0.0.1" # Only reachable from the same machine
+JOB_SERVER_PORT            = 52437
+JOB_RESULTS_CHUNK_SIZE     = 1024 # Alignments sent to the clients in each message
+JOB_MAX_SIZE               = 2**30 # Longest job accepted by the server, sequences included
+CLUSTER_HOST               = "0.0.0.0" # Reachable from the other hosts of the cluster
+CLUSTER_PORT               = 52438
+CLUSTER_KEY_ENV_VAR        = "PARASEQ_CLUSTER_KEY" # Shared secret authenticating the cluster hosts
+CLUSTER_WINDOW_SIZE        = 2**16 # Target window of each task, when no window size is provided
+CLUSTER_HEARTBEAT_INTERVAL = 1  # Seconds between the heartbeats of each worker
+CLUSTER_WORKER_TIMEOUT     = 10 # Seconds without heartbeats after which a worker is considered lost
+CLUSTER_POLL_INTERVAL      = 0.05 # Seconds between checks for new tasks or finished rounds
+CLUSTER_CONNECT_TIMEOUT    = 60 # Seconds a worker waits for the coordinator to start listening
+BATCH_MAX_LANES            = 256 # Queries aligned at once by the batched kernel
+BATCH_MAX_CELLS            = 2**18 # Lanes times target columns of a batch, so that its rows stay in cache
+BATCH_INSERTION_PASSES     = 8 # Column-by-column insertion passes before switching to a running maximum
+BATCH_TRACEBACK_CELLS      = 2**24 # Cells of the matrices filled at once for the tracebacks of a batch
+BATCH_OUTPUT_PATH          = "./output/batch_output.tsv"
+SKETCHES_DIR_NAME          = "sketches"
+SKETCH_KMER_SIZE           = 16 # Nucleotides of the k-mers, long enough to rarely occur by chance in a genome
+SKETCH_MAX_KMER_SIZE       = 32 # Longest k-mers whose 2-bit codes fit a 64-bit integer
+SKETCH_SCALE               = 1  # Keeps 1 in this many k-mer hashes, 1 keeps them all
+SHARED_POOL_NAME_PREFIX    = "para_seq_pool"
+SHARED_POOL_MIN_SEGMENT    = 2**16 # Bytes of the smallest size class of pooled shared segments
+SHARED_POOL_MAX_IDLE       = 2**30 # Bytes of idle pooled segments kept for the next analyses
+NPZ_CHUNK_ALIGNMENTS       = 2**16 # Alignments converted to arrays at once by the binary output
+FORKSERVER_PRELOAD         = ("numpy", "para_seq.local_alignment") # Imported once by the fork server, inherited by its workers
+IUPAC_NUCLEOTIDES          = "ACGTRYSWKMBDHVN" # The 4 unambiguous nucleotides first, N (any of them) last
+PROGRESS_LINE_INTERVAL     = 0.25 # Seconds between updates of the progress line of the fill
+DIFFERENTIAL_CASES         = 100 # Random analyses every engine is checked on by default
+DIFFERENTIAL_MAX_SEQ_LEN   = 40 # Longest sequences of the random analyses, so that the serial reference stays quick
+DIFFERENTIAL_TILE_SIZE     = 4  # Tiny tiles, so that even short sequences span many waves of them
+DIFFERENTIAL_WORKERS       = 2  # Workers of the pooled engines, enough to split every wave
 
 # -Strings section-
 # Package description and documentation:
@@ -13,14 +61,44 @@ PACKAGE_NAME     = "ParaSeq"
 PACKAGE_DESCR    = "A parallel Python implementation of the Smith-Waterman local sequence alignment algorithm."
 TARGET_SEQ_HELP  = "Target DNA sequence or FASTA file path"
 QUERY_SEQ_HELP   = "Query DNA sequence or FASTA file path"
-TARGET_POS_HELP  = "Index (non-negative) of the target sequence in the FASTA file, if provided"
-QUERY_POS_HELP   = "Index (non-negative) of the query sequence in the FASTA file, if provided"
+TARGET_POS_HELP  = "Index (non-negative) or record ID of the target sequence in the FASTA file, if provided"
+QUERY_POS_HELP   = "Index (non-negative) or record ID of the query sequence in the FASTA file, if provided"
 MATCH_HELP       = "Match score, as a non-negative integer"
 MISMATCH_HELP    = "Mismatch penalty, as a non-negative integer"
 GAP_HELP         = "Constant gap penalty, as a non-negative integer"
-OUT_PATH_HELP    = "Path to the output file the tool will create. Warning: will override if existing"
+GAP_EXTENSION_HELP = "Makes gaps affine: the gap penalty is only paid to open a gap, and this penalty (a non-negative integer up to the gap penalty) for each of its further positions. Defaults to the gap penalty (constant gaps)"
+MATRIX_HELP      = "Substitution matrix file scoring each pair of nucleotides, instead of the match score and mismatch penalty: a line with the IUPAC codes of the columns (target nucleotides), then a line per row (query nucleotide) starting with its code, comments start with #. The pairs it leaves out keep the default scores, where only identical unambiguous nucleotides match (N never does)"
+OUT_PATH_HELP    = "Path to the output file the tool will create, gzip-compressed if it ends with .gz. Warning: will override if existing"
 MAX_ALIGN_HELP   = "Maximum number of alignments shown in the terminal as output"
 MAX_SEQ_LEN_HELP = "Maximum length for aligned chunks before sequences are truncated"
+BACKEND_HELP     = "Workers used to fill the matrices and reconstruct the alignments: processes attaching to shared memory, threads sharing the matrices directly (best on free-threaded Python builds), a single cell-by-cell engine in this process with no workers at all (fastest for tiny inputs, and the reference the others are checked against), or automatically picked for the input size and machine"
+WINDOW_SIZE_HELP = "Splits the target into overlapping windows of (at least) this size, aligned independently. Meant for short queries against very long targets, 0 disables it"
+MAX_MEMORY_HELP  = "Memory budget for the analysis, in bytes or with a K, M, G or T suffix (like 16G). Modes needing more are downgraded to lower-memory ones, or refused before allocating anything. Defaults to most of the available memory"
+JOBS_HELP        = "Maximum number of cores the analysis uses, among the ones it's allowed to run on (CPU affinity). 0 uses all of them"
+CACHE_HELP       = "Reuses the results of past analyses with the same sequences and scores, stored in the user cache folder, and stores the new ones there"
+CACHE_SIZE_HELP  = "Maximum size of the result cache, in bytes or with a K, M, G or T suffix. The least recently used results are evicted first"
+CHECKPOINTED_HELP = "Keeps only one row of scores every so often instead of the full matrices, recomputing the rows the traceback visits. Same results with a fraction of the memory, for some extra time"
+RESUME_HELP       = "Fills the matrices on disk in the user cache folder, saving the progress every minute. If the same analysis was interrupted before (preemption, crash, Ctrl+C), it continues from where it was left"
+OUT_FORMAT_HELP  = "Format of the output file: the readable text, tab-separated lines like the BLAST tabular format (without e-values), SAM records with CIGARs, or NumPy arrays (.npz)"
+RETUNE_HELP      = "Runs again the quick benchmarks the automatic backend relies on, instead of using the results cached for this machine"
+SERVER_HELP      = "Sends the analysis to the job server listening on this local port instead of running it here, 0 runs it here"
+SERVER_DESCR     = "Runs alignment jobs sent by local clients, keeping warm workers and matrix buffers between them."
+PORT_HELP        = "Local port the job server listens on"
+CLUSTER_HELP     = f"Coordinates the analysis on this port instead of running it here: the target is split into windows (see -w), aligned by the cluster workers connected to it. Needs the {CLUSTER_KEY_ENV_VAR} environment variable, 0 runs it here"
+WORKER_DESCR     = f"Aligns the target windows handed out by a ParaSeq cluster coordinator, authenticated by the {CLUSTER_KEY_ENV_VAR} environment variable."
+COORDINATOR_HELP = "Address of the coordinator, as host:port"
+BATCH_DESCR      = "Aligns every query of a FASTA file against the same target at once, stacking short queries as lanes of a single vectorized kernel."
+QUERIES_HELP     = "FASTA file path of the query DNA sequences"
+MIN_SCORE_HELP   = "Minimum alignment score of the queries whose alignments are reconstructed, the others only get their score"
+BATCH_OUT_HELP   = "Path to the tab-separated output file the tool will create, with a line for each alignment. Warning: will override if existing"
+SIMILARITY_HELP  = "Minimum fraction of the k-mers of a query found in the target for it to be aligned, the others are skipped. 0 aligns all of them"
+KMER_SIZE_HELP   = "Length of the k-mers sketching the sequences for --min-similarity"
+SCALE_HELP       = "Keeps only 1 in this many k-mers in the sketches, smaller but less accurate for short queries"
+DIFFERENTIAL_DESCR = "Checks that every engine and backend finds the same best score and alignments as the serial reference engine, on random analyses."
+CASES_HELP       = "Number of random analyses to check"
+SEED_HELP        = "Seed of the random analyses, the same one always generates the same analyses"
+MAX_LENGTH_HELP  = "Maximum length of the random sequences"
+ENGINES_HELP     = "Engines to check against the serial one, all of them by default"
 
 # Output:
 ALIGNMENT_INFO = """
@@ -29,13 +107,27 @@ Query start pos: {}
 Target sequence: {}
 Query sequence:  {}
 """
+PROGRESS_LINE = "\r{:.1%} of the cells filled (wave {}/{}), {:,.0f} cells/s, {} left"
+SAM_HEADER = "@HD\tVN:1.6\tSO:unsorted\n@SQ\tSN:{}\tLN:{}\n@PG\tID:para_seq\tPN:ParaSeq\n"
 
 # Error messages:
 UINT_ERR = "Expected a non-negative integer, got \"{}\"."
+POSITIVE_INT_ERR = "Expected a positive integer, got \"{}\"."
 IDENTICAL_SEQS_PREFIX = "Alignment of identical sequences is pointless"
-INVALID_SEQ_PREFIX    = "The provided sequence is not valid DNA as it contains characters outside of the ACGTN set"
+INVALID_SEQ_PREFIX    = "The provided sequence is not valid DNA as it contains characters outside of the IUPAC nucleotide codes (ACGTRYSWKMBDHVN)"
 MISSING_SEQ_PREFIX    = "Please provide at least 1 FASTA file path or 2 DNA sequences or FASTA file paths"
 INVALID_FILE_PREFIX   = "The provided path or the corresponding file cannot be used"
+MEMORY_SIZE_ERR = "Expected a non-negative integer, optionally followed by a K, M, G or T suffix, got \"{}\"."
+ADDRESS_ERR     = "Expected an address as host:port, got \"{}\"."
+FRACTION_ERR    = "Expected a number between 0 and 1, got \"{}\"."
+RESOURCE_BUDGET_PREFIX = "The analysis doesn't fit the resources it's allowed to use"
+INVALID_JOB_PREFIX     = "The alignment job is not valid"
+JOB_FAILED_PREFIX      = "The job server couldn't run the analysis"
+CLUSTER_PREFIX         = "The distributed analysis couldn't be run"
+INVALID_SCORES_PREFIX  = "The provided scores can't be used together"
+INVALID_MATRIX_PREFIX  = "The provided substitution matrix can't be used"
+FILL_CANCELLED_PREFIX  = "The analysis was cancelled while filling the matrices"
+DISCREPANCY_PREFIX     = "Some engines don't agree with the serial reference engine"
 
 # -Classes section-
 class SeqName(StrEnum):
@@ -46,4 +138,18 @@ class SeqName(StrEnum):
     @property
     def id(self) -> str:
         """The sequence identifier, built from the 1st character of the name."""
-        return self.value[0]
\ No newline at end of file
+        return self.value[0]
+
+class OutputFormat(StrEnum):
+    """Enum type for the formats the alignments can be saved in."""
+    Text    = "text"
+    Tabular = "tabular"
+    Sam     = "sam"
+    Npz     = "npz"
+
+class Backend(StrEnum):
+    """Enum type for the kinds of workers the analysis can run on, none at all for the serial one."""
+    Auto    = "auto"
+    Process = "process"
+    Thread  = "thread"
+    Serial  = "serial"
\ No newline at end of file
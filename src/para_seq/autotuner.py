@@ -0,0 +1,306 @@
+## Autotuner module, picks the fastest way to run an analysis on the current machine
+from os                       import cpu_count, makedirs
+from json                     import dump, load
+from time                     import perf_counter
+from numpy                    import dtype, iinfo, polyfit, uint8, uint16, uint32
+from numpy.random             import default_rng
+from os.path                  import dirname, join
+from platform                 import machine, node, python_version
+from para_seq                 import AUTOTUNE_FILE_NAME, AUTOTUNE_TILE_SIZES, DEFAULT_TILE_SIZE, Backend
+from para_seq.utils           import getCacheDir, getUsableCpusAmt, isGilEnabled
+from para_seq.local_alignment import AnalysisParams, computeTileWaves, createLocalMatrices, \
+    createPool, fillMatricesSerially, fillTile, getMatrixShape, getMaxSubstitutionScore
+
+from multiprocessing.shared_memory import SharedMemory
+
+type AutotuneResults = dict[str, float|str]
+# Backend, window size (0 if disabled, CHECKPOINTED_WINDOW_SIZE for the checkpointed mode),
+# tile size, score type and workers amount:
+type RunConfig       = tuple[Backend, int, int, dtype, int|None]
+
+def getScoreType(analysisParams:AnalysisParams) -> dtype:
+    """
+    Picks the smallest unsigned integer type able to hold every score of the analysis,
+    since no local alignment can score more than all the nucleotides of the shortest
+    sequence matching (with the best substitution score).
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        np.dtype: The smallest fitting type between uint8, uint16 and uint32.
+    """
+    targetSeq, querySeq, *_ = analysisParams
+    bestScore = getMaxSubstitutionScore(analysisParams) * min(len(targetSeq), len(querySeq))
+    for itemType in (uint8, uint16):
+        if bestScore <= iinfo(itemType).max: return dtype(itemType)
+
+    return dtype(uint32)
+
+def getMachineId() -> str:
+    """
+    Builds an identifier of the current machine and interpreter, autotune results measured
+    with a different one are not trusted.
+
+    Returns:
+        str: The identifier.
+    """
+    return f"{node()}|{machine()}|{cpu_count()}|{python_version()}|gil={isGilEnabled()}"
+
+def getAutotunePath() -> str:
+    """
+    Computes the path of the local file where autotune results are cached, in the user
+    cache folder.
+
+    Returns:
+        str: The path to the autotune results file.
+    """
+    return join(getCacheDir(), AUTOTUNE_FILE_NAME)
+
+def _timeIt(func, *args) -> float:
+    """
+    Measures how long the provided function takes to run with the provided args.
+
+    Args:
+        func (Callable): The function to time.
+        *args: The args passed to the function.
+
+    Returns:
+        float: The elapsed time, in seconds.
+    """
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+def _noop(*_) -> None:
+    """Trivial pool task, only the dispatch overhead gets measured."""
+
+def runAutotune(benchSize = 512, serialBenchSize = 64) -> AutotuneResults:
+    """
+    Runs a quick set of micro-benchmarks measuring the costs the run configurations are
+    chosen on: the vectorized kernel with each tile size, how well threads scale while
+    running it, the serial engine, spawning pools, dispatching tasks and attaching shared
+    memory.
+
+    Args:
+        benchSize (int, optional): Length of the random sequences the kernel is measured on. Defaults to: 512.
+        serialBenchSize (int, optional): Length of the prefixes of the same sequences the serial engine is measured on, a cell at a time is much slower. Defaults to: 64.
+
+    Returns:
+        AutotuneResults: The measured costs, in seconds.
+    """
+    rng    = default_rng(0)
+    target = rng.choice(list(b"ACGT"), benchSize).astype(uint8)
+    query  = rng.choice(list(b"ACGT"), benchSize).astype(uint8)
+    params = (target.tobytes().decode(), query.tobytes().decode(), 2, 1, 1)
+    shape  = getMatrixShape(*params[:2])
+    cellsAmt = benchSize * benchSize
+
+    def fillSerially(tileSize:int) -> None:
+        matrices = createLocalMatrices(shape)
+        for wave in computeTileWaves(*shape, tileSize):
+            for tile in wave: fillTile(*matrices, tile, target, query, *params[2:])
+
+    # Each kernel row costs a fixed overhead plus something for each cell, so the cost
+    # per cell of a tile is linear with the inverse of its side:
+    tileCellCosts = [_timeIt(fillSerially, tileSize) / cellsAmt for tileSize in AUTOTUNE_TILE_SIZES]
+    cellCost, rowCost = polyfit([1 / tileSize for tileSize in AUTOTUNE_TILE_SIZES], tileCellCosts, 1)[::-1]
+
+    threadsAmt = getUsableCpusAmt()
+    def fillThreaded() -> None:
+        matrices = createLocalMatrices(shape)
+        with createPool(Backend.Thread, params, workersAmt = threadsAmt) as pool:
+            for wave in computeTileWaves(*shape, DEFAULT_TILE_SIZE // 2):
+                pool.starmap(fillTile,
+                    [(*matrices, tile, target, query, *params[2:]) for tile in wave])
+
+    # Efficiency of each extra thread, 1 when threads scale perfectly:
+    speedup = _timeIt(fillSerially, DEFAULT_TILE_SIZE // 2) / _timeIt(fillThreaded)
+    threadEfficiency = 0.0 if threadsAmt == 1 else min(max(
+        (speedup - 1) / (threadsAmt - 1), 0.0), 1.0)
+
+    serialParams = (params[0][:serialBenchSize], params[1][:serialBenchSize], *params[2:])
+    serialTime = _timeIt(fillMatricesSerially, serialParams,
+        createLocalMatrices(getMatrixShape(*serialParams[:2])))
+
+    results :AutotuneResults = {
+        "machine"          : getMachineId(),
+        "kernelRowCost"    : max(float(rowCost),  0.0),
+        "kernelCellCost"   : max(float(cellCost), 0.0),
+        "threadEfficiency" : threadEfficiency,
+        "serialCellCost"   : serialTime / serialBenchSize**2 }
+
+    tasks = [()] * 256
+    for backend in Backend.Process, Backend.Thread:
+        start = perf_counter()
+        with createPool(backend, params) as pool:
+            spawned = perf_counter()
+            pool.starmap(_noop, [()])
+            roundTrip = perf_counter()
+            pool.starmap(_noop, tasks)
+            end = perf_counter()
+
+        results[f"{backend}PoolCost"]  = spawned - start
+        results[f"{backend}RoundTrip"] = roundTrip - spawned
+        results[f"{backend}TaskCost"]  = max(end - roundTrip - (roundTrip - spawned), 0) / len(tasks)
+
+    def attachSharedMem(name:str) -> None:
+        for _ in range(64): SharedMemory(name = name).close()
+
+    sharedMem = SharedMemory(create = True, size = 1) # Random name, nothing can collide
+    results["attachCost"] = _timeIt(attachSharedMem, sharedMem.name) / 64
+    sharedMem.close()
+    sharedMem.unlink()
+
+    return results
+
+def loadAutotuneResults(path :str|None = None, *, doRetune = False) -> AutotuneResults:
+    """
+    Loads the cached autotune results for this machine, running (and caching) the
+    autotune first if they're missing, were measured elsewhere or a retune is requested.
+
+    Args:
+        path (str | None, optional): The path of the results file, if None the one in the user cache folder. Defaults to: None.
+        doRetune (bool, optional): If True the benchmarks run again regardless of the cache. Defaults to: False.
+
+    Returns:
+        AutotuneResults: The measured costs, in seconds.
+    """
+    path = path or getAutotunePath()
+    if not doRetune:
+        try:
+            with open(path) as fd: results = load(fd)
+            # Results cached before the serial engine was measured are incomplete:
+            if results.get("machine") == getMachineId() and "serialCellCost" in results: return results
+
+        except (OSError, ValueError): pass # Missing or corrupted, same thing
+
+    results = runAutotune()
+    try:
+        makedirs(dirname(path), exist_ok = True)
+        with open(path, 'w') as fd: dump(results, fd, indent = 4)
+
+    except OSError: pass # A read-only home shouldn't stop the analysis, we'll retune next time
+    return results
+
+def estimateTileFillTime(shape:tuple[int, int], tileSize:int, workersAmt:int, results:AutotuneResults) -> float:
+    """
+    Estimates how long filling matrices with the provided shape takes with the vectorized
+    kernel, either in-process (1 worker) or on a pool of threads.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+        tileSize (int): The side of each tile, ignored with a single worker.
+        workersAmt (int): The amount of threads.
+        results (AutotuneResults): The measured costs.
+
+    Returns:
+        float: The estimated time, in seconds.
+    """
+    rowsAmt, columnsAmt = shape
+    rowCost, cellCost = results["kernelRowCost"], results["kernelCellCost"]
+    if workersAmt == 1: # The whole matrix as a single tile, with no pool
+        return (rowsAmt - 1) * (rowCost + (columnsAmt - 1) * cellCost)
+
+    # Threads fill up to workersAmt tiles at a time, at a reduced speed if they don't scale:
+    slowdown  = workersAmt / (1 + (workersAmt - 1) * results["threadEfficiency"])
+    tileTime  = tileSize * (rowCost + tileSize * cellCost) * slowdown
+    rowTiles  = -(-(rowsAmt - 1)    // tileSize) # Ceiling divisions
+    colTiles  = -(-(columnsAmt - 1) // tileSize)
+    totalTime = results["threadPoolCost"]
+    for waveId in range(rowTiles + colTiles - 1):
+        waveTiles = min(waveId + 1, rowTiles, colTiles, rowTiles + colTiles - 1 - waveId)
+        totalTime += -(-waveTiles // workersAmt) * tileTime + results["threadRoundTrip"]
+
+    return totalTime
+
+def estimateSerialFillTime(shape:tuple[int, int], results:AutotuneResults) -> float:
+    """
+    Estimates how long filling matrices with the provided shape takes with the serial
+    engine, which has no setup cost at all.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+        results (AutotuneResults): The measured costs.
+
+    Returns:
+        float: The estimated time, in seconds.
+    """
+    rowsAmt, columnsAmt = shape
+    return (rowsAmt - 1) * (columnsAmt - 1) * results["serialCellCost"]
+
+def estimateCellFillTime(shape:tuple[int, int], workersAmt:int, results:AutotuneResults) -> float:
+    """
+    Estimates how long filling matrices with the provided shape takes with a pool of
+    processes computing one cell per task.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+        workersAmt (int): The amount of processes.
+        results (AutotuneResults): The measured costs.
+
+    Returns:
+        float: The estimated time, in seconds.
+    """
+    rowsAmt, columnsAmt = shape
+    cellCost = results["processTaskCost"] + results["attachCost"]
+    return (2 * results["processPoolCost"] # The backtracking step spawns its own pool
+        + (rowsAmt + columnsAmt - 1) * results["processRoundTrip"]
+        + rowsAmt * columnsAmt * cellCost / workersAmt)
+
+def chooseRunConfig(analysisParams:AnalysisParams, results:AutotuneResults, cpusAmt:int) -> RunConfig:
+    """
+    Picks the run configuration with the lowest estimated time for the provided analysis,
+    based on the matrix shape and the amount of cores. Memory isn't considered here, the
+    resource governor downgrades the configuration later if needed.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        results (AutotuneResults): The measured costs.
+        cpusAmt (int): The amount of cores the analysis is allowed to use.
+
+    Returns:
+        RunConfig: The backend, window size (0 if disabled), tile size, score type and amount of workers.
+    """
+    scoreType = getScoreType(analysisParams)
+    shape = getMatrixShape(*analysisParams[:2])
+    workerAmts = sorted({ 1, cpusAmt, *(2 ** i for i in range(cpusAmt.bit_length())) })
+    estimates :list[tuple[float, RunConfig]] = [(
+        estimateSerialFillTime(shape, results),
+        (Backend.Serial, 0, DEFAULT_TILE_SIZE, scoreType, 1)), (
+        estimateCellFillTime(shape, cpusAmt, results),
+        (Backend.Process, 0, DEFAULT_TILE_SIZE, scoreType, cpusAmt))]
+
+    for workersAmt in workerAmts:
+        for tileSize in (AUTOTUNE_TILE_SIZES if workersAmt > 1 else [DEFAULT_TILE_SIZE]):
+            estimates.append((estimateTileFillTime(shape, tileSize, workersAmt, results),
+                (Backend.Thread, 0, tileSize, scoreType, workersAmt)))
+
+    # vvv Sorting on the estimate alone keeps the first (simplest) config among ties
+    return min(estimates, key = lambda estimate: estimate[0])[1]
+
+def getRunConfig(analysisParams:AnalysisParams, backend:Backend, windowSize:int, cpusAmt:int, *, doRetune = False) -> RunConfig:
+    """
+    Obtains the run configuration for the provided analysis: automatically chosen if the
+    backend is Backend.Auto, otherwise the provided backend and window size as they are
+    (with a single worker for the serial backend).
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        backend (Backend): The backend requested by the user.
+        windowSize (int): The window size requested by the user, 0 if disabled.
+        cpusAmt (int): The amount of cores the analysis is allowed to use.
+        doRetune (bool, optional): If True the autotune benchmarks run again. Defaults to: False.
+
+    Returns:
+        RunConfig: The backend, window size (0 if disabled), tile size, score type and amount of workers.
+    """
+    if backend != Backend.Auto: return backend, windowSize, DEFAULT_TILE_SIZE, dtype(uint32), \
+        1 if backend == Backend.Serial else cpusAmt
+
+    config = chooseRunConfig(analysisParams, loadAutotuneResults(doRetune = doRetune), cpusAmt)
+    if not windowSize: return config
+
+    # An explicit window size always wins:
+    backend, _, tileSize, scoreType, workersAmt = config
+    return backend, windowSize, tileSize, scoreType, workersAmt
@@ -0,0 +1,449 @@
+## Batched alignment module, meant for many short queries against the same target
+from os                          import makedirs
+from numpy                       import ndarray, dtype, int32, int64, intp, uint8, add, arange, argwhere, \
+    array, empty, flatnonzero, iinfo, maximum, ones, subtract, take, where, zeros
+from para_seq                    import BATCH_DESCR, BATCH_INSERTION_PASSES, BATCH_MAX_CELLS, \
+    BATCH_MAX_LANES, BATCH_TRACEBACK_CELLS, BATCH_OUT_HELP, BATCH_OUTPUT_PATH, GAP_HELP, JOBS_HELP, \
+    KMER_SIZE_HELP, MATCH_HELP, MATRIX_HELP, MIN_SCORE_HELP, MISMATCH_HELP, QUERIES_HELP, SCALE_HELP, \
+    SIMILARITY_HELP, SKETCH_KMER_SIZE, SKETCH_MAX_KMER_SIZE, SKETCH_SCALE, TARGET_POS_HELP, TARGET_SEQ_HELP, \
+    SeqName
+from os.path                     import dirname
+from argparse                    import ArgumentParser
+from para_seq.utils              import getUsableCpusAmt
+from collections.abc             import Iterator, Sequence
+from para_seq.sketches           import prefilterQueries
+from para_seq.input_manager      import SubstitutionScores, fraction, parseFastaRecords, parseSeq, \
+    positiveInt, readSubstitutionMatrix, seqRef, uint
+from contextlib                  import ExitStack
+from multiprocessing.pool        import ThreadPool
+from para_seq.local_alignment    import DIAG_DIR, LEFT_DIR, UP_DIR, NUCLEOTIDE_INDEXES, CompactAlignment, \
+    encodeSeq, getSubstitutionTable, imapTasks, traceAlignments
+from para_seq.windowed_alignment import getMaxAlignmentSpan
+
+# Maximum score of a query and all its compact local alignments:
+type QueryResult = tuple[int, list[CompactAlignment]]
+
+def bucketQueries(queryLens:Sequence[int], lanesAmt:int) -> list[list[int]]:
+    """
+    Groups the queries into batches of the provided amount of lanes, sorting them by
+    length first, so that the queries sharing a batch need as little padding as possible.
+
+    Args:
+        queryLens (Sequence[int]): The length of each query.
+        lanesAmt (int): The amount of queries in each batch, the last one can have fewer.
+
+    Returns:
+        list[list[int]]: The indexes of the queries in each batch.
+    """
+    order = sorted(range(len(queryLens)), key = queryLens.__getitem__)
+    return [order[start:start + lanesAmt] for start in range(0, len(order), lanesAmt)]
+
+def getBatchLanesAmt(targetSeqLen:int) -> int:
+    """
+    Computes how many queries a batch can stack against the target, so that a row of all
+    the lanes stays within BATCH_MAX_CELLS cells.
+
+    Args:
+        targetSeqLen (int): The length of the target sequence.
+
+    Returns:
+        int: The amount of lanes, between 1 and BATCH_MAX_LANES.
+    """
+    return max(1, min(BATCH_MAX_LANES, BATCH_MAX_CELLS // (targetSeqLen + 1)))
+
+def stackQueries(queriesCodes:list[ndarray]) -> tuple[ndarray, ndarray]:
+    """
+    Stacks encoded queries as the lanes of a 2D-array, padding the shorter ones with a
+    code matching no nucleotide.
+
+    Args:
+        queriesCodes (list[np.ndarray]): The encoded query sequences.
+
+    Returns:
+        tuple:
+        - np.ndarray: 2D-array of nucleotide codes, one lane per query.
+        - np.ndarray: The length of each query.
+    """
+    queryLens = array([len(queryCodes) for queryCodes in queriesCodes], dtype = int64)
+    lanes = zeros((len(queriesCodes), queryLens.max(initial = 0)), dtype = uint8)
+    for lane, queryCodes in enumerate(queriesCodes): lanes[lane, :len(queryCodes)] = queryCodes
+    return lanes, queryLens
+
+def getBestSubstitutionScore(matchScore:int, mismatchPenalty:int, substitutions :SubstitutionScores|None = None) -> int:
+    """
+    Gets the highest score a single pair of aligned nucleotides can add, see
+    getMaxSubstitutionScore.
+
+    Args:
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+
+    Returns:
+        int: The highest substitution score, at least 0.
+    """
+    return max(0, int(getSubstitutionTable(matchScore, mismatchPenalty, substitutions).max()))
+
+def fillQueryLanes(targetCodes:ndarray, lanes:ndarray, queryLens:ndarray, matchScore:int, mismatchPenalty:int, gapPenalty:int, *, substitutions :SubstitutionScores|None = None, matrices :tuple[ndarray, ndarray]|None = None) -> tuple[ndarray, ndarray, ndarray]:
+    """
+    Computes the alignment scores of many queries at once, stacked as the lanes of the
+    same rows: each step fills one row of every lane, with the same recurrence as
+    fillTile. Unless matrices are provided only the previous row is kept, and the rows
+    past the end of each query are ignored. Insertions, the only dependency within a row,
+    are applied one column at a time for all the lanes until no cell improves, which takes
+    a few passes when gaps cost at least as much as a match, or otherwise with a running
+    maximum.
+
+    Args:
+        targetCodes (np.ndarray): The encoded target sequence shared by all the lanes, or a 2D-array with one target slice per lane.
+        lanes (np.ndarray): The stacked query codes, see stackQueries.
+        queryLens (np.ndarray): The length of each query.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+        matrices (tuple[np.ndarray, np.ndarray] | None, optional): Zero-filled 3D score and directions matrices (lane, row, column) to fill, of type getLanesRowType. Defaults to: None.
+
+    Returns:
+        tuple:
+        - np.ndarray: The maximum score of each lane.
+        - np.ndarray: The first column of each lane reaching its maximum score.
+        - np.ndarray: The last column of each lane reaching its maximum score.
+    """
+    global UP_DIR, DIAG_DIR, LEFT_DIR
+
+    (lanesAmt, rowsAmt), columnsAmt = lanes.shape, targetCodes.shape[-1] + 1
+    bestScore = getBestSubstitutionScore(matchScore, mismatchPenalty, substitutions)
+    rowType = getLanesRowType(columnsAmt, bestScore, gapPenalty)
+    gapSteps = arange(columnsAmt, dtype = rowType) * gapPenalty
+    # Insertions cheaper than a match often chain on, better left to the running maximum:
+    insertionPassesAmt = BATCH_INSERTION_PASSES if gapPenalty >= bestScore > 0 else 0
+
+    # With a shared target each lane picks the line of its query nucleotide from the
+    # target profile (its substitution scores against every query nucleotide), otherwise
+    # the scores are gathered from the flattened table at the row of the query nucleotide
+    # of each lane and the column of each target nucleotide:
+    table = getSubstitutionTable(matchScore, mismatchPenalty, substitutions)
+    laneIndexes = NUCLEOTIDE_INDEXES[lanes].astype(intp)
+    isTargetShared = targetCodes.ndim == 1
+    if isTargetShared: targetProfile = table[:, NUCLEOTIDE_INDEXES[targetCodes]].astype(rowType)
+    else:
+        flatTable = table.ravel().astype(rowType)
+        targetIndexes = NUCLEOTIDE_INDEXES[targetCodes].astype(intp)
+        laneIndexes *= table.shape[1] # Offsets of the rows of the flattened table
+        pairIndexes = empty((lanesAmt, columnsAmt - 1), dtype = intp)
+
+    # Buffers are preallocated and reused by every row, the first column always stays 0:
+    rowBuffers = zeros((2, lanesAmt, columnsAmt), dtype = rowType) if matrices is None else None
+    comparison, deletion, insertion = (empty((lanesAmt, columnsAmt - 1), dtype = rowType) for _ in range(3))
+    maxScores, firstEnds, lastEnds = (zeros(lanesAmt, dtype = int64) for _ in range(3))
+
+    for y in range(rowsAmt):
+        upperRows, rows = (matrices[0][:, y], matrices[0][:, y + 1]) if rowBuffers is None else \
+            (rowBuffers[y % 2], rowBuffers[(y + 1) % 2])
+
+        cells = rows[:, 1:]
+        # vvv The indexes are always in bounds, clipping skips checking them
+        if isTargetShared: take(targetProfile, laneIndexes[:, y], axis = 0, out = comparison, mode = "clip")
+        else: take(flatTable, add(targetIndexes, laneIndexes[:, y, None], out = pairIndexes),
+            out = comparison, mode = "clip")
+
+        comparison += upperRows[:, :-1]
+        subtract(upperRows[:, 1:], gapPenalty, out = deletion)
+        maximum(comparison, deletion, out = cells)
+        maximum(cells, 0, out = cells)
+
+        for _ in range(insertionPassesAmt):
+            subtract(rows[:, :-1], gapPenalty, out = insertion)
+            if not (insertion > cells).any(): break
+            maximum(cells, insertion, out = cells)
+
+        else: # Still improving, H[x] = max over k <= x of (H[k] + gap * k) - gap * x
+            rows += gapSteps
+            maximum.accumulate(rows, axis = 1, out = rows)
+            rows -= gapSteps
+
+        if matrices is not None:
+            subtract(rows[:, :-1], gapPenalty, out = insertion)
+            matrices[1][:, y + 1, 1:] = (cells > 0) * (
+                (cells == deletion)   * UP_DIR   |
+                (cells == comparison) * DIAG_DIR |
+                (cells == insertion)  * LEFT_DIR)
+
+        # Only the lanes reaching their best score so far need their end columns updated:
+        rowMaxScores = rows.max(axis = 1).astype(int64)
+        rowMaxScores[queryLens <= y] = 0 # Padding rows
+        hits = flatnonzero((rowMaxScores >= maxScores) & (rowMaxScores > 0))
+        if not hits.size: continue
+
+        isBest = rows[hits] == rowMaxScores[hits, None]
+        rowFirstEnds = isBest.argmax(axis = 1)
+        rowLastEnds  = columnsAmt - 1 - isBest[:, ::-1].argmax(axis = 1)
+
+        isNewBest = rowMaxScores[hits] > maxScores[hits]
+        firstEnds[hits] = where(isNewBest, rowFirstEnds, firstEnds[hits].clip(max = rowFirstEnds))
+        lastEnds[hits]  = where(isNewBest, rowLastEnds,  lastEnds[hits].clip(min = rowLastEnds))
+        maxScores[hits] = rowMaxScores[hits]
+
+    return maxScores, firstEnds, lastEnds
+
+def getLanesRowType(columnsAmt:int, matchScore:int, gapPenalty:int) -> dtype:
+    """
+    Picks the type of the lanes' scores: half-size values are enough, unless the running
+    maximum of the insertions could overflow them on a very long target.
+
+    Args:
+        columnsAmt (int): The amount of columns of the rows.
+        matchScore (int): The highest score a pair of aligned nucleotides can add, see getBestSubstitutionScore.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+
+    Returns:
+        np.dtype: Either np.int32 or np.int64.
+    """
+    return dtype(int32 if (matchScore + gapPenalty) * columnsAmt < iinfo(int32).max else int64)
+
+def getTracebackWindow(queryLen:int, matchScore:int, gapPenalty:int, firstEnd:int, lastEnd:int) -> tuple[int, int]:
+    """
+    Computes the target slice the best local alignments of a query can cover: from the
+    longest span a positive-scoring alignment can have before its first end column, up to
+    its last end column. Every best alignment fits there entirely, so filling the matrices
+    on it alone gives the same alignments as the whole target.
+
+    Args:
+        queryLen (int): The length of the query.
+        matchScore (int): The highest score a pair of aligned nucleotides can add, see getBestSubstitutionScore.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        firstEnd (int): The first column reaching the maximum score.
+        lastEnd (int): The last column reaching the maximum score.
+
+    Returns:
+        tuple[int, int]: The 0-based target slice [start, end).
+    """
+    maxSpan = getMaxAlignmentSpan(queryLen, matchScore, gapPenalty)
+    return 0 if maxSpan is None else max(0, firstEnd - maxSpan), lastEnd
+
+def alignQueryLanes(targetCodes:ndarray, queriesCodes:list[ndarray], matchScore:int, mismatchPenalty:int, gapPenalty:int, maxScores:list[int], windows:list[tuple[int, int]], substitutions :SubstitutionScores|None = None) -> list[list[CompactAlignment]]:
+    """
+    Reconstructs the best local alignments of many queries, filling their matrices at
+    once over the target window of each one (padded to the widest of them), in chunks
+    of lanes whose matrices take at most BATCH_TRACEBACK_CELLS cells.
+
+    Args:
+        targetCodes (np.ndarray): The encoded target sequence.
+        queriesCodes (list[np.ndarray]): The encoded query sequences.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        maxScores (list[int]): The maximum score of each query, all positive.
+        windows (list[tuple[int, int]]): The target slice of each query, see getTracebackWindow.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+
+    Returns:
+        list[list[CompactAlignment]]: The best local alignments of each query, in whole target coords.
+    """
+    # Chunks grow while the matrices of all their lanes fit:
+    chunks :list[list[int]] = []
+    rowsAmt = columnsAmt = 0
+    for lane, ((start, end), queryCodes) in enumerate(zip(windows, queriesCodes)):
+        nextRowsAmt, nextColumnsAmt = max(rowsAmt, len(queryCodes) + 1), max(columnsAmt, end - start + 1)
+        if not chunks or (len(chunks[-1]) + 1) * nextRowsAmt * nextColumnsAmt > BATCH_TRACEBACK_CELLS:
+            chunks.append([])
+            nextRowsAmt, nextColumnsAmt = len(queryCodes) + 1, end - start + 1
+
+        chunks[-1].append(lane)
+        rowsAmt, columnsAmt = nextRowsAmt, nextColumnsAmt
+
+    bestScore = getBestSubstitutionScore(matchScore, mismatchPenalty, substitutions)
+    alignments :list[list[CompactAlignment]] = []
+    for chunk in chunks:
+        lanes, queryLens = stackQueries([queriesCodes[lane] for lane in chunk])
+        widths = [windows[lane][1] - windows[lane][0] for lane in chunk]
+        # Padding columns (scored as N) are past the window of their lane, sliced off below:
+        laneTargets = ones((len(chunk), max(widths)), dtype = uint8)
+        for chunkLane, lane in enumerate(chunk):
+            start, end = windows[lane]
+            laneTargets[chunkLane, :end - start] = targetCodes[start:end]
+
+        shape = (len(chunk), lanes.shape[1] + 1, laneTargets.shape[1] + 1)
+        scoreMatrices = zeros(shape, dtype = getLanesRowType(shape[2], bestScore, gapPenalty))
+        dirsMatrices  = zeros(shape, dtype = uint8)
+        fillQueryLanes(laneTargets, lanes, queryLens, matchScore, mismatchPenalty, gapPenalty,
+            substitutions = substitutions, matrices = (scoreMatrices, dirsMatrices))
+
+        for chunkLane, lane in enumerate(chunk):
+            start = windows[lane][0]
+            laneShape = slice(queryLens[chunkLane] + 1), slice(widths[chunkLane] + 1)
+            scoreMatrix = scoreMatrices[chunkLane][laneShape]
+            dirsMatrix  = dirsMatrices[chunkLane][laneShape]
+            alignments.append([(start + targetX, queryY, start + targetEndX, queryEndY, cigar)
+                for y, x in argwhere(scoreMatrix == maxScores[lane]).tolist()
+                for targetX, queryY, targetEndX, queryEndY, cigar in traceAlignments(scoreMatrix, dirsMatrix, y, x)])
+
+    return alignments
+
+def alignQueryBatch(targetCodes:ndarray, queriesCodes:list[ndarray], matchScore:int, mismatchPenalty:int, gapPenalty:int, minScore = 1, substitutions :SubstitutionScores|None = None) -> list[QueryResult]:
+    """
+    Scores a batch of queries against the target at once, then reconstructs the best
+    local alignments of the queries scoring at least the minimum score, again all at once
+    but only over the target windows their alignments can cover.
+
+    Args:
+        targetCodes (np.ndarray): The encoded target sequence.
+        queriesCodes (list[np.ndarray]): The encoded query sequences.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        minScore (int, optional): The minimum score of the queries whose alignments are reconstructed, at least 1. Defaults to: 1.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+
+    Returns:
+        list[QueryResult]: The maximum score and the best local alignments of each query, in the same order.
+    """
+    lanes, queryLens = stackQueries(queriesCodes)
+    maxScores, firstEnds, lastEnds = fillQueryLanes(targetCodes, lanes, queryLens, matchScore,
+        mismatchPenalty, gapPenalty, substitutions = substitutions)
+
+    maxScores = maxScores.tolist()
+    bestScore = getBestSubstitutionScore(matchScore, mismatchPenalty, substitutions)
+    tracedLanes = [lane for lane, maxScore in enumerate(maxScores) if maxScore >= max(minScore, 1)]
+    tracedAlignments = alignQueryLanes(targetCodes, [queriesCodes[lane] for lane in tracedLanes],
+        matchScore, mismatchPenalty, gapPenalty, [maxScores[lane] for lane in tracedLanes],
+        [getTracebackWindow(len(queriesCodes[lane]), bestScore, gapPenalty,
+            int(firstEnds[lane]), int(lastEnds[lane])) for lane in tracedLanes], substitutions)
+
+    results :list[QueryResult] = [(maxScore, []) for maxScore in maxScores]
+    for lane, alignments in zip(tracedLanes, tracedAlignments): results[lane] = maxScores[lane], alignments
+    return results
+
+def alignQueries(targetSeq:str, querySeqs:Sequence[str], matchScore:int, mismatchPenalty:int, gapPenalty:int, *, substitutions :SubstitutionScores|None = None, minScore = 1, workersAmt :int|None = None) -> Iterator[tuple[int, QueryResult]]:
+    """
+    Aligns many queries against the same target, in batches of queries of similar length
+    run by a pool of threads, yielding the results of each batch as soon as it's done.
+
+    Args:
+        targetSeq (str): The target sequence to align.
+        querySeqs (Sequence[str]): The query sequences to align.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+        minScore (int, optional): The minimum score of the queries whose alignments are reconstructed. Defaults to: 1.
+        workersAmt (int | None, optional): The amount of threads, if None as many as there are cores. Defaults to: None.
+
+    Returns:
+        Iterator[tuple[int, QueryResult]]: The index of each query, with its maximum score and best local alignments, in batch order.
+    """
+    targetCodes = encodeSeq(targetSeq)
+    batches = bucketQueries([len(querySeq) for querySeq in querySeqs], getBatchLanesAmt(len(targetSeq)))
+    # Queries are only encoded right before their batch is submitted:
+    tasks = ((targetCodes, [encodeSeq(querySeqs[queryId]) for queryId in batch],
+        matchScore, mismatchPenalty, gapPenalty, minScore, substitutions) for batch in batches)
+
+    with ExitStack() as stack:
+        # A single thread runs the batches in-process, with no pool:
+        pool = None if workersAmt == 1 else stack.enter_context(ThreadPool(workersAmt))
+        results = imapTasks(pool, alignQueryBatch, tasks) if pool else \
+            (alignQueryBatch(*task) for task in tasks)
+
+        for batch, batchResults in zip(batches, results): yield from zip(batch, batchResults)
+
+def findBatchedLocalAlignments(targetSeq:str, querySeqs:Sequence[str], matchScore:int, mismatchPenalty:int, gapPenalty:int, *, substitutions :SubstitutionScores|None = None, minScore = 1, workersAmt :int|None = None) -> list[QueryResult]:
+    """
+    Find all local alignments of many queries against the same target, see alignQueries.
+
+    Args:
+        targetSeq (str): The target sequence to align.
+        querySeqs (Sequence[str]): The query sequences to align.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+        minScore (int, optional): The minimum score of the queries whose alignments are reconstructed. Defaults to: 1.
+        workersAmt (int | None, optional): The amount of threads, if None as many as there are cores. Defaults to: None.
+
+    Returns:
+        list[QueryResult]: The maximum score and the best local alignments of each query, in query order.
+    """
+    results :list[QueryResult] = [(0, [])] * len(querySeqs)
+    for queryId, result in alignQueries(targetSeq, querySeqs, matchScore, mismatchPenalty, gapPenalty,
+        substitutions = substitutions, minScore = minScore, workersAmt = workersAmt): results[queryId] = result
+
+    return results
+
+def setupBatchArgParser() -> ArgumentParser:
+    """
+    Setup an argparse.ArgumentParser instance for the batched alignment of many queries.
+
+    Returns:
+        ArgumentParser: The parser, whose Namespace has the properties:
+            - .target_seq (str): Target DNA sequence or FASTA file path.
+            - .queries_path (str): FASTA file path of the queries.
+            - .target_pos (int | str): 1-based target DNA sequence position or record ID in FASTA file.
+            - .match_score (int): Match score.
+            - .mismatch_penalty (int): Mismatch penalty.
+            - .gap_penalty (int): Constant gap penalty.
+            - .substitution_matrix (str | None): Substitution matrix file path.
+            - .min_score (int): Minimum score of the queries whose alignments are reconstructed.
+            - .min_similarity (float): Minimum fraction of the k-mers of a query found in the target, 0 to align all of them.
+            - .kmer_size (int): Length of the k-mers of the sketches.
+            - .sketch_scale (int): Keeps 1 in this many k-mers in the sketches.
+            - .output_path (str): Path to the tab-separated output file.
+            - .jobs (int): Maximum number of used cores, 0 for all the usable ones.
+    """
+    parser = ArgumentParser(prog = "ParaSeq batch", description = BATCH_DESCR)
+    parser.add_argument("target_seq", type = str, help = TARGET_SEQ_HELP)
+    parser.add_argument("queries_path", type = str, help = QUERIES_HELP)
+    parser.add_argument("--target-pos", "-tp", type = seqRef, default = 1, help = TARGET_POS_HELP)
+    parser.add_argument("--match-score", "-m", type = uint, required = True, help = MATCH_HELP)
+    parser.add_argument("--mismatch-penalty", "-mm", type = uint, required = True, help = MISMATCH_HELP)
+    parser.add_argument("--gap-penalty", "-g", type = uint, required = True, help = GAP_HELP)
+    parser.add_argument("--substitution-matrix", "-sm", type = str, default = None, help = MATRIX_HELP)
+    parser.add_argument("--min-score", type = uint, default = 1, help = MIN_SCORE_HELP)
+    parser.add_argument("--min-similarity", type = fraction, default = 0, help = SIMILARITY_HELP)
+    parser.add_argument("--kmer-size", type = uint, default = SKETCH_KMER_SIZE, metavar = "K",
+        choices = range(1, SKETCH_MAX_KMER_SIZE + 1), help = KMER_SIZE_HELP)
+    parser.add_argument("--sketch-scale", type = positiveInt, default = SKETCH_SCALE, help = SCALE_HELP)
+    parser.add_argument("--output-path", "-o", type = str, default = BATCH_OUTPUT_PATH, help = BATCH_OUT_HELP)
+    parser.add_argument("--jobs", "-j", type = uint, default = 0, help = JOBS_HELP)
+    return parser
+
+def main(args :tuple[str, ...]|None = None) -> None:
+    """
+    Batched alignment entry point, writes a line for each alignment of each query (query
+    ID, score, target and query start and end positions, CIGAR), or just the query ID and
+    score for the queries without reconstructed alignments. The queries skipped by the
+    k-mer prefilter have no line.
+
+    Args:
+        args (tuple[str, ...] | None): The input arguments, if passed manually for testing purposes. Defaults to: None.
+    """
+    args = setupBatchArgParser().parse_args(args)
+    substitutions = None if args.substitution_matrix is None else readSubstitutionMatrix(
+        args.substitution_matrix, args.match_score, args.mismatch_penalty)
+
+    targetSeq = parseSeq(args.target_seq, args.target_pos, SeqName.Target)
+    records = parseFastaRecords(args.queries_path)
+    queryIds, querySeqs = [recordId for recordId, _ in records], [seq for _, seq in records]
+
+    if args.min_similarity:
+        print("Sketching the queries...")
+        keptIndexes = prefilterQueries(targetSeq, args.queries_path, querySeqs, args.min_similarity,
+            args.kmer_size, args.sketch_scale).tolist()
+        print(f"Skipped {len(querySeqs) - len(keptIndexes)} of {len(querySeqs)} queries sharing less than "
+            f"{args.min_similarity:.0%} of their k-mers with the target.")
+        queryIds, querySeqs = [queryIds[index] for index in keptIndexes], [querySeqs[index] for index in keptIndexes]
+
+    print(f"Aligning {len(querySeqs)} queries...")
+    if dirname(args.output_path): makedirs(dirname(args.output_path), exist_ok = True)
+    alignedAmt = 0
+    with open(args.output_path, 'w') as fd:
+        for queryId, (maxScore, alignments) in alignQueries(targetSeq, querySeqs, args.match_score,
+            args.mismatch_penalty, args.gap_penalty, substitutions = substitutions,
+            minScore = args.min_score, workersAmt = getUsableCpusAmt(args.jobs)):
+            alignedAmt += bool(alignments)
+            fd.writelines(f"{queryIds[queryId]}\t{maxScore}" + "".join(f"\t{value}" for value in alignment) + "\n"
+                for alignment in alignments or [()])
+
+    print(f"All done! {alignedAmt} queries have alignments, check them at \"{args.output_path}\".")
+
+if __name__ == "__main__": main()
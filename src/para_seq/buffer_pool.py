@@ -0,0 +1,164 @@
+## Buffer pool module, keeps shared memory segments alive across consecutive analyses
+from os                            import getpid
+from numpy                         import ndarray, dtype, uint8
+from para_seq                      import SHARED_POOL_MAX_IDLE, SHARED_POOL_MIN_SEGMENT, SHARED_POOL_NAME_PREFIX
+from threading                     import Lock
+from itertools                     import count
+from collections                   import OrderedDict
+from para_seq.utils                import getAvailableMemory, getSharedMemoryLimit
+from multiprocessing.shared_memory import SharedMemory
+
+# Names of the shared segments holding the score and directions matrices, which is all
+# the pooled processes need to attach to them:
+type MatrixNames = tuple[str, str]
+
+def getSegmentSize(bytesAmt:int) -> int:
+    """
+    Computes the size class of a shared segment holding the provided amount of bytes: the
+    next power of 2, so that segments fit many similar matrices and are reused often.
+    The pages past the bytes actually used are never touched, so on a new segment the
+    rounding costs no memory.
+
+    Args:
+        bytesAmt (int): The amount of bytes needed.
+
+    Returns:
+        int: The segment size, at least SHARED_POOL_MIN_SEGMENT.
+    """
+    return max(SHARED_POOL_MIN_SEGMENT, 1 << (bytesAmt - 1).bit_length())
+
+def getFreeMemory() -> int|None:
+    """
+    Retrieves how much memory a new shared segment can take, the least of the available
+    physical memory and the free shared memory.
+
+    Returns:
+        int | None: The free memory in bytes, or None if the platform doesn't expose it.
+    """
+    limits = [limit for limit in (getAvailableMemory(), getSharedMemoryLimit()) if limit is not None]
+    return min(limits, default = None)
+
+def _destroySegment(segment:SharedMemory) -> None:
+    """Unmaps and destroys a segment, no matrix viewing it can be used anymore."""
+    segment.close()
+    segment.unlink()
+
+class SharedBufferPool:
+    """
+    Shared memory segments kept alive across consecutive analyses, so that each one
+    doesn't create, zero-fill and destroy its own. Segments come in size classes and are
+    handed out as matrices of any shape fitting them. Idle segments are destroyed least
+    recently used first, once they take more than the allowed memory or when a new
+    segment wouldn't fit the free memory otherwise.
+    """
+    def __init__(self, *, maxIdleBytes = SHARED_POOL_MAX_IDLE) -> None:
+        """
+        Create an empty pool, its segments are created by the first analyses.
+
+        Args:
+            maxIdleBytes (int, optional): The most memory idle segments can take, 0 to destroy them as soon as they're released. Defaults to: SHARED_POOL_MAX_IDLE.
+        """
+        self.maxIdleBytes = maxIdleBytes
+        self.lock         = Lock()
+        self.idleSegments :OrderedDict[str, SharedMemory] = OrderedDict() # Least recently used first
+        self.busySegments :dict[str, SharedMemory] = {}
+        self.namesCounter = count()
+
+    def getIdleBytes(self) -> int:
+        """
+        Sums the sizes of the idle segments.
+
+        Returns:
+            int: The memory the idle segments take, in bytes.
+        """
+        with self.lock: return sum(segment.size for segment in self.idleSegments.values())
+
+    def _evictIdleSegment(self) -> None:
+        """Destroys the least recently used idle segment, the lock must be held."""
+        _, segment = self.idleSegments.popitem(last = False)
+        _destroySegment(segment)
+
+    def acquireSegment(self, bytesAmt:int) -> SharedMemory:
+        """
+        Provides a segment of at least the requested size for exclusive use until it's
+        released: the most recently used idle one of its size class, or a new one, after
+        destroying idle segments as long as the free memory can't fit it.
+
+        Args:
+            bytesAmt (int): The amount of bytes needed.
+
+        Returns:
+            SharedMemory: The segment, whose content is left from its last use.
+        """
+        segmentSize = getSegmentSize(bytesAmt)
+        with self.lock:
+            for name in reversed(self.idleSegments):
+                if self.idleSegments[name].size == segmentSize:
+                    self.busySegments[name] = segment = self.idleSegments.pop(name)
+                    return segment
+
+            while self.idleSegments:
+                freeMemory = getFreeMemory()
+                if freeMemory is None or freeMemory >= segmentSize: break
+                self._evictIdleSegment()
+
+            segment = SharedMemory(f"{SHARED_POOL_NAME_PREFIX}_{getpid()}_{next(self.namesCounter)}",
+                create = True, size = segmentSize)
+
+            self.busySegments[segment.name] = segment
+            return segment
+
+    def releaseSegment(self, name:str) -> None:
+        """
+        Marks a segment as idle, ready for the next analyses, then destroys idle segments
+        least recently used first until they fit the allowed memory.
+
+        Args:
+            name (str): The name of the segment.
+        """
+        with self.lock:
+            self.idleSegments[name] = self.busySegments.pop(name)
+            while sum(segment.size for segment in self.idleSegments.values()) > self.maxIdleBytes:
+                self._evictIdleSegment()
+
+    def acquireMatrices(self, shape:tuple[int, int], scoreType:dtype) -> tuple[ndarray, ndarray, MatrixNames]:
+        """
+        Provides score and directions matrices of the requested shape, viewing the start
+        of pooled segments. Only their first row and column are reset, the only cells the
+        fill reads before writing them.
+
+        Args:
+            shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+            scoreType (np.dtype): Type of the values in the score matrix.
+
+        Returns:
+            tuple:
+            - np.ndarray: The score matrix.
+            - np.ndarray: The directions matrix.
+            - MatrixNames: The names of their segments, to attach to them or release them.
+        """
+        scoreSegment = self.acquireSegment(shape[0] * shape[1] * dtype(scoreType).itemsize)
+        dirsSegment  = self.acquireSegment(shape[0] * shape[1])
+        scoreMatrix  = ndarray(shape, dtype = scoreType, buffer = scoreSegment.buf)
+        dirsMatrix   = ndarray(shape, dtype = uint8, buffer = dirsSegment.buf)
+        for matrix in (scoreMatrix, dirsMatrix):
+            matrix[0]    = 0
+            matrix[:, 0] = 0
+
+        return scoreMatrix, dirsMatrix, (scoreSegment.name, dirsSegment.name)
+
+    def releaseMatrices(self, names:MatrixNames) -> None:
+        """
+        Releases the segments of the matrices provided by acquireMatrices.
+
+        Args:
+            names (MatrixNames): The names of their segments.
+        """
+        for name in names: self.releaseSegment(name)
+
+    def close(self) -> None:
+        """Destroys all the segments of the pool, the matrices still viewing them can't be used anymore."""
+        with self.lock:
+            for segment in (*self.idleSegments.values(), *self.busySegments.values()): _destroySegment(segment)
+            self.idleSegments.clear()
+            self.busySegments.clear()
@@ -0,0 +1,200 @@
+## Checkpointed alignment module, trades recomputation for memory on large matrices
+from math                     import isqrt
+from numpy                    import ndarray, argwhere, dtype, uint8, uint32, empty, stack, zeros
+from para_seq                 import CHECKPOINT_CACHE_BLOCKS, Backend
+from functools                import lru_cache
+from collections.abc          import Callable, Iterator
+from para_seq.progress        import FillMonitor
+from para_seq.local_alignment import AnalysisParams, CompactAlignment, buildTracebackDag, \
+    encodeSeq, enumerateAlignments, fillTile, getGapExtension, getMatrixShape
+
+type Block = tuple[ndarray, ndarray] # Score and directions of a band of rows
+
+def getCheckpointInterval(rowsAmt:int) -> int:
+    """
+    Computes how many rows apart the checkpoints are kept, balancing the checkpoints
+    against the recomputed blocks: both take about the square root of the rows.
+
+    Args:
+        rowsAmt (int): The amount of rows of the full matrices.
+
+    Returns:
+        int: The interval between checkpoint rows, at least 1.
+    """
+    return max(isqrt(rowsAmt - 1), 1)
+
+def estimateCheckpointedMemory(shape:tuple[int, int], interval:int, scoreType:dtype, *, isAffine = False) -> int:
+    """
+    Estimates the peak memory of the checkpointed mode: the checkpoint rows plus the
+    cached blocks of recomputed rows.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the full matrices.
+        interval (int): The interval between checkpoint rows.
+        scoreType (np.dtype): Type of the values in the score matrix.
+        isAffine (bool, optional): If True the gaps are affine, so each checkpoint also keeps its vertical gap scores. Defaults to: False.
+
+    Returns:
+        int: The estimated peak memory, in bytes.
+    """
+    rowsAmt, columnsAmt = shape
+    checkpointsAmt = (rowsAmt - 2) // interval + 1
+    blockSize = (interval + 1) * columnsAmt * (dtype(scoreType).itemsize + 1)
+    return (checkpointsAmt * (1 + isAffine) * columnsAmt * dtype(scoreType).itemsize +
+        CHECKPOINT_CACHE_BLOCKS * blockSize)
+
+def fillBlock(analysisParams:AnalysisParams, checkpointRow:ndarray, firstY:int, rowsAmt:int, scoreType:dtype = uint32) -> tuple[int, Block, ndarray]:
+    """
+    Fills a band of rows of the score and directions matrices starting from the
+    checkpoint row right above it.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        checkpointRow (np.ndarray): The scores of the row above the band, stacked over its vertical gap scores if the gaps are affine.
+        firstY (int): The index of the first row of the band in the full matrices.
+        rowsAmt (int): The amount of rows in the band.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+
+    Returns:
+        tuple: The maximum score in the band, its score and directions with the checkpoint row on top, and the checkpoint row below it.
+    """
+    targetSeq, querySeq, *scores = analysisParams
+    # Horizontal gaps never cross the band edges, vertical ones continue from the checkpoint:
+    isAffine   = getGapExtension(analysisParams) is not None
+    upperRow   = checkpointRow[0] if isAffine else checkpointRow
+    gapBorders = (zeros(rowsAmt + 1, dtype = scoreType), checkpointRow[1].copy()) if isAffine else None
+    scoreBlock = empty((rowsAmt + 1, len(upperRow)), dtype = scoreType)
+    dirsBlock  = zeros((rowsAmt + 1, len(upperRow)), dtype = uint8)
+    scoreBlock[0] = upperRow
+    scoreBlock[:, 0] = 0 # The first column is always 0
+
+    # The query codes are shifted so that the band is filled as if it started at row 1:
+    maxScore = fillTile(scoreBlock, dirsBlock, (1, rowsAmt + 1, 1, len(upperRow)),
+        encodeSeq(targetSeq), encodeSeq(querySeq[firstY - 1:]), *scores, gapBorders = gapBorders)
+
+    nextCheckpointRow = stack((scoreBlock[-1], gapBorders[1])) if gapBorders else scoreBlock[-1]
+    return maxScore, (scoreBlock, dirsBlock), nextCheckpointRow
+
+def fillCheckpoints(analysisParams:AnalysisParams, interval:int, scoreType:dtype = uint32, monitor :FillMonitor|None = None) -> tuple[int, ndarray, list[tuple[int, int]]]:
+    """
+    Fills the score matrix one band of rows at a time, keeping only the last row of each
+    band along with the cells holding the maximum score.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        interval (int): The amount of rows in each band, so the interval between checkpoints.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+        monitor (FillMonitor | None, optional): Gets the progress after each band of rows, and stops the fill there once cancelled. Defaults to: None.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill.
+
+    Returns:
+        tuple:
+        - int: The maximum alignment score.
+        - np.ndarray: The checkpoint rows, the i-th being row i * interval of the full score matrix (stacked over its vertical gap scores if the gaps are affine).
+        - list[tuple[int, int]]: The (y, x) coordinates of the cells with the maximum score, in row-major order.
+    """
+    rowsAmt, columnsAmt = getMatrixShape(*analysisParams[:2])
+    rowShape = (2, columnsAmt) if getGapExtension(analysisParams) is not None else (columnsAmt,)
+    checkpoints = zeros(((rowsAmt - 2) // interval + 1, *rowShape), dtype = scoreType)
+    maxScore, maxCells = 0, []
+    if monitor: monitor.start((rowsAmt - 1) * (columnsAmt - 1), len(checkpoints))
+    for blockId, firstY in enumerate(range(1, rowsAmt, interval)):
+        blockRowsAmt = min(interval, rowsAmt - firstY)
+        blockMaxScore, (scoreBlock, _), nextCheckpointRow = fillBlock(
+            analysisParams, checkpoints[blockId], firstY, blockRowsAmt, scoreType)
+
+        if blockId + 1 < len(checkpoints): checkpoints[blockId + 1] = nextCheckpointRow
+        if monitor: monitor.completeWave(blockRowsAmt * (columnsAmt - 1))
+        if not blockMaxScore or blockMaxScore < maxScore: continue
+        if blockMaxScore > maxScore: maxScore, maxCells = blockMaxScore, []
+        maxCells.extend((int(y) + firstY - 1, int(x)) for y, x in argwhere(scoreBlock == maxScore) if y)
+
+    return maxScore, checkpoints, maxCells
+
+def createBlockLoader(analysisParams:AnalysisParams, checkpoints:ndarray, interval:int, scoreType:dtype = uint32) -> Callable[[int], Block]:
+    """
+    Creates a function recomputing the blocks of rows between consecutive checkpoints,
+    keeping the most recently used ones so that tracebacks going back and forth over the
+    same rows don't recompute them every time.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        checkpoints (np.ndarray): The checkpoint rows.
+        interval (int): The interval between checkpoint rows.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+
+    Returns:
+        Callable: The function returning the score and directions of the block at the provided index.
+    """
+    rowsAmt = getMatrixShape(*analysisParams[:2])[0]
+
+    @lru_cache(maxsize = CHECKPOINT_CACHE_BLOCKS)
+    def loadBlock(blockId:int) -> Block:
+        firstY = blockId * interval + 1
+        return fillBlock(analysisParams, checkpoints[blockId], firstY,
+            min(interval, rowsAmt - firstY), scoreType)[1]
+
+    return loadBlock
+
+class BlockMatrixView:
+    """Read-only [y, x] access to one of the matrices, recomputing blocks as needed."""
+    def __init__(self, loadBlock:Callable[[int], Block], interval:int, matrixId:int) -> None:
+        """
+        Create a view over the score (0) or directions (1) matrix.
+
+        Args:
+            loadBlock (Callable): The function returning the block at the provided index.
+            interval (int): The interval between checkpoint rows.
+            matrixId (int): 0 for the score matrix, 1 for the directions matrix.
+        """
+        self.loadBlock = loadBlock
+        self.interval  = interval
+        self.matrixId  = matrixId
+
+    def __getitem__(self, cell:tuple[int, int]) -> int:
+        y, x = cell
+        if not y: return 0 # The first row is always 0
+        blockId = (y - 1) // self.interval
+        return self.loadBlock(blockId)[self.matrixId][y - blockId * self.interval, x]
+
+def findCheckpointedLocalAlignments(analysisParams:AnalysisParams, *, interval = 0, backend = Backend.Thread, scoreType:dtype = uint32, workersAmt :int|None = None, monitor :FillMonitor|None = None, doStream = False, doLogProgress = False) -> tuple[int, list[CompactAlignment]|Iterator[CompactAlignment]]:
+    """
+    Find all local alignments starting from the provided analysis parameters, without
+    ever holding the full matrices: only every interval-th score row is kept during the
+    fill, and the traceback recomputes the blocks of rows its paths actually visit. The
+    results are identical to those of findLocalAlignments.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        interval (int, optional): The interval between checkpoint rows, if 0 about the square root of the rows. Defaults to: 0.
+        backend (Backend, optional): The kind of workers enumerating the alignments. Defaults to: Backend.Thread.
+        scoreType (np.dtype, optional): Type of the values in the score matrix, must fit the best possible score. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. Defaults to: None.
+        monitor (FillMonitor | None, optional): Follows the fill of the checkpoints and can cancel it, see fillCheckpoints. Defaults to: None.
+        doStream (bool, optional): If True the alignments are returned as an iterator reconstructing them lazily. Defaults to: False.
+        doLogProgress (bool, optional): If True prints analysis progress messages to standard output. Defaults to: False.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill.
+
+    Returns:
+        tuple: The maximum alignment score and all the compact local alignments, as a list or an iterator.
+    """
+    interval = interval or getCheckpointInterval(getMatrixShape(*analysisParams[:2])[0])
+    if doLogProgress: print(f"Filling score matrix, keeping one row every {interval}...")
+    maxScore, checkpoints, startCells = fillCheckpoints(analysisParams, interval, scoreType, monitor)
+
+    if doLogProgress: print("Reconstructing best local alignments...")
+    alignments :Iterator[CompactAlignment] = iter(())
+    if maxScore:
+        loadBlock = createBlockLoader(analysisParams, checkpoints, interval, scoreType)
+        dag = buildTracebackDag(BlockMatrixView(loadBlock, interval, 0),
+            BlockMatrixView(loadBlock, interval, 1), startCells)
+
+        loadBlock.cache_clear() # The DAG is all the traceback needs from now on
+        alignments = enumerateAlignments(dag, startCells, analysisParams,
+            backend = backend, scoreType = scoreType, workersAmt = workersAmt)
+
+    return maxScore, alignments if doStream else list(alignments)
@@ -0,0 +1,390 @@
+## Cluster module, spreads the target windows of an analysis over workers on several hosts
+from os                          import getenv, getpid
+from time                        import monotonic, sleep
+from numpy                       import dtype, uint32
+from socket                      import gethostname
+from argparse                    import ArgumentParser
+from para_seq                    import ADDRESS_ERR, CLUSTER_CONNECT_TIMEOUT, CLUSTER_HEARTBEAT_INTERVAL, \
+    CLUSTER_HOST, CLUSTER_KEY_ENV_VAR, CLUSTER_POLL_INTERVAL, CLUSTER_PORT, CLUSTER_PREFIX, \
+    CLUSTER_WORKER_TIMEOUT, COORDINATOR_HELP, JOBS_HELP, WORKER_DESCR
+from threading                   import Event, Lock, Thread
+from collections                 import deque
+from para_seq.utils              import CustomErr, getProcessContext, getUsableCpusAmt
+from para_seq.input_manager      import uint
+from multiprocessing.managers    import BaseManager
+from para_seq.local_alignment    import AnalysisParams, CompactAlignment
+from para_seq.windowed_alignment import _setWindowTaskConsts, alignWindow, computeWindowMaxScore, \
+    getAnalysisWindows
+
+type Address = tuple[str, int]
+# Task kind, analysis parameters and score type, shared by all the tasks of a round:
+type RoundInfo = tuple[str, AnalysisParams, dtype]
+
+# The tasks are sent by name, the workers look up the function:
+CLUSTER_TASKS = { "score" : computeWindowMaxScore, "align" : alignWindow }
+
+# Custom errors:
+class ClusterErr(CustomErr):
+    """Error class for distributed analyses that can't be run."""
+    msgPrefix = CLUSTER_PREFIX
+
+class TaskBoard:
+    """
+    The state of a distributed analysis, shared by the coordinator with its workers: the
+    tasks of the current round waiting for a worker, the ones running and their results.
+    Every call from a worker counts as a heartbeat, and the tasks of workers gone silent
+    for too long are handed out again, keeping the first result that comes back.
+    """
+    def __init__(self, workerTimeout:float = CLUSTER_WORKER_TIMEOUT) -> None:
+        """
+        Create an empty task board.
+
+        Args:
+            workerTimeout (float, optional): Seconds without heartbeats after which a worker is considered lost. Defaults to: CLUSTER_WORKER_TIMEOUT.
+        """
+        self.workerTimeout = workerTimeout
+        self.lock      = Lock() # Each worker connection is served by its own thread
+        self.roundId   = 0
+        self.roundInfo :RoundInfo|None = None
+        self.tasks     :list[tuple] = []
+        self.pending   :deque[int] = deque()
+        self.running   :dict[int, str] = {} # Task ID -> worker ID
+        self.results   :dict[int, object] = {}
+        self.error     = ""
+        self.lastSeen  :dict[str, float] = {} # Worker ID -> time of its last heartbeat
+
+    def startRound(self, taskKind:str, analysisParams:AnalysisParams, scoreType:dtype, tasks:list[tuple]) -> int:
+        """
+        Replaces the tasks on the board with a new round, dropping any late result of the
+        previous one.
+
+        Args:
+            taskKind (str): The kind of the tasks, a key of CLUSTER_TASKS.
+            analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+            scoreType (np.dtype): Type of the values in the windows' score matrices.
+            tasks (list[tuple]): The args of each task.
+
+        Returns:
+            int: The ID of the new round.
+        """
+        with self.lock:
+            self.roundId  += 1
+            self.roundInfo = taskKind, analysisParams, scoreType
+            self.tasks     = tasks
+            self.pending   = deque(range(len(tasks)))
+            self.running, self.results, self.error = {}, {}, ""
+            return self.roundId
+
+    def _requeueLostTasks(self) -> None:
+        """Puts back in front of the queue the tasks of the workers considered lost."""
+        now = monotonic()
+        for taskId, workerId in list(self.running.items()):
+            if now - self.lastSeen.get(workerId, now) > self.workerTimeout:
+                del self.running[taskId]
+                self.pending.appendleft(taskId)
+
+    def heartbeat(self, workerId:str) -> None:
+        """Records that the worker is still alive."""
+        with self.lock: self.lastSeen[workerId] = monotonic()
+
+    def takeTask(self, workerId:str, knownRoundId:int) -> tuple[int, int, tuple, RoundInfo|None]|None:
+        """
+        Hands out the next waiting task to a worker.
+
+        Args:
+            workerId (str): The ID of the worker.
+            knownRoundId (int): The round the worker has the info of, 0 for none.
+
+        Returns:
+            tuple | None: The round ID, the task ID, its args and the round info if the worker doesn't have it yet, or None if no task is waiting.
+        """
+        with self.lock:
+            self.lastSeen[workerId] = monotonic()
+            self._requeueLostTasks()
+            if not self.pending: return None
+
+            taskId = self.pending.popleft()
+            self.running[taskId] = workerId
+            roundInfo = self.roundInfo if knownRoundId != self.roundId else None
+            return self.roundId, taskId, self.tasks[taskId], roundInfo
+
+    def putResult(self, workerId:str, roundId:int, taskId:int, result:object, error = "") -> None:
+        """
+        Stores the result of a task, unless it belongs to a past round or a retry of the
+        same task already finished.
+
+        Args:
+            workerId (str): The ID of the worker.
+            roundId (int): The round of the task.
+            taskId (int): The ID of the task.
+            result (object): The value returned by the task.
+            error (str, optional): The error raised by the task instead, if any. Defaults to: "".
+        """
+        with self.lock:
+            self.lastSeen[workerId] = monotonic()
+            if roundId != self.roundId or taskId in self.results: return
+
+            self.running.pop(taskId, None)
+            self.results[taskId] = result
+            if error: self.error = error
+
+    def collectResults(self, roundId:int) -> tuple[str, list|None]:
+        """
+        Collects the results of a round, also handing out again the tasks of lost workers.
+
+        Args:
+            roundId (int): The round whose results to collect.
+
+        Returns:
+            tuple: The first error raised by a task ("" if none) and the results ordered by task, or None if the round isn't done.
+        """
+        with self.lock:
+            self._requeueLostTasks()
+            if roundId != self.roundId or len(self.results) < len(self.tasks): return self.error, None
+            return self.error, [self.results[taskId] for taskId in range(len(self.tasks))]
+
+# The board lives in the manager process, created by its initializer:
+TASK_BOARD = TaskBoard()
+def _createTaskBoard(workerTimeout:float) -> None:
+    """Creates the task board of the manager process."""
+    global TASK_BOARD
+    TASK_BOARD = TaskBoard(workerTimeout)
+
+def _getTaskBoard() -> TaskBoard:
+    """Provides the task board of the manager process to the connecting proxies."""
+    return TASK_BOARD
+
+class ClusterManager(BaseManager):
+    """Manager sharing the task board of the coordinator with the workers over the network."""
+
+ClusterManager.register("getTaskBoard", callable = _getTaskBoard)
+
+def getClusterKey() -> bytes:
+    """
+    Retrieves the secret shared by the hosts of the cluster, which authenticates every
+    connection to the coordinator.
+
+    Raises:
+        ClusterErr: If the environment variable holding it is not set.
+
+    Returns:
+        bytes: The cluster key.
+    """
+    key = getenv(CLUSTER_KEY_ENV_VAR)
+    if not key: raise ClusterErr("no cluster key was provided",
+        f"set the {CLUSTER_KEY_ENV_VAR} environment variable to the same secret on every host")
+
+    return key.encode()
+
+# Type casting function passed to some ArgumentParser args
+def address(value:str) -> Address:
+    """
+    Type casting function from string to network address.
+
+    Args:
+        value (str): The string representation of an address, like "node1:52438".
+
+    Raises:
+        ValueError: When the provided string does not represent an address.
+
+    Returns:
+        Address: The host and the port.
+    """
+    host, _, port = value.rpartition(':')
+    if not host or not port.isdigit(): raise ValueError(ADDRESS_ERR.format(value))
+
+    return host, int(port)
+
+class ClusterCoordinator:
+    """
+    Runs the task board of a distributed analysis in a manager process listening for
+    workers, and hands out the rounds of tasks of each analysis through it.
+    """
+    def __init__(self, authkey:bytes, *, host = CLUSTER_HOST, port = CLUSTER_PORT, workerTimeout:float = CLUSTER_WORKER_TIMEOUT) -> None:
+        """
+        Create a coordinator, listening right away.
+
+        Args:
+            authkey (bytes): The secret shared with the workers.
+            host (str, optional): The address to listen on. Defaults to: CLUSTER_HOST.
+            port (int, optional): The port to listen on, if 0 any free one, see the address attribute. Defaults to: CLUSTER_PORT.
+            workerTimeout (float, optional): Seconds without heartbeats after which a worker is considered lost. Defaults to: CLUSTER_WORKER_TIMEOUT.
+        """
+        self.manager = ClusterManager((host, port), authkey)
+        self.manager.start(_createTaskBoard, (workerTimeout,))
+        self.address :Address = self.manager.address
+        self.board = self.manager.getTaskBoard()
+
+    def runTasks(self, taskKind:str, analysisParams:AnalysisParams, scoreType:dtype, tasks:list[tuple]) -> list:
+        """
+        Runs a round of tasks on the workers, waiting for all of them to be done.
+
+        Args:
+            taskKind (str): The kind of the tasks, a key of CLUSTER_TASKS.
+            analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+            scoreType (np.dtype): Type of the values in the windows' score matrices.
+            tasks (list[tuple]): The args of each task.
+
+        Raises:
+            ClusterErr: If a task raised an error on its worker.
+
+        Returns:
+            list: The results of the tasks, in the same order.
+        """
+        roundId = self.board.startRound(taskKind, analysisParams, scoreType, tasks)
+        while True:
+            error, results = self.board.collectResults(roundId)
+            if error: raise ClusterErr("a worker couldn't run its task", error.rstrip('.'))
+            if results is not None: return results
+            sleep(CLUSTER_POLL_INTERVAL)
+
+    def close(self) -> None:
+        """Stops listening, which also makes the connected workers exit."""
+        self.manager.shutdown()
+
+# Contains some prints since it's meant to replace findLocalAlignments in the main file:
+def findDistributedLocalAlignments(analysisParams:AnalysisParams, windowSize:int, coordinator:ClusterCoordinator, *, scoreType:dtype = uint32, doLogProgress = False) -> tuple[int, list[CompactAlignment]]:
+    """
+    Find all local alignments by splitting the target into overlapping windows, like the
+    windowed mode, scored and then aligned by the workers of the cluster. The windows'
+    alignments are merged in target order, so the results match a full alignment exactly.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        windowSize (int): The desired window size, raised to the maximum alignment span if smaller.
+        coordinator (ClusterCoordinator): The coordinator the workers are connected to.
+        scoreType (np.dtype, optional): Type of the values in the windows' score matrices, must fit the best possible score. Defaults to: np.uint32.
+        doLogProgress (bool, optional): If True prints analysis progress messages to standard output. Defaults to: False.
+
+    Raises:
+        ClusterErr: If a task raised an error on its worker.
+
+    Returns:
+        tuple: The maximum alignment score and all the compact local alignments.
+    """
+    targetSeq = analysisParams[0]
+    windows = getAnalysisWindows(analysisParams, windowSize)
+    if doLogProgress: print(f"Scoring {len(windows)} target windows on the cluster...")
+    windowScores = coordinator.runTasks("score", analysisParams, scoreType, windows)
+
+    maxScore = max(windowScores)
+    if not maxScore: return 0, []
+
+    # Only the windows reaching the best score need the traceback:
+    if doLogProgress: print("Reconstructing best local alignments on the cluster...")
+    nextWindows = windows[1:] + [(len(targetSeq), len(targetSeq))]
+    tasks = [(*window, *nextWindow)
+        for window, nextWindow, score in zip(windows, nextWindows, windowScores)
+        if score == maxScore]
+
+    windowsAlignments = coordinator.runTasks("align", analysisParams, scoreType, tasks)
+    return maxScore, [alignment for alignments in windowsAlignments for alignment in alignments]
+
+def _connect(address:Address, authkey:bytes, connectTimeout:float) -> ClusterManager:
+    """Connects to the coordinator, waiting for it to start listening if needed."""
+    manager = ClusterManager(address, authkey)
+    deadline = monotonic() + connectTimeout
+    while True:
+        try:
+            manager.connect()
+            return manager
+
+        except ConnectionRefusedError:
+            if monotonic() >= deadline: raise ClusterErr(
+                "no coordinator is listening", "{}:{}".format(*address))
+
+            sleep(CLUSTER_HEARTBEAT_INTERVAL)
+
+def _sendHeartbeats(manager:ClusterManager, workerId:str, stopped:Event) -> None:
+    """Tells the coordinator the worker is alive, even while a long task runs."""
+    board = manager.getTaskBoard()
+    try:
+        while not stopped.wait(CLUSTER_HEARTBEAT_INTERVAL): board.heartbeat(workerId)
+    except (EOFError, OSError): pass # The coordinator is done
+
+def runWorker(coordinatorAddress:Address, authkey:bytes, *, connectTimeout:float = CLUSTER_CONNECT_TIMEOUT) -> None:
+    """
+    Runs the tasks of a coordinator one at a time in this process, sending heartbeats
+    from a background thread, until the coordinator stops listening.
+
+    Args:
+        coordinatorAddress (Address): The host and port of the coordinator.
+        authkey (bytes): The secret shared with the coordinator.
+        connectTimeout (float, optional): Seconds to wait for the coordinator to start listening. Defaults to: CLUSTER_CONNECT_TIMEOUT.
+
+    Raises:
+        ClusterErr: If the coordinator didn't start listening in time.
+    """
+    manager  = _connect(coordinatorAddress, authkey, connectTimeout)
+    workerId = f"{gethostname()}:{getpid()}"
+    stopped  = Event()
+    Thread(target = _sendHeartbeats, args = (manager, workerId, stopped), daemon = True).start()
+
+    board, knownRoundId, taskKind = manager.getTaskBoard(), 0, ""
+    try:
+        while True:
+            task = board.takeTask(workerId, knownRoundId)
+            if task is None:
+                sleep(CLUSTER_POLL_INTERVAL)
+                continue
+
+            roundId, taskId, args, roundInfo = task
+            if roundInfo: # Same trick as the pools: values shared by the round's tasks are set once
+                taskKind, analysisParams, scoreType = roundInfo
+                _setWindowTaskConsts(analysisParams, scoreType)
+                knownRoundId = roundId
+
+            try: result, error = CLUSTER_TASKS[taskKind](*args), ""
+            except Exception as err: result, error = None, str(err) or repr(err)
+            board.putResult(workerId, roundId, taskId, result, error)
+
+    except (EOFError, OSError): pass # The coordinator is done
+    finally: stopped.set()
+
+def runWorkers(coordinatorAddress:Address, authkey:bytes, workersAmt :int|None = None, *, connectTimeout:float = CLUSTER_CONNECT_TIMEOUT) -> None:
+    """
+    Runs a worker process per usable core (or the provided amount), until the coordinator
+    stops listening.
+
+    Args:
+        coordinatorAddress (Address): The host and port of the coordinator.
+        authkey (bytes): The secret shared with the coordinator.
+        workersAmt (int | None, optional): The amount of worker processes, if None as many as there are usable cores. Defaults to: None.
+        connectTimeout (float, optional): Seconds to wait for the coordinator to start listening. Defaults to: CLUSTER_CONNECT_TIMEOUT.
+    """
+    workers = [getProcessContext().Process(target = runWorker, args = (coordinatorAddress, authkey),
+        kwargs = { "connectTimeout" : connectTimeout }) for _ in range(workersAmt or getUsableCpusAmt())]
+
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+
+def setupWorkerArgParser() -> ArgumentParser:
+    """
+    Setup an argparse.ArgumentParser instance for the cluster workers.
+
+    Returns:
+        ArgumentParser: The parser, whose Namespace has the properties:
+            - .coordinator (Address): Host and port of the coordinator.
+            - .jobs (int): Maximum number of used cores, 0 for all the usable ones.
+    """
+    parser = ArgumentParser(prog = "ParaSeq cluster worker", description = WORKER_DESCR)
+    parser.add_argument("coordinator", type = address, help = COORDINATOR_HELP)
+    parser.add_argument("--jobs", "-j", type = uint, default = 0, help = JOBS_HELP)
+    return parser
+
+def main(args :tuple[str, ...]|None = None) -> None:
+    """
+    Cluster worker entry point, works until the coordinator is done.
+
+    Args:
+        args (tuple[str, ...] | None): The input arguments, if passed manually for testing purposes. Defaults to: None.
+    """
+    args = setupWorkerArgParser().parse_args(args)
+    authkey = getClusterKey()
+    workersAmt = getUsableCpusAmt(args.jobs)
+    print("Working for the coordinator on {}:{} with {} processes...".format(*args.coordinator, workersAmt))
+    runWorkers(args.coordinator, authkey, workersAmt)
+
+if __name__ == "__main__":
+    try: main()
+    except KeyboardInterrupt: print("The cluster worker was stopped.")
@@ -0,0 +1,254 @@
+## Differential testing module, checks every engine against the serial reference engine
+from numpy.random                    import Generator, default_rng
+from para_seq                        import CASES_HELP, DIFFERENTIAL_CASES, DIFFERENTIAL_DESCR, \
+    DIFFERENTIAL_MAX_SEQ_LEN, DIFFERENTIAL_TILE_SIZE, DIFFERENTIAL_WORKERS, DISCREPANCY_PREFIX, \
+    ENGINES_HELP, IUPAC_NUCLEOTIDES, MAX_LENGTH_HELP, SEED_HELP, Backend
+from argparse                        import ArgumentParser
+from para_seq.utils                  import CustomErr, ellipsize
+from collections.abc                 import Callable, Iterator, Sequence
+from para_seq.input_manager          import getScores, positiveInt, uint
+from para_seq.local_alignment        import AnalysisParams, CompactAlignment, findLocalAlignments, \
+    getGapExtension, getSubstitutions
+from para_seq.resumable_fill         import findResumableLocalAlignments
+from para_seq.batched_alignment      import findBatchedLocalAlignments
+from para_seq.windowed_alignment     import findWindowedLocalAlignments
+from para_seq.checkpointed_alignment import findCheckpointedLocalAlignments
+
+# Maximum score and all the compact local alignments, sorted so that results compare as sets:
+type EngineResult = tuple[int, list[CompactAlignment]]
+# Runs a whole analysis, returning None if the engine can't run analyses like that one:
+type Engine       = Callable[[AnalysisParams], tuple[int, Sequence[CompactAlignment]]|None]
+
+# Custom errors:
+class DiscrepancyErr(CustomErr):
+    """Error class for engines finding different results than the serial reference engine."""
+    msgPrefix = DISCREPANCY_PREFIX
+
+def _mutateSeq(rng:Generator, seq:str, mutationRate:float) -> str:
+    """Substitutes, deletes or inserts a random nucleotide at each position, with the provided probability."""
+    nucleotides :list[str] = []
+    for nucleotide, roll in zip(seq, rng.random(len(seq))):
+        if roll < mutationRate / 3: continue # Deletion
+        nucleotides.append(str(rng.choice(list("ACGT"))) if roll < mutationRate * 2 / 3 else nucleotide)
+        if roll < mutationRate: nucleotides.append(str(rng.choice(list("ACGT")))) # Insertion
+
+    return "".join(nucleotides) or seq
+
+def generateSeqPair(rng:Generator, maxSeqLen = DIFFERENTIAL_MAX_SEQ_LEN) -> tuple[str, str]:
+    """
+    Generates a random pair of DNA sequences of one of the kinds the engines have to
+    agree on: unrelated, repeats of a short unit (with many co-optimal alignments), or a
+    mutated piece of the target as query. Some of them have ambiguous IUPAC codes too.
+
+    Args:
+        rng (np.random.Generator): The source of randomness.
+        maxSeqLen (int, optional): The maximum length of each sequence. Defaults to: DIFFERENTIAL_MAX_SEQ_LEN.
+
+    Returns:
+        tuple[str, str]: The target and query sequences, at least 1 nucleotide long.
+    """
+    def randomSeq(seqLen:int, nucleotides = "ACGT") -> str:
+        return "".join(rng.choice(list(nucleotides), seqLen))
+
+    targetLen, queryLen = (int(seqLen) for seqLen in rng.integers(1, maxSeqLen + 1, 2))
+    match int(rng.integers(3)):
+        case 0: targetSeq, querySeq = randomSeq(targetLen), randomSeq(queryLen)
+        case 1: # Repeats, of the same unit or of different ones
+            unit = randomSeq(int(rng.integers(1, 5)))
+            targetSeq = _mutateSeq(rng, (unit * targetLen)[:targetLen], 0.05)
+            if rng.random() < 0.5: unit = randomSeq(int(rng.integers(1, 5)))
+            querySeq  = _mutateSeq(rng, (unit * queryLen)[:queryLen], 0.05)
+
+        case _: # Related, like a read of the target
+            targetSeq = randomSeq(targetLen)
+            start = int(rng.integers(targetLen))
+            querySeq = _mutateSeq(rng, targetSeq[start:start + queryLen], 0.2)[:maxSeqLen]
+
+    if rng.random() < 0.25: # Sprinkles ambiguous codes over one of the sequences
+        isTarget = rng.random() < 0.5
+        seq = targetSeq if isTarget else querySeq
+        ambiguousSeq = "".join(randomSeq(1, IUPAC_NUCLEOTIDES[4:]) if roll < 0.2 else nucleotide
+            for nucleotide, roll in zip(seq, rng.random(len(seq))))
+        targetSeq, querySeq = (ambiguousSeq, querySeq) if isTarget else (targetSeq, ambiguousSeq)
+
+    return targetSeq, querySeq
+
+def generateAnalysisParams(rng:Generator, maxSeqLen = DIFFERENTIAL_MAX_SEQ_LEN) -> AnalysisParams:
+    """
+    Generates a random analysis: a pair of sequences (see generateSeqPair) and random
+    scores, with affine gaps or a random substitution matrix once in a while. Scores are
+    kept positive so that the co-optimal alignments stay few enough to enumerate.
+
+    Args:
+        rng (np.random.Generator): The source of randomness.
+        maxSeqLen (int, optional): The maximum length of each sequence. Defaults to: DIFFERENTIAL_MAX_SEQ_LEN.
+
+    Returns:
+        AnalysisParams: The analysis parameters, laid out like the ones of the command line.
+    """
+    targetSeq, querySeq = generateSeqPair(rng, maxSeqLen)
+    matchScore, mismatchPenalty, gapPenalty = (int(score) for score in rng.integers(1, 6, 3))
+    gapExtension = int(rng.integers(1, gapPenalty + 1)) if rng.random() < 1 / 3 else None
+    substitutions = tuple(tuple(int(score) for score in row) for row in rng.integers(
+        -mismatchPenalty, matchScore + 1, (len(IUPAC_NUCLEOTIDES), len(IUPAC_NUCLEOTIDES)))) \
+        if rng.random() < 0.25 else None
+
+    return (targetSeq, querySeq,
+        *getScores(matchScore, mismatchPenalty, gapPenalty, gapExtension, substitutions))
+
+def _alignBatched(analysisParams:AnalysisParams) -> tuple[int, Sequence[CompactAlignment]]|None:
+    """Aligns the query as the only one of a batch, which only knows linear gaps."""
+    if getGapExtension(analysisParams) is not None: return None
+    targetSeq, querySeq, matchScore, mismatchPenalty, gapPenalty, *_ = analysisParams
+    return findBatchedLocalAlignments(targetSeq, [querySeq], matchScore, mismatchPenalty, gapPenalty,
+        substitutions = getSubstitutions(analysisParams), workersAmt = DIFFERENTIAL_WORKERS)[0]
+
+# Every way of running an analysis, with tiny tiles, windows and bands of rows so that
+# short sequences go through as many of their edges as possible. The cluster and the job
+# server run the windowed and thread engines on their workers, so they're covered here:
+DIFFERENTIAL_ENGINES :dict[str, Engine] = {
+    "serial" : lambda params: findLocalAlignments(params, backend = Backend.Serial),
+    "thread" : lambda params: findLocalAlignments(params, backend = Backend.Thread,
+        tileSize = DIFFERENTIAL_TILE_SIZE, workersAmt = DIFFERENTIAL_WORKERS),
+    "thread-single" : lambda params: findLocalAlignments(params, backend = Backend.Thread, workersAmt = 1),
+    "process" : lambda params: findLocalAlignments(params, backend = Backend.Process,
+        tileSize = DIFFERENTIAL_TILE_SIZE, workersAmt = DIFFERENTIAL_WORKERS),
+    "windowed-thread" : lambda params: findWindowedLocalAlignments(params, 1, backend = Backend.Thread,
+        workersAmt = DIFFERENTIAL_WORKERS),
+    "windowed-process" : lambda params: findWindowedLocalAlignments(params, 1, backend = Backend.Process,
+        workersAmt = DIFFERENTIAL_WORKERS),
+    "windowed-serial" : lambda params: findWindowedLocalAlignments(params, 1, backend = Backend.Serial),
+    "checkpointed" : lambda params: findCheckpointedLocalAlignments(params, interval = 3,
+        backend = Backend.Thread, workersAmt = DIFFERENTIAL_WORKERS),
+    "resumable" : lambda params: findResumableLocalAlignments(params, backend = Backend.Thread,
+        tileSize = DIFFERENTIAL_TILE_SIZE, workersAmt = DIFFERENTIAL_WORKERS),
+    "batched" : _alignBatched }
+REFERENCE_ENGINE = "serial"
+
+def runEngine(engineName:str, analysisParams:AnalysisParams) -> EngineResult|None:
+    """
+    Runs an analysis on the engine with the provided name.
+
+    Args:
+        engineName (str): The name of the engine, a key of DIFFERENTIAL_ENGINES.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        EngineResult | None: The maximum score and the sorted alignments, or None if the engine can't run the analysis.
+    """
+    result = DIFFERENTIAL_ENGINES[engineName](analysisParams)
+    if result is None: return None
+    maxScore, alignments = result
+    return int(maxScore), sorted(map(tuple, alignments))
+
+def compareEngines(analysisParams:AnalysisParams, engineNames :Sequence[str]|None = None) -> tuple[EngineResult, dict[str, EngineResult]]:
+    """
+    Runs an analysis on the serial reference engine and on the provided ones, collecting
+    the results of the engines that don't agree with it on the maximum score or on the
+    set of best alignments.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        engineNames (Sequence[str] | None, optional): The names of the engines to check, if None all of them. Defaults to: None.
+
+    Returns:
+        tuple:
+        - EngineResult: The result of the reference engine.
+        - dict[str, EngineResult]: The results of the engines disagreeing with it, by engine name.
+    """
+    reference = runEngine(REFERENCE_ENGINE, analysisParams)
+    discrepancies :dict[str, EngineResult] = {}
+    for engineName in engineNames or DIFFERENTIAL_ENGINES:
+        if engineName == REFERENCE_ENGINE: continue
+        result = runEngine(engineName, analysisParams)
+        if result is not None and result != reference: discrepancies[engineName] = result
+
+    return reference, discrepancies
+
+def fuzzEngines(casesAmt = DIFFERENTIAL_CASES, *, seed = 0, maxSeqLen = DIFFERENTIAL_MAX_SEQ_LEN, engineNames :Sequence[str]|None = None) -> Iterator[tuple[AnalysisParams, EngineResult, dict[str, EngineResult]]]:
+    """
+    Checks the provided engines against the serial reference engine on random analyses,
+    see generateAnalysisParams and compareEngines. The same seed always generates the
+    same analyses, so any discrepancy can be reproduced.
+
+    Args:
+        casesAmt (int, optional): The amount of random analyses. Defaults to: DIFFERENTIAL_CASES.
+        seed (int, optional): The seed of the random analyses. Defaults to: 0.
+        maxSeqLen (int, optional): The maximum length of each sequence. Defaults to: DIFFERENTIAL_MAX_SEQ_LEN.
+        engineNames (Sequence[str] | None, optional): The names of the engines to check, if None all of them. Defaults to: None.
+
+    Returns:
+        Iterator: The analyses some engines disagree on, each with the reference result and the disagreeing ones.
+    """
+    rng = default_rng(seed)
+    for _ in range(casesAmt):
+        analysisParams = generateAnalysisParams(rng, maxSeqLen)
+        reference, discrepancies = compareEngines(analysisParams, engineNames)
+        if discrepancies: yield analysisParams, reference, discrepancies
+
+def describeDiscrepancy(analysisParams:AnalysisParams, reference:EngineResult, discrepancies:dict[str, EngineResult]) -> str:
+    """
+    Describes an analysis the engines disagree on, along with what each of them found.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        reference (EngineResult): The result of the reference engine.
+        discrepancies (dict[str, EngineResult]): The results of the engines disagreeing with it, by engine name.
+
+    Returns:
+        str: The description, a line for the analysis and one for each engine.
+    """
+    targetSeq, querySeq, *scores = analysisParams
+    if getSubstitutions(analysisParams) is not None: scores[-1] = "substitution matrix"
+    lines = [f"{targetSeq} {querySeq} {', '.join(map(str, scores))}"]
+    for engineName, (maxScore, alignments) in {REFERENCE_ENGINE : reference, **discrepancies}.items():
+        lines.append(f"  {engineName}: score {maxScore}, {len(alignments)} alignments, " +
+            ellipsize(" ".join(alignment[4] + f"@{alignment[0]},{alignment[1]}" for alignment in alignments), 200))
+
+    return "\n".join(lines)
+
+def setupDifferentialArgParser() -> ArgumentParser:
+    """
+    Setup an argparse.ArgumentParser instance for the differential testing of the engines.
+
+    Returns:
+        ArgumentParser: The parser, whose Namespace has the properties:
+            - .cases (int): Number of random analyses.
+            - .seed (int): Seed of the random analyses.
+            - .max_length (int): Maximum length of the random sequences.
+            - .engines (list[str]): Names of the engines to check.
+    """
+    parser = ArgumentParser(prog = "ParaSeq differential", description = DIFFERENTIAL_DESCR)
+    parser.add_argument("--cases", "-n", type = positiveInt, default = DIFFERENTIAL_CASES, help = CASES_HELP)
+    parser.add_argument("--seed", "-s", type = uint, default = 0, help = SEED_HELP)
+    parser.add_argument("--max-length", "-l", type = positiveInt, default = DIFFERENTIAL_MAX_SEQ_LEN,
+        help = MAX_LENGTH_HELP)
+    parser.add_argument("--engines", "-e", nargs = "+", default = list(DIFFERENTIAL_ENGINES),
+        choices = list(DIFFERENTIAL_ENGINES), help = ENGINES_HELP)
+    return parser
+
+def main(args :tuple[str, ...]|None = None) -> None:
+    """
+    Differential testing entry point, prints every analysis the engines disagree on.
+
+    Raises:
+        DiscrepancyErr: If the engines disagreed on any analysis.
+
+    Args:
+        args (tuple[str, ...] | None): The input arguments, if passed manually for testing purposes. Defaults to: None.
+    """
+    args = setupDifferentialArgParser().parse_args(args)
+    print(f"Checking {len(args.engines)} engines against the {REFERENCE_ENGINE} one on {args.cases} random analyses...")
+    failedCasesAmt = 0
+    for case in fuzzEngines(args.cases, seed = args.seed, maxSeqLen = args.max_length, engineNames = args.engines):
+        failedCasesAmt += 1
+        print(describeDiscrepancy(*case))
+
+    if failedCasesAmt: raise DiscrepancyErr(f"they disagree on {failedCasesAmt} of {args.cases} analyses",
+        f"rerun with seed {args.seed} to reproduce them")
+
+    print(f"All done! The engines agree on all the {args.cases} analyses.")
+
+if __name__ == "__main__":
+    try: main()
+    except DiscrepancyErr as err: raise SystemExit(str(err))
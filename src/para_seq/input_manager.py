@@ -1,9 +1,19 @@
 ## Input manager module
-from os             import SEEK_END
-from pyfastx        import Fasta
+from __future__     import annotations
+from os             import makedirs, stat
+from typing         import TYPE_CHECKING
+from hashlib        import sha256
+from os.path        import abspath, join
 from para_seq       import *
 from argparse       import ArgumentParser, Namespace
-from para_seq.utils import CustomErr, ellipsize
+from functools      import cache, lru_cache
+from para_seq.utils import CustomErr, ellipsize, getCacheDir
+
+# numpy and pyfastx are only imported once a sequence is parsed, so that the arguments
+# are parsed (and --help printed) without waiting for them:
+if TYPE_CHECKING:
+    from numpy   import ndarray
+    from pyfastx import Fasta
 
 # Custom errors:
 class IdenticalSeqsErr(CustomErr):
@@ -22,10 +32,19 @@ class InvalidFileErr(CustomErr):
     """Error class for invalid FASTA or output (.txt) files."""
     msgPrefix = INVALID_FILE_PREFIX
 
+class InvalidScoresErr(CustomErr):
+    """Error class for scores that are valid on their own, but not together."""
+    msgPrefix = INVALID_SCORES_PREFIX
+
+class InvalidMatrixErr(CustomErr):
+    """Error class for malformed substitution matrices."""
+    msgPrefix = INVALID_MATRIX_PREFIX
+
 # This method can be considered enough to discern between a file and a raw DNA seq.
 def isValidFastaFilePath(filePath:str) -> bool:
     """
-    Simply checks if the provided string ends with a valid FASTA file extension.
+    Simply checks if the provided string ends with a valid FASTA file extension, optionally
+    followed by ".gz" for gzip (or bgzip) compressed files.
 
     Args:
         filePath (str): The string to check.
@@ -33,12 +52,52 @@ def isValidFastaFilePath(filePath:str) -> bool:
     Returns:
         bool: If the string can be considered a valid FASTA file path or not.
     """
-    return filePath.lower().endswith((".fa", ".fasta"))
+    return filePath.lower().removesuffix(".gz").endswith((".fa", ".fasta"))
+
+@cache
+def getNucleotideCodes() -> ndarray:
+    """
+    Builds the upper-case ASCII code of every byte that is a valid nucleotide in either
+    case, 0 for all the other bytes. A single lookup validates and upper-cases a whole
+    sequence.
+
+    Returns:
+        np.ndarray: 1D-array of 256 uint8 codes, indexed by byte.
+    """
+    from numpy import uint8, zeros
+    nucleotideCodes = zeros(256, dtype = uint8)
+    for nucleotide in IUPAC_NUCLEOTIDES.encode(): nucleotideCodes[[nucleotide, nucleotide | 0x20]] = nucleotide
+    return nucleotideCodes
+
+def encodeDNA(seq:str) -> ndarray:
+    """
+    Validates case-insensitively a DNA sequence against the IUPAC nucleotide codes and
+    encodes it as the upper-case ASCII codes of its nucleotides, in a single vectorized
+    pass over its bytes.
+
+    Args:
+        seq (str): The provided sequence string.
+
+    Raises:
+        InvalidSeqErr: If the sequence is empty or has characters outside of the IUPAC nucleotide codes, reporting the first one.
+
+    Returns:
+        np.ndarray: 1D-array of uint8 upper-case nucleotide codes, one per sequence character.
+    """
+    from numpy import frombuffer, uint8
+    if not seq: raise InvalidSeqErr("the sequence is empty")
+    try: codes = getNucleotideCodes()[frombuffer(seq.encode("ascii"), dtype = uint8)]
+    except UnicodeEncodeError as err: invalidPos = err.start # Not even ASCII
+    else:
+        if codes.all(): return codes
+        invalidPos = int(codes.argmin()) # The first 0
+
+    raise InvalidSeqErr(f"found \"{seq[invalidPos]}\" at position {invalidPos + 1}")
 
 def isValidDNA(seq:str) -> bool:
     """
     Checks case-insensitively that the provided string is non-empty and made up entirely
-    of valid DNA nucleotide characters in the (mostly) unambiguous "ACGTN" alphabet.
+    of valid DNA nucleotide characters, the IUPAC nucleotide codes.
 
     Args:
         seq (str): The provided sequence string.
@@ -46,11 +105,9 @@ def isValidDNA(seq:str) -> bool:
     Returns:
         bool: If the sequence can be considered valid DNA or not.
     """
-    # Adding the lowercase variants to the set instead of calling seq.upper() is perhaps
-    # premature and needless optimization, but let's go for it:
-    return seq and set(seq) <= {'A', 'C', 'G', 'T', 'N', 'a', 'c', 'g', 't', 'n'}
-    # ^^^ checking the seq itself avoids the set computation for empty strs, which are
-    # obviously invalid but also should never happen given how the program works.
+    try: encodeDNA(seq)
+    except InvalidSeqErr: return False
+    return True
 
 # Type casting function passed to some ArgumentParser args
 def uint(value:str) -> int:
@@ -73,7 +130,215 @@ def uint(value:str) -> int:
     
     return int(value)
 
-type DNA = str # Valid DNA, all the characters belong to the ACGTN set.
+# Type casting function passed to some ArgumentParser args
+def positiveInt(value:str) -> int:
+    """
+    Type casting function from string to positive integer.
+
+    Args:
+        value (str): The string representation of a positive integer.
+
+    Raises:
+        ValueError: When the provided string does not represent a positive integer, in
+        fully explicit decimal notation.
+
+    Returns:
+        int: The converted value.
+    """
+    if not value.isdigit() or not int(value): raise ValueError(POSITIVE_INT_ERR.format(value))
+
+    return int(value)
+
+MEMORY_UNITS = { 'K' : 2**10, 'M' : 2**20, 'G' : 2**30, 'T' : 2**40 }
+# Type casting function passed to some ArgumentParser args
+def memorySize(value:str) -> int:
+    """
+    Type casting function from string to amount of bytes, either a non-negative integer
+    or one followed by a binary unit suffix (K, M, G or T, case-insensitive).
+
+    Args:
+        value (str): The string representation of a memory size, like "512M" or "16G".
+
+    Raises:
+        ValueError: When the provided string does not represent a memory size.
+
+    Returns:
+        int: The amount of bytes.
+    """
+    amount, unit = value, value[-1:].upper()
+    if unit in MEMORY_UNITS: amount = value[:-1]
+    if not amount.isdigit(): raise ValueError(MEMORY_SIZE_ERR.format(value))
+
+    return int(amount) * MEMORY_UNITS.get(unit, 1)
+
+# Type casting function passed to some ArgumentParser args
+def fraction(value:str) -> float:
+    """
+    Type casting function from string to a number between 0 and 1, both included.
+
+    Args:
+        value (str): The string representation of a fraction, like "0.25".
+
+    Raises:
+        ValueError: When the provided string does not represent a number between 0 and 1.
+
+    Returns:
+        float: The converted value.
+    """
+    try: number = float(value)
+    except ValueError: number = -1.0
+    if not 0 <= number <= 1: raise ValueError(FRACTION_ERR.format(value)) # Also excludes NaN
+
+    return number
+
+type DNA = str # Valid DNA, all the characters are IUPAC nucleotide codes.
+def getGapPenalties(gapPenalty:int, gapExtension :int|None = None) -> tuple[int]|tuple[int, int]:
+    """
+    Collects the gap penalties of an analysis, with the extension penalty only if it
+    makes the gaps affine: the same as the gap penalty are linear gaps, which share their
+    results (and cached ones) with analyses not setting it at all.
+
+    Args:
+        gapPenalty (int): The gap penalty, only for opening gaps if they're affine.
+        gapExtension (int | None, optional): The penalty of each gap position after the first. Defaults to: None.
+
+    Raises:
+        InvalidScoresErr: If the extension penalty is higher than the gap penalty.
+
+    Returns:
+        tuple[int] | tuple[int, int]: The gap penalty, followed by the extension penalty with affine gaps.
+    """
+    if gapExtension is None or gapExtension == gapPenalty: return (gapPenalty,)
+    # The vectorized kernels rely on extending a gap never costing more than opening one:
+    if gapExtension > gapPenalty: raise InvalidScoresErr(
+        f"the gap extension penalty ({gapExtension}) is higher than the gap penalty ({gapPenalty})",
+        "it can be at most as high")
+
+    return gapPenalty, gapExtension
+
+# Score of each query nucleotide (rows) against each target one (columns), both in the
+# IUPAC_NUCLEOTIDES order:
+type SubstitutionScores = tuple[tuple[int, ...], ...]
+@cache
+def getSubstitutionScores(matchScore:int, mismatchPenalty:int) -> SubstitutionScores:
+    """
+    Builds the default substitution scores: only identical unambiguous nucleotides match,
+    any pair with an ambiguous one is a mismatch. Counting N against N as a match would
+    align masked regions to each other.
+
+    Args:
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+
+    Returns:
+        SubstitutionScores: The score of every pair of IUPAC nucleotide codes.
+    """
+    return tuple(tuple(
+        matchScore if row == column and row < 4 else -mismatchPenalty
+        for column in range(len(IUPAC_NUCLEOTIDES))) for row in range(len(IUPAC_NUCLEOTIDES)))
+
+def parseSubstitutionMatrix(matrix:str, matchScore:int, mismatchPenalty:int) -> SubstitutionScores:
+    """
+    Parses a substitution matrix in the usual text layout (like NCBI's NUC.4.4): a line
+    with the nucleotides of the columns, then a line per row starting with its nucleotide
+    and followed by its integer scores. Nucleotides are case-insensitive IUPAC codes,
+    empty lines and the ones starting with # are skipped. Any pair of nucleotides the
+    matrix leaves out keeps its default score, see getSubstitutionScores.
+
+    Args:
+        matrix (str): The text of the substitution matrix.
+        matchScore (int): The default alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The default alignment score penalty for a nucleotide mismatch.
+
+    Raises:
+        InvalidMatrixErr: If the matrix is empty, has unknown or repeated nucleotides, or rows of the wrong length or with non-integer scores, reporting the first offending line.
+
+    Returns:
+        SubstitutionScores: The score of every pair of IUPAC nucleotide codes.
+    """
+    def getIndexes(nucleotides:list[str], lineId:int) -> list[int]:
+        """Maps the nucleotides of a line to their indexes, all known and distinct."""
+        for nucleotide in nucleotides:
+            if nucleotide.upper() not in IUPAC_NUCLEOTIDES: raise InvalidMatrixErr(
+                f"found \"{nucleotide}\" at line {lineId}", "expected an IUPAC nucleotide code")
+
+        indexes = [IUPAC_NUCLEOTIDES.index(nucleotide.upper()) for nucleotide in nucleotides]
+        if len(set(indexes)) < len(indexes): raise InvalidMatrixErr(f"repeated nucleotide at line {lineId}")
+        return indexes
+
+    scores = [list(row) for row in getSubstitutionScores(matchScore, mismatchPenalty)]
+    lines = [(lineId, line.split()) for lineId, line in enumerate(matrix.splitlines(), 1)
+        if line.strip() and not line.lstrip().startswith('#')]
+    if not lines: raise InvalidMatrixErr("the matrix is empty")
+
+    (headerId, header), *rows = lines
+    columns = getIndexes(header, headerId)
+    seenRows :set[int] = set()
+    for lineId, (nucleotide, *rowScores) in rows:
+        row, = getIndexes([nucleotide], lineId)
+        if row in seenRows: raise InvalidMatrixErr(f"repeated nucleotide at line {lineId}")
+        if len(rowScores) != len(columns): raise InvalidMatrixErr(
+            f"found {len(rowScores)} scores at line {lineId}", f"expected {len(columns)}, one per column")
+
+        for column, score in zip(columns, rowScores):
+            try: scores[row][column] = int(score)
+            except ValueError: raise InvalidMatrixErr(
+                f"found \"{score}\" at line {lineId}", "expected an integer score")
+
+        seenRows.add(row)
+
+    return tuple(map(tuple, scores))
+
+def readSubstitutionMatrix(filePath:str, matchScore:int, mismatchPenalty:int) -> SubstitutionScores:
+    """
+    Reads and parses a substitution matrix file, see parseSubstitutionMatrix.
+
+    Args:
+        filePath (str): The path to the substitution matrix file.
+        matchScore (int): The default alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The default alignment score penalty for a nucleotide mismatch.
+
+    Raises:
+        InvalidFileErr: If the file can't be read as text.
+        InvalidMatrixErr: If the matrix is malformed.
+
+    Returns:
+        SubstitutionScores: The score of every pair of IUPAC nucleotide codes.
+    """
+    try:
+        with open(filePath) as fd: matrix = fd.read()
+
+    except (OSError, UnicodeDecodeError) as err: raise InvalidFileErr(
+        err, f"\"{filePath}\" is not a readable substitution matrix file")
+
+    return parseSubstitutionMatrix(matrix, matchScore, mismatchPenalty)
+
+def getScores(matchScore:int, mismatchPenalty:int, gapPenalty:int, gapExtension :int|None = None, substitutions :SubstitutionScores|None = None) -> tuple[int, ...]|tuple[int, int, int, int, SubstitutionScores]:
+    """
+    Collects the scores of an analysis, laid out as they follow the sequences in the
+    analysis parameters: the gap penalties as in getGapPenalties, then the substitution
+    scores only if they differ from the default ones (always after the extension penalty,
+    the same as the gap penalty for linear gaps).
+
+    Args:
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The gap penalty, only for opening gaps if they're affine.
+        gapExtension (int | None, optional): The penalty of each gap position after the first. Defaults to: None.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, see parseSubstitutionMatrix. Defaults to: None.
+
+    Raises:
+        InvalidScoresErr: If the extension penalty is higher than the gap penalty.
+
+    Returns:
+        tuple: The match score, the mismatch penalty, the gap penalties and the substitution scores, if any.
+    """
+    gapPenalties = getGapPenalties(gapPenalty, gapExtension)
+    if substitutions is None or substitutions == getSubstitutionScores(matchScore, mismatchPenalty):
+        return matchScore, mismatchPenalty, *gapPenalties
+
+    return matchScore, mismatchPenalty, gapPenalty, gapPenalties[-1], substitutions
+
 def validateDNA(seq:str) -> DNA:
     """
     Parse raw DNA sequence string into valid DNA string with upper-case nucleotides.
@@ -82,79 +347,132 @@ def validateDNA(seq:str) -> DNA:
         seq (str): The raw DNA sequence string.
 
     Raises:
-        InvalidSeqErr: If the sequence string is not valid DNA (only characters in the ACGTN set).
+        InvalidSeqErr: If the sequence string is not valid DNA (only IUPAC nucleotide codes), reporting the first offending character.
 
     Returns:
         DNA: The valid DNA sequence.
     """
-    if not isValidDNA(seq): raise InvalidSeqErr("")
-    # The specifics of the error are filled in later, which isn't ideal in general but
-    # the error class does a good job of explaining what more or less happened.
+    # The codes are already the ASCII bytes the engines encode the sequences as:
+    return encodeDNA(seq).tobytes().decode("ascii")
 
-    return seq.upper()
+# Type casting function passed to some ArgumentParser args
+def seqRef(value:str) -> int|str:
+    """
+    Type casting function from string to sequence reference in a FASTA file: a 1-based
+    position if the string is a non-negative integer, otherwise the record ID.
 
-# Untested as it requires a mock file descriptor which is a whole mess, I verified
-# manually that the newline is being added.
-# Add a trailing newline if needed: this solves a bug in pyfastx
-def addTrailingNewline(filePath:str) -> None:
+    Args:
+        value (str): The string representation of a position or a record ID.
+
+    Returns:
+        int | str: The position or the record ID.
     """
-    Adds trailing empty line to the (assumed FASTA) file at the provided path, if missing.
+    return int(value) if value.isdigit() else value
+
+def getFastaCacheKey(filePath:str) -> str:
+    """
+    Computes the key of the data derived from a FASTA file and kept in the user cache
+    folder, tied to the absolute path, size and modification time of the file, so a
+    changed file gets a new one.
 
     Args:
-        filePath (str): The provided file path.
+        filePath (str): The FASTA file path.
 
     Raises:
         MissingSeqErr: When the provided FASTA file is empty.
         InvalidFileErr: When the provided file path doesn't lead to an existent FASTA file.
+
+    Returns:
+        str: The hexadecimal key.
     """
-    try:
-        # Reading in bytes makes the process more streamlined:
-        with open(filePath, 'rb+') as f:
-            f.seek(0, SEEK_END) # Move cursor to EOF
-            if f.tell() == 0:   # If we're still at the start the file is empty
-                raise MissingSeqErr(f"provided FASTA file \"{filePath}\" is empty")
-
-            # Go back 1 byte
-            f.seek(-1, SEEK_END)
-            if f.read(1) != b'\n': f.write(b'\n')
-    
+    try: fileStat = stat(filePath)
     except FileNotFoundError as err:
         raise InvalidFileErr(err, "the provided FASTA file doesn't exist")
 
+    if not fileStat.st_size: raise MissingSeqErr(f"provided FASTA file \"{filePath}\" is empty")
+    fileKey = f"{abspath(filePath)}\0{fileStat.st_size}\0{fileStat.st_mtime_ns}"
+    return sha256(fileKey.encode()).hexdigest()
+
+def getFastaIndexPath(filePath:str) -> str:
+    """
+    Computes the path of the pyfastx index of a FASTA file in the user cache folder, so
+    that the folder of the file is never written to, see getFastaCacheKey.
+
+    Args:
+        filePath (str): The FASTA file path.
+
+    Raises:
+        MissingSeqErr: When the provided FASTA file is empty.
+        InvalidFileErr: When the provided file path doesn't lead to an existent FASTA file.
+
+    Returns:
+        str: The path to the index file, which might not exist yet.
+    """
+    return join(getCacheDir(), FASTA_INDEXES_DIR_NAME, getFastaCacheKey(filePath) + ".fxi")
+
+@lru_cache
+def _openIndexedFasta(filePath:str, indexPath:str) -> Fasta:
+    """Opens a FASTA file with its index, kept open for the following lookups."""
+    from pyfastx import Fasta
+    makedirs(join(getCacheDir(), FASTA_INDEXES_DIR_NAME), exist_ok = True)
+    try: return Fasta(filePath, index_file = indexPath)
+    except RuntimeError as err: raise InvalidFileErr(err, "file is malformed")
+
+def openFasta(filePath:str) -> Fasta:
+    """
+    Opens a FASTA file for random access to its records, without ever writing to it: the
+    index is built in the user cache folder the first time and reused afterwards, and
+    files missing the trailing newline are read as they are. For gzip compressed files
+    the index also records access points into the compressed stream, so that only the
+    requested records are decompressed.
+
+    Args:
+        filePath (str): The provided FASTA file path.
+
+    Raises:
+        MissingSeqErr: When the provided FASTA file is empty.
+        InvalidFileErr: When the provided file path doesn't lead to an existent FASTA file, or the file is malformed.
+
+    Returns:
+        Fasta: The indexed FASTA file.
+    """
+    return _openIndexedFasta(filePath, getFastaIndexPath(filePath))
+
 # Untested as it's hard to isolate (I'd have to create a Fasta instance)
-def _getValidSeqFromCollection(collection:Fasta, pos:int, filePath:str) -> DNA:
+def _getValidSeqFromCollection(collection:Fasta, pos:int|str, filePath:str) -> DNA:
     """
-    Retrieve and validate the sequence at a given position in the provided collection, if
-    present.
+    Retrieve and validate the sequence at a given position, or with a given record ID, in
+    the provided collection, if present.
 
     Args:
         collection (Fasta): The collection containing the desired sequence.
-        pos (int): The 1-based position of the desired sequence in the collection.
+        pos (int | str): The 1-based position or the record ID of the desired sequence in the collection.
         filePath (str): The FASTA file path the collection was loaded from, for error reporting reasons.
 
     Raises:
-        InvalidSeqErr: If the sequence string is not valid DNA (only characters in the ACGTN set).
+        InvalidSeqErr: If the sequence string is not valid DNA (only IUPAC nucleotide codes).
         MissingSeqErr: If the provided collection does not contain a sequence at the desired position.
     
     Returns:
         DNA: The valid DNA sequence.
     """
-    try: return validateDNA(collection[pos - 1].seq)
-    except InvalidSeqErr: raise InvalidSeqErr(
-        f"sequence at position {pos} in FASTA file \"{filePath}\" is not valid DNA")
-    except IndexError: raise MissingSeqErr(
-        f"FASTA file \"{filePath}\" doesn't contain a sequence at position {pos}")
+    where = f"with ID \"{pos}\"" if isinstance(pos, str) else f"at position {pos}"
+    try: return validateDNA(collection[pos if isinstance(pos, str) else pos - 1].seq)
+    except InvalidSeqErr as err: raise InvalidSeqErr(
+        f"sequence {where} in FASTA file \"{filePath}\" is not valid DNA", err.msg)
+    except (IndexError, KeyError): raise MissingSeqErr(
+        f"FASTA file \"{filePath}\" doesn't contain a sequence {where}")
 
 # Obtain seq object from FASTA file path, tests on this also cover the func above
-def parseFastaSeq(filePath:str, seq1Pos:int, seq2Pos :int = None) -> tuple[DNA, DNA]:
+def parseFastaSeq(filePath:str, seq1Pos:int|str, seq2Pos :int|str|None = None) -> tuple[DNA, DNA]:
     """
     Attempts to load a FASTA file at the provided path, then validates, parses and
-    retrieves the sequence(s) at the desired position(s).
+    retrieves the sequence(s) at the desired position(s) or with the desired record ID(s).
 
     Args:
         filePath (str): The provided FASTA file path.
-        seq1Pos (int): 1-based position of the desired sequence.
-        seq2Pos (int, optional): 1-based position of a second desired sequence, if provided. Defaults to: None.
+        seq1Pos (int | str): 1-based position or record ID of the desired sequence.
+        seq2Pos (int | str, optional): 1-based position or record ID of a second desired sequence, if provided. Defaults to: None.
     
     Raises:
         InvalidFileErr: When the provided FASTA file is malformed.
@@ -162,27 +480,46 @@ def parseFastaSeq(filePath:str, seq1Pos:int, seq2Pos :int = None) -> tuple[DNA,
     Returns:
         tuple: The first, and optionally second, sequence(s) at the desired position(s).
     """
-    addTrailingNewline(filePath)
-
-    try: seqs = Fasta(filePath)
-    except RuntimeError as err: raise InvalidFileErr(err, "file is malformed")
-
+    seqs = openFasta(filePath)
     seq1 = _getValidSeqFromCollection(seqs, seq1Pos, filePath)
     seq2 = "" if seq2Pos is None else _getValidSeqFromCollection(seqs, seq2Pos, filePath)
     return seq1, seq2
 
+def parseFastaRecords(filePath:str) -> list[tuple[str, DNA]]:
+    """
+    Loads all the records of a FASTA file, validating their sequences, for the modes
+    aligning many queries at once.
+
+    Args:
+        filePath (str): The provided FASTA file path.
+
+    Raises:
+        InvalidFileErr: When the provided FASTA file is malformed.
+        InvalidSeqErr: If a sequence is not valid DNA (only IUPAC nucleotide codes).
+
+    Returns:
+        list[tuple[str, DNA]]: The record ID and the valid DNA sequence of every record, in file order.
+    """
+    records :list[tuple[str, DNA]] = []
+    for pos, record in enumerate(openFasta(filePath), 1):
+        try: records.append((record.name, validateDNA(record.seq)))
+        except InvalidSeqErr as err: raise InvalidSeqErr(
+            f"sequence at position {pos} in FASTA file \"{filePath}\" is not valid DNA", err.msg)
+
+    return records
+
 # A method that checks which type of seq info was given and acts accordingly:
-def parseSeq(seqOrFilePath:str, pos:int, name:SeqName) -> DNA:
+def parseSeq(seqOrFilePath:str, pos:int|str, name:SeqName) -> DNA:
     """
     Obtains valid DNA sequence from raw DNA sequence string or FASTA file path.
 
     Args:
         seqOrFilePath (str): The raw DNA sequence string or FASTA file path.
-        pos (int): The 1-based position of the sequence in the FASTA file, if provided.
+        pos (int | str): The 1-based position or record ID of the sequence in the FASTA file, if provided.
         name (SeqName): Sequence metadata merely for error reporting purposes, used if the sequence is provided as raw DNA.
 
     Raises:
-        InvalidSeqErr: If the provided string could not be interpreted as a FASTA file but is also not valid DNA (only characters in the ACGTN set).
+        InvalidSeqErr: If the provided string could not be interpreted as a FASTA file but is also not valid DNA (only IUPAC nucleotide codes).
 
     Returns:
         DNA: The valid DNA sequence.
@@ -191,24 +528,25 @@ def parseSeq(seqOrFilePath:str, pos:int, name:SeqName) -> DNA:
         return parseFastaSeq(seqOrFilePath, pos)[0] # <-- We only take one seq here
     
     try: return validateDNA(seqOrFilePath)
-    except InvalidSeqErr:
-        raise InvalidSeqErr(f"Your \"{name}\" sequence is not valid DNA")
+    except InvalidSeqErr as err:
+        raise InvalidSeqErr(f"Your \"{name}\" sequence is not valid DNA", err.msg)
     
     # ^^^ Not as dumb as it looks, I didn't want to pass useless info to the validateDNA
-    # function, the error stays the same but gets enriched with the seq name/path here.
+    # function, the error gets enriched with the seq name/path here.
 
 # Helper to isolate the "same file" case a bit more:
-def parseSeqsFromFile(filePath:str, targetPos:int, queryPos:int) -> tuple[DNA, DNA]:
+def parseSeqsFromFile(filePath:str, targetPos:int|str, queryPos:int|str) -> tuple[DNA, DNA]:
     """
     Obtain valid DNA target and query sequences, taken from the same FASTA file.
 
     Args:
         filePath (str): The provided FASTA file path.
-        targetPos (int): The 1-based position of the target sequence in the FASTA file.
-        queryPos (int): The 1-based position of the query sequence in the FASTA file.
+        targetPos (int | str): The 1-based position or record ID of the target sequence in the FASTA file.
+        queryPos (int | str): The 1-based position or record ID of the query sequence in the FASTA file.
 
     Raises:
         IdenticalSeqsErr: If the sequences to load are the same.
+        InvalidScoresErr: If the gap extension penalty is higher than the gap penalty.
 
     Returns:
         tuple[DNA, DNA]: Respectively the target and query sequences.
@@ -235,14 +573,27 @@ def setupArgParser() -> ArgumentParser:
         Namespace: Object containing the arguments and their values as properties:
             - .target_seq (str): Target DNA sequence or FASTA file path.
             - .query_seq (str): Query DNA sequence or FASTA file path, if provided.
-            - .target_pos (int): 1-based target DNA sequence position in FASTA file.
-            - .query_pos (int): 1-based query DNA sequence position in FASTA file.
+            - .target_pos (int | str): 1-based target DNA sequence position or record ID in FASTA file.
+            - .query_pos (int | str): 1-based query DNA sequence position or record ID in FASTA file.
             - .match_score (int): Match score.
             - .mismatch_penalty (int): Mismatch penalty.
             - .gap_penalty (int): Constant gap penalty.
+            - .gap_extension (int | None): Penalty of each gap position after the first, if the gaps are affine.
             - .output_path (str): Path to output file.
+            - .output_format (OutputFormat): Format of the output file.
             - .max_alignments_shown (int): Maximum number of alignments shown before terminal output is cut off.
             - .longest_sequence_shown (int): Maximum aligned sequence length before output is truncated.
+            - .backend (Backend): The kind of workers running the analysis.
+            - .window_size (int): Target window size for the windowed mode, 0 if disabled.
+            - .checkpointed (bool): Whether to keep only checkpoint rows instead of the full matrices.
+            - .resume (bool): Whether to fill the matrices on disk, continuing an interrupted fill.
+            - .retune (bool): Whether to rerun the autotune benchmarks for the automatic backend.
+            - .max_memory (int): Memory budget in bytes, 0 for most of the available memory.
+            - .jobs (int): Maximum number of used cores, 0 for all the usable ones.
+            - .cache (bool): Whether to use the on-disk result cache.
+            - .cache_size (int): Maximum size of the result cache in bytes.
+            - .server (int): Local port of the job server running the analysis, 0 to run it here.
+            - .cluster (int): Port the cluster coordinator listens on, 0 to run the analysis here.
         
     All positions, scores and penalties are non-negative.
     """
@@ -257,12 +608,13 @@ def setupArgParser() -> ArgumentParser:
 
     # When a file containing the desired seq(s) is provided, the user can specify
     # which specific sequence of that file he wants. Positions are not allowed to be
-    # negative and are interpreted as 1-based which is more user-friendly.
+    # negative and are interpreted as 1-based which is more user-friendly, anything that
+    # isn't a position is taken as the ID of the record (the header up to the 1st space).
     parser.add_argument("--target-pos", "-tp",
-        type = uint, default = 1, help = TARGET_POS_HELP)
+        type = seqRef, default = 1, help = TARGET_POS_HELP)
     
     parser.add_argument("--query-pos", "-qp",
-        type = uint, default = 1, help = QUERY_POS_HELP)
+        type = seqRef, default = 1, help = QUERY_POS_HELP)
 
     # As is customary for simple DNA alignment, all the relevant scores are
     # (non-negative) integers:
@@ -275,19 +627,57 @@ def setupArgParser() -> ArgumentParser:
     parser.add_argument("--gap-penalty", "-g",
         type = uint, required = True, help = GAP_HELP)
 
+    parser.add_argument("--gap-extension", "-ge",
+        type = uint, default = None, help = GAP_EXTENSION_HELP)
+
+    parser.add_argument("--substitution-matrix", "-sm",
+        type = str, default = None, help = MATRIX_HELP)
+
     # Output customization:
     parser.add_argument("--output-path", "-o",
         type = str, default = "./output/output.txt", help = OUT_PATH_HELP)  
 
+    parser.add_argument("--output-format", "-of", type = OutputFormat,
+        choices = list(OutputFormat), default = OutputFormat.Text, help = OUT_FORMAT_HELP)
+
     parser.add_argument("--max-alignments-shown", "-ma",
         type = uint, default = MAX_DISPLAYED_ALIGNMENTS, help = MAX_ALIGN_HELP)
     
     parser.add_argument("--longest-sequence-shown", "-ls",
         type = uint, default = MAX_DISPLAYED_SEQ_LEN, help = MAX_SEQ_LEN_HELP)
 
+    # Analysis modes:
+    parser.add_argument("--backend", "-b",
+        type = Backend, choices = list(Backend), default = Backend.Auto, help = BACKEND_HELP)
+
+    parser.add_argument("--window-size", "-w",
+        type = uint, default = 0, help = WINDOW_SIZE_HELP)
+
+    parser.add_argument("--checkpointed", action = "store_true", help = CHECKPOINTED_HELP)
+    parser.add_argument("--resume", action = "store_true", help = RESUME_HELP)
+    parser.add_argument("--retune", action = "store_true", help = RETUNE_HELP)
+
+    # Resource budget, mostly for shared machines and job schedulers:
+    parser.add_argument("--max-memory", "-mem",
+        type = memorySize, default = 0, help = MAX_MEMORY_HELP)
+
+    parser.add_argument("--jobs", "-j",
+        type = uint, default = 0, help = JOBS_HELP)
+
+    # Caching:
+    parser.add_argument("--cache", action = "store_true", help = CACHE_HELP)
+    parser.add_argument("--cache-size",
+        type = memorySize, default = DEFAULT_CACHE_SIZE, help = CACHE_SIZE_HELP)
+
+    # Job server client:
+    parser.add_argument("--server", type = uint, default = 0, help = SERVER_HELP)
+
+    # Cluster coordinator:
+    parser.add_argument("--cluster", type = uint, default = 0, help = CLUSTER_HELP)
+
     return parser
 
-def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, int]:
+def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, int] | tuple[DNA, DNA, int, int, int, int, str, int, int] | tuple[DNA, DNA, int, int, int, int, SubstitutionScores, str, int, int]:
     """
     Parse all the CLI input arguments passed by the user and necessary for
     the analysis.
@@ -296,9 +686,11 @@ def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, i
         args (Namespace): The Namespace object containing the arguments and their values.
 
     Raises:
-        InvalidFileErr: If the output file path argument is invalid.
+        InvalidFileErr: If the output file path argument is invalid, or the substitution matrix file can't be read.
         MissingSeqsErr: When not enough information was provided to retrieve the two sequences.
         IdenticalSeqsErr: If the sequences to load are the same.
+        InvalidScoresErr: If the gap extension penalty is higher than the gap penalty.
+        InvalidMatrixErr: If the substitution matrix is malformed.
 
     Returns:
         tuple:
@@ -307,6 +699,8 @@ def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, i
         - int: The match score.
         - int: The mismatch penalty.
         - int: The gap penalty.
+        - int: The gap extension penalty, only if the gaps are affine or substitution scores follow.
+        - SubstitutionScores: The score of every pair of nucleotides, only if they differ from the default ones.
         - str: The path to the output file.
         - int: The maximum number of shown alignments in the terminal output.
         - int: The length after which aligned sequences are truncated in the terminal output.
@@ -324,6 +718,12 @@ def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, i
     except Exception as err: raise InvalidFileErr(
         err, f"\"{args.output_path}\" is not a valid output file path")
 
+    substitutions = None if args.substitution_matrix is None else readSubstitutionMatrix(
+        args.substitution_matrix, args.match_score, args.mismatch_penalty)
+
+    scores = getScores(args.match_score, args.mismatch_penalty, args.gap_penalty,
+        args.gap_extension, substitutions)
+
     # It's impossible for this check to fail when query doesn't exist AND the 2 seqs are
     # the same, as target must exists:
     areTheSame = args.query_seq == args.target_seq
@@ -331,8 +731,7 @@ def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, i
         return (
             parseSeq(args.target_seq, args.target_pos, SeqName.Target),
             parseSeq(args.query_seq,  args.query_pos,  SeqName.Query),
-            args.match_score, args.mismatch_penalty, args.gap_penalty,
-            args.output_path, args.max_alignments_shown, args.longest_sequence_shown)
+            *scores, args.output_path, args.max_alignments_shown, args.longest_sequence_shown)
 
     # If only the target seq exists that's fine, as long as it's a file from which to load
     # both seqs:
@@ -347,9 +746,8 @@ def parseInputArgs(args:Namespace) -> tuple[DNA, DNA, int, int, int, str, int, i
 
     # the following ignores the case where the 2 paths are the same, and handles the
     # case where the query seq doesn't exist:
-    return (*parseSeqsFromFile(args.target_seq, args.target_pos, args.query_pos),
-        args.match_score, args.mismatch_penalty, args.gap_penalty, args.output_path,
-        args.max_alignments_shown, args.longest_sequence_shown)
+    return (*parseSeqsFromFile(args.target_seq, args.target_pos, args.query_pos), *scores,
+        args.output_path, args.max_alignments_shown, args.longest_sequence_shown)
 
 # The main is used here to showcase how to use this file's functions:
 if __name__ == "__main__":
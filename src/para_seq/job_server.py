@@ -0,0 +1,325 @@
+## Job server module, runs many analyses in a row on warm workers and matrix buffers
+from json                            import dumps, loads
+from numpy                           import ndarray, dtype, uint8, zeros
+from socket                          import create_connection
+from asyncio                         import Event, Future, Queue, StreamReader, StreamWriter, \
+    create_task, get_running_loop, run, start_server
+from argparse                        import ArgumentParser
+from para_seq                        import CHECKPOINTED_WINDOW_SIZE, DEFAULT_TILE_SIZE, INVALID_JOB_PREFIX, \
+    IUPAC_NUCLEOTIDES, JOB_FAILED_PREFIX, JOB_MAX_SIZE, JOB_RESULTS_CHUNK_SIZE, JOB_SERVER_HOST, \
+    JOB_SERVER_PORT, JOBS_HELP, MAX_MEMORY_HELP, PORT_HELP, SERVER_DESCR, Backend
+from itertools                       import islice
+from threading                       import Event as ThreadEvent
+from para_seq.utils                  import CustomErr, getUsableCpusAmt
+from collections.abc                 import Iterator
+from para_seq.autotuner              import getScoreType
+from para_seq.input_manager          import getScores, memorySize, uint, validateDNA
+from multiprocessing.pool            import ThreadPool
+from para_seq.resource_governor      import governResources
+from para_seq.local_alignment        import AnalysisParams, CompactAlignment, fillMatrices, \
+    getMatrixShape, reconstructAlignments
+from para_seq.windowed_alignment     import findWindowedLocalAlignments
+from para_seq.checkpointed_alignment import findCheckpointedLocalAlignments
+
+# Custom errors:
+class InvalidJobErr(CustomErr):
+    """Error class for malformed jobs."""
+    msgPrefix = INVALID_JOB_PREFIX
+
+class JobFailedErr(CustomErr):
+    """Error class for the errors the job server reports back to its clients."""
+    msgPrefix = JOB_FAILED_PREFIX
+
+class MatrixBuffers:
+    """Score and directions buffers reused by consecutive analyses, grown when needed."""
+    def __init__(self) -> None:
+        """Create empty buffers, allocated by the first analysis."""
+        self.scoreBuffer = zeros(0, dtype = uint8)
+        self.dirsBuffer  = zeros(0, dtype = uint8)
+
+    def getMatrices(self, shape:tuple[int, int], scoreType:dtype) -> tuple[ndarray, ndarray]:
+        """
+        Provides score and directions matrices of the requested shape as views over the
+        buffers, which are only reallocated when too small. Only the first row and column
+        are reset, since the fill overwrites every other cell.
+
+        Args:
+            shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+            scoreType (np.dtype): Type of the values in the score matrix.
+
+        Returns:
+            tuple: The score and directions matrices.
+        """
+        cellsAmt = shape[0] * shape[1]
+        scoreBytesAmt = cellsAmt * dtype(scoreType).itemsize
+        if self.scoreBuffer.size < scoreBytesAmt: self.scoreBuffer = zeros(scoreBytesAmt, dtype = uint8)
+        if self.dirsBuffer.size < cellsAmt: self.dirsBuffer = zeros(cellsAmt, dtype = uint8)
+
+        scoreMatrix = self.scoreBuffer[:scoreBytesAmt].view(scoreType).reshape(shape)
+        dirsMatrix  = self.dirsBuffer[:cellsAmt].reshape(shape)
+        for matrix in (scoreMatrix, dirsMatrix):
+            matrix[0]    = 0
+            matrix[:, 0] = 0
+
+        return scoreMatrix, dirsMatrix
+
+def _isSubstitutionMatrix(value:object) -> bool:
+    """Checks that a job value is a list of integer score lists, both as long as IUPAC_NUCLEOTIDES."""
+    nucleotidesAmt = len(IUPAC_NUCLEOTIDES)
+    return isinstance(value, list) and len(value) == nucleotidesAmt and all(
+        isinstance(row, list) and len(row) == nucleotidesAmt and all(type(score) is int for score in row)
+        for row in value)
+
+def parseJob(line:bytes) -> AnalysisParams:
+    """
+    Parses a job sent by a client, a JSON object with the "target" and "query" sequences
+    and the "match", "mismatch" and "gap" scores, plus the "gapExtension" one for affine
+    gaps and the "substitutions" matrix (a list of rows of integer scores, one row and
+    column per IUPAC nucleotide code) to score nucleotide pairs with.
+
+    Args:
+        line (bytes): The JSON line sent by the client.
+
+    Raises:
+        InvalidJobErr: If the job is malformed.
+        InvalidSeqErr: If a sequence is not valid DNA (only IUPAC nucleotide codes).
+        InvalidScoresErr: If the gap extension penalty is higher than the gap penalty.
+
+    Returns:
+        AnalysisParams: The analysis parameters, with validated sequences.
+    """
+    try: job = loads(line)
+    except ValueError as err: raise InvalidJobErr("expected a JSON object", str(err))
+
+    fields = ("target", "query", "match", "mismatch", "gap")
+    if not isinstance(job, dict) or not all(field in job for field in fields):
+        raise InvalidJobErr("expected the fields " + ", ".join(fields))
+
+    targetSeq, querySeq, matchScore, mismatchPenalty, gapPenalty = (job[field] for field in fields)
+    scores = (matchScore, mismatchPenalty, gapPenalty, job.get("gapExtension", gapPenalty))
+    if not all(type(score) is int and score >= 0 for score in scores):
+        raise InvalidJobErr("the scores must be non-negative integers")
+
+    substitutions = job.get("substitutions")
+    if substitutions is not None:
+        if not _isSubstitutionMatrix(substitutions): raise InvalidJobErr(
+            "the substitutions must be a row of integer scores for each IUPAC nucleotide code",
+            f"as many as the codes ({IUPAC_NUCLEOTIDES})")
+
+        substitutions = tuple(map(tuple, substitutions))
+
+    if not isinstance(targetSeq, str) or not isinstance(querySeq, str):
+        raise InvalidJobErr("the sequences must be strings")
+
+    return (validateDNA(targetSeq), validateDNA(querySeq),
+        *getScores(matchScore, mismatchPenalty, gapPenalty, scores[3], substitutions))
+
+def _encodeMessage(message:dict) -> bytes:
+    """Encodes a message to a client as a JSON line."""
+    return dumps(message).encode() + b"\n"
+
+async def _broadcast(writers:list[StreamWriter], message:dict) -> None:
+    """Sends a message to all the provided clients, skipping the ones that left."""
+    data = _encodeMessage(message)
+    for writer in writers:
+        if writer.is_closing(): continue
+        writer.write(data)
+        try: await writer.drain() # Slow clients hold back the analysis, not the memory
+        except ConnectionError: writer.close()
+
+class JobServer:
+    """
+    Runs the alignment jobs sent by local clients one at a time, each on all the warm
+    threads and the same matrix buffers, so that a job costs little more than its
+    compute time. Jobs waiting together in the queue form a batch, in which identical
+    analyses are run only once for all the clients that sent them.
+    """
+    def __init__(self, *, workersAmt = 0, tileSize = DEFAULT_TILE_SIZE, maxMemory = 0) -> None:
+        """
+        Create a job server, starting its threads right away.
+
+        Args:
+            workersAmt (int, optional): The maximum amount of threads, 0 for all the usable cores. Defaults to: 0.
+            tileSize (int, optional): The side of the tiles each thread fills at once. Defaults to: DEFAULT_TILE_SIZE.
+            maxMemory (int, optional): The memory budget of each analysis in bytes, if 0 a share of the available memory. Defaults to: 0.
+        """
+        self.workersAmt = getUsableCpusAmt(workersAmt)
+        self.tileSize   = tileSize
+        self.maxMemory  = maxMemory
+        self.pool       = ThreadPool(self.workersAmt)
+        self.buffers    = MatrixBuffers()
+        self.port       = 0
+        self.isReady    = ThreadEvent() # Set once listening, from the server thread
+
+    def startAnalysis(self, analysisParams:AnalysisParams) -> tuple[int, Iterator[CompactAlignment]]:
+        """
+        Fills the matrices of an analysis within the memory budget, on the buffers when
+        the full matrices fit and in the lower-memory modes otherwise.
+
+        Args:
+            analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+        Raises:
+            ResourceBudgetErr: If not even the lowest-memory mode fits the budget.
+
+        Returns:
+            tuple: The maximum alignment score and an iterator over all the compact local alignments.
+        """
+        config = (Backend.Thread, 0, self.tileSize, getScoreType(analysisParams), self.workersAmt)
+        _, windowSize, tileSize, scoreType, workersAmt = governResources(
+            analysisParams, config, self.workersAmt, maxMemory = self.maxMemory)
+
+        if windowSize == CHECKPOINTED_WINDOW_SIZE: return findCheckpointedLocalAlignments(
+            analysisParams, scoreType = scoreType, workersAmt = workersAmt, doStream = True)
+
+        if windowSize: return findWindowedLocalAlignments(analysisParams, windowSize,
+            backend = Backend.Thread, scoreType = scoreType, workersAmt = workersAmt, doStream = True)
+
+        scoreMatrix, dirsMatrix = self.buffers.getMatrices(getMatrixShape(*analysisParams[:2]), scoreType)
+        maxScore = fillMatrices(analysisParams, backend = Backend.Thread, matrices = (scoreMatrix, dirsMatrix),
+            tileSize = tileSize, scoreType = scoreType, workersAmt = workersAmt, pool = self.pool)
+
+        return maxScore, reconstructAlignments(scoreMatrix, maxScore, analysisParams,
+            backend = Backend.Thread, dirsMatrix = dirsMatrix, workersAmt = workersAmt, pool = self.pool)
+
+    async def _streamResult(self, analysisParams:AnalysisParams, writers:list[StreamWriter]) -> None:
+        """Runs an analysis off the event loop, streaming its result to the clients in chunks."""
+        loop = get_running_loop()
+        try:
+            maxScore, alignments = await loop.run_in_executor(None, self.startAnalysis, analysisParams)
+            await _broadcast(writers, { "score" : int(maxScore) })
+
+            # The next chunk is only reconstructed once the clients took the previous one:
+            alignmentsAmt = 0
+            while chunk := await loop.run_in_executor(None, list, islice(alignments, JOB_RESULTS_CHUNK_SIZE)):
+                alignmentsAmt += len(chunk)
+                await _broadcast(writers, { "alignments" : chunk })
+                if all(writer.is_closing() for writer in writers): # Nobody is left to receive the rest
+                    alignments.close()
+                    return
+
+            await _broadcast(writers, { "total" : alignmentsAmt })
+
+        except Exception as err: await _broadcast(writers, { "error" : str(err) })
+
+    async def _runJobs(self, jobs:Queue) -> None:
+        """Takes the queued jobs in batches and runs them one analysis at a time."""
+        while True:
+            batch = [await jobs.get()]
+            while not jobs.empty(): batch.append(jobs.get_nowait())
+
+            clients :dict[AnalysisParams, list[tuple[StreamWriter, Future]]] = {}
+            for line, writer, done in batch:
+                try: clients.setdefault(parseJob(line), []).append((writer, done))
+                except CustomErr as err:
+                    await _broadcast([writer], { "error" : str(err) })
+                    done.set_result(None)
+
+            for analysisParams, analysisClients in clients.items():
+                await self._streamResult(analysisParams, [writer for writer, _ in analysisClients])
+                for _, done in analysisClients: done.set_result(None)
+
+    async def serve(self, host = JOB_SERVER_HOST, port = JOB_SERVER_PORT) -> None:
+        """
+        Listens for clients until stopped, each sending jobs one JSON line at a time and
+        receiving the results of each job before sending the next one.
+
+        Args:
+            host (str, optional): The address to listen on. Defaults to: JOB_SERVER_HOST.
+            port (int, optional): The port to listen on, if 0 any free one, see the port attribute. Defaults to: JOB_SERVER_PORT.
+        """
+        jobs :Queue = Queue()
+        self.loop, self.stopped = get_running_loop(), Event()
+
+        async def handleClient(reader:StreamReader, writer:StreamWriter) -> None:
+            try:
+                while line := await reader.readline():
+                    done = self.loop.create_future()
+                    await jobs.put((line, writer, done))
+                    await done
+
+            finally: writer.close()
+
+        runner = create_task(self._runJobs(jobs))
+        server = await start_server(handleClient, host, port, limit = JOB_MAX_SIZE)
+        self.port = server.sockets[0].getsockname()[1]
+        self.isReady.set()
+        async with server: await self.stopped.wait()
+
+        runner.cancel()
+        self.pool.terminate()
+
+    def stop(self) -> None:
+        """Stops the server, from any thread."""
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+def _receiveAlignments(fd, connection) -> Iterator[CompactAlignment]:
+    """Yields the alignments the server streams back, closing the connection at the end."""
+    with connection, fd:
+        while message := loads(fd.readline() or "{}"):
+            if "error" in message: raise JobFailedErr(message["error"].rstrip('.'))
+            if "total" in message: return
+            yield from map(tuple, message["alignments"])
+
+    raise JobFailedErr("the server closed the connection before the end of the result")
+
+def submitJob(analysisParams:AnalysisParams, *, host = JOB_SERVER_HOST, port = JOB_SERVER_PORT) -> tuple[int, Iterator[CompactAlignment]]:
+    """
+    Sends an analysis to a running job server and receives its result.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        host (str, optional): The address of the server. Defaults to: JOB_SERVER_HOST.
+        port (int, optional): The port of the server. Defaults to: JOB_SERVER_PORT.
+
+    Raises:
+        JobFailedErr: If the server reports an error about the job.
+
+    Returns:
+        tuple: The maximum alignment score and an iterator over all the compact local alignments, streamed by the server.
+    """
+    targetSeq, querySeq, matchScore, mismatchPenalty, gapPenalty, *extraScores = analysisParams
+    connection = create_connection((host, port))
+    fd = connection.makefile("rwb")
+    fd.write(_encodeMessage({ "target" : targetSeq, "query" : querySeq,
+        "match" : matchScore, "mismatch" : mismatchPenalty, "gap" : gapPenalty,
+        **dict(zip(("gapExtension", "substitutions"), extraScores)) }))
+
+    fd.flush()
+    message = loads(fd.readline() or "{}")
+    if "score" not in message:
+        with connection, fd: raise JobFailedErr(message.get("error", "the server closed the connection").rstrip('.'))
+
+    return message["score"], _receiveAlignments(fd, connection)
+
+def setupServerArgParser() -> ArgumentParser:
+    """
+    Setup an argparse.ArgumentParser instance for the job server.
+
+    Returns:
+        ArgumentParser: The parser, whose Namespace has the properties:
+            - .port (int): Local port to listen on.
+            - .jobs (int): Maximum number of used cores, 0 for all the usable ones.
+            - .max_memory (int): Memory budget of each analysis in bytes, 0 for most of the available memory.
+    """
+    parser = ArgumentParser(prog = "ParaSeq job server", description = SERVER_DESCR)
+    parser.add_argument("--port", "-p", type = uint, default = JOB_SERVER_PORT, help = PORT_HELP)
+    parser.add_argument("--jobs", "-j", type = uint, default = 0, help = JOBS_HELP)
+    parser.add_argument("--max-memory", "-mem", type = memorySize, default = 0, help = MAX_MEMORY_HELP)
+    return parser
+
+def main(args :tuple[str, ...]|None = None) -> None:
+    """
+    Job server entry point, serves until interrupted.
+
+    Args:
+        args (tuple[str, ...] | None): The input arguments, if passed manually for testing purposes. Defaults to: None.
+    """
+    args = setupServerArgParser().parse_args(args)
+    jobServer = JobServer(workersAmt = args.jobs, maxMemory = args.max_memory)
+    print(f"Serving alignment jobs on {JOB_SERVER_HOST}:{args.port}...")
+    run(jobServer.serve(port = args.port))
+
+if __name__ == "__main__":
+    try: main()
+    except KeyboardInterrupt: print("The job server was stopped.")
@@ -1,27 +1,74 @@
 ## Analysis pipeline module
-from numpy           import ndarray, uint8, uint32, dtype, arange, column_stack, argwhere
-from para_seq        import DIRS_MATRIX_SHMEM_NAME, SCORE_MATRIX_SHMEM_NAME
-from multiprocessing import Pool
+from re              import findall
+from numpy           import ndarray, uint8, uint32, int64, dtype, arange, array, column_stack, \
+    argwhere, frombuffer, full, maximum, empty, zeros
+from para_seq        import DIRS_MATRIX_SHMEM_NAME, SCORE_MATRIX_SHMEM_NAME, DEFAULT_TILE_SIZE, \
+    IUPAC_NUCLEOTIDES, MIN_TRACEBACK_BATCH_SIZE, PENDING_TASKS_PER_WORKER, TRACEBACK_TASKS_PER_WORKER, \
+    Backend
+from para_seq.utils  import getProcessContext, getUsableCpusAmt, isGilEnabled
+from signal          import SIGINT, SIG_IGN, signal
+from functools       import cache
+from itertools       import groupby
+from contextlib      import nullcontext
+from collections     import deque
+from collections.abc import Callable, Iterable, Iterator
+
+from multiprocessing.pool          import Pool as PoolType, ThreadPool
+from para_seq.progress             import FillMonitor
+from para_seq.buffer_pool          import MatrixNames, SharedBufferPool
+from para_seq.input_manager        import SubstitutionScores, getSubstitutionScores
 
 from multiprocessing.shared_memory import SharedMemory
 
-type Alignment      = tuple[int, int, str, str]
-type AnalysisParams = tuple[str, str, int, int, int]
+type Alignment      = tuple[int, int, str, str] # Start positions and gapped sequences
+# Run-length alignment operations, like "3M1D2M": M advances on both sequences, D only on
+# the target (gap in the query) and I only on the query (gap in the target):
+type Cigar            = str
+# 1-based target and query start positions, (inclusive) end positions and CIGAR:
+type CompactAlignment = tuple[int, int, int, int, Cigar]
+# Sequences, match score, mismatch and gap penalties, plus the gap extension penalty when
+# gaps are affine and then the substitution scores replacing the match and mismatch ones:
+type AnalysisParams = tuple[str, str, int, int, int] | tuple[str, str, int, int, int, int] | \
+    tuple[str, str, int, int, int, int, SubstitutionScores]
+type Tile           = tuple[int, int, int, int] # rows [y0, y1) and columns [x0, x1)
+# Each co-optimal cell (y, x) mapped to the cells it backtracks to and the operations of
+# each step (a whole gap with affine gaps), the cells with a score of 0 (where alignments
+# begin) have no entry:
+type TracebackDag = dict[tuple[int, int], tuple[tuple[int, int, str], ...]]
+# Persistent run of identical operations linked to the runs before it in the alignment,
+# so that paths forking from the same cell share everything up to the fork:
+type PathRun = tuple[str, int, PathRun|None]
+# A point of the enumeration: starting cell (y, x), current cell (y, x) and path so far:
+type TracebackState = tuple[int, int, int, int, PathRun|None]
 
 # The 3 possible backtracking dirs are encoded as single bits of different value, such
 # that a single bitflag can hold all combinations:
 UP_DIR, DIAG_DIR, LEFT_DIR = 1, 2, 4
+# With affine gaps the spare bits tell how the best vertical and horizontal gaps ending at
+# each cell were reached: opened right after the previous cell or extending its gap.
+UP_OPEN_DIR, UP_EXTEND_DIR, LEFT_OPEN_DIR, LEFT_EXTEND_DIR = 8, 16, 32, 64
+
+# Index of each nucleotide code in the substitution tables, by ASCII code. Any other byte
+# (like the padding of the batched kernel) gets the one of N, which never matches:
+NUCLEOTIDE_INDEXES = full(256, len(IUPAC_NUCLEOTIDES) - 1, dtype = uint8)
+NUCLEOTIDE_INDEXES[frombuffer(IUPAC_NUCLEOTIDES.encode(), dtype = uint8)] = arange(len(IUPAC_NUCLEOTIDES))
 
 # Structuring the values needed by all processes as global consts allows me to set them
 # during Pool init, greatly reducing the amount of args I need to pass to each process
 # and avoiding the creation of long lists of the same values copied over and over
 TARGET_SEQ       = ""
 QUERY_SEQ        = ""
-MATCH_SCORE      = 0
-MISMATCH_PENALTY = 0
+TARGET_INDEXES   = b"" # Nucleotide indexes of the sequences in the substitution table
+QUERY_INDEXES    = b""
+SUBSTITUTIONS :list[list[int]] = []
 GAP_PENALTY      = 0
 MATRIX_SHAPE     = (0, 0)
-def _setProcessTaskConsts(analysisParams:AnalysisParams) -> None:
+SCORE_TYPE       = uint32
+# The matrices live in segments of fixed names, unless they come from a buffer pool:
+SHARED_MATRIX_NAMES :MatrixNames = (SCORE_MATRIX_SHMEM_NAME, DIRS_MATRIX_SHMEM_NAME)
+MATRIX_NAMES        :MatrixNames = SHARED_MATRIX_NAMES
+TRACEBACK_DAG :TracebackDag = {}
+def _setProcessTaskConsts(analysisParams:AnalysisParams, scoreType:dtype = uint32, matrixNames:MatrixNames = SHARED_MATRIX_NAMES) -> None:
     """
     Sets values for unchanging analysis parameters as global constants, also computing
     matrix shape from the provided sequences. Meant as an initializer for pooled
@@ -35,10 +82,22 @@ def _setProcessTaskConsts(analysisParams:AnalysisParams) -> None:
         - matchScore (int) : The alignment score bonus for a nucleotide match.
         - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
         - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+        - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+        - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
+
+        scoreType (np.dtype, optional): Type of the values in the shared score matrix. Defaults to: np.uint32.
+        matrixNames (MatrixNames, optional): The names of the shared segments of the matrices. Defaults to: SHARED_MATRIX_NAMES.
     """
-    global TARGET_SEQ, QUERY_SEQ, MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, MATRIX_SHAPE
-    TARGET_SEQ, QUERY_SEQ, MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY = analysisParams
+    global TARGET_SEQ, QUERY_SEQ, TARGET_INDEXES, QUERY_INDEXES, SUBSTITUTIONS, GAP_PENALTY
+    global MATRIX_SHAPE, SCORE_TYPE, MATRIX_NAMES
+    TARGET_SEQ, QUERY_SEQ, _, _, GAP_PENALTY, *_ = analysisParams
+    # Plain bytes and lists are the fastest to index one cell at a time:
+    indexTable = NUCLEOTIDE_INDEXES.tobytes()
+    TARGET_INDEXES, QUERY_INDEXES = TARGET_SEQ.encode().translate(indexTable), QUERY_SEQ.encode().translate(indexTable)
+    SUBSTITUTIONS = getSubstitutionTable(*analysisParams[2:4], getSubstitutions(analysisParams)).tolist()
     MATRIX_SHAPE = getMatrixShape(TARGET_SEQ, QUERY_SEQ)
+    SCORE_TYPE   = scoreType
+    MATRIX_NAMES = matrixNames
 
 # Untested, as it would be a very convoluted setup. Sufficient test coverage on the
 # process-joining functions should be enough to test this as well.
@@ -61,19 +120,19 @@ def computeCellScoreAndDirs(x:int, y:int) -> int:
         int: The computed alignment score for this cell.
     """
     global UP_DIR, DIAG_DIR, LEFT_DIR
-    global MATRIX_SHAPE, MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, QUERY_SEQ, TARGET_SEQ
+    global MATRIX_SHAPE, SUBSTITUTIONS, GAP_PENALTY, QUERY_INDEXES, TARGET_INDEXES
+    global SCORE_TYPE, MATRIX_NAMES
 
     # The whole thing is 0-init so we just skip the first row/column cells
     if not y or not x: return 0
     
     scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(
-        MATRIX_SHAPE, isNew = False)
+        MATRIX_SHAPE, isNew = False, scoreType = SCORE_TYPE, names = MATRIX_NAMES)
     
     # vvv int casting prevents underflow errors
     insertion  = int(scoreMatrix[y    , x - 1]) - GAP_PENALTY
     deletion   = int(scoreMatrix[y - 1, x    ]) - GAP_PENALTY
-    comparison = int(scoreMatrix[y - 1, x - 1]) + (
-        MATCH_SCORE if QUERY_SEQ[y - 1] == TARGET_SEQ[x - 1] else -MISMATCH_PENALTY)
+    comparison = int(scoreMatrix[y - 1, x - 1]) + SUBSTITUTIONS[QUERY_INDEXES[y - 1]][TARGET_INDEXES[x - 1]]
     # ^^^ -1 on seq pos is due to the matrix having an extra row/column for gaps.
 
     scoreMatrix[y, x] = score = max(0, comparison, deletion, insertion)
@@ -103,7 +162,7 @@ def getMatrixShape(targetSeq:str, querySeq:str) -> tuple[int, int]:
     return (len(querySeq) + 1, len(targetSeq) + 1)
 
 # Helper method since we need to repeat this bit of code in main and in the processes:
-def createMatrices(shape:tuple[int, int], *, isNew = True) -> tuple[ndarray, SharedMemory, ndarray, SharedMemory]:
+def createMatrices(shape:tuple[int, int], *, isNew = True, scoreType:dtype = uint32, names:MatrixNames = SHARED_MATRIX_NAMES) -> tuple[ndarray, SharedMemory, ndarray, SharedMemory]:
     """
     Creates or retrieves reference to alignment score and directions matrices with
     provided shape. Remember to call freeSharedMem on the SharedMemory instance at the end
@@ -111,6 +170,8 @@ def createMatrices(shape:tuple[int, int], *, isNew = True) -> tuple[ndarray, Sha
     Args:
         shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
         isNew (bool, optional): Whether to create (True) the matrix or simply retrieve it (False). Defaults to True.
+        scoreType (np.dtype, optional): Type of the values in the score matrix, must be the same for all processes. Defaults to: np.uint32.
+        names (MatrixNames, optional): The names of the shared segments, to retrieve pooled ones larger than the matrices. Defaults to: SHARED_MATRIX_NAMES.
 
     Returns:
         tuple:
@@ -119,10 +180,11 @@ def createMatrices(shape:tuple[int, int], *, isNew = True) -> tuple[ndarray, Sha
         -np.ndarray: The created/retrieved directions matrix.
         -SharedMemory: The SharedMemory instance tied to the directions matrix.
     """
-    # In local alignment scores can never be negative (therefore uint32)
+    # In local alignment scores can never be negative (therefore uint32, or smaller uints
+    # when the best possible score is known to fit)
     return (
-        *createSharedMatrix(shape, uint32, SCORE_MATRIX_SHMEM_NAME, isNew = isNew),
-        *createSharedMatrix(shape, uint8,  DIRS_MATRIX_SHMEM_NAME,  isNew = isNew))
+        *createSharedMatrix(shape, scoreType, names[0], isNew = isNew),
+        *createSharedMatrix(shape, uint8,     names[1], isNew = isNew))
 
 def freeSharedMem(mem:SharedMemory, *, isFreedCompletely = False) -> None:
     """
@@ -166,6 +228,112 @@ def createSharedMatrix(shape:tuple[int, int], itemType:dtype, name:str, *, isNew
 
     return matrix, sharedMem
 
+def createLocalMatrices(shape:tuple[int, int], scoreType:dtype = uint32) -> tuple[ndarray, ndarray]:
+    """
+    Creates zeros-filled alignment score and directions matrices with provided shape,
+    private to the current process. Meant for threads and in-process kernels, which can
+    share the matrices directly without going through shared memory.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+
+    Returns:
+        tuple:
+        -np.ndarray: The created alignment score matrix.
+        -np.ndarray: The created directions matrix.
+    """
+    return zeros(shape, dtype = scoreType), zeros(shape, dtype = uint8)
+
+def _initProcessWorker(initializer:Callable, *initArgs) -> None:
+    """
+    Makes a pooled process ignore Ctrl+C (SIGINT), which the terminal sends to the whole
+    process group: a worker dying halfway through a task would leave the pool waiting for
+    its result forever. The main process decides how to stop them instead, terminating the
+    pool. Then runs the actual initializer.
+
+    Args:
+        initializer (Callable): The function setting the global constants of the process.
+        initArgs: The args of the initializer.
+    """
+    signal(SIGINT, SIG_IGN)
+    initializer(*initArgs)
+
+def createPool(backend:Backend, analysisParams:AnalysisParams, *, initializer = _setProcessTaskConsts, scoreType:dtype = uint32, workersAmt :int|None = None, extraInitArgs:tuple = ()) -> PoolType:
+    """
+    Creates a pool of workers of the provided kind. Processes are all initialized with
+    the provided analysis parameters, while threads would set the global constants of the
+    calling process itself (clashing with any other analysis running in it), so their
+    tasks must get every value they need as args instead. Processes ignore Ctrl+C, see
+    _initProcessWorker.
+
+    Args:
+        backend (Backend): The kind of workers to pool.
+        analysisParams (AnalysisParams): The analysis parameters set as global constants in each process.
+        initializer (Callable, optional): The function setting the global constants in each process. Defaults to: _setProcessTaskConsts.
+        scoreType (np.dtype, optional): Type of the values in the score matrix, also passed to the initializer. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. Defaults to: None.
+        extraInitArgs (tuple, optional): More args for the initializer, after the score type. Defaults to: ().
+
+    Returns:
+        Pool: The created pool, to be used as a context manager.
+    """
+    if backend == Backend.Thread: return ThreadPool(workersAmt)
+    return getProcessContext().Pool(workersAmt, _initProcessWorker,
+        (initializer, analysisParams, scoreType, *extraInitArgs))
+
+def getTracebackThreadsAmt(workersAmt:int|None) -> int|None:
+    """
+    Computes the amount of threads worth using for the backtracking step, which is pure
+    Python: on builds of Python with the GIL threads would only take turns, so a single
+    one (meaning no pool at all) is used.
+
+    Args:
+        workersAmt (int | None): The desired amount of workers, if None as many as there are cores.
+
+    Returns:
+        int | None: The amount of threads to use, if None as many as there are cores.
+    """
+    return 1 if isGilEnabled() else workersAmt
+
+def _setTracebackTaskConsts(analysisParams:AnalysisParams, scoreType:dtype, dag:TracebackDag) -> None:
+    """
+    Sets the analysis parameters and the traceback DAG as global constants. Meant as an
+    initializer for pooled processes, which this way receive the DAG once instead of with
+    every task.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        scoreType (np.dtype): Type of the values in the score matrix.
+        dag (TracebackDag): The traceback DAG of all the best local alignments.
+    """
+    global TRACEBACK_DAG
+    _setProcessTaskConsts(analysisParams, scoreType)
+    TRACEBACK_DAG = dag
+
+def imapTasks(pool:PoolType, func:Callable, tasks:Iterable[tuple]) -> Iterator:
+    """
+    Lazy version of pool.starmap: results are yielded in order as soon as they're ready,
+    instead of all together once every task is done. Only a few tasks per worker are
+    submitted ahead of the consumer, so when it's slower than the workers (e.g. writing
+    the results out) finished results don't pile up in memory.
+
+    Args:
+        pool (Pool): The pool running the tasks.
+        func (Callable): The function to call, must be picklable for process pools.
+        tasks (Iterable[tuple]): The args of each call.
+
+    Returns:
+        Iterator: The results of each call.
+    """
+    maxPendingAmt = pool._processes * PENDING_TASKS_PER_WORKER
+    pending = deque()
+    for task in tasks:
+        if len(pending) == maxPendingAmt: yield pending.popleft().get()
+        pending.append(pool.apply_async(func, task))
+
+    while pending: yield pending.popleft().get()
+
 def computeAntidiagCoords(antidiagId:int, rowsAmt:int, columnsAmt:int) -> ndarray:
     """
     Computes the coordinates of cells belonging to the antidiagonal at the provided index
@@ -188,7 +356,265 @@ def computeAntidiagCoords(antidiagId:int, rowsAmt:int, columnsAmt:int) -> ndarra
     xs = antidiagId - ys
     return column_stack((xs, ys))
 
-def fillMatrices(analysisParams:AnalysisParams) -> int:
+def encodeSeq(seq:str) -> ndarray:
+    """
+    Encodes a DNA sequence as an array of its ASCII codes, so that nucleotides can be
+    compared in bulk by the vectorized kernels.
+
+    Args:
+        seq (str): The DNA sequence to encode.
+
+    Returns:
+        np.ndarray: 1D-array of uint8 nucleotide codes, one per sequence character.
+    """
+    return frombuffer(seq.encode("ascii"), dtype = uint8)
+
+def getGapExtension(analysisParams:AnalysisParams) -> int|None:
+    """
+    Gets the gap extension penalty of an analysis with affine gaps. An extension penalty
+    equal to the gap penalty is the same as linear gaps, which are faster to fill.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        int | None: The gap extension penalty, or None if the gaps are linear.
+    """
+    if len(analysisParams) < 6 or analysisParams[5] == analysisParams[4]: return None
+    return analysisParams[5]
+
+def getSubstitutions(analysisParams:AnalysisParams) -> SubstitutionScores|None:
+    """
+    Gets the substitution scores of an analysis scoring nucleotide pairs with a matrix.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        SubstitutionScores | None: The score of every pair of nucleotides, or None if the match score and mismatch penalty are used.
+    """
+    return analysisParams[6] if len(analysisParams) > 6 else None
+
+def getTileScores(analysisParams:AnalysisParams) -> tuple[int, int, int, int|None, SubstitutionScores|None]:
+    """
+    Gets all the scores of an analysis in the order fillTile takes them, so that any gap
+    borders can follow them.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        tuple: The match score, the mismatch and gap penalties, then the gap extension penalty (see getGapExtension) and the substitution scores (see getSubstitutions).
+    """
+    return (*analysisParams[2:5], getGapExtension(analysisParams), getSubstitutions(analysisParams))
+
+def getMaxSubstitutionScore(analysisParams:AnalysisParams) -> int:
+    """
+    Gets the highest score a single pair of aligned nucleotides can add, the match score
+    unless a substitution matrix says otherwise. Bounds the scores and lengths of the
+    alignments.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        int: The highest substitution score, at least 0.
+    """
+    substitutions = getSubstitutions(analysisParams)
+    if substitutions is None: return analysisParams[2]
+    return max(0, max(map(max, substitutions)))
+
+@cache
+def getSubstitutionTable(matchScore:int, mismatchPenalty:int, substitutions :SubstitutionScores|None = None) -> ndarray:
+    """
+    Builds the table the kernels look the score of each pair of nucleotides up in, with a
+    row per query nucleotide and a column per target one, both indexed by
+    NUCLEOTIDE_INDEXES. Built once and shared by all the tiles of an analysis.
+
+    Args:
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, if None only identical unambiguous nucleotides match, see getSubstitutionScores. Defaults to: None.
+
+    Returns:
+        np.ndarray: Read-only 2D-array of int64 substitution scores.
+    """
+    table = array(substitutions or getSubstitutionScores(matchScore, mismatchPenalty), dtype = int64)
+    table.flags.writeable = False # Shared by every caller
+    return table
+
+def createGapBorders(shape:tuple[int, int], scoreType:dtype = uint32) -> tuple[ndarray, ndarray]:
+    """
+    Creates the rolling gap scores affine tiles hand over to the tiles right of and below
+    them: the horizontal gap score of each row at the right edge of the last tile filled
+    there, and the vertical one of each column at the bottom edge. Tiles of the same wave
+    never share rows nor columns, so a single pair serves the whole fill.
+
+    Args:
+        shape (tuple[int, int]): The dimensions (rows, columns) of the matrices.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The horizontal gap scores by row and the vertical ones by column, all 0.
+    """
+    return zeros(shape[0], dtype = scoreType), zeros(shape[1], dtype = scoreType)
+
+def fillTile(scoreMatrix:ndarray, dirsMatrix:ndarray, tile:Tile, targetCodes:ndarray, queryCodes:ndarray, matchScore:int, mismatchPenalty:int, gapPenalty:int, gapExtension :int|None = None, substitutions :SubstitutionScores|None = None, gapBorders :tuple[ndarray, ndarray]|None = None) -> int:
+    """
+    Computes alignment scores and backtracking directions for a rectangular block of
+    cells, one whole row at a time. The row above and the column to the left of the
+    tile must already be filled (the first row and column of the matrices are always 0).
+
+    Args:
+        scoreMatrix (np.ndarray): The alignment score matrix, filled in place.
+        dirsMatrix (np.ndarray): The directions matrix, filled in place.
+        tile (Tile): The rows [y0, y1) and columns [x0, x1) of the block, both starting from at least 1.
+        targetCodes (np.ndarray): The encoded target sequence.
+        queryCodes (np.ndarray): The encoded query sequence.
+        matchScore (int): The alignment score bonus for a nucleotide match.
+        mismatchPenalty (int): The alignment score penalty for a nucleotide mismatch.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        gapExtension (int | None, optional): The penalty of each gap position after the first, at most the gap penalty. If None the gaps are linear. Defaults to: None.
+        substitutions (SubstitutionScores | None, optional): The score of every pair of nucleotides, replacing the match score and mismatch penalty. Defaults to: None.
+        gapBorders (tuple[np.ndarray, np.ndarray] | None, optional): The rolling gap scores of affine gaps, see createGapBorders, updated in place. If None the tile must start at the first row and column. Defaults to: None.
+
+    Returns:
+        int: The maximum alignment score found in the tile.
+    """
+    y0, y1, x0, x1 = tile
+    # The substitution score of each query nucleotide against every column of the tile
+    # (a target profile), so that each row just picks its line instead of comparing:
+    targetProfile = getSubstitutionTable(matchScore, mismatchPenalty, substitutions)[
+        :, NUCLEOTIDE_INDEXES[targetCodes[x0 - 1:x1 - 1]]]
+    queryIndexes  = NUCLEOTIDE_INDEXES[queryCodes[y0 - 1:y1 - 1]]
+
+    if gapExtension is not None and gapExtension < gapPenalty: return _fillAffineTile(
+        scoreMatrix, dirsMatrix, tile, targetProfile, queryIndexes, gapPenalty, gapExtension,
+        gapBorders or createGapBorders(scoreMatrix.shape))
+
+    # Insertions are the only horizontal dependency, so given the other 2 candidates
+    # (and 0) for each cell, H[x] = max(A[x], H[x - 1] - gap) unrolls into a running
+    # maximum: H[x] = max over k <= x of (A[k] + gap * k) - gap * x.
+    gapSteps   = arange(x1 - x0 + 1, dtype = int64) * gapPenalty
+    candidates = empty(x1 - x0 + 1, dtype = int64)
+
+    maxScore = 0
+    for y in range(y0, y1):
+        # vvv int casting prevents underflow errors
+        upperRow   = scoreMatrix[y - 1, x0 - 1:x1].astype(int64)
+        comparison = upperRow[:-1] + targetProfile[queryIndexes[y - y0]]
+
+        deletion = upperRow[1:] - gapPenalty
+
+        # The first candidate is the (already filled) cell left of the tile:
+        candidates[0] = scoreMatrix[y, x0 - 1]
+        maximum(maximum(comparison, deletion), 0, out = candidates[1:])
+        row = maximum.accumulate(candidates + gapSteps) - gapSteps
+
+        scores    = row[1:]
+        insertion = row[:-1] - gapPenalty
+        scoreMatrix[y, x0:x1] = scores
+        dirsMatrix[y, x0:x1]  = (scores > 0) * (
+            (scores == deletion)   * UP_DIR   |
+            (scores == comparison) * DIAG_DIR |
+            (scores == insertion)  * LEFT_DIR)
+
+        if scores.size: maxScore = max(maxScore, int(scores.max()))
+
+    return maxScore
+
+def _fillAffineTile(scoreMatrix:ndarray, dirsMatrix:ndarray, tile:Tile, targetProfile:ndarray, queryIndexes:ndarray, gapPenalty:int, gapExtension:int, gapBorders:tuple[ndarray, ndarray]) -> int:
+    """
+    Same as fillTile (with the target profile and query indexes it computes), with
+    affine gaps. Instead of 2 extra matrices, the best vertical
+    and horizontal gap scores only live as rolling rows (plus the borders handed over
+    between tiles), while the spare bits of the directions matrix record how they were
+    reached, which is all the traceback needs. Gap scores are kept non-negative, since a
+    gap never brings a negative score back above 0.
+    """
+    y0, y1, x0, x1 = tile
+    if x1 <= x0: return 0 # No columns, nothing to fill
+    leftGaps, upperGaps = gapBorders
+    # Same running maximum as the linear gaps: with the extension penalty at most the gap
+    # penalty, a horizontal gap either opens right after the best score without one or
+    # extends the gap ending left of it, so E[x] = max over k < x of (A[k] - gap - ext *
+    # (x - 1 - k)), seeded with the gap coming from the tile on the left.
+    extensionSteps = arange(x1 - x0, dtype = int64) * gapExtension
+    candidates   = empty(x1 - x0, dtype = int64)
+    leftScores   = empty(x1 - x0 + 1, dtype = int64) # The cell left of the tile, then its row
+    leftGapsRow  = empty(x1 - x0 + 1, dtype = int64)
+    upperGapsRow = upperGaps[x0:x1].astype(int64)
+
+    maxScore = 0
+    for y in range(y0, y1):
+        # vvv int casting prevents underflow errors
+        upperRow   = scoreMatrix[y - 1, x0 - 1:x1].astype(int64)
+        comparison = upperRow[:-1] + targetProfile[queryIndexes[y - y0]]
+
+        upperOpening   = upperRow[1:] - gapPenalty
+        upperExtension = upperGapsRow - gapExtension
+        upperGapsRow   = maximum(maximum(upperOpening, upperExtension), 0)
+        withoutLeftGap = maximum(comparison, upperGapsRow)
+
+        leftScores[0], leftGapsRow[0] = scoreMatrix[y, x0 - 1], leftGaps[y]
+        candidates[0] = max(leftScores[0] - gapPenalty, leftGapsRow[0] - gapExtension)
+        candidates[1:] = withoutLeftGap[:-1] - gapPenalty
+        leftGapsRow[1:] = maximum(maximum.accumulate(candidates + extensionSteps) - extensionSteps, 0)
+        leftScores[1:]  = scores = maximum(withoutLeftGap, leftGapsRow[1:])
+
+        scoreMatrix[y, x0:x1] = scores
+        dirsMatrix[y, x0:x1]  = (scores > 0) * (
+            (scores == upperGapsRow)    * UP_DIR   |
+            (scores == comparison)      * DIAG_DIR |
+            (scores == leftGapsRow[1:]) * LEFT_DIR) | (upperGapsRow > 0) * (
+            (upperGapsRow == upperOpening)   * UP_OPEN_DIR |
+            (upperGapsRow == upperExtension) * UP_EXTEND_DIR) | (leftGapsRow[1:] > 0) * (
+            (leftGapsRow[1:] == leftScores[:-1] - gapPenalty)    * LEFT_OPEN_DIR |
+            (leftGapsRow[1:] == leftGapsRow[:-1] - gapExtension) * LEFT_EXTEND_DIR)
+
+        leftGaps[y] = leftGapsRow[-1]
+        maxScore = max(maxScore, int(scores.max()))
+
+    upperGaps[x0:x1] = upperGapsRow
+    return maxScore
+
+def computeTileWaves(rowsAmt:int, columnsAmt:int, tileSize:int) -> list[list[Tile]]:
+    """
+    Splits a matrix with the provided amount of rows and columns, minus the first row and
+    column, into square tiles (cut short at the edges) grouped by antidiagonal of tiles.
+    Tiles in the same wave only depend on tiles of previous waves.
+
+    Args:
+        rowsAmt (int): The amount of rows in the matrix.
+        columnsAmt (int): The amount of columns in the matrix.
+        tileSize (int): The side of each tile.
+
+    Returns:
+        list[list[Tile]]: The waves of tiles, in the order they have to be filled.
+    """
+    rowStarts    = range(1, rowsAmt,    tileSize)
+    columnStarts = range(1, columnsAmt, tileSize)
+
+    waves :list[list[Tile]] = [[] for _ in range(len(rowStarts) + len(columnStarts) - 1)]
+    for i, y0 in enumerate(rowStarts):
+        for j, x0 in enumerate(columnStarts): waves[i + j].append(
+            (y0, min(y0 + tileSize, rowsAmt), x0, min(x0 + tileSize, columnsAmt)))
+
+    return waves
+
+def countTileCells(tiles:Iterable[Tile]) -> int:
+    """
+    Counts the cells of the provided tiles, like those of a wave.
+
+    Args:
+        tiles (Iterable[Tile]): The tiles to count the cells of.
+
+    Returns:
+        int: The total amount of cells.
+    """
+    return sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in tiles)
+
+def fillMatrices(analysisParams:AnalysisParams, *, backend = Backend.Process, matrices :tuple[ndarray, ndarray]|None = None, tileSize = DEFAULT_TILE_SIZE, scoreType:dtype = uint32, workersAmt :int|None = None, pool :ThreadPool|None = None, matrixNames:MatrixNames = SHARED_MATRIX_NAMES, monitor :FillMonitor|None = None) -> int:
     """
     Fill aligment score and directions matrices based on the provided analysis parameters.
 
@@ -199,28 +625,255 @@ def fillMatrices(analysisParams:AnalysisParams) -> int:
         - matchScore (int) : The alignment score bonus for a nucleotide match.
         - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
         - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+        - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+        - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
+
+        backend (Backend, optional): The kind of workers filling the matrices, always threads with affine gaps (unless serial, see fillMatricesSerially). Defaults to: Backend.Process.
+        matrices (tuple[np.ndarray, np.ndarray] | None, optional): The score and directions matrices to fill, not used by processes. If None threads and the serial engine attach to the shared ones. Defaults to: None.
+        tileSize (int, optional): The side of the tiles each thread fills at once. Defaults to: DEFAULT_TILE_SIZE.
+        scoreType (np.dtype, optional): Type of the values in the score matrix. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. A single thread fills the whole matrix in-process, with no pool. Defaults to: None.
+        pool (ThreadPool | None, optional): An already running pool of threads to use instead of a new one, left open. Defaults to: None.
+        matrixNames (MatrixNames, optional): The names of the shared segments of the matrices the workers attach to. Defaults to: SHARED_MATRIX_NAMES.
+        monitor (FillMonitor | None, optional): Gets the progress after each antidiagonal of cells (or wave of tiles), and stops the fill there once cancelled. Defaults to: None.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill, the pool of workers is terminated.
     
     Returns:
         int: The maximum alignment score found in the score matrix. All the cells with this value are the starting point for the backtracking step.
     """
+    if backend == Backend.Serial:
+        if matrices is not None: return fillMatricesSerially(analysisParams, matrices, monitor = monitor)
+        scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(
+            getMatrixShape(*analysisParams[:2]), isNew = False, scoreType = scoreType, names = matrixNames)
+
+        try: return fillMatricesSerially(analysisParams, (scoreMatrix, dirsMatrix), monitor = monitor)
+        finally:
+            freeSharedMem(scoreSharedMem)
+            freeSharedMem(dirsSharedMem)
+
+    # The per-cell tasks only know linear gaps, affine ones are filled by tiles on the
+    # same matrices:
+    if backend == Backend.Thread or getGapExtension(analysisParams) is not None:
+        return _fillMatricesByTiles(
+            analysisParams, matrices, tileSize, scoreType, workersAmt, pool, matrixNames, monitor)
+
     maxScore = 0
     # Recomputing this a lot is not a problem since it's a simple operation and it helps
     # isolate the function for testing:
     rowsAmt, columnsAmt = getMatrixShape(*analysisParams[:2])
-    # Python automatically spreads initargs into the initializer, so I need to wrap them:
-    with Pool(initializer = _setProcessTaskConsts, initargs = (analysisParams,)) as pool:
+    if monitor: monitor.start(rowsAmt * columnsAmt, rowsAmt + columnsAmt - 1)
+    # Leaving the pool terminates the workers, also when the fill is cancelled:
+    with createPool(backend, analysisParams, scoreType = scoreType, workersAmt = workersAmt,
+        extraInitArgs = (matrixNames,)) as pool:
         for antidiagId in range(rowsAmt + columnsAmt - 1):
             # Each cell in the same antidiag can be computed in parallel:
             antidiag = computeAntidiagCoords(antidiagId, rowsAmt, columnsAmt)
             antidiagMaxScore = max(pool.starmap(computeCellScoreAndDirs, antidiag))
             if maxScore < antidiagMaxScore: maxScore = antidiagMaxScore
+            if monitor: monitor.completeWave(len(antidiag))
+
+    return maxScore
+
+def _fillMatricesByTiles(analysisParams:AnalysisParams, matrices:tuple[ndarray, ndarray]|None, tileSize:int, scoreType:dtype, workersAmt:int|None, pool :ThreadPool|None = None, matrixNames:MatrixNames = SHARED_MATRIX_NAMES, monitor :FillMonitor|None = None) -> int:
+    """
+    Fill aligment score and directions matrices with a pool of threads, each filling a
+    whole tile at once with the vectorized kernel. Threads share the matrices directly, so
+    there is no attaching to shared memory nor pickling for each task.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters, see fillMatrices.
+        matrices (tuple[np.ndarray, np.ndarray] | None): The score and directions matrices to fill, if None the shared ones are attached once for all threads.
+        tileSize (int): The side of the tiles each thread fills at once.
+        scoreType (np.dtype): Type of the values in the shared score matrix.
+        workersAmt (int | None): The amount of threads, if None as many as there are cores.
+        pool (ThreadPool | None, optional): An already running pool of threads to use instead of a new one, left open. Defaults to: None.
+        matrixNames (MatrixNames, optional): The names of the shared segments of the matrices to attach to. Defaults to: SHARED_MATRIX_NAMES.
+        monitor (FillMonitor | None, optional): Gets the progress after each wave of tiles, and stops the fill there once cancelled. Defaults to: None.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill.
+
+    Returns:
+        int: The maximum alignment score found in the score matrix.
+    """
+    targetSeq, querySeq = analysisParams[:2]
+    targetCodes, queryCodes = encodeSeq(targetSeq), encodeSeq(querySeq)
+    rowsAmt, columnsAmt = shape = getMatrixShape(targetSeq, querySeq)
+    scoring = [*getTileScores(analysisParams)]
+    if getGapExtension(analysisParams) is not None: scoring.append(createGapBorders(shape, scoreType))
+
+    sharedMems :list[SharedMemory] = []
+    if matrices is None: # Attached only once, all threads see the same buffers
+        scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(
+            shape, isNew = False, scoreType = scoreType, names = matrixNames)
+
+        matrices, sharedMems = (scoreMatrix, dirsMatrix), [scoreSharedMem, dirsSharedMem]
+
+    # A single thread isn't worth a pool, and fills the whole matrix as a single tile
+    # unless the fill has to stop between waves:
+    if workersAmt == 1: pool = None
+    waves = [[(1, rowsAmt, 1, columnsAmt)]] if workersAmt == 1 and monitor is None else \
+        computeTileWaves(rowsAmt, columnsAmt, tileSize)
+
+    if monitor: monitor.start((rowsAmt - 1) * (columnsAmt - 1), len(waves))
+
+    maxScore = 0
+    try:
+        with nullcontext(pool) if pool or workersAmt == 1 else createPool(Backend.Thread, analysisParams, workersAmt = workersAmt) as pool:
+            # Each tile in the same wave can be filled in parallel, NumPy releases the GIL
+            # while doing so:
+            for wave in waves:
+                tasks = [(*matrices, tile, targetCodes, queryCodes, *scoring) for tile in wave]
+                waveMaxScore = max(pool.starmap(fillTile, tasks) if pool else
+                    (fillTile(*task) for task in tasks))
+
+                if maxScore < waveMaxScore: maxScore = waveMaxScore
+                if monitor: monitor.completeWave(countTileCells(wave))
+
+    finally:
+        for sharedMem in sharedMems: freeSharedMem(sharedMem)
+
+    return maxScore
+
+def fillMatricesSerially(analysisParams:AnalysisParams, matrices:tuple[ndarray, ndarray], *, monitor :FillMonitor|None = None) -> int:
+    """
+    Fill aligment score and directions matrices one cell at a time in the calling
+    process, with plain Python integers: no workers, no shared memory and no vectorized
+    tricks, just the textbook recurrences. Nothing beats it on tiny inputs, where pools
+    and kernels cost more to set up than the whole fill, and being the simplest it's also
+    the reference every other engine is checked against (see para_seq.differential).
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters, see fillMatrices.
+        matrices (tuple[np.ndarray, np.ndarray]): The zeros-filled score and directions matrices to fill.
+        monitor (FillMonitor | None, optional): Gets the progress after each row, and stops the fill there once cancelled. Defaults to: None.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill.
+
+    Returns:
+        int: The maximum alignment score found in the score matrix.
+    """
+    targetSeq, querySeq, matchScore, mismatchPenalty, gapPenalty, *_ = analysisParams
+    scoreMatrix, dirsMatrix = matrices
+    rowsAmt, columnsAmt = getMatrixShape(targetSeq, querySeq)
+    # Plain bytes and lists are the fastest to index one cell at a time:
+    indexTable = NUCLEOTIDE_INDEXES.tobytes()
+    targetIndexes, queryIndexes = targetSeq.encode().translate(indexTable), querySeq.encode().translate(indexTable)
+    substitutions = getSubstitutionTable(matchScore, mismatchPenalty, getSubstitutions(analysisParams)).tolist()
+    gapExtension  = getGapExtension(analysisParams)
+    if gapExtension is not None and gapExtension >= gapPenalty: gapExtension = None # Same as fillTile
+
+    maxScore = 0
+    upperRow  = [0] * columnsAmt # The first row is always 0
+    upperGaps = [0] * columnsAmt # Best vertical gap scores, only with affine gaps
+    if monitor: monitor.start((rowsAmt - 1) * (columnsAmt - 1), rowsAmt - 1)
+    for y in range(1, rowsAmt):
+        pairScores = [substitutions[queryIndexes[y - 1]][targetIndex] for targetIndex in targetIndexes]
+        row, rowDirs = ( # The first column is always 0
+            _fillSerialRow(upperRow, pairScores, gapPenalty) if gapExtension is None else
+            _fillSerialAffineRow(upperRow, upperGaps, pairScores, gapPenalty, gapExtension))
+
+        scoreMatrix[y], dirsMatrix[y] = row, rowDirs
+        maxScore, upperRow = max(maxScore, *row), row
+        if monitor: monitor.completeWave(columnsAmt - 1)
 
     return maxScore
 
-def reconstructAlignments(scoreMatrix:ndarray, maxScore:int, analysisParams:AnalysisParams) -> list[Alignment]:
+def _fillSerialRow(upperRow:list[int], pairScores:list[int], gapPenalty:int) -> tuple[list[int], list[int]]:
+    """Computes the scores and directions of a row from the one above, with linear gaps."""
+    global UP_DIR, DIAG_DIR, LEFT_DIR
+    row, rowDirs = [0] * len(upperRow), [0] * len(upperRow)
+    for x in range(1, len(upperRow)):
+        deletion   = upperRow[x] - gapPenalty
+        insertion  = row[x - 1] - gapPenalty
+        comparison = upperRow[x - 1] + pairScores[x - 1]
+        row[x] = score = max(0, comparison, deletion, insertion)
+        if score: rowDirs[x] = (
+            (score == deletion)   * UP_DIR   |
+            (score == comparison) * DIAG_DIR |
+            (score == insertion)  * LEFT_DIR)
+
+    return row, rowDirs
+
+def _fillSerialAffineRow(upperRow:list[int], upperGaps:list[int], pairScores:list[int], gapPenalty:int, gapExtension:int) -> tuple[list[int], list[int]]:
+    """
+    Same as _fillSerialRow with affine gaps, updating the best vertical gap scores in place.
+    Gap scores are kept non-negative and recorded in the spare bits of the directions,
+    exactly like _fillAffineTile does.
+    """
+    global UP_DIR, DIAG_DIR, LEFT_DIR, UP_OPEN_DIR, UP_EXTEND_DIR, LEFT_OPEN_DIR, LEFT_EXTEND_DIR
+    row, rowDirs = [0] * len(upperRow), [0] * len(upperRow)
+    leftGap = 0
+    for x in range(1, len(upperRow)):
+        upperOpening, upperExtension = upperRow[x] - gapPenalty, upperGaps[x] - gapExtension
+        leftOpening,  leftExtension  = row[x - 1] - gapPenalty,  leftGap - gapExtension
+        upperGaps[x] = upperGap = max(0, upperOpening, upperExtension)
+        leftGap    = max(0, leftOpening, leftExtension)
+        comparison = upperRow[x - 1] + pairScores[x - 1]
+        row[x] = score = max(comparison, upperGap, leftGap)
+        rowDirs[x] = (score > 0) * (
+            (score == upperGap)   * UP_DIR   |
+            (score == comparison) * DIAG_DIR |
+            (score == leftGap)    * LEFT_DIR) | (upperGap > 0) * (
+            (upperGap == upperOpening)   * UP_OPEN_DIR |
+            (upperGap == upperExtension) * UP_EXTEND_DIR) | (leftGap > 0) * (
+            (leftGap == leftOpening)   * LEFT_OPEN_DIR |
+            (leftGap == leftExtension) * LEFT_EXTEND_DIR)
+
+    return row, rowDirs
+
+def encodeCigar(ops:Iterable[str]) -> Cigar:
+    """
+    Run-length encodes a sequence of single alignment operations.
+
+    Args:
+        ops (Iterable[str]): The operations (M, D or I) in alignment order.
+
+    Returns:
+        Cigar: The run-length encoded operations.
+    """
+    return "".join(f"{len(list(run))}{op}" for op, run in groupby(ops))
+
+def materializeAlignment(alignment:CompactAlignment, targetSeq:str, querySeq:str) -> Alignment:
+    """
+    Builds the gapped sequences of a compact alignment, only needed for text output.
+
+    Args:
+        alignment (CompactAlignment): The compact alignment.
+        targetSeq (str): The aligned target sequence.
+        querySeq (str): The aligned query sequence.
+
+    Returns:
+        Alignment: The start positions and the gapped target and query sequences.
+    """
+    targetX, queryY, _, _, cigar = alignment
+    targetPos, queryPos = targetX - 1, queryY - 1
+    targetParts :list[str] = []
+    queryParts  :list[str] = []
+    for runLen, op in findall(r"(\d+)([MDI])", cigar):
+        runLen = int(runLen)
+        if op == 'I': targetParts.append('-' * runLen)
+        else:
+            targetParts.append(targetSeq[targetPos:targetPos + runLen])
+            targetPos += runLen
+
+        if op == 'D': queryParts.append('-' * runLen)
+        else:
+            queryParts.append(querySeq[queryPos:queryPos + runLen])
+            queryPos += runLen
+
+    return targetX, queryY, "".join(targetParts), "".join(queryParts)
+
+def reconstructAlignments(scoreMatrix:ndarray, maxScore:int, analysisParams:AnalysisParams, *, backend = Backend.Process, dirsMatrix :ndarray|None = None, workersAmt :int|None = None, pool :ThreadPool|None = None) -> Iterator[CompactAlignment]:
     """
     Reconstruct all best local alignments based on the filled matrices, the maximum
-    alignment score identified and the provided analysis parameters.
+    alignment score identified and the provided analysis parameters. The traceback DAG
+    is built once for all the starting cells, then its paths are split into batches of
+    similar size for the workers. Alignments are yielded as soon as their batch is
+    done, in the same order as a serial traceback, so they never need to be all in memory.
 
     Args:
         scoreMatrix (np.ndarray): The filled alignment score matrix.
@@ -231,82 +884,319 @@ def reconstructAlignments(scoreMatrix:ndarray, maxScore:int, analysisParams:Anal
             - matchScore (int) : The alignment score bonus for a nucleotide match.
             - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
             - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+            - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+            - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
+
+        backend (Backend, optional): The kind of workers enumerating the alignments, serial enumerates them in-process. Defaults to: Backend.Process.
+        dirsMatrix (np.ndarray | None, optional): The filled directions matrix. If None the shared one is attached. Defaults to: None.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. A single worker runs in-process, with no pool. Defaults to: None.
+        pool (ThreadPool | None, optional): An already running pool of threads to use instead of a new one, left open. Defaults to: None.
+
+    Returns:
+        Iterator[CompactAlignment]: All the optimal local alignments, each exactly once.
+    """
+    if not maxScore: return # No point in aligning if maxScore is 0
+
+    # No deduplication needed: the start position and the CIGAR determine the whole path
+    # of an alignment, and each path is enumerated exactly once.
+    startCells = [(int(y), int(x)) for y, x in argwhere(scoreMatrix == maxScore)]
+    if dirsMatrix is None:
+        dirsMatrix, dirsSharedMem = createSharedMatrix(
+            scoreMatrix.shape, uint8, DIRS_MATRIX_SHMEM_NAME)
+
+        try: dag = buildTracebackDag(scoreMatrix, dirsMatrix, startCells)
+        finally: freeSharedMem(dirsSharedMem)
+
+    else: dag = buildTracebackDag(scoreMatrix, dirsMatrix, startCells)
+
+    yield from enumerateAlignments(dag, startCells, analysisParams,
+        backend = backend, scoreType = scoreMatrix.dtype, workersAmt = workersAmt, pool = pool)
+
+def enumerateAlignments(dag:TracebackDag, startCells:list[tuple[int, int]], analysisParams:AnalysisParams, *, backend = Backend.Process, scoreType:dtype = uint32, workersAmt :int|None = None, pool :ThreadPool|None = None) -> Iterator[CompactAlignment]:
+    """
+    Enumerates all the paths of the traceback DAG from the provided starting cells,
+    split into batches of similar size for the workers. Alignments are yielded as soon as
+    their batch is done, in the same order as a serial enumeration.
+
+    Args:
+        dag (TracebackDag): The traceback DAG, including all the starting cells.
+        startCells (list[tuple[int, int]]): The (y, x) coordinates of the starting cells, in order.
+        analysisParams (AnalysisParams): The analysis parameters set as global constants in each worker.
+        backend (Backend, optional): The kind of workers enumerating the alignments, serial enumerates them in-process. Defaults to: Backend.Process.
+        scoreType (np.dtype, optional): Type of the values in the score matrix, passed to the pool initializer. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. A single worker runs in-process, with no pool. Defaults to: None.
+        pool (ThreadPool | None, optional): An already running pool of threads to use instead of a new one, left open. Defaults to: None.
 
     Returns:
-        list[Alignment]: All the optimal local alignments, ignoring exact duplicates.
+        Iterator[CompactAlignment]: All the local alignments from the starting cells.
     """
-    if not maxScore: return [] # No point in aligning if maxScore is 0
+    tracebackWorkersAmt = getTracebackThreadsAmt(workersAmt) if backend == Backend.Thread else workersAmt
+    if tracebackWorkersAmt == 1 or backend == Backend.Serial:
+        yield from enumerateDagStates(dag, ((y, x, y, x, None) for y, x in startCells))
+        return
+
+    # Tasks are batches of similar size, no matter how the paths are spread over the cells:
+    tasks = [(batch,) for batch in splitTracebackStates(dag, startCells,
+        (tracebackWorkersAmt or getUsableCpusAmt()) * TRACEBACK_TASKS_PER_WORKER)]
 
-    bestLocalAlignments :set[Alignment] = set()
-    # vvv Python automatically spreads initargs into the initializer, so I need to wrap them:
-    with Pool(initializer = _setProcessTaskConsts, initargs = (analysisParams,)) as pool:
-        for alignments in pool.starmap(execTraceback, argwhere(scoreMatrix == maxScore)):
-            bestLocalAlignments.update(alignments)
+    if backend == Backend.Process:
+        with createPool(backend, analysisParams, initializer = _setTracebackTaskConsts,
+            scoreType = scoreType, workersAmt = workersAmt, extraInitArgs = (dag,)) as pool:
+            for alignments in imapTasks(pool, execTraceback, tasks):
+                yield from alignments
 
-    # List conversion is useful for slicing this collection and everything else we want
-    # to do in output.
-    return list(bestLocalAlignments)
+        return
+
+    # Each thread collects the alignments of a whole batch, or the enumeration would
+    # happen lazily in the consuming thread instead:
+    with nullcontext(pool) if pool else createPool(backend, analysisParams, workersAmt = tracebackWorkersAmt) as pool:
+        for alignments in imapTasks(pool, lambda batch: list(enumerateDagStates(dag, batch)), tasks):
+            yield from alignments
 
 # Untested, as it would be a very convoluted setup. Sufficient test coverage on the
 # process-joining functions should be enough to test this as well.
-# Coords here are accepted y first to comply with numpy.
-def execTraceback(startY:int, startX:int) -> list[Alignment]:
+def execTraceback(states:list[TracebackState]) -> list[CompactAlignment]:
     """
     **Only works as process task**\n
-    Executes traceback and reconstructs local alignments, starting from cell at the
-    provided coordinates.
+    Enumerates the local alignments from a batch of traceback states, with the traceback
+    DAG received at pool init.
 
     Args:
-        y (int): The y coordinate of the local alignment starting cell.
-        x (int): The x coordinate of the local alignment starting cell.
-    
-    **Side effects**
-        scoreMatrix: mutates
-        dirsMatrix: mutates
-        thread safe
-    
+        states (list[TracebackState]): The states to enumerate the paths of.
+
     Returns:
-        list[Alignment]: All the best local alignments.
+        list[CompactAlignment]: All the best local alignments going through those states.
     """
-    global UP_DIR, DIAG_DIR, LEFT_DIR, MATRIX_SHAPE, QUERY_SEQ, TARGET_SEQ
+    global TRACEBACK_DAG
+    return list(enumerateDagStates(TRACEBACK_DAG, states))
 
-    scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(
-        MATRIX_SHAPE, isNew = False)
-    
-    bestAlignments :list[Alignment] = []
-    
-    stack = []
-    stack.append((startX, startY, "", ""))
-    while stack:
-        x, y, targetAlignment, queryAlignment = stack.pop()
+def buildTracebackDag(scoreMatrix:ndarray, dirsMatrix:ndarray, startCells:Iterable[tuple[int, int]]) -> TracebackDag:
+    """
+    Collects the cells reachable by backtracking from the provided starting cells, with
+    the steps leaving each of them. Every cell is visited once, no matter how many paths
+    or starting cells share it. With affine gaps a step is a whole gap, going back to
+    every cell the gap might have been opened from.
+
+    Args:
+        scoreMatrix (np.ndarray): The filled alignment score matrix.
+        dirsMatrix (np.ndarray): The filled directions matrix.
+        startCells (Iterable[tuple[int, int]]): The (y, x) coordinates of the starting cells.
 
+    Returns:
+        TracebackDag: The steps leaving each co-optimal cell.
+    """
+    global UP_DIR, DIAG_DIR, LEFT_DIR, UP_OPEN_DIR, LEFT_OPEN_DIR
+
+    dag :TracebackDag = {}
+    stack = list(startCells)
+    while stack:
+        y, x = cell = stack.pop()
         # Local alignment ends at any cell with a value of 0:
-        if not scoreMatrix[y, x]:
-            if targetAlignment and queryAlignment: # No point in saving empty alignments
-                # Coords are shifted by 1 to enter a 1-based system of reference:
-                bestAlignments.append((x + 1, y + 1, targetAlignment, queryAlignment))
-            
+        if cell in dag or not scoreMatrix[y, x]: continue
+
+        # Same order as the old depth-first traceback, so alignments keep coming out in it:
+        cellDirs = int(dirsMatrix[y, x])
+        if cellDirs <= UP_DIR | DIAG_DIR | LEFT_DIR: steps = tuple(step for step, isDir in (
+            ((y - 1, x,     'I'), cellDirs & UP_DIR),
+            ((y - 1, x - 1, 'M'), cellDirs & DIAG_DIR),
+            ((y,     x - 1, 'D'), cellDirs & LEFT_DIR)) if isDir)
+
+        else: steps = ( # Affine gaps, which can come from further away
+            *(_traceGap(dirsMatrix, y, x, -1, 0, 'I', UP_OPEN_DIR) if cellDirs & UP_DIR else ()),
+            *(((y - 1, x - 1, 'M'),) if cellDirs & DIAG_DIR else ()),
+            *(_traceGap(dirsMatrix, y, x, 0, -1, 'D', LEFT_OPEN_DIR) if cellDirs & LEFT_DIR else ()))
+
+        dag[cell] = steps
+        stack.extend((nextY, nextX) for nextY, nextX, _ in steps)
+
+    return dag
+
+def _traceGap(dirsMatrix:ndarray, y:int, x:int, stepY:int, stepX:int, op:str, openDir:int) -> Iterator[tuple[int, int, str]]:
+    """
+    Follows the affine gap ending at the provided cell back to every cell it might have
+    been opened from, as steps with the whole gap as operations.
+
+    Args:
+        dirsMatrix (np.ndarray): The filled directions matrix.
+        y (int): The y coordinate of the cell the gap ends at.
+        x (int): The x coordinate of the cell the gap ends at.
+        stepY (int): The y offset of the previous cell of the gap.
+        stepX (int): The x offset of the previous cell of the gap.
+        op (str): The operation of each gap position.
+        openDir (int): The bit of the gap opening, the extension is the next one.
+
+    Returns:
+        Iterator[tuple[int, int, str]]: The cells the gap comes from, nearest first, and the gap operations.
+    """
+    gapLen, gapDirs = 1, int(dirsMatrix[y, x])
+    while True:
+        y, x = y + stepY, x + stepX
+        if gapDirs & openDir: yield y, x, op * gapLen
+        if not gapDirs & openDir << 1: return
+        gapLen, gapDirs = gapLen + 1, int(dirsMatrix[y, x])
+
+def _encodePathRuns(path:PathRun|None) -> Cigar:
+    """Encodes the linked runs of a path, which already go in alignment order."""
+    runs = []
+    while path:
+        op, runLen, path = path
+        runs.append(f"{runLen}{op}")
+
+    return "".join(runs)
+
+def _extendPath(path:PathRun|None, ops:str) -> PathRun:
+    """Links the (identical) operations of a step to a path, backtracking goes backwards so they become the head."""
+    return (ops[0], path[1] + len(ops), path[2]) if path and path[0] == ops[0] else (ops[0], len(ops), path)
+
+def enumerateDagStates(dag:TracebackDag, states:Iterable[TracebackState]) -> Iterator[CompactAlignment]:
+    """
+    Enumerates all the paths of the traceback DAG going through the provided states,
+    yielding each local alignment as soon as it's complete. Paths are persistent linked
+    runs of operations: a fork only links one new run (or extends the last one) to the
+    path it shares, so no partial alignment is ever copied.
+
+    Args:
+        dag (TracebackDag): The traceback DAG, including the cells of the states.
+        states (Iterable[TracebackState]): The states to continue from, in order.
+
+    Returns:
+        Iterator[CompactAlignment]: All the local alignments going through the states.
+    """
+    for state in states:
+        stack = [state]
+        while stack:
+            startY, startX, y, x, path = stack.pop()
+            steps = dag.get((y, x))
+            if steps is None: # The alignment begins here
+                if path: # No point in saving empty alignments
+                    # Coords are shifted by 1 to enter a 1-based system of reference:
+                    yield (x + 1, y + 1, startX, startY, _encodePathRuns(path))
+
+                continue
+
+            for nextY, nextX, op in steps:
+                stack.append((startY, startX, nextY, nextX, _extendPath(path, op)))
+
+def enumerateDagAlignments(dag:TracebackDag, startY:int, startX:int) -> Iterator[CompactAlignment]:
+    """
+    Enumerates all the paths of the traceback DAG from the cell at the provided
+    coordinates, yielding each local alignment as soon as it's complete.
+
+    Args:
+        dag (TracebackDag): The traceback DAG, including the starting cell.
+        startY (int): The y coordinate of the local alignment starting cell.
+        startX (int): The x coordinate of the local alignment starting cell.
+
+    Returns:
+        Iterator[CompactAlignment]: All the local alignments found from the starting cell.
+    """
+    return enumerateDagStates(dag, [(startY, startX, startY, startX, None)])
+
+def countDagPaths(dag:TracebackDag, startCells:Iterable[tuple[int, int]]) -> dict[tuple[int, int], int]:
+    """
+    Counts the paths leaving each cell of the traceback DAG reachable from the provided
+    starting cells, in a single pass over them.
+
+    Args:
+        dag (TracebackDag): The traceback DAG.
+        startCells (Iterable[tuple[int, int]]): The (y, x) coordinates of the starting cells.
+
+    Returns:
+        dict[tuple[int, int], int]: The amount of paths (so of alignments) leaving each cell, 1 for the cells alignments begin at.
+    """
+    pathsAmts :dict[tuple[int, int], int] = {}
+    stack = [(cell, False) for cell in startCells]
+    while stack:
+        cell, areStepsCounted = stack.pop()
+        if cell in pathsAmts: continue
+        steps = dag.get(cell)
+        if steps is None: pathsAmts[cell] = 1
+        elif areStepsCounted:
+            pathsAmts[cell] = sum(pathsAmts[(nextY, nextX)] for nextY, nextX, _ in steps)
+
+        else: # Counted once all the next cells are
+            stack.append((cell, True))
+            stack.extend(((nextY, nextX), False) for nextY, nextX, _ in steps)
+
+    return pathsAmts
+
+def splitTracebackStates(dag:TracebackDag, startCells:list[tuple[int, int]], tasksAmt:int) -> list[list[TracebackState]]:
+    """
+    Splits the enumeration of all the paths from the provided starting cells into
+    batches of about the same amount of paths. States with too many paths are split into
+    the states after their next step, while states with few of them are batched
+    together, so that a single huge traceback is spread over all the workers and many
+    tiny ones don't cost a task each. Batches keep the order of the serial enumeration.
+
+    Args:
+        dag (TracebackDag): The traceback DAG.
+        startCells (list[tuple[int, int]]): The (y, x) coordinates of the starting cells.
+        tasksAmt (int): The desired amount of batches.
+
+    Returns:
+        list[list[TracebackState]]: The batches of states.
+    """
+    pathsAmts = countDagPaths(dag, startCells)
+    batchSize = max(-(-sum(pathsAmts[cell] for cell in startCells) // tasksAmt), MIN_TRACEBACK_BATCH_SIZE)
+
+    batches :list[list[TracebackState]] = []
+    batch, batchPathsAmt = [], 0
+    # Reversed, since the enumeration pops its stack from the end:
+    stack = [(y, x, y, x, None) for y, x in reversed(startCells)]
+    while stack:
+        state = startY, startX, y, x, path = stack.pop()
+        pathsAmt = pathsAmts[(y, x)]
+        if pathsAmt > batchSize:
+            stack.extend((startY, startX, nextY, nextX, _extendPath(path, op))
+                for nextY, nextX, op in dag[(y, x)])
+
             continue
 
-        # Each fork in the road adds a stack entry that sends the program to the next cell
-        # and keeps track of the aligned seqs so far:
-        cellDirs = dirsMatrix[y, x]
-        if cellDirs & UP_DIR: stack.append((
-            x, y - 1, '-' + targetAlignment, QUERY_SEQ[y - 1] + queryAlignment))
-        
-        if cellDirs & DIAG_DIR: stack.append((
-            x - 1, y - 1, TARGET_SEQ[x - 1] + targetAlignment, QUERY_SEQ[y - 1] + queryAlignment))
+        batch.append(state)
+        batchPathsAmt += pathsAmt
+        if batchPathsAmt >= batchSize:
+            batches.append(batch)
+            batch, batchPathsAmt = [], 0
 
-        if cellDirs & LEFT_DIR: stack.append((
-            x - 1, y, TARGET_SEQ[x - 1] + targetAlignment, '-' + queryAlignment))
+    if batch: batches.append(batch)
+    return batches
 
-    freeSharedMem(scoreSharedMem)
-    freeSharedMem(dirsSharedMem)
-    return bestAlignments
+def traceAlignments(scoreMatrix:ndarray, dirsMatrix:ndarray, startY:int, startX:int) -> Iterator[CompactAlignment]:
+    """
+    Reconstructs all the local alignments ending at the cell at the provided coordinates
+    by following the backtracking directions of the provided (filled) matrices, yielding
+    each one as soon as it's complete.
+
+    Args:
+        scoreMatrix (np.ndarray): The filled alignment score matrix.
+        dirsMatrix (np.ndarray): The filled directions matrix.
+        startY (int): The y coordinate of the local alignment starting cell.
+        startX (int): The x coordinate of the local alignment starting cell.
+
+    Returns:
+        Iterator[CompactAlignment]: All the local alignments found from the starting cell.
+    """
+    dag = buildTracebackDag(scoreMatrix, dirsMatrix, [(startY, startX)])
+    return enumerateDagAlignments(dag, startY, startX)
+
+def _freeMatricesAfter(alignments:Iterator[CompactAlignment], freeMatrices:Callable[[], None]) -> Iterator[CompactAlignment]:
+    """
+    Passes the alignments through, freeing the matrices once they're exhausted (or the
+    iteration is closed).
+
+    Args:
+        alignments (Iterator[CompactAlignment]): The alignments, still needing the matrices.
+        freeMatrices (Callable[[], None]): Frees the shared memory of the matrices, or gives it back to its pool.
+
+    Returns:
+        Iterator[CompactAlignment]: The same alignments.
+    """
+    try: yield from alignments
+    finally: freeMatrices()
 
 # Contains some prints since it's intended as the main collection of analysis pipeline
 # steps, to be called in the main file:
-def findLocalAlignments(analysisParams:AnalysisParams, *, doLogProgress = False, doShowMatrices = False) -> tuple[int, list[Alignment]]:
+def findLocalAlignments(analysisParams:AnalysisParams, *, backend = Backend.Process, tileSize = DEFAULT_TILE_SIZE, scoreType:dtype = uint32, workersAmt :int|None = None, bufferPool :SharedBufferPool|None = None, monitor :FillMonitor|None = None, doStream = False, doLogProgress = False, doShowMatrices = False) -> tuple[int, list[CompactAlignment]|Iterator[CompactAlignment]]:
     """
     Find all local alignments starting from the provided analysis parameters.
 
@@ -317,29 +1207,63 @@ def findLocalAlignments(analysisParams:AnalysisParams, *, doLogProgress = False,
             - matchScore (int) : The alignment score bonus for a nucleotide match.
             - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
             - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+            - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+            - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
 
+        backend (Backend, optional): The kind of workers running the analysis, threads and the serial engine (no workers at all) don't need shared memory. Defaults to: Backend.Process.
+        tileSize (int, optional): The side of the tiles each thread fills at once. Defaults to: DEFAULT_TILE_SIZE.
+        scoreType (np.dtype, optional): Type of the values in the score matrix, must fit the best possible score. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. Defaults to: None.
+        bufferPool (SharedBufferPool | None, optional): The pool lending its shared segments to the matrices, so that consecutive analyses don't create their own. Defaults to: None.
+        monitor (FillMonitor | None, optional): Follows the fill of the matrices and can cancel it, see fillMatrices. Defaults to: None.
+        doStream (bool, optional): If True the alignments are returned as an iterator reconstructing them lazily, which must be exhausted or closed to free the matrices. Defaults to: False.
         doLogProgress (bool, optional): If True prints analysis progress messages to standard output. Defaults to: False.
         doShowMatrices (bool, optional): If True prints the filled score and directions matrices to standard output, useful for debugging. Defaults to: False.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill, after freeing the matrices.
     
     Returns:
-        tuple: The maximum alignment score and all the local alignments, ignoring exact duplicates.
+        tuple: The maximum alignment score and all the compact local alignments, as a list or an iterator.
     """
-    _setProcessTaskConsts(analysisParams)
-    scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(MATRIX_SHAPE)
+    _setProcessTaskConsts(analysisParams, scoreType)
+    sharedMems :list[SharedMemory] = []
+    matrixNames = SHARED_MATRIX_NAMES
+    if bufferPool is not None:
+        scoreMatrix, dirsMatrix, matrixNames = bufferPool.acquireMatrices(MATRIX_SHAPE, scoreType)
+
+    elif backend in (Backend.Thread, Backend.Serial):
+        scoreMatrix, dirsMatrix = createLocalMatrices(MATRIX_SHAPE, scoreType)
+
+    else:
+        scoreMatrix, scoreSharedMem, dirsMatrix, dirsSharedMem = createMatrices(
+            MATRIX_SHAPE, scoreType = scoreType)
+
+        sharedMems = [scoreSharedMem, dirsSharedMem]
+
+    def freeMatrices() -> None:
+        """Gives the segments of the matrices back to their pool, or destroys them."""
+        if bufferPool is not None: bufferPool.releaseMatrices(matrixNames)
+        for sharedMem in sharedMems: freeSharedMem(sharedMem, isFreedCompletely = True)
 
     if doLogProgress: print("Filling score and directions matrices...")
-    maxScore = fillMatrices(analysisParams)
+    try: maxScore = fillMatrices(analysisParams, backend = backend, matrices = (scoreMatrix, dirsMatrix),
+        tileSize = tileSize, scoreType = scoreType, workersAmt = workersAmt, matrixNames = matrixNames,
+        monitor = monitor)
+
+    except BaseException: # Interrupted, cancelled or crashed, the segments would outlive the process
+        freeMatrices()
+        raise
 
     if doShowMatrices:
         print("score matrix:", scoreMatrix, "directions matrix:", dirsMatrix,
               sep = "\n\n", end = "\n\n")
 
     if doLogProgress: print("Reconstructing best local alignments...")
-    bestLocalAlignments = reconstructAlignments(scoreMatrix, maxScore, analysisParams)
+    bestLocalAlignments = _freeMatricesAfter(reconstructAlignments(scoreMatrix, maxScore,
+        analysisParams, backend = backend, dirsMatrix = dirsMatrix, workersAmt = workersAmt), freeMatrices)
 
-    freeSharedMem(scoreSharedMem, isFreedCompletely = True)
-    freeSharedMem(dirsSharedMem,  isFreedCompletely = True)
-    return maxScore, bestLocalAlignments
+    return maxScore, bestLocalAlignments if doStream else list(bestLocalAlignments)
 
 # The main is used here to showcase how to use this file's functions:
 def main() -> None:
@@ -347,6 +1271,7 @@ def main() -> None:
     querySeq  = "TTGACCGTAGGATAGTCGATCGATCGATAGCTAGCTAGCTAGCTAGTACGATAGCTTTCGATAGCTAGCATGCTAGC"
     maxScore, bestLocalAlignments = findLocalAlignments((targetSeq, querySeq, 2, 1, 2))
     print(maxScore)
-    print(*bestLocalAlignments, sep = '\n')
+    print(*(materializeAlignment(alignment, targetSeq, querySeq)
+        for alignment in bestLocalAlignments), sep = '\n')
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -1,7 +1,99 @@
 ## Main application file, run this if starting the project manually from an editor.
-from para_seq.input_manager   import setupArgParser, parseInputArgs
-from para_seq.local_alignment import findLocalAlignments
-from para_seq.output_manager  import displayOutputSummary, saveOutput
+from __future__                      import annotations
+from typing                          import TYPE_CHECKING
+from argparse                        import Namespace
+from para_seq                        import CHECKPOINTED_WINDOW_SIZE, CLUSTER_WINDOW_SIZE, Backend
+from collections.abc                 import Iterator
+from itertools                       import chain
+from contextlib                      import ExitStack, closing
+from para_seq.utils                  import getUsableCpusAmt, startProcessServer
+from para_seq.input_manager          import setupArgParser, parseInputArgs
+
+# The engines (and numpy with them) are only imported once the arguments are parsed, so
+# that --help and argument errors return right away:
+if TYPE_CHECKING:
+    from para_seq.local_alignment    import AnalysisParams, CompactAlignment
+
+def runAnalysis(analysisParams:AnalysisParams, args:Namespace, *, isDebugMode = False) -> tuple[int, Iterator[CompactAlignment]]:
+    """
+    Picks the run configuration within the resource budget and runs the analysis with it,
+    or sends the analysis to the job server or the cluster workers if requested.
+
+    Raises:
+        ResourceBudgetErr: If the analysis doesn't fit the budget, or one is set for a resumable fill.
+        FillCancelledErr: If the fill of the matrices was cancelled with Ctrl+C.
+        JobFailedErr: If the job server couldn't run the analysis.
+        ClusterErr: If there is no cluster key, or a cluster worker couldn't run its task.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        args (Namespace): The parsed input arguments.
+        isDebugMode (bool, optional): If True, the filled matrices are printed. Defaults to: False.
+
+    Returns:
+        tuple: The maximum alignment score and an iterator over all the compact local alignments.
+    """
+    # The server has its own workers, budget and warm buffers:
+    if args.server:
+        from para_seq.job_server import submitJob
+        print(f"Sending the analysis to the job server on port {args.server}...")
+        return submitJob(analysisParams, port = args.server)
+
+    # The workers align the target windows on their own hosts, with their own cores:
+    if args.cluster:
+        from para_seq.autotuner import getScoreType
+        from para_seq.cluster   import ClusterCoordinator, findDistributedLocalAlignments, getClusterKey
+        authkey = getClusterKey()
+        print(f"Coordinating the analysis on port {args.cluster}, waiting for cluster workers...")
+        with closing(ClusterCoordinator(authkey, port = args.cluster)) as coordinator:
+            maxScore, bestLocalAlignments = findDistributedLocalAlignments(analysisParams,
+                args.window_size or CLUSTER_WINDOW_SIZE, coordinator,
+                scoreType = getScoreType(analysisParams), doLogProgress = True)
+
+        return maxScore, iter(bestLocalAlignments)
+
+    from para_seq.autotuner              import getRunConfig
+    from para_seq.resource_governor      import ResourceBudgetErr, governResources
+    from para_seq.local_alignment        import findLocalAlignments
+    from para_seq.windowed_alignment     import findWindowedLocalAlignments
+    from para_seq.checkpointed_alignment import findCheckpointedLocalAlignments
+    from para_seq.resumable_fill         import findResumableLocalAlignments
+    from para_seq.progress               import monitorFillInTerminal
+
+    cpusAmt = getUsableCpusAmt(args.jobs)
+    config  = getRunConfig(analysisParams, args.backend, args.window_size, cpusAmt,
+        doRetune = args.retune)
+
+    # The resumable fill keeps the matrices in files, paged in and out by the system:
+    if args.resume:
+        if args.max_memory: raise ResourceBudgetErr(
+            "the matrices of a resumable fill are kept on disk", "where a memory budget can't limit them")
+
+        backend, _, tileSize, scoreType, workersAmt = config
+        with monitorFillInTerminal() as monitor: return findResumableLocalAlignments(analysisParams,
+            backend = backend, tileSize = tileSize, scoreType = scoreType,
+            workersAmt = min(workersAmt or cpusAmt, cpusAmt), monitor = monitor, doStream = True, doLogProgress = True)
+
+    if args.checkpointed:
+        backend, _, tileSize, scoreType, workersAmt = config
+        config = backend, CHECKPOINTED_WINDOW_SIZE, tileSize, scoreType, workersAmt
+
+    backend, windowSize, tileSize, scoreType, workersAmt = governResources(
+        analysisParams, config, cpusAmt, maxMemory = args.max_memory, doLogProgress = True)
+
+    # The windows are filled all at once, with no waves to report or stop at:
+    if windowSize and windowSize != CHECKPOINTED_WINDOW_SIZE: return findWindowedLocalAlignments(
+        analysisParams, windowSize, backend = backend, scoreType = scoreType,
+        workersAmt = workersAmt, doStream = True, doLogProgress = True)
+
+    with monitorFillInTerminal() as monitor:
+        if windowSize == CHECKPOINTED_WINDOW_SIZE: return findCheckpointedLocalAlignments(
+            analysisParams, backend = backend, scoreType = scoreType, workersAmt = workersAmt,
+            monitor = monitor, doStream = True, doLogProgress = True)
+
+        return findLocalAlignments(analysisParams,
+            backend = backend, tileSize = tileSize, scoreType = scoreType, workersAmt = workersAmt,
+            monitor = monitor, doStream = True, doLogProgress = True, doShowMatrices = isDebugMode)
 
 def main(args :tuple[str, ...]|None = None, *, isDebugMode = False) -> None:
     """
@@ -13,21 +105,47 @@ def main(args :tuple[str, ...]|None = None, *, isDebugMode = False) -> None:
     """
     print("Starting analysis...")
     args = setupArgParser().parse_args(args)
+    # Local processes might be needed, the fork server warms up meanwhile on another core:
+    isLocalRun = not (args.server or args.cluster)
+    if isLocalRun and args.backend not in (Backend.Thread, Backend.Serial) and getUsableCpusAmt(args.jobs) > 1:
+        startProcessServer()
+
+    from para_seq.result_cache    import cacheAlignments, getCachedResult, openResultCache
+    from para_seq.local_alignment import materializeAlignment
+    from para_seq.output_manager  import displayOutputSummary, saveAlignments
 
     print("Retrieving sequences...")
     *analysisParams, outputPath, shownAlignments, maxSeqLen = parseInputArgs(args)
 
-    maxScore, bestLocalAlignments = findLocalAlignments(
-        analysisParams, doLogProgress = True, doShowMatrices = isDebugMode)
-    
-    if not bestLocalAlignments:
-        print("No alignments were found, which might indicate that your sequences' \
+    with ExitStack() as resources:
+        # The cache must stay open until the alignments are exhausted:
+        cache = resources.enter_context(closing(openResultCache())) if args.cache else None
+        result = cache and getCachedResult(cache, analysisParams)
+        if result: print("Found the results of an identical analysis in the cache...")
+        else:
+            maxScore, bestLocalAlignments = runAnalysis(analysisParams, args, isDebugMode = isDebugMode)
+            if cache: bestLocalAlignments = cacheAlignments(
+                cache, analysisParams, maxScore, bestLocalAlignments, args.cache_size)
+
+            result = maxScore, bestLocalAlignments
+
+        # Alignments are streamed from the tracebacks to the output file, peeking at the
+        # first one is enough to know if there are any:
+        maxScore, bestLocalAlignments = result[0], iter(result[1])
+        firstAlignment = next(bestLocalAlignments, None)
+        if firstAlignment is None:
+            print("No alignments were found, which might indicate that your sequences' \
 nucleotides are completely different.")
-        return
-    
-    displayOutputSummary(maxScore, bestLocalAlignments, shownAlignments, maxSeqLen)
-    saveOutput(outputPath, maxScore, bestLocalAlignments)
+            return
+
+        _, shownLocalAlignments = saveAlignments(outputPath, maxScore,
+            chain([firstAlignment], bestLocalAlignments), analysisParams,
+            outputFormat = args.output_format, keptAlignmentsAmt = shownAlignments)
 
+    # Gapped sequences are only built for the alignments shown:
+    targetSeq, querySeq, *_ = analysisParams
+    displayOutputSummary(maxScore, [materializeAlignment(alignment, targetSeq, querySeq)
+        for alignment in shownLocalAlignments], shownAlignments, maxSeqLen)
     print(f"All done! Check the full list of alignments at \"{outputPath}\".")
 
 # Why here? Because I want to be able to test main and catch specific errors. Meanwhile
@@ -1,7 +1,22 @@
 ## Output manager module
-from para_seq                 import ALIGNMENT_INFO
+from re                       import findall
+from gzip                     import open as gzipOpen
+from numpy                    import ndarray, dtype, int64, uint8, array, count_nonzero, cumsum, load
+from typing                   import BinaryIO, TextIO
+from shutil                   import copyfileobj
+from zipfile                  import ZIP_DEFLATED, ZIP_STORED, ZipFile
+from para_seq                 import ALIGNMENT_INFO, NPZ_CHUNK_ALIGNMENTS, SAM_HEADER, OutputFormat, SeqName
+from tempfile                 import TemporaryFile
+from itertools                import batched
 from para_seq.utils           import ellipsize
-from para_seq.local_alignment import Alignment
+from numpy.lib.format         import dtype_to_descr, write_array, write_array_header_1_0
+from collections.abc          import Callable, Iterable, Iterator
+from para_seq.local_alignment import Alignment, AnalysisParams, CompactAlignment, encodeSeq, \
+    materializeAlignment
+
+# Writes compact alignments to the output path in some format, given the maximum score
+# and the analysis parameters (for the sequences they refer to):
+type AlignmentsWriter = Callable[[str, int, Iterable[CompactAlignment], AnalysisParams], None]
 
 def displayOutputSummary(maxScore:int, bestLocalAlignments:list[Alignment], maxDisplayedAlignments:int, maxDisplayedSeqLen:int) -> None:
     """
@@ -25,18 +40,230 @@ def displayOutputSummary(maxScore:int, bestLocalAlignments:list[Alignment], maxD
     
     print(outputBuf)
 
-def saveOutput(outputPath:str, maxScore:int, bestLocalAlignments:list[Alignment]) -> None:
+def openOutputFile(outputPath:str) -> TextIO:
+    """
+    Opens the output file for writing text, gzip-compressed if its name ends with ".gz".
+
+    Args:
+        outputPath (str): The path to the output file.
+
+    Returns:
+        TextIO: The opened output file.
+    """
+    if str(outputPath).endswith(".gz"): return gzipOpen(outputPath, "wt")
+    return open(outputPath, 'w')
+
+def saveOutput(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[Alignment], *, keptAlignmentsAmt = 0) -> tuple[int, list[Alignment]]:
     """
     Saves entire result of the alignment procedure to a file at the provided path,
-    creating it if it doesn't exist and overwriting it otherwise.
+    creating it if it doesn't exist and overwriting it otherwise. Alignments are consumed
+    one by one and written as they come, so they never need to be all in memory, and the
+    total amount of them closes the file since it's only known at the end.
+
+    Args:
+        outputPath (str): The path to the output file, gzip-compressed if ending with ".gz".
+        maxScore (int): The maximum alignment score found in the score matrix.
+        bestLocalAlignments (Iterable[Alignment]): All the optimal local alignments.
+        keptAlignmentsAmt (int, optional): How many of the first alignments to return, for the summary output. Defaults to: 0.
+
+    Returns:
+        tuple: The total amount of alignments and the first few of them.
+    """
+    alignmentsAmt, keptAlignments = 0, []
+    with openOutputFile(outputPath) as fd:
+        fd.write(f"Score: {maxScore}\n")
+        for alignment in bestLocalAlignments:
+            alignmentsAmt += 1
+            if len(keptAlignments) < keptAlignmentsAmt: keptAlignments.append(alignment)
+            fd.write(ALIGNMENT_INFO.format(*alignment)) # Already has newlines
+
+        fd.write(f"\nTotal alignments: {alignmentsAmt}\n")
+
+    return alignmentsAmt, keptAlignments
+
+def writeText(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[CompactAlignment], analysisParams:AnalysisParams) -> None:
+    """
+    Writes the alignments in the readable text format of saveOutput, building the gapped
+    sequences of each one right before writing it.
+
+    Args:
+        outputPath (str): The path to the output file, gzip-compressed if ending with ".gz".
+        maxScore (int): The maximum alignment score found in the score matrix.
+        bestLocalAlignments (Iterable[CompactAlignment]): All the optimal local alignments.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+    """
+    targetSeq, querySeq, *_ = analysisParams
+    saveOutput(outputPath, maxScore, (materializeAlignment(alignment, targetSeq, querySeq)
+        for alignment in bestLocalAlignments))
+
+def getAlignmentStats(alignment:CompactAlignment, targetCodes:ndarray, queryCodes:ndarray) -> tuple[int, int, int, int]:
+    """
+    Counts the columns of an alignment, its identical positions, its mismatches and its
+    gap openings, comparing the aligned nucleotides a whole run at a time where the CIGAR
+    advances on both sequences.
+
+    Args:
+        alignment (CompactAlignment): The compact alignment.
+        targetCodes (np.ndarray): The ASCII codes of the aligned target sequence, see encodeSeq.
+        queryCodes (np.ndarray): The ASCII codes of the aligned query sequence.
+
+    Returns:
+        tuple: The alignment length, the amount of identical positions, of mismatches and of gap openings.
+    """
+    targetPos, queryPos, _, _, cigar = alignment
+    targetPos, queryPos = targetPos - 1, queryPos - 1
+    length = matchesAmt = mismatchesAmt = gapOpeningsAmt = 0
+    for runLen, op in findall(r"(\d+)([MDI])", cigar):
+        runLen = int(runLen)
+        length += runLen
+        if op == 'M':
+            runMismatchesAmt = int(count_nonzero(
+                targetCodes[targetPos:targetPos + runLen] != queryCodes[queryPos:queryPos + runLen]))
+
+            matchesAmt    += runLen - runMismatchesAmt
+            mismatchesAmt += runMismatchesAmt
+
+        else: gapOpeningsAmt += 1 # Runs of the same operation are never split
+        if op != 'I': targetPos += runLen
+        if op != 'D': queryPos  += runLen
+
+    return length, matchesAmt, mismatchesAmt, gapOpeningsAmt
+
+def writeTabular(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[CompactAlignment], analysisParams:AnalysisParams) -> None:
+    """
+    Writes a tab-separated line per alignment, with the columns of the BLAST tabular
+    format (query and target IDs, percentage of identical positions, length, mismatches,
+    gap openings, query start and end, target start and end) followed by the score, as
+    there's no e-value nor bit score.
+
+    Args:
+        outputPath (str): The path to the output file, gzip-compressed if ending with ".gz".
+        maxScore (int): The maximum alignment score found in the score matrix.
+        bestLocalAlignments (Iterable[CompactAlignment]): All the optimal local alignments.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+    """
+    targetCodes, queryCodes = encodeSeq(analysisParams[0]), encodeSeq(analysisParams[1])
+    with openOutputFile(outputPath) as fd:
+        for alignment in bestLocalAlignments:
+            targetStart, queryStart, targetEnd, queryEnd, _ = alignment
+            length, matchesAmt, mismatchesAmt, gapOpeningsAmt = getAlignmentStats(alignment, targetCodes, queryCodes)
+            fd.write(f"{SeqName.Query}\t{SeqName.Target}\t{100 * matchesAmt / length:.2f}\t{length}\t{mismatchesAmt}\t\
+{gapOpeningsAmt}\t{queryStart}\t{queryEnd}\t{targetStart}\t{targetEnd}\t{maxScore}\n")
+
+def writeSam(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[CompactAlignment], analysisParams:AnalysisParams) -> None:
+    """
+    Writes a SAM record per alignment of the query to the target (the reference), after a
+    header describing the target. The unaligned ends of the query are soft-clipped, so
+    the CIGAR covers it all. The first alignment is the primary one, the others are
+    flagged as secondary and leave out the query sequence, which the primary one has.
+
+    Args:
+        outputPath (str): The path to the output file, gzip-compressed if ending with ".gz".
+        maxScore (int): The maximum alignment score found in the score matrix.
+        bestLocalAlignments (Iterable[CompactAlignment]): All the optimal local alignments.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+    """
+    targetSeq, querySeq, *_ = analysisParams
+    with openOutputFile(outputPath) as fd:
+        fd.write(SAM_HEADER.format(SeqName.Target, len(targetSeq)))
+        for i, (targetStart, queryStart, _, queryEnd, cigar) in enumerate(bestLocalAlignments):
+            startClip = f"{queryStart - 1}S" if queryStart > 1 else ""
+            endClip   = f"{len(querySeq) - queryEnd}S" if queryEnd < len(querySeq) else ""
+            flag, seq = (256, '*') if i else (0, querySeq) # Secondary alignment or primary
+            fd.write(f"{SeqName.Query}\t{flag}\t{SeqName.Target}\t{targetStart}\t255\t\
+{startClip}{cigar}{endClip}\t*\t0\t0\t{seq}\t*\tAS:i:{maxScore}\n")
+
+def _writeNpyMember(archive:ZipFile, name:str, fd:BinaryIO, valuesType:dtype, shape:tuple[int, ...]) -> None:
+    """Writes the raw values of a file as an array in the archive, where np.load finds it by name."""
+    fd.seek(0)
+    with archive.open(f"{name}.npy", 'w', force_zip64 = True) as member:
+        write_array_header_1_0(member, {
+            "descr" : dtype_to_descr(dtype(valuesType)), "fortran_order" : False, "shape" : shape })
+        copyfileobj(fd, member)
+
+def writeNpz(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[CompactAlignment], analysisParams:AnalysisParams) -> None:
+    """
+    Writes the alignments as NumPy arrays in an .npz archive: "score" (the maximum score),
+    "positions" (a row of 1-based target start, query start, target end and query end per
+    alignment), "cigars" (all the CIGARs as concatenated ASCII codes) and "cigarOffsets"
+    (where each CIGAR starts, with a final one past the last). The alignments are turned
+    into arrays a chunk at a time and kept in temporary files until the archive is
+    written, so they never need to be all in memory. If the path ends with ".gz" the
+    arrays are compressed inside the archive, so that np.load can still read it.
 
     Args:
         outputPath (str): The path to the output file.
         maxScore (int): The maximum alignment score found in the score matrix.
-        bestLocalAlignments (list[Alignment]): All the optimal local alignments.
+        bestLocalAlignments (Iterable[CompactAlignment]): All the optimal local alignments.
+        analysisParams (AnalysisParams): The analysis parameters, unused as the alignments refer to the sequences by position.
     """
-    outputBuf  = f"Score: {maxScore}\nTotal alignments: {len(bestLocalAlignments)}\n"
-    outputBuf += "".join( # ALIGNMENT_INFO already has newlines
-        map(lambda alignment: ALIGNMENT_INFO.format(*alignment), bestLocalAlignments))
-    
-    with open(outputPath, 'w') as fd: fd.write(outputBuf)
\ No newline at end of file
+    with TemporaryFile() as positionsFd, TemporaryFile() as cigarsFd, TemporaryFile() as offsetsFd:
+        alignmentsAmt = cigarsLen = 0
+        offsetsFd.write(array([0], dtype = int64).tobytes())
+        for chunk in batched(bestLocalAlignments, NPZ_CHUNK_ALIGNMENTS):
+            cigars = [alignment[4].encode("ascii") for alignment in chunk]
+            positionsFd.write(array([alignment[:4] for alignment in chunk], dtype = int64).tobytes())
+            cigarsFd.write(b"".join(cigars))
+            offsetsFd.write((cigarsLen + cumsum([len(cigar) for cigar in cigars], dtype = int64)).tobytes())
+            alignmentsAmt += len(chunk)
+            cigarsLen     += sum(len(cigar) for cigar in cigars)
+
+        compression = ZIP_DEFLATED if str(outputPath).endswith(".gz") else ZIP_STORED
+        with ZipFile(outputPath, 'w', compression) as archive:
+            with archive.open("score.npy", 'w') as member: write_array(member, array(maxScore, dtype = int64))
+            _writeNpyMember(archive, "positions", positionsFd, int64, (alignmentsAmt, 4))
+            _writeNpyMember(archive, "cigars", cigarsFd, uint8, (cigarsLen,))
+            _writeNpyMember(archive, "cigarOffsets", offsetsFd, int64, (alignmentsAmt + 1,))
+
+def loadNpzOutput(outputPath:str) -> tuple[int, Iterator[CompactAlignment]]:
+    """
+    Reads back the alignments written by writeNpz.
+
+    Args:
+        outputPath (str): The path to the output file.
+
+    Returns:
+        tuple: The maximum alignment score and an iterator over all the compact local alignments.
+    """
+    with load(outputPath) as archive:
+        maxScore, positions = int(archive["score"]), archive["positions"].tolist()
+        cigars, offsets = archive["cigars"].tobytes().decode("ascii"), archive["cigarOffsets"].tolist()
+
+    return maxScore, ((*alignmentPositions, cigars[start:end]) for alignmentPositions, start, end
+        in zip(positions, offsets[:-1], offsets[1:]))
+
+# Writer of each output format, new formats only need to be added here:
+OUTPUT_WRITERS :dict[OutputFormat, AlignmentsWriter] = {
+    OutputFormat.Text    : writeText,
+    OutputFormat.Tabular : writeTabular,
+    OutputFormat.Sam     : writeSam,
+    OutputFormat.Npz     : writeNpz }
+
+def saveAlignments(outputPath:str, maxScore:int, bestLocalAlignments:Iterable[CompactAlignment], analysisParams:AnalysisParams, *, outputFormat = OutputFormat.Text, keptAlignmentsAmt = 0) -> tuple[int, list[CompactAlignment]]:
+    """
+    Saves entire result of the alignment procedure to a file at the provided path in the
+    provided format, creating it if it doesn't exist and overwriting it otherwise.
+    Alignments are consumed one by one as the writer goes, so they never need to be all
+    in memory.
+
+    Args:
+        outputPath (str): The path to the output file, compressed if ending with ".gz".
+        maxScore (int): The maximum alignment score found in the score matrix.
+        bestLocalAlignments (Iterable[CompactAlignment]): All the optimal local alignments.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        outputFormat (OutputFormat, optional): The format of the output file. Defaults to: OutputFormat.Text.
+        keptAlignmentsAmt (int, optional): How many of the first alignments to return, for the summary output. Defaults to: 0.
+
+    Returns:
+        tuple: The total amount of alignments and the first few of them.
+    """
+    alignmentsAmt, keptAlignments = 0, []
+    def countAlignments() -> Iterator[CompactAlignment]:
+        nonlocal alignmentsAmt
+        for alignment in bestLocalAlignments:
+            alignmentsAmt += 1
+            if len(keptAlignments) < keptAlignmentsAmt: keptAlignments.append(alignment)
+            yield alignment
+
+    OUTPUT_WRITERS[outputFormat](outputPath, maxScore, countAlignments(), analysisParams)
+    return alignmentsAmt, keptAlignments
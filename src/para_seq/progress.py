@@ -0,0 +1,167 @@
+## Progress module, reports how far the fill of the matrices is and stops it on request
+import sys
+from time            import monotonic
+from signal          import SIGINT, default_int_handler, signal
+from threading       import Event, current_thread, main_thread
+from contextlib      import contextmanager
+from para_seq        import FILL_CANCELLED_PREFIX, PROGRESS_LINE, PROGRESS_LINE_INTERVAL
+from para_seq.utils  import CustomErr, formatDuration
+from collections.abc import Callable, Iterator
+
+# Cells filled so far and in total, waves done and in total, cells filled per second and
+# estimated seconds left (None until the throughput is known):
+type FillProgress     = tuple[int, int, int, int, float, float|None]
+type ProgressCallback = Callable[[FillProgress], None]
+
+# Custom errors:
+class FillCancelledErr(CustomErr):
+    """Error class for fills stopped by a cancellation."""
+    msgPrefix = FILL_CANCELLED_PREFIX
+
+class FillMonitor:
+    """
+    Follows a fill of the matrices one wave at a time (an antidiagonal of cells or of
+    tiles, a band of rows...): after each wave it reports the progress, then stops the
+    fill if it was cancelled meanwhile. Cancelling only flags the fill, so it's safe from
+    other threads and signal handlers, and the workers are never interrupted halfway
+    through a wave: the engine stops at the next wave boundary, terminating its workers
+    and freeing its matrices on the way out like with any other error.
+    """
+    def __init__(self, onProgress :ProgressCallback|None = None, *, reportInterval = 0.0) -> None:
+        """
+        Create a monitor, ready to follow a fill.
+
+        Args:
+            onProgress (ProgressCallback | None, optional): Called with the progress of the fill after each wave, from the thread running it. Defaults to: None.
+            reportInterval (float, optional): The minimum time between reports in seconds, the last wave is always reported. Defaults to: 0.0.
+        """
+        self.onProgress     = onProgress
+        self.reportInterval = reportInterval
+        self.cancelEvent    = Event()
+        self.start(0, 0)
+
+    def start(self, cellsAmt:int, wavesAmt:int, *, cellsDone = 0, wavesDone = 0) -> None:
+        """
+        Starts following a fill, from the beginning or from where a previous run left it.
+        Only the cells filled from now on count towards the throughput.
+
+        Args:
+            cellsAmt (int): The amount of cells of the whole fill.
+            wavesAmt (int): The amount of waves of the whole fill.
+            cellsDone (int, optional): The cells already filled. Defaults to: 0.
+            wavesDone (int, optional): The waves already filled. Defaults to: 0.
+        """
+        self.cellsAmt, self.wavesAmt   = cellsAmt, wavesAmt
+        self.cellsDone, self.wavesDone = cellsDone, wavesDone
+        self.startCellsDone = cellsDone
+        self.startTime = self.lastReportTime = monotonic()
+
+    def getProgress(self) -> FillProgress:
+        """
+        Measures the progress of the fill, estimating the time left from the throughput
+        so far.
+
+        Returns:
+            FillProgress: The progress of the fill.
+        """
+        elapsedTime    = monotonic() - self.startTime
+        cellsPerSecond = (self.cellsDone - self.startCellsDone) / elapsedTime if elapsedTime else 0.0
+        secondsLeft    = (self.cellsAmt - self.cellsDone) / cellsPerSecond if cellsPerSecond else None
+        return self.cellsDone, self.cellsAmt, self.wavesDone, self.wavesAmt, cellsPerSecond, secondsLeft
+
+    def completeWave(self, cellsAmt:int) -> None:
+        """
+        Records a filled wave, reports the progress if enough time passed since the last
+        report and stops the fill if it was cancelled.
+
+        Raises:
+            FillCancelledErr: If the fill was cancelled.
+
+        Args:
+            cellsAmt (int): The amount of cells of the wave.
+        """
+        self.cellsDone += cellsAmt
+        self.wavesDone += 1
+        now = monotonic()
+        if self.onProgress is not None and (self.wavesDone == self.wavesAmt or now - self.lastReportTime >= self.reportInterval):
+            self.lastReportTime = now
+            self.onProgress(self.getProgress())
+
+        if self.isCancelled():
+            raise FillCancelledErr(f"stopped after {self.wavesDone} of {self.wavesAmt} waves")
+
+    def cancel(self) -> None:
+        """Cancels the fill, which stops at the end of the wave running now."""
+        self.cancelEvent.set()
+
+    def isCancelled(self) -> bool:
+        """
+        Checks if the fill was cancelled.
+
+        Returns:
+            bool: If the fill was cancelled or not.
+        """
+        return self.cancelEvent.is_set()
+
+def printProgressLine(progress:FillProgress) -> None:
+    """
+    Prints the progress of a fill over the previous progress line, ending the line once
+    the fill is done. Meant as the progress callback of a terminal.
+
+    Args:
+        progress (FillProgress): The progress of the fill.
+    """
+    cellsDone, cellsAmt, wavesDone, wavesAmt, cellsPerSecond, secondsLeft = progress
+    timeLeft = "unknown time" if secondsLeft is None else formatDuration(secondsLeft)
+    line = PROGRESS_LINE.format(cellsDone / cellsAmt if cellsAmt else 1, wavesDone, wavesAmt,
+        cellsPerSecond, timeLeft)
+
+    # Padded to cover a longer previous line:
+    print(line.ljust(80), end = "\n" if wavesDone == wavesAmt else "", flush = True)
+
+@contextmanager
+def cancelOnInterrupt(monitor:FillMonitor) -> Iterator[FillMonitor]:
+    """
+    Makes the first Ctrl+C (SIGINT) cancel the monitored fill instead of interrupting
+    whatever runs at that moment, like a wait on the workers of a pool. Any further one
+    interrupts right away as usual. Only the main thread gets signals, elsewhere nothing
+    changes.
+
+    Args:
+        monitor (FillMonitor): The monitor of the fill to cancel.
+
+    Returns:
+        Iterator[FillMonitor]: The same monitor, as a context manager restoring the previous handler on exit.
+    """
+    if current_thread() is not main_thread():
+        yield monitor
+        return
+
+    def handleInterrupt(signalNum:int, frame) -> None:
+        """Cancels the fill the first time, raises KeyboardInterrupt afterwards."""
+        if monitor.isCancelled(): default_int_handler(signalNum, frame)
+        monitor.cancel()
+
+    previousHandler = signal(SIGINT, handleInterrupt)
+    try: yield monitor
+    finally: signal(SIGINT, previousHandler if previousHandler is not None else default_int_handler)
+
+@contextmanager
+def monitorFillInTerminal() -> Iterator[FillMonitor]:
+    """
+    Provides the monitor of a fill run from the command line: the progress line is shown
+    when the standard output is a terminal (not in logs or pipes), and the first Ctrl+C
+    cancels the fill, see cancelOnInterrupt.
+
+    Raises:
+        FillCancelledErr: If the fill was cancelled, after ending the progress line.
+
+    Returns:
+        Iterator[FillMonitor]: The monitor to pass to the engine, as a context manager.
+    """
+    onProgress = printProgressLine if sys.stdout.isatty() else None
+    with cancelOnInterrupt(FillMonitor(onProgress, reportInterval = PROGRESS_LINE_INTERVAL)) as monitor:
+        try: yield monitor
+        except FillCancelledErr:
+            if onProgress: print() # The error goes on its own line
+            raise
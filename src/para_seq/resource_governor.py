@@ -0,0 +1,114 @@
+## Resource governor module, keeps each analysis within its memory and cores budget
+from para_seq                        import CHECKPOINTED_WINDOW_SIZE, MEMORY_USE_RATIO, RESOURCE_BUDGET_PREFIX, \
+    Backend
+from para_seq.utils                  import CustomErr, formatSize, getAvailableMemory, getSharedMemoryLimit, \
+    getUsableCpusAmt
+from para_seq.autotuner              import RunConfig, getScoreType
+from para_seq.local_alignment        import AnalysisParams, getGapExtension, getMatrixShape, \
+    getMaxSubstitutionScore
+from para_seq.windowed_alignment     import getMaxAlignmentSpan
+from para_seq.checkpointed_alignment import estimateCheckpointedMemory, getCheckpointInterval
+
+# Custom errors:
+class ResourceBudgetErr(CustomErr):
+    """Error class for analyses that can't fit the resources they're allowed to use."""
+    msgPrefix = RESOURCE_BUDGET_PREFIX
+
+def estimatePeakMemory(analysisParams:AnalysisParams, config:RunConfig) -> int:
+    """
+    Estimates the peak memory the matrices of an analysis take with the provided run
+    configuration: both full matrices, one pair of window matrices per worker, or the
+    checkpoint rows and recomputed blocks of the checkpointed mode.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        config (RunConfig): The run configuration.
+
+    Returns:
+        int: The estimated peak memory, in bytes.
+    """
+    targetSeq, querySeq, _, _, gapPenalty, *_ = analysisParams
+    gapExtension = getGapExtension(analysisParams)
+    _, windowSize, _, scoreType, workersAmt = config
+    cellSize = scoreType.itemsize + 1 # The directions matrix uses a single byte
+    if windowSize == CHECKPOINTED_WINDOW_SIZE:
+        shape = getMatrixShape(targetSeq, querySeq)
+        return estimateCheckpointedMemory(shape, getCheckpointInterval(shape[0]), scoreType,
+            isAffine = gapExtension is not None)
+
+    maxSpan = getMaxAlignmentSpan(len(querySeq), getMaxSubstitutionScore(analysisParams), gapPenalty,
+        gapExtension)
+    if not windowSize or maxSpan is None or maxSpan >= len(targetSeq):
+        rowsAmt, columnsAmt = getMatrixShape(targetSeq, querySeq)
+        return rowsAmt * columnsAmt * cellSize
+
+    # Same window size and count as in findWindowedLocalAlignments:
+    windowSize = min(max(windowSize, maxSpan), len(targetSeq))
+    windowsAmt = -(-(len(targetSeq) - maxSpan + 1) // (windowSize - maxSpan + 1))
+    return min(workersAmt or getUsableCpusAmt(), windowsAmt) * (
+        (windowSize + 1) * (len(querySeq) + 1) * cellSize)
+
+def governResources(analysisParams:AnalysisParams, config:RunConfig, cpusAmt:int, *, maxMemory = 0, doLogProgress = False) -> RunConfig:
+    """
+    Checks the run configuration against the memory and cores budget before anything is
+    allocated. If it doesn't fit it's downgraded, trying in order: the smallest score
+    type, local instead of shared memory, the windowed mode with as many workers and as
+    large windows as the budget allows, and finally the checkpointed mode.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        config (RunConfig): The requested run configuration.
+        cpusAmt (int): The amount of cores the analysis is allowed to use.
+        maxMemory (int, optional): The memory budget in bytes, if 0 a share of the available memory. Defaults to: 0.
+        doLogProgress (bool, optional): If True prints a message when the configuration is downgraded. Defaults to: False.
+
+    Raises:
+        ResourceBudgetErr: If not even the lowest-memory mode fits the budget.
+
+    Returns:
+        RunConfig: The run configuration to use, with the amount of workers always set.
+    """
+    backend, windowSize, tileSize, scoreType, workersAmt = config
+    workersAmt = min(workersAmt or cpusAmt, cpusAmt)
+    availableMemory = getAvailableMemory()
+    budget = maxMemory or (int(availableMemory * MEMORY_USE_RATIO) if availableMemory else 0)
+    sharedMemoryLimit = getSharedMemoryLimit()
+
+    def fits(config:RunConfig) -> bool:
+        peakMemory = estimatePeakMemory(analysisParams, config)
+        # Only the full matrices of the process backend live in shared memory:
+        isShared = config[0] == Backend.Process and not config[1]
+        return ((not budget or peakMemory <= budget) and
+            not (isShared and sharedMemoryLimit is not None and peakMemory > sharedMemoryLimit))
+
+    config = backend, windowSize, tileSize, scoreType, workersAmt
+    if fits(config): return config
+
+    scoreType = getScoreType(analysisParams)
+    candidates = [
+        (backend, windowSize, tileSize, scoreType, workersAmt),
+        (Backend.Thread, windowSize, tileSize, scoreType, workersAmt)]
+
+    targetSeq, querySeq, _, _, gapPenalty, *_ = analysisParams
+    maxSpan = getMaxAlignmentSpan(len(querySeq), getMaxSubstitutionScore(analysisParams), gapPenalty,
+        getGapExtension(analysisParams))
+    windowCellsSize = (len(querySeq) + 1) * (scoreType.itemsize + 1)
+    if budget and maxSpan is not None and maxSpan < len(targetSeq):
+        # The largest windows fitting the budget, first with all the workers then fewer:
+        for windowWorkersAmt in range(workersAmt, 0, -1):
+            candidates.append((backend, max(budget // windowWorkersAmt // windowCellsSize - 1,
+                maxSpan), tileSize, scoreType, windowWorkersAmt))
+
+    # The slowest but the only one that fits when both sequences are long:
+    candidates.append((backend, CHECKPOINTED_WINDOW_SIZE, tileSize, scoreType, workersAmt))
+    for candidate in candidates:
+        if not fits(candidate): continue
+        if doLogProgress:
+            peakMemory = formatSize(estimatePeakMemory(analysisParams, config))
+            print(f"The analysis would need about {peakMemory}, switching to a lower-memory mode...")
+
+        return candidate
+
+    lowestPeakMemory = min(estimatePeakMemory(analysisParams, candidate) for candidate in candidates)
+    raise ResourceBudgetErr(f"the lowest-memory mode needs about {formatSize(lowestPeakMemory)}",
+        f"while the budget is {formatSize(budget or sharedMemoryLimit)}")
@@ -0,0 +1,170 @@
+## Result cache module, stores the results of past analyses on disk
+from os                       import makedirs
+from time                     import time
+from zlib                     import compressobj, decompressobj
+from sqlite3                  import Connection, connect
+from hashlib                  import sha256
+from os.path                  import dirname, join
+from para_seq                 import OUTPUT_CHUNK_SIZE, RESULT_CACHE_FILE_NAME
+from para_seq.utils           import getCacheDir
+from collections.abc          import Iterable, Iterator
+from para_seq.local_alignment import AnalysisParams, CompactAlignment, encodeSeq
+
+# Bump this whenever the stored format (or the scoring) changes, old entries simply stop
+# matching:
+CACHE_FORMAT_VERSION = 3
+
+def getResultCachePath() -> str:
+    """
+    Computes the path of the result cache database, in the user cache folder.
+
+    Returns:
+        str: The path to the result cache database.
+    """
+    return join(getCacheDir(), RESULT_CACHE_FILE_NAME)
+
+def computeResultKey(analysisParams:AnalysisParams) -> bytes:
+    """
+    Computes the digest identifying an analysis: the encoded sequences plus the scores.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        bytes: The SHA-256 digest of the analysis.
+    """
+    targetSeq, querySeq, *scores = analysisParams
+    digest = sha256(f"{CACHE_FORMAT_VERSION}:{len(targetSeq)}:{len(querySeq)}:{scores}:".encode())
+    # ^^^ The lengths keep the boundary between the 2 sequences unambiguous.
+    digest.update(encodeSeq(targetSeq).tobytes())
+    digest.update(encodeSeq(querySeq).tobytes())
+    return digest.digest()
+
+def _packAlignment(alignment:CompactAlignment) -> bytes:
+    """Serializes a compact local alignment as a tab-separated line."""
+    return ("\t".join(map(str, alignment)) + "\n").encode()
+
+def unpackAlignments(data:bytes) -> Iterator[CompactAlignment]:
+    """
+    Decompresses and deserializes local alignments packed by cacheAlignments, a chunk at
+    a time so that they never need to be all in memory.
+
+    Args:
+        data (bytes): The compressed alignments, one tab-separated line each.
+
+    Returns:
+        Iterator[CompactAlignment]: The local alignments.
+    """
+    chunkSize = OUTPUT_CHUNK_SIZE // 256 # Compressed text expands a lot
+    decompressor, pending = decompressobj(), b""
+    for start in range(0, len(data) + chunkSize, chunkSize):
+        # vvv The extra step flushes whatever is left
+        chunk = data[start:start + chunkSize]
+        pending += decompressor.decompress(chunk) if chunk else decompressor.flush() + b"\n"
+        *lines, pending = pending.split(b"\n")
+        for line in filter(None, lines):
+            *positions, cigar = line.decode().split("\t")
+            yield *map(int, positions), cigar
+
+def openResultCache(path :str|None = None) -> Connection:
+    """
+    Opens (creating it if needed) the result cache database. SQLite takes care of
+    locking, so any amount of processes can use the same cache at the same time.
+
+    Args:
+        path (str | None, optional): The path of the database, if None the one in the user cache folder. Defaults to: None.
+
+    Returns:
+        Connection: The connection to the cache, to be closed when done.
+    """
+    path = path or getResultCachePath()
+    makedirs(dirname(path) or '.', exist_ok = True)
+
+    # Waits up to 30s for other processes writing at the same time:
+    cache = connect(path, timeout = 30, isolation_level = None)
+    cache.execute("PRAGMA journal_mode = WAL") # Readers don't block the writer
+    cache.execute("""CREATE TABLE IF NOT EXISTS results (
+        key        BLOB PRIMARY KEY,
+        maxScore   INTEGER NOT NULL,
+        alignments BLOB    NOT NULL,
+        lastAccess REAL    NOT NULL)""")
+
+    return cache
+
+def getCachedResult(cache:Connection, analysisParams:AnalysisParams) -> tuple[int, Iterator[CompactAlignment]]|None:
+    """
+    Looks up the result of an analysis in the cache, marking it as recently used.
+
+    Args:
+        cache (Connection): The connection to the cache.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        tuple | None: The maximum alignment score and an iterator over all the local alignments, or None if the result isn't cached.
+    """
+    key = computeResultKey(analysisParams)
+    row = cache.execute("SELECT maxScore, alignments FROM results WHERE key = ?", (key,)).fetchone()
+    if row is None: return None
+
+    cache.execute("UPDATE results SET lastAccess = ? WHERE key = ?", (time(), key))
+    maxScore, data = row
+    return maxScore, unpackAlignments(data)
+
+def _storeResult(cache:Connection, analysisParams:AnalysisParams, maxScore:int, data:bytes, maxSize:int) -> None:
+    """
+    Stores the packed result of an analysis in the cache, then evicts the least recently
+    used results until the stored alignments fit the provided size.
+
+    Args:
+        cache (Connection): The connection to the cache.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        maxScore (int): The maximum alignment score.
+        data (bytes): All the local alignments, packed.
+        maxSize (int): The maximum total size of the stored alignments, in bytes.
+    """
+    if len(data) > maxSize: return # It would evict everything, including itself
+
+    # IMMEDIATE takes the write lock right away, so concurrent evictions can't interleave:
+    cache.execute("BEGIN IMMEDIATE")
+    try:
+        cache.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (computeResultKey(analysisParams), maxScore, data, time()))
+
+        cache.execute("""DELETE FROM results WHERE key IN (
+            SELECT key FROM (SELECT key, SUM(LENGTH(alignments))
+                OVER (ORDER BY lastAccess DESC ROWS UNBOUNDED PRECEDING) AS usedSize FROM results)
+            WHERE usedSize > ?)""", (maxSize,))
+
+        cache.execute("COMMIT")
+
+    except BaseException:
+        cache.execute("ROLLBACK")
+        raise
+
+def cacheAlignments(cache:Connection, analysisParams:AnalysisParams, maxScore:int, alignments:Iterable[CompactAlignment], maxSize:int) -> Iterator[CompactAlignment]:
+    """
+    Passes the alignments of an analysis through, packing them on the way, and stores the
+    result in the cache once they're exhausted. Packing stops as soon as the result gets
+    too large for the cache, so at most the cache size is ever held in memory.
+
+    Args:
+        cache (Connection): The connection to the cache.
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        maxScore (int): The maximum alignment score.
+        alignments (Iterable[CompactAlignment]): All the local alignments.
+        maxSize (int): The maximum total size of the stored alignments, in bytes.
+
+    Returns:
+        Iterator[CompactAlignment]: The same alignments.
+    """
+    compressor, chunks, packedSize = compressobj(), [], 0
+    for alignment in alignments:
+        if chunks is not None:
+            chunks.append(compressor.compress(_packAlignment(alignment)))
+            packedSize += len(chunks[-1])
+            if packedSize > maxSize: chunks = None # Won't be cached anyway
+
+        yield alignment
+
+    if chunks is not None:
+        _storeResult(cache, analysisParams, maxScore, b"".join(chunks) + compressor.flush(), maxSize)
@@ -0,0 +1,189 @@
+## Resumable fill module, keeps the matrices on disk so that long fills survive interruptions
+from os                       import makedirs, replace
+from json                     import dump, load
+from time                     import monotonic
+from numpy                    import ndarray, dtype, uint8, uint32
+from shutil                   import rmtree
+from contextlib               import ExitStack
+from os.path                  import exists, join
+from para_seq                 import DEFAULT_TILE_SIZE, FILL_CHECKPOINT_INTERVAL, FILL_STATES_DIR_NAME, \
+    Backend
+from para_seq.utils           import getCacheDir
+from para_seq.progress        import FillCancelledErr, FillMonitor
+from collections.abc          import Iterator
+from numpy.lib.format         import open_memmap
+from multiprocessing.pool     import ThreadPool
+from para_seq.result_cache    import computeResultKey
+from para_seq.local_alignment import AnalysisParams, CompactAlignment, computeTileWaves, countTileCells, \
+    createGapBorders, encodeSeq, fillTile, getGapExtension, getMatrixShape, getTileScores, reconstructAlignments
+
+PROGRESS_FILE_NAME = "progress.json"
+
+def getFillStatePath(analysisParams:AnalysisParams) -> str:
+    """
+    Computes the path of the folder holding the fill state of an analysis, in the user
+    cache folder. Identical analyses share it, which is how a rerun finds it.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+
+    Returns:
+        str: The path to the fill state folder, which might not exist yet.
+    """
+    return join(getCacheDir(), FILL_STATES_DIR_NAME, computeResultKey(analysisParams).hex())
+
+def _saveProgress(statePath:str, progress:dict) -> None:
+    """Writes the fill progress so that it's replaced all at once, never half-written."""
+    tmpPath = join(statePath, PROGRESS_FILE_NAME + ".tmp")
+    with open(tmpPath, 'w') as fd: dump(progress, fd)
+    replace(tmpPath, join(statePath, PROGRESS_FILE_NAME))
+
+def openFillState(analysisParams:AnalysisParams, statePath:str, *, tileSize = DEFAULT_TILE_SIZE, scoreType:dtype = uint32) -> tuple[ndarray, ndarray, dict]:
+    """
+    Opens the file-backed matrices and the progress of a fill, creating them if there
+    isn't one to resume. A resumed fill keeps the tile size and score type it was started
+    with, since the progress is counted in waves of tiles.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        statePath (str): The path of the fill state folder.
+        tileSize (int, optional): The side of the tiles of a new fill. Defaults to: DEFAULT_TILE_SIZE.
+        scoreType (np.dtype, optional): Type of the values in the score matrix of a new fill. Defaults to: np.uint32.
+
+    Returns:
+        tuple:
+        - np.ndarray: The file-backed score matrix.
+        - np.ndarray: The file-backed directions matrix.
+        - dict: The progress, with the tile size, completed waves and maximum score so far, plus the gap borders with affine gaps.
+    """
+    scorePath, dirsPath = join(statePath, "scores.npy"), join(statePath, "directions.npy")
+    progressPath = join(statePath, PROGRESS_FILE_NAME)
+    if exists(progressPath):
+        with open(progressPath) as fd: progress = load(fd)
+        return open_memmap(scorePath, mode = "r+"), open_memmap(dirsPath, mode = "r+"), progress
+
+    makedirs(statePath, exist_ok = True)
+    shape = getMatrixShape(*analysisParams[:2])
+    # New .npy files are zero-filled (and sparse on most filesystems):
+    scoreMatrix = open_memmap(scorePath, mode = "w+", dtype = scoreType, shape = shape)
+    dirsMatrix  = open_memmap(dirsPath,  mode = "w+", dtype = uint8,     shape = shape)
+    progress = { "tileSize" : tileSize, "wavesDone" : 0, "maxScore" : 0 }
+    _saveProgress(statePath, progress)
+    return scoreMatrix, dirsMatrix, progress
+
+def fillMatricesResumably(analysisParams:AnalysisParams, statePath:str, *, tileSize = DEFAULT_TILE_SIZE, scoreType:dtype = uint32, workersAmt :int|None = None, checkpointInterval = FILL_CHECKPOINT_INTERVAL, monitor :FillMonitor|None = None, doLogProgress = False) -> tuple[int, ndarray, ndarray]:
+    """
+    Fills file-backed score and directions matrices one wave of tiles at a time,
+    continuing from the last checkpoint if the fill was interrupted. Every so often the
+    matrices are flushed to disk and only then the completed waves are recorded, so a
+    checkpoint never counts tiles that might not be on disk: at worst the waves after it
+    are filled again. A cancelled fill saves a checkpoint before stopping.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        statePath (str): The path of the fill state folder.
+        tileSize (int, optional): The side of the tiles of a new fill. Defaults to: DEFAULT_TILE_SIZE.
+        scoreType (np.dtype, optional): Type of the values in the score matrix of a new fill. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of threads, if None as many as there are cores. Defaults to: None.
+        checkpointInterval (float, optional): The minimum time between checkpoints, in seconds. Defaults to: FILL_CHECKPOINT_INTERVAL.
+        monitor (FillMonitor | None, optional): Gets the progress after each wave of tiles, and stops the fill there once cancelled. Defaults to: None.
+        doLogProgress (bool, optional): If True prints a message when resuming a fill. Defaults to: False.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill, once the checkpoint is saved.
+
+    Returns:
+        tuple: The maximum alignment score and the filled score and directions matrices.
+    """
+    scoreMatrix, dirsMatrix, progress = openFillState(
+        analysisParams, statePath, tileSize = tileSize, scoreType = scoreType)
+
+    targetCodes, queryCodes = encodeSeq(analysisParams[0]), encodeSeq(analysisParams[1])
+    scoring = [*getTileScores(analysisParams)]
+    waves = computeTileWaves(*scoreMatrix.shape, progress["tileSize"])
+    # The tiles after a checkpoint already rolled the gap borders past it, so the ones it
+    # continues from are saved with the progress:
+    gapBorders = None
+    if getGapExtension(analysisParams) is not None:
+        gapBorders = createGapBorders(scoreMatrix.shape, scoreMatrix.dtype)
+        for gaps, savedGaps in zip(gapBorders, progress.get("gapBorders", ())): gaps[:] = savedGaps
+        scoring.append(gapBorders)
+
+    if doLogProgress and progress["wavesDone"]:
+        print(f"Resuming the fill from the last checkpoint ({progress['wavesDone']}/{len(waves)} waves done)...")
+
+    def checkpoint(wavesDone:int, maxScore:int) -> None:
+        scoreMatrix.flush()
+        dirsMatrix.flush()
+        progress.update(wavesDone = wavesDone, maxScore = maxScore)
+        if gapBorders: progress["gapBorders"] = [gaps.tolist() for gaps in gapBorders]
+        _saveProgress(statePath, progress)
+
+    maxScore, lastCheckpointTime = progress["maxScore"], monotonic()
+    if monitor: monitor.start((scoreMatrix.shape[0] - 1) * (scoreMatrix.shape[1] - 1), len(waves),
+        cellsDone = sum(map(countTileCells, waves[:progress["wavesDone"]])), wavesDone = progress["wavesDone"])
+
+    with ExitStack() as stack:
+        # A single thread fills the tiles in-process, with no pool:
+        pool = None if workersAmt == 1 else stack.enter_context(ThreadPool(workersAmt))
+        for waveId in range(progress["wavesDone"], len(waves)):
+            tasks = [(scoreMatrix, dirsMatrix, tile, targetCodes, queryCodes, *scoring)
+                for tile in waves[waveId]]
+
+            waveMaxScore = max(pool.starmap(fillTile, tasks) if pool else
+                (fillTile(*task) for task in tasks))
+
+            if maxScore < waveMaxScore: maxScore = waveMaxScore
+            try:
+                if monitor: monitor.completeWave(countTileCells(waves[waveId]))
+
+            except FillCancelledErr: # The next run continues right after this wave
+                checkpoint(waveId + 1, maxScore)
+                raise
+
+            if monotonic() - lastCheckpointTime >= checkpointInterval:
+                checkpoint(waveId + 1, maxScore)
+                lastCheckpointTime = monotonic()
+
+    if progress["wavesDone"] < len(waves): checkpoint(len(waves), maxScore)
+    return maxScore, scoreMatrix, dirsMatrix
+
+def _removeFillStateAfter(alignments:Iterator[CompactAlignment], statePath:str) -> Iterator[CompactAlignment]:
+    """Passes the alignments through, removing the fill state once they're all done."""
+    yield from alignments
+    rmtree(statePath, ignore_errors = True)
+
+def findResumableLocalAlignments(analysisParams:AnalysisParams, *, backend = Backend.Thread, tileSize = DEFAULT_TILE_SIZE, scoreType:dtype = uint32, workersAmt :int|None = None, monitor :FillMonitor|None = None, doStream = False, doLogProgress = False) -> tuple[int, list[CompactAlignment]|Iterator[CompactAlignment]]:
+    """
+    Find all local alignments starting from the provided analysis parameters, filling
+    the matrices on disk with periodic checkpoints. If the same analysis was interrupted
+    before, it continues from its last checkpoint instead of starting over. The fill
+    state is removed once all the alignments are reconstructed.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        backend (Backend, optional): The kind of workers reconstructing the alignments, the fill always uses threads. Defaults to: Backend.Thread.
+        tileSize (int, optional): The side of the tiles of a new fill. Defaults to: DEFAULT_TILE_SIZE.
+        scoreType (np.dtype, optional): Type of the values in the score matrix of a new fill. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. Defaults to: None.
+        monitor (FillMonitor | None, optional): Follows the fill of the matrices and can cancel it, see fillMatricesResumably. Defaults to: None.
+        doStream (bool, optional): If True the alignments are returned as an iterator reconstructing them lazily. Defaults to: False.
+        doLogProgress (bool, optional): If True prints analysis progress messages to standard output. Defaults to: False.
+
+    Raises:
+        FillCancelledErr: If the monitor cancelled the fill, which the next run of the same analysis resumes.
+
+    Returns:
+        tuple: The maximum alignment score and all the compact local alignments, as a list or an iterator.
+    """
+    statePath = getFillStatePath(analysisParams)
+    if doLogProgress: print("Filling score and directions matrices on disk...")
+    maxScore, scoreMatrix, dirsMatrix = fillMatricesResumably(analysisParams, statePath,
+        tileSize = tileSize, scoreType = scoreType, workersAmt = workersAmt, monitor = monitor,
+        doLogProgress = doLogProgress)
+
+    if doLogProgress: print("Reconstructing best local alignments...")
+    bestLocalAlignments = _removeFillStateAfter(reconstructAlignments(scoreMatrix, maxScore,
+        analysisParams, backend = backend, dirsMatrix = dirsMatrix, workersAmt = workersAmt), statePath)
+
+    return maxScore, bestLocalAlignments if doStream else list(bestLocalAlignments)
@@ -0,0 +1,185 @@
+## Sketches module, estimates from k-mers which queries are worth aligning in batch modes
+from os                       import makedirs, replace
+from numpy                    import ndarray, int64, uint8, uint64, add, concatenate, cumsum, empty, \
+    flatnonzero, full, load, ones, savez, searchsorted, unique, zeros
+from para_seq                 import SKETCH_KMER_SIZE, SKETCH_SCALE, SKETCHES_DIR_NAME
+from os.path                  import join
+from para_seq.utils           import getCacheDir
+from collections.abc          import Sequence
+from para_seq.input_manager   import getFastaCacheKey
+from para_seq.local_alignment import encodeSeq
+
+# All the sketches of a collection of sequences, concatenated, and the offset where each
+# one starts (with a final one past the last sketch):
+type Sketches = tuple[ndarray, ndarray]
+
+# 2-bit code of every nucleotide ASCII code, 4 for N and the other ambiguous nucleotides
+# (and any other byte), which can't be part of a k-mer:
+KMER_CODES = full(256, 4, dtype = uint64)
+for code, nucleotide in enumerate(b"ACGT"): KMER_CODES[nucleotide] = code
+
+def hashKmers(kmers:ndarray) -> ndarray:
+    """
+    Scrambles the 2-bit packed k-mers with the SplitMix64 finalizer, so that keeping the
+    smallest hashes samples the k-mers uniformly, whatever their composition.
+
+    Args:
+        kmers (np.ndarray): 1D-array of uint64 packed k-mers, scrambled in place.
+
+    Returns:
+        np.ndarray: The same array, now holding the hashes.
+    """
+    kmers ^= kmers >> uint64(30)
+    kmers *= uint64(0xBF58476D1CE4E5B9) # Wraps around on overflow
+    kmers ^= kmers >> uint64(27)
+    kmers *= uint64(0x94D049BB133111EB)
+    kmers ^= kmers >> uint64(31)
+    return kmers
+
+def sketchSeq(seq:str, kmerSize = SKETCH_KMER_SIZE, scale = SKETCH_SCALE) -> ndarray:
+    """
+    Computes the sketch of a sequence: the sorted distinct hashes of its k-mers, keeping
+    only those in the lowest 1/scale of the hash range (a FracMinHash), so that the
+    sketches of a query and of the target sample the same k-mers and can be compared.
+    The k-mers with an ambiguous nucleotide (like N) are left out.
+
+    Args:
+        seq (str): The DNA sequence to sketch.
+        kmerSize (int, optional): The length of the k-mers, between 1 and SKETCH_MAX_KMER_SIZE. Defaults to: SKETCH_KMER_SIZE.
+        scale (int, optional): Keeps 1 in this many hashes, at least 1. Defaults to: SKETCH_SCALE.
+
+    Returns:
+        np.ndarray: 1D-array of the sorted uint64 hashes, empty if the sequence is shorter than a k-mer.
+    """
+    kmersAmt = len(seq) - kmerSize + 1
+    if kmersAmt < 1: return empty(0, dtype = uint64)
+
+    codes = KMER_CODES[encodeSeq(seq)]
+    # The amount of Ns up to each position tells which k-mers have some:
+    nsCounts = concatenate(([0], cumsum(codes == 4)))
+    isValid = nsCounts[kmerSize:] == nsCounts[:kmersAmt]
+    codes[codes == 4] = 0
+
+    # Packs each k-mer in the 2 * kmerSize lowest bits, one shifted slice at a time:
+    kmers = zeros(kmersAmt, dtype = uint64)
+    for offset in range(kmerSize):
+        kmers <<= uint64(2)
+        kmers |= codes[offset:offset + kmersAmt]
+
+    hashes = hashKmers(kmers[isValid])
+    return unique(hashes[hashes <= uint64(0xFFFFFFFFFFFFFFFF // scale)])
+
+def sketchSeqs(seqs:Sequence[str], kmerSize = SKETCH_KMER_SIZE, scale = SKETCH_SCALE) -> Sketches:
+    """
+    Computes the sketches of many sequences, see sketchSeq.
+
+    Args:
+        seqs (Sequence[str]): The DNA sequences to sketch.
+        kmerSize (int, optional): The length of the k-mers, between 1 and SKETCH_MAX_KMER_SIZE. Defaults to: SKETCH_KMER_SIZE.
+        scale (int, optional): Keeps 1 in this many hashes, at least 1. Defaults to: SKETCH_SCALE.
+
+    Returns:
+        Sketches: The concatenated sketches and their offsets.
+    """
+    sketches = [sketchSeq(seq, kmerSize, scale) for seq in seqs]
+    offsets = concatenate(([0], cumsum([len(sketch) for sketch in sketches], dtype = int64)))
+    return concatenate([empty(0, dtype = uint64)] + sketches), offsets
+
+def getSketchesPath(filePath:str, kmerSize:int, scale:int) -> str:
+    """
+    Computes the path of the sketches of the records of a FASTA file in the user cache
+    folder, tied to the file like its index (see getFastaCacheKey) and to the sketch
+    settings.
+
+    Args:
+        filePath (str): The FASTA file path.
+        kmerSize (int): The length of the k-mers.
+        scale (int): The fraction of the hashes kept.
+
+    Raises:
+        MissingSeqErr: When the provided FASTA file is empty.
+        InvalidFileErr: When the provided file path doesn't lead to an existent FASTA file.
+
+    Returns:
+        str: The path to the sketches file, which might not exist yet.
+    """
+    return join(getCacheDir(), SKETCHES_DIR_NAME, f"{getFastaCacheKey(filePath)}_k{kmerSize}_s{scale}.npz")
+
+def loadFastaSketches(filePath:str, seqs:Sequence[str], kmerSize = SKETCH_KMER_SIZE, scale = SKETCH_SCALE) -> Sketches:
+    """
+    Loads the sketches of the records of a FASTA file from the user cache folder, or
+    computes them and stores them there for the next runs.
+
+    Args:
+        filePath (str): The FASTA file path.
+        seqs (Sequence[str]): The DNA sequences of the records of the file, in file order.
+        kmerSize (int, optional): The length of the k-mers, between 1 and SKETCH_MAX_KMER_SIZE. Defaults to: SKETCH_KMER_SIZE.
+        scale (int, optional): Keeps 1 in this many hashes, at least 1. Defaults to: SKETCH_SCALE.
+
+    Raises:
+        MissingSeqErr: When the provided FASTA file is empty.
+        InvalidFileErr: When the provided file path doesn't lead to an existent FASTA file.
+
+    Returns:
+        Sketches: The concatenated sketches and their offsets, one per record.
+    """
+    sketchesPath = getSketchesPath(filePath, kmerSize, scale)
+    try:
+        with load(sketchesPath) as sketchesFile: hashes, offsets = sketchesFile["hashes"], sketchesFile["offsets"]
+        if len(offsets) == len(seqs) + 1: return hashes, offsets
+
+    except (OSError, ValueError, KeyError): pass # Missing or unreadable, computed again
+
+    hashes, offsets = sketchSeqs(seqs, kmerSize, scale)
+    makedirs(join(getCacheDir(), SKETCHES_DIR_NAME), exist_ok = True)
+    # Written aside first, so that it's replaced all at once, never half-written:
+    with open(sketchesPath + ".tmp", 'wb') as fd: savez(fd, hashes = hashes, offsets = offsets)
+    replace(sketchesPath + ".tmp", sketchesPath)
+    return hashes, offsets
+
+def estimateContainments(sketches:Sketches, targetSketch:ndarray) -> ndarray:
+    """
+    Estimates for each sketched query the fraction of its k-mers found in the target,
+    looking all of their hashes up in the sorted target sketch at once. The queries too
+    short for a single k-mer (or made of Ns) can't be judged, so they're given 1.
+
+    Args:
+        sketches (Sketches): The sketches of the queries.
+        targetSketch (np.ndarray): The sketch of the target.
+
+    Returns:
+        np.ndarray: The estimated containment of each query in the target, between 0 and 1.
+    """
+    hashes, offsets = sketches
+    sketchSizes = offsets[1:] - offsets[:-1]
+    isFound = zeros(len(hashes) + 1, dtype = uint8) # Padded, so that the last offset is valid
+    if len(targetSketch):
+        positions = searchsorted(targetSketch, hashes).clip(max = len(targetSketch) - 1)
+        isFound[:-1] = targetSketch[positions] == hashes
+
+    # Every sketch adds up its found hashes, the empty ones are skipped:
+    isSketched = flatnonzero(sketchSizes)
+    containments = ones(len(sketchSizes))
+    containments[isSketched] = add.reduceat(isFound, offsets[isSketched], dtype = int64) / sketchSizes[isSketched]
+    return containments
+
+def prefilterQueries(targetSeq:str, queriesPath:str, querySeqs:Sequence[str], minSimilarity:float, kmerSize = SKETCH_KMER_SIZE, scale = SKETCH_SCALE) -> ndarray:
+    """
+    Picks the queries of a FASTA file sharing enough k-mers with the target to be worth
+    aligning, so that the unrelated ones can be skipped without running the engines.
+    The sketches of the queries are cached, the target one is computed every time.
+
+    Args:
+        targetSeq (str): The target sequence.
+        queriesPath (str): The FASTA file path of the queries.
+        querySeqs (Sequence[str]): The DNA sequences of the records of the file, in file order.
+        minSimilarity (float): The minimum estimated fraction of the k-mers of a query found in the target.
+        kmerSize (int, optional): The length of the k-mers, between 1 and SKETCH_MAX_KMER_SIZE. Defaults to: SKETCH_KMER_SIZE.
+        scale (int, optional): Keeps 1 in this many hashes, at least 1. Defaults to: SKETCH_SCALE.
+
+    Returns:
+        np.ndarray: The sorted indexes of the queries to align.
+    """
+    containments = estimateContainments(loadFastaSketches(queriesPath, querySeqs, kmerSize, scale),
+        sketchSeq(targetSeq, kmerSize, scale))
+    return flatnonzero(containments >= minSimilarity)
@@ -1,4 +1,16 @@
 ## Generic utilities
+from __future__ import annotations
+from os         import getenv, process_cpu_count
+from sys        import _is_gil_enabled
+from typing     import TYPE_CHECKING
+from shutil     import disk_usage
+from os.path    import expanduser, join
+from para_seq   import FORKSERVER_PRELOAD, SHARED_MEMORY_DIR
+
+# multiprocessing is only imported once workers are started, see getProcessContext:
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
 def ellipsize(s:str, size:int) -> str:
     """
     Truncates to size and adds ellipsis (...) to the end of the string, if needed.
@@ -12,6 +24,123 @@ def ellipsize(s:str, size:int) -> str:
     """
     return s[:size - 3] + "..." if len(s) > size else s
 
+def isGilEnabled() -> bool:
+    """
+    Checks if the running interpreter holds the GIL, which is always the case except for
+    free-threaded builds of Python (3.13t and later) started without it.
+
+    Returns:
+        bool: If the GIL is enabled or not.
+    """
+    return _is_gil_enabled()
+
+def getUsableCpusAmt(jobsAmt = 0) -> int:
+    """
+    Computes how many cores the analysis can use: the ones in the CPU affinity set of the
+    process (which is how schedulers confine jobs), optionally capped further.
+
+    Args:
+        jobsAmt (int, optional): The maximum amount of cores to use, 0 for no limit. Defaults to: 0.
+
+    Returns:
+        int: The amount of usable cores, at least 1.
+    """
+    usableCpusAmt = process_cpu_count() or 1
+    return min(jobsAmt, usableCpusAmt) if jobsAmt else usableCpusAmt
+
+def getProcessContext() -> BaseContext:
+    """
+    Provides the context all the worker processes are started from: a fork server where
+    available (not on Windows), which imports the heavy modules once and then forks every
+    worker already warm from itself. Unlike forking the calling process, that's safe when
+    it runs threads, and unlike spawning it doesn't import everything again per worker.
+
+    Returns:
+        BaseContext: The context, whose Pool and Process classes start the workers.
+    """
+    from multiprocessing import get_all_start_methods, get_context
+    if "forkserver" not in get_all_start_methods(): return get_context()
+
+    context = get_context("forkserver")
+    # Only read when the server starts, with the first worker:
+    context.set_forkserver_preload(list(FORKSERVER_PRELOAD))
+    return context
+
+def startProcessServer() -> None:
+    """
+    Starts the fork server of getProcessContext without waiting for it, so that it imports
+    the heavy modules while the calling process is still busy with its own imports and
+    the inputs, and the first workers don't wait for it. Does nothing without a fork server.
+    """
+    if getProcessContext().get_start_method() != "forkserver": return
+
+    from multiprocessing.forkserver import ensure_running
+    ensure_running()
+
+def getAvailableMemory() -> int|None:
+    """
+    Retrieves the amount of physical memory currently available, in bytes.
+
+    Returns:
+        int | None: The available memory, or None if the platform doesn't expose it.
+    """
+    try:
+        from os import sysconf # Unix only, importing it at the top would break Windows
+        return sysconf("SC_AVPHYS_PAGES") * sysconf("SC_PAGE_SIZE")
+
+    except (ImportError, ValueError, OSError): return None
+
+def getSharedMemoryLimit() -> int|None:
+    """
+    Retrieves how much shared memory can still be allocated, which on Linux lives in a
+    separate filesystem often much smaller than the physical memory.
+
+    Returns:
+        int | None: The free shared memory in bytes, or None if it's only limited by the physical memory.
+    """
+    try: return disk_usage(SHARED_MEMORY_DIR).free
+    except OSError: return None # Not Linux
+
+def getCacheDir() -> str:
+    """
+    Computes the path of the folder where the tool caches data across runs, inside the
+    user cache folder.
+
+    Returns:
+        str: The path to the cache folder, which might not exist yet.
+    """
+    return join(getenv("XDG_CACHE_HOME") or join(expanduser('~'), ".cache"), "para_seq")
+
+def formatSize(bytesAmt:int) -> str:
+    """
+    Converts an amount of bytes to a human-readable string, using binary units.
+
+    Args:
+        bytesAmt (int): The amount of bytes.
+
+    Returns:
+        str: The formatted size, like "1.5 GiB".
+    """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if bytesAmt < 1024: return f"{bytesAmt:.1f} {unit}" if unit != "B" else f"{bytesAmt} B"
+        bytesAmt /= 1024
+
+    return f"{bytesAmt:.1f} TiB"
+
+def formatDuration(seconds:float) -> str:
+    """
+    Converts an amount of seconds to a human-readable string, rounded to the second.
+
+    Args:
+        seconds (float): The amount of seconds.
+
+    Returns:
+        str: The formatted duration, like "1:02:03" for hours, minutes and seconds.
+    """
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes   = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
 class CustomErr(Exception):
     """General custom error template class."""
     msgPrefix = ""
@@ -0,0 +1,287 @@
+## Windowed alignment module, meant for short queries against very long targets
+from numpy                    import ndarray, argwhere, dtype, uint32
+from para_seq                 import Backend
+from itertools                import starmap
+from contextlib               import nullcontext
+from collections.abc          import Iterator
+from para_seq.input_manager   import SubstitutionScores
+from para_seq.local_alignment import AnalysisParams, CompactAlignment, createLocalMatrices, \
+    createPool, encodeSeq, fillTile, getGapExtension, getMatrixShape, getMaxSubstitutionScore, \
+    getTileScores, imapTasks, traceAlignments
+
+from multiprocessing.pool     import Pool as PoolType
+
+type Window = tuple[int, int] # 0-based target slice [start, end)
+# Encoded target and query, match score, mismatch, gap and gap extension penalties (None
+# for linear gaps), substitution scores (None without a matrix) and score type:
+type WindowParams = tuple[ndarray, ndarray, int, int, int, int|None, SubstitutionScores|None, dtype]
+
+# Same trick as the main pipeline: values shared by all the window tasks are set once
+# per process during Pool init.
+TARGET_SEQ       = ""
+QUERY_SEQ        = ""
+TARGET_CODES     = encodeSeq("")
+QUERY_CODES      = encodeSeq("")
+MATCH_SCORE      = 0
+MISMATCH_PENALTY = 0
+GAP_PENALTY      = 0
+GAP_EXTENSION :int|None = None
+SUBSTITUTIONS :SubstitutionScores|None = None
+SCORE_TYPE       = uint32
+def _setWindowTaskConsts(analysisParams:AnalysisParams, scoreType:dtype = uint32) -> None:
+    """
+    Sets values for unchanging analysis parameters as global constants, also encoding the
+    sequences for the vectorized kernel. Meant as an initializer for pooled processes.
+
+    Args:
+        analysisParams (AnalysisParams): A tuple containing:
+        - targetSeq (str) : The target sequence to align.
+        - querySeq (str) : The query sequence to align.
+        - matchScore (int) : The alignment score bonus for a nucleotide match.
+        - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
+        - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+        - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+        - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
+
+        scoreType (np.dtype, optional): Type of the values in the windows' score matrices. Defaults to: np.uint32.
+    """
+    global TARGET_SEQ, QUERY_SEQ, TARGET_CODES, QUERY_CODES
+    global MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXTENSION, SUBSTITUTIONS, SCORE_TYPE
+    TARGET_SEQ, QUERY_SEQ = analysisParams[:2]
+    MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXTENSION, SUBSTITUTIONS = getTileScores(analysisParams)
+    TARGET_CODES, QUERY_CODES = encodeSeq(TARGET_SEQ), encodeSeq(QUERY_SEQ)
+    SCORE_TYPE = scoreType
+
+def getMaxAlignmentSpan(querySeqLen:int, matchScore:int, gapPenalty:int, gapExtension :int|None = None) -> int|None:
+    """
+    Computes the maximum amount of target nucleotides a positive-scoring local alignment
+    can cover: every query nucleotide plus as many gaps as the best possible score can
+    pay for. With affine gaps that's a single gap, opened once and extended as long as
+    the score allows.
+
+    Args:
+        querySeqLen (int): The length of the query sequence.
+        matchScore (int): The highest score a pair of aligned nucleotides can add, see getMaxSubstitutionScore.
+        gapPenalty (int): The alignment score gap penalty for gap opening and extension.
+        gapExtension (int | None, optional): The penalty of each gap position after the first, if None the gaps are linear. Defaults to: None.
+
+    Returns:
+        int | None: The maximum alignment span in the target, or None if gaps are free and the span is unbounded.
+    """
+    if gapExtension is None: gapExtension = gapPenalty
+    if not gapExtension: return None
+    return querySeqLen + max((matchScore * querySeqLen - gapPenalty) // gapExtension + 1, 0)
+
+def computeWindows(targetSeqLen:int, windowSize:int, overlap:int) -> list[Window]:
+    """
+    Splits the target sequence into consecutive windows of the provided size, each
+    overlapping the next one by the provided amount of nucleotides. The last window is
+    cut short at the end of the target.
+
+    Args:
+        targetSeqLen (int): The length of the target sequence.
+        windowSize (int): The size of each window, must be greater than the overlap.
+        overlap (int): The amount of nucleotides shared by consecutive windows.
+
+    Returns:
+        list[Window]: The windows, ordered by start position.
+    """
+    windows :list[Window] = []
+    start, stride = 0, windowSize - overlap
+    while start + windowSize < targetSeqLen:
+        windows.append((start, start + windowSize))
+        start += stride
+
+    windows.append((start, targetSeqLen))
+    return windows
+
+def getAnalysisWindows(analysisParams:AnalysisParams, windowSize:int) -> list[Window]:
+    """
+    Splits the target of an analysis into windows of at least the provided size,
+    overlapping by the longest span a positive-scoring alignment can have, so that every
+    best alignment fits entirely in at least one window.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        windowSize (int): The desired window size, raised to the maximum alignment span if smaller.
+
+    Returns:
+        list[Window]: The windows, ordered by start position.
+    """
+    targetSeq, querySeq, _, _, gapPenalty, *_ = analysisParams
+    maxSpan = getMaxAlignmentSpan(len(querySeq), getMaxSubstitutionScore(analysisParams), gapPenalty,
+        getGapExtension(analysisParams))
+
+    # With free gaps an alignment can stretch over the whole target:
+    if maxSpan is None or maxSpan >= len(targetSeq): return [(0, len(targetSeq))]
+    return computeWindows(len(targetSeq), max(windowSize, maxSpan), maxSpan - 1)
+
+def getWindowParams(analysisParams:AnalysisParams, scoreType:dtype = uint32) -> WindowParams:
+    """
+    Collects the values every window task needs, with the sequences already encoded.
+    Threads get them as args, so that analyses sharing a process can't clash.
+
+    Args:
+        analysisParams (AnalysisParams): The analysis parameters (sequences and scores).
+        scoreType (np.dtype, optional): Type of the values in the windows' score matrices. Defaults to: np.uint32.
+
+    Returns:
+        WindowParams: The values needed by the window tasks.
+    """
+    return (encodeSeq(analysisParams[0]), encodeSeq(analysisParams[1]), *getTileScores(analysisParams),
+        scoreType)
+
+def _fillWindowMatrices(window:Window, windowParams :WindowParams|None = None) -> tuple[ndarray, ndarray, int]:
+    """
+    Creates and fills worker-local score and directions matrices for the query aligned
+    against the provided window of the target.
+
+    Args:
+        window (Window): The target slice to align the query against.
+        windowParams (WindowParams | None, optional): The values needed by the task, if None the global constants of the process. Defaults to: None.
+
+    Returns:
+        tuple: The filled score matrix, the filled directions matrix and the maximum score.
+    """
+    global TARGET_CODES, QUERY_CODES, MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXTENSION
+    global SUBSTITUTIONS, SCORE_TYPE
+
+    targetCodes, queryCodes, *scores, scoreType = windowParams or (TARGET_CODES, QUERY_CODES,
+        MATCH_SCORE, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXTENSION, SUBSTITUTIONS, SCORE_TYPE)
+
+    start, end = window
+    rowsAmt, columnsAmt = shape = getMatrixShape(targetCodes[start:end], queryCodes)
+    scoreMatrix, dirsMatrix = createLocalMatrices(shape, scoreType)
+    maxScore = fillTile(scoreMatrix, dirsMatrix, (1, rowsAmt, 1, columnsAmt),
+        targetCodes[start:end], queryCodes, *scores)
+
+    return scoreMatrix, dirsMatrix, maxScore
+
+# Untested, as it would be a very convoluted setup. Sufficient test coverage on the
+# process-joining functions should be enough to test this as well.
+def computeWindowMaxScore(start:int, end:int, windowParams :WindowParams|None = None) -> int:
+    """
+    **Only works as pool task**\n
+    Computes the maximum local alignment score of the query against a target window.
+
+    Args:
+        start (int): The 0-based target position where the window starts.
+        end (int): The 0-based target position where the window ends (excluded).
+        windowParams (WindowParams | None, optional): The values needed by thread tasks, processes use their global constants. Defaults to: None.
+
+    Returns:
+        int: The maximum alignment score in the window.
+    """
+    return _fillWindowMatrices((start, end), windowParams)[2]
+
+# Untested, as it would be a very convoluted setup. Sufficient test coverage on the
+# process-joining functions should be enough to test this as well.
+def alignWindow(start:int, end:int, nextWindowStart:int, nextWindowEnd:int, windowParams :WindowParams|None = None) -> list[CompactAlignment]:
+    """
+    **Only works as pool task**\n
+    Reconstructs the best local alignments of the query against a target window, with
+    target positions mapped back to the whole target. Alignments that fit entirely in the
+    next window are left to that window, so that overlaps don't produce duplicates.
+
+    Args:
+        start (int): The 0-based target position where the window starts.
+        end (int): The 0-based target position where the window ends (excluded).
+        nextWindowStart (int): Where the next window starts, equal to end if there is none.
+        nextWindowEnd (int): Where the next window ends, equal to end if there is none.
+        windowParams (WindowParams | None, optional): The values needed by thread tasks, processes use their global constants. Defaults to: None.
+
+    Returns:
+        list[CompactAlignment]: The best local alignments owned by this window.
+    """
+    scoreMatrix, dirsMatrix, maxScore = _fillWindowMatrices((start, end), windowParams)
+    if not maxScore: return []
+
+    alignments :list[CompactAlignment] = []
+    for y, x in argwhere(scoreMatrix == maxScore).tolist():
+        for windowX, queryY, windowEndX, queryEndY, cigar in traceAlignments(
+            scoreMatrix, dirsMatrix, y, x):
+            # Still 1-based, in whole target coords:
+            targetX, targetEndX = start + windowX, start + windowEndX
+            if nextWindowStart < targetX and targetEndX <= nextWindowEnd: continue
+            alignments.append((targetX, queryY, targetEndX, queryEndY, cigar))
+
+    return alignments
+
+def _alignWindows(pool:PoolType|None, tasks:list[tuple]) -> Iterator[CompactAlignment]:
+    """
+    Yields the best local alignments of each provided window as soon as it's aligned,
+    terminating the pool once they're exhausted (or the iteration is closed).
+
+    Args:
+        pool (Pool | None): The pool the windows are aligned on, if None they're aligned in this process.
+        tasks (list): The args of alignWindow for each window.
+
+    Returns:
+        Iterator[CompactAlignment]: The best local alignments.
+    """
+    with pool or nullcontext():
+        for alignments in imapTasks(pool, alignWindow, tasks) if pool else starmap(alignWindow, tasks):
+            yield from alignments
+
+# Contains some prints since it's meant to replace findLocalAlignments in the main file:
+def findWindowedLocalAlignments(analysisParams:AnalysisParams, windowSize:int, *, backend = Backend.Process, scoreType:dtype = uint32, workersAmt :int|None = None, doStream = False, doLogProgress = False) -> tuple[int, list[CompactAlignment]|Iterator[CompactAlignment]]:
+    """
+    Find all local alignments by splitting the target into overlapping windows, each
+    aligned independently against the whole query on the pool of workers (one after the
+    other in this process with the serial backend). Windows overlap by
+    the longest span a positive-scoring alignment can have, so every best alignment fits
+    entirely in at least one window and the results match a full alignment exactly.
+
+    Args:
+        analysisParams (AnalysisParams): A tuple containing:
+            - targetSeq (str) : The target sequence to align.
+            - querySeq (str) : The query sequence to align.
+            - matchScore (int) : The alignment score bonus for a nucleotide match.
+            - mismatchPenalty (int) : The alignment score penalty for a nucleotide mismatch.
+            - gapPenalty (int) : The alignment score gap penalty for gap opening and extension.
+            - gapExtension (int, optional) : The penalty of each gap position after the first, making gaps affine (the gap penalty is then only paid to open them).
+            - substitutions (SubstitutionScores, optional) : The score of every pair of nucleotides, replacing the match score and mismatch penalty.
+
+        windowSize (int): The desired window size, raised to the maximum alignment span if smaller.
+        backend (Backend, optional): The kind of workers aligning the windows, none for the serial backend. Defaults to: Backend.Process.
+        scoreType (np.dtype, optional): Type of the values in the windows' score matrices, must fit the best possible score. Defaults to: np.uint32.
+        workersAmt (int | None, optional): The amount of workers, if None as many as there are cores. Defaults to: None.
+        doStream (bool, optional): If True the alignments are returned as an iterator reconstructing them lazily, which must be exhausted or closed to stop the workers. Defaults to: False.
+        doLogProgress (bool, optional): If True prints analysis progress messages to standard output. Defaults to: False.
+
+    Returns:
+        tuple: The maximum alignment score and all the compact local alignments, as a list or an iterator.
+    """
+    targetSeq = analysisParams[0]
+    windows = getAnalysisWindows(analysisParams, windowSize)
+
+    # The same pool scores the windows and then aligns them, as long as it's needed:
+    pool = None if backend == Backend.Serial else createPool(backend, analysisParams,
+        initializer = _setWindowTaskConsts, scoreType = scoreType, workersAmt = workersAmt)
+
+    # Processes already have the values as global constants, the others get them as args:
+    windowParams = () if backend == Backend.Process else (getWindowParams(analysisParams, scoreType),)
+    try:
+        if doLogProgress: print(f"Scoring {len(windows)} target windows...")
+        tasks = [(*window, *windowParams) for window in windows]
+        windowScores = pool.starmap(computeWindowMaxScore, tasks) if pool else \
+            list(starmap(computeWindowMaxScore, tasks))
+
+    except BaseException:
+        if pool: pool.terminate()
+        raise
+
+    maxScore = max(windowScores)
+    if not maxScore:
+        if pool: pool.terminate()
+        return 0, iter([]) if doStream else []
+
+    # Only the windows reaching the best score need the traceback:
+    if doLogProgress: print("Reconstructing best local alignments...")
+    nextWindows = windows[1:] + [(len(targetSeq), len(targetSeq))]
+    tasks = [(*window, *nextWindow, *windowParams)
+        for window, nextWindow, score in zip(windows, nextWindows, windowScores)
+        if score == maxScore]
+
+    bestLocalAlignments = _alignWindows(pool, tasks)
+    return maxScore, bestLocalAlignments if doStream else list(bestLocalAlignments)
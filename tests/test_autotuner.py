@@ -0,0 +1,98 @@
+from para_seq.autotuner import *
+import pytest
+
+# Synthetic costs, roughly those of a machine with threads scaling well:
+RESULTS = {
+    "machine"          : "test",
+    "kernelRowCost"    : 2e-5,
+    "kernelCellCost"   : 5e-8,
+    "threadEfficiency" : 0.9,
+    "processPoolCost"  : 5e-3,
+    "processRoundTrip" : 1e-3,
+    "processTaskCost"  : 1e-5,
+    "threadPoolCost"   : 1e-3,
+    "threadRoundTrip"  : 1e-4,
+    "threadTaskCost"   : 2e-7,
+    "attachCost"       : 2e-5,
+    "serialCellCost"   : 1e-6 }
+
+# getScoreType----------------------------------------------------------------------------
+@pytest.mark.parametrize("params, expected", [
+    (("ACGT", "AC", 2, 1, 1), uint8),
+    (("A" * 200, "C" * 200, 2, 1, 1), uint16),
+    (("A" * 10, "C" * 10, 10_000, 1, 1), uint32)])
+def test_getScoreType(params, expected):
+    assert getScoreType(params) == expected
+
+# The scores are bounded by the best pair of the matrix, not by the match score:
+def test_getScoreTypeSubstitutions():
+    substitutions = tuple(tuple(300 if i == j else -1 for j in range(15)) for i in range(15))
+    assert getScoreType(("ACGT", "AC", 2, 1, 1, 1, substitutions)) == uint16
+
+# estimateSerialFillTime------------------------------------------------------------------
+def test_estimateSerialFillTime():
+    assert estimateSerialFillTime((11, 101), RESULTS) == pytest.approx(10 * 100 * 1e-6)
+
+# estimateTileFillTime--------------------------------------------------------------------
+def test_estimateTileFillTimeSerial():
+    assert estimateTileFillTime((11, 101), DEFAULT_TILE_SIZE, 1, RESULTS) == pytest.approx(10 * (2e-5 + 100 * 5e-8))
+
+def test_estimateTileFillTimeScaling():
+    shape = (5001, 5001)
+    assert estimateTileFillTime(shape, 256, 8, RESULTS) < estimateTileFillTime(shape, 256, 2, RESULTS)
+
+# chooseRunConfig-------------------------------------------------------------------------
+# Tiny inputs are filled faster a cell at a time than by the kernel:
+def test_chooseRunConfigSmall():
+    assert chooseRunConfig(("ACGT", "AC", 2, 1, 1), RESULTS, 8) == \
+        (Backend.Serial, 0, DEFAULT_TILE_SIZE, dtype(uint8), 1)
+
+def test_chooseRunConfigMedium():
+    assert chooseRunConfig(("A" * 100, "C" * 100, 2, 1, 1), RESULTS, 8) == \
+        (Backend.Thread, 0, DEFAULT_TILE_SIZE, dtype(uint8), 1)
+
+def test_chooseRunConfigLarge():
+    backend, windowSize, tileSize, scoreType, workersAmt = chooseRunConfig(
+        ("A" * 5000, "C" * 5000, 2, 1, 1), RESULTS, 8)
+
+    assert (backend, windowSize, scoreType, workersAmt) == (Backend.Thread, 0, uint16, 8)
+    assert tileSize in AUTOTUNE_TILE_SIZES
+
+def test_chooseRunConfigSingleCore():
+    assert chooseRunConfig(("A" * 5000, "C" * 5000, 2, 1, 1), RESULTS, 1)[4] == 1
+
+# loadAutotuneResults---------------------------------------------------------------------
+def test_loadAutotuneResultsCached(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    results = loadAutotuneResults(path)
+    assert results["machine"] == getMachineId()
+    # A cached file with this machine's id is used as it is:
+    with open(path, 'w') as fd: dump(dict(RESULTS, machine = getMachineId()), fd)
+    assert loadAutotuneResults(path)["kernelRowCost"] == RESULTS["kernelRowCost"]
+
+# Results cached before the serial engine was measured are measured again:
+def test_loadAutotuneResultsIncomplete(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    results = { key : value for key, value in RESULTS.items() if key != "serialCellCost" }
+    with open(path, 'w') as fd: dump(dict(results, machine = getMachineId()), fd)
+    assert loadAutotuneResults(path)["serialCellCost"] > 0
+
+def test_loadAutotuneResultsOtherMachine(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    with open(path, 'w') as fd: dump(RESULTS, fd)
+    assert loadAutotuneResults(path)["machine"] == getMachineId()
+
+def test_loadAutotuneResultsCorrupted(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    with open(path, 'w') as fd: fd.write("{foo")
+    assert loadAutotuneResults(path)["machine"] == getMachineId()
+
+# getRunConfig----------------------------------------------------------------------------
+def test_getRunConfigManual():
+    assert getRunConfig(("ACGT", "AC", 2, 1, 1), Backend.Process, 10, 4) == \
+        (Backend.Process, 10, DEFAULT_TILE_SIZE, dtype(uint32), 4)
+
+# The serial backend never has more than one worker:
+def test_getRunConfigSerial():
+    assert getRunConfig(("ACGT", "AC", 2, 1, 1), Backend.Serial, 0, 4) == \
+        (Backend.Serial, 0, DEFAULT_TILE_SIZE, dtype(uint32), 1)
@@ -0,0 +1,144 @@
+from para_seq.local_alignment   import createLocalMatrices, fillTile, findLocalAlignments
+from para_seq.batched_alignment import *
+from para_seq.input_manager     import parseSubstitutionMatrix
+from para_seq                   import Backend
+from numpy                      import uint32
+import pytest
+
+TARGET = "ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG"
+QUERIES = ["AAAATTTAAAAA", "CTG", "GCTAGCTA", "TTTTTTTT", "CGATCGTTAGCA", "A", "GGGGG"]
+# Transitions cost less than transversions, any N is neutral:
+SUBSTITUTIONS = parseSubstitutionMatrix(
+    "   A  C  G  T  N\nA  3 -3 -1 -3  0\nC -3  3 -3 -1  0\nG -1 -3  3 -3  0\nT -3 -1 -3  3  0\nN  0  0  0  0  0", 3, 3)
+
+# The maxima of the classic kernel on the whole matrices:
+def getFillTileMaxScore(targetSeq:str, querySeq:str, scores:tuple[int, int, int]) -> int:
+    scoreMatrix, dirsMatrix = createLocalMatrices((len(querySeq) + 1, len(targetSeq) + 1), uint32)
+    fillTile(scoreMatrix, dirsMatrix, (1, len(querySeq) + 1, 1, len(targetSeq) + 1),
+        encodeSeq(targetSeq), encodeSeq(querySeq), *scores)
+    return int(scoreMatrix.max())
+
+# bucketQueries---------------------------------------------------------------------------
+def test_bucketQueries():
+    assert bucketQueries([5, 1, 3, 2, 4], 2) == [[1, 3], [2, 4], [0]]
+
+def test_bucketQueriesEmpty():
+    assert bucketQueries([], 4) == []
+
+# getBatchLanesAmt------------------------------------------------------------------------
+def test_getBatchLanesAmt():
+    assert getBatchLanesAmt(0) == BATCH_MAX_LANES
+    assert getBatchLanesAmt(BATCH_MAX_CELLS // 3 - 1) == 3
+    assert getBatchLanesAmt(BATCH_MAX_CELLS * 2) == 1
+
+# stackQueries----------------------------------------------------------------------------
+def test_stackQueries():
+    lanes, queryLens = stackQueries([encodeSeq("ACG"), encodeSeq("T")])
+    assert lanes.tolist() == [[65, 67, 71], [84, 0, 0]]
+    assert queryLens.tolist() == [3, 1]
+
+# fillQueryLanes--------------------------------------------------------------------------
+@pytest.mark.parametrize("scores", [(2, 2, 1), (1, 3, 5), (3, 1, 0), (0, 1, 1)])
+def test_fillQueryLanes(scores):
+    maxScores, firstEnds, lastEnds = fillQueryLanes(encodeSeq(TARGET),
+        *stackQueries([encodeSeq(query) for query in QUERIES]), *scores)
+
+    assert maxScores.tolist() == [getFillTileMaxScore(TARGET, query, scores) for query in QUERIES]
+    assert (firstEnds <= lastEnds).all()
+
+def test_fillQueryLanesEnds():
+    maxScores, firstEnds, lastEnds = fillQueryLanes(encodeSeq("CTGAACTG"),
+        *stackQueries([encodeSeq("CTG"), encodeSeq("AA")]), 1, 1, 1)
+
+    assert maxScores.tolist() == [3, 2]
+    assert firstEnds.tolist() == [3, 5]
+    assert lastEnds.tolist() == [8, 5]
+
+def test_fillQueryLanesSubstitutions():
+    queries = [*QUERIES, "CGATNGTTRGCA", "NNNN"]
+    maxScores, firstEnds, lastEnds = fillQueryLanes(encodeSeq(TARGET),
+        *stackQueries([encodeSeq(query) for query in queries]), 3, 3, 2, substitutions = SUBSTITUTIONS)
+
+    assert maxScores.tolist() == [getFillTileMaxScore(TARGET, query, (3, 3, 2, None, SUBSTITUTIONS)) for query in queries]
+    assert (firstEnds <= lastEnds).all()
+
+# getTracebackWindow----------------------------------------------------------------------
+def test_getTracebackWindow():
+    # The maximum span is 3 + 2 * 3 // 1 = 9:
+    assert getTracebackWindow(3, 2, 1, 20, 30) == (11, 30)
+    assert getTracebackWindow(3, 2, 1, 4, 30) == (0, 30)
+    assert getTracebackWindow(3, 2, 0, 20, 30) == (0, 30)
+
+# findBatchedLocalAlignments--------------------------------------------------------------
+@pytest.mark.parametrize("scores", [(2, 2, 1), (1, 3, 5), (3, 1, 2), (0, 1, 1)])
+@pytest.mark.parametrize("workersAmt", [1, 2])
+def test_findBatchedLocalAlignments(scores, workersAmt):
+    results = findBatchedLocalAlignments(TARGET, QUERIES, *scores, workersAmt = workersAmt)
+    for query, (maxScore, alignments) in zip(QUERIES, results):
+        expectedScore, expectedAlignments = findLocalAlignments((TARGET, query, *scores), backend = Backend.Thread)
+        assert maxScore == expectedScore
+        assert sorted(alignments) == sorted(expectedAlignments)
+
+@pytest.mark.parametrize("workersAmt", [1, 2])
+def test_findBatchedLocalAlignmentsSubstitutions(workersAmt):
+    queries = [*QUERIES, "CGATNGTTRGCA"]
+    results = findBatchedLocalAlignments(TARGET, queries, 3, 3, 2, substitutions = SUBSTITUTIONS, workersAmt = workersAmt)
+    for query, (maxScore, alignments) in zip(queries, results):
+        expectedScore, expectedAlignments = findLocalAlignments((TARGET, query, 3, 3, 2, 2, SUBSTITUTIONS),
+            backend = Backend.Thread)
+        assert maxScore == expectedScore
+        assert sorted(alignments) == sorted(expectedAlignments)
+
+def test_findBatchedLocalAlignmentsMinScore():
+    results = findBatchedLocalAlignments(TARGET, QUERIES, 2, 2, 1, minScore = 10, workersAmt = 1)
+    # The scores are always computed, only the alignments are skipped:
+    assert [maxScore for maxScore, _ in results] == [getFillTileMaxScore(TARGET, query, (2, 2, 1)) for query in QUERIES]
+    assert all(bool(alignments) == (maxScore >= 10) for maxScore, alignments in results)
+
+def test_findBatchedLocalAlignmentsTracebackChunks(monkeypatch):
+    results = findBatchedLocalAlignments(TARGET, QUERIES, 2, 2, 1, workersAmt = 1)
+    # Every query gets its own chunk of matrices:
+    monkeypatch.setattr("para_seq.batched_alignment.BATCH_TRACEBACK_CELLS", 1)
+    assert findBatchedLocalAlignments(TARGET, QUERIES, 2, 2, 1, workersAmt = 1) == results
+
+# main------------------------------------------------------------------------------------
+def test_main(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    queriesPath, outputPath = tmp_path / "queries.fa", tmp_path / "out" / "batch.tsv"
+    queriesPath.write_text(">hit\nctg\n>miss\nGGGG\n")
+    main(("CTGAACTGTT", str(queriesPath), "-m", '3', "-mm", '3', "-g", '1',
+        "--min-score", '4', "-o", str(outputPath), "-j", '1'))
+
+    assert outputPath.read_text().splitlines() == [
+        "hit\t9\t1\t1\t3\t3\t3M",
+        "hit\t9\t6\t1\t8\t3\t3M",
+        "miss\t3"]
+    assert "1 queries have alignments" in capsys.readouterr().out
+
+def test_mainSubstitutionMatrix(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    queriesPath, matrixPath, outputPath = tmp_path / "queries.fa", tmp_path / "matrix.txt", tmp_path / "batch.tsv"
+    queriesPath.write_text(">ambiguous\nCNG\n")
+    matrixPath.write_text("   T\nN  3\n")
+    main(("CTGAACTGTT", str(queriesPath), "-m", '3', "-mm", '3', "-g", '1',
+        "-sm", str(matrixPath), "-o", str(outputPath), "-j", '1'))
+
+    assert outputPath.read_text().splitlines() == [
+        "ambiguous\t9\t1\t1\t3\t3\t3M",
+        "ambiguous\t9\t6\t1\t8\t3\t3M"]
+
+def test_mainPrefilter(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    queriesPath, outputPath = tmp_path / "queries.fa", tmp_path / "batch.tsv"
+    queriesPath.write_text(">inside\nCGATCGTTAGCATCG\n>outside\nTTTTTTTTTTTTTTT\n>short\nACG\n")
+    main((TARGET, str(queriesPath), "-m", '2', "-mm", '2', "-g", '1', "--min-similarity", '0.5',
+        "--kmer-size", '8', "-o", str(outputPath), "-j", '1'))
+
+    # The unrelated query is skipped, the one too short to be sketched is kept:
+    assert {tuple(line.split("\t")[:2]) for line in outputPath.read_text().splitlines()} == \
+        {("inside", "30"), ("short", "6")}
+    assert "Skipped 1 of 3 queries" in capsys.readouterr().out
+
+@pytest.mark.parametrize("option", [("--min-similarity", "2"), ("--kmer-size", "33"), ("--sketch-scale", "0")])
+def test_mainInvalidSketchOptions(tmp_path, option):
+    with pytest.raises(SystemExit): main((TARGET, str(tmp_path / "queries.fa"), "-m", '2', "-mm", '2', "-g", '1', *option))
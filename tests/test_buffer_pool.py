@@ -0,0 +1,91 @@
+from para_seq.buffer_pool          import *
+from numpy                         import uint32
+from contextlib                    import closing
+from multiprocessing.shared_memory import SharedMemory
+import pytest
+
+@pytest.fixture
+def pool():
+    with closing(SharedBufferPool()) as pool: yield pool
+
+def isDestroyed(name:str) -> bool:
+    try: SharedMemory(name).close()
+    except FileNotFoundError: return True
+    return False
+
+# getSegmentSize--------------------------------------------------------------------------
+def test_getSegmentSize():
+    assert getSegmentSize(1) == SHARED_POOL_MIN_SEGMENT
+    assert getSegmentSize(SHARED_POOL_MIN_SEGMENT + 1) == 2 * SHARED_POOL_MIN_SEGMENT
+    assert getSegmentSize(2**20) == 2**20
+
+# getFreeMemory---------------------------------------------------------------------------
+def test_getFreeMemory():
+    freeMemory = getFreeMemory()
+    assert freeMemory is None or freeMemory >= 0
+
+# SharedBufferPool------------------------------------------------------------------------
+def test_SharedBufferPoolMatrices(pool):
+    scoreMatrix, dirsMatrix, names = pool.acquireMatrices((3, 4), uint32)
+    assert scoreMatrix.shape == dirsMatrix.shape == (3, 4)
+    assert scoreMatrix.dtype == uint32 and dirsMatrix.dtype == uint8
+    assert scoreMatrix[0].sum() == scoreMatrix[:, 0].sum() == 0
+
+    # Processes find the matrices by the names of their segments:
+    segment = SharedMemory(names[0])
+    assert ndarray((3, 4), dtype = uint32, buffer = segment.buf) is not None
+    segment.close()
+
+def test_SharedBufferPoolReuse(pool):
+    scoreMatrix, dirsMatrix, names = pool.acquireMatrices((30, 40), uint32)
+    scoreMatrix.fill(7)
+    dirsMatrix.fill(7)
+    pool.releaseMatrices(names)
+
+    # Another shape of the same size class gets the same segments, only the first row and
+    # column are reset:
+    scoreMatrix, dirsMatrix, otherNames = pool.acquireMatrices((40, 30), uint32)
+    assert set(otherNames) == set(names)
+    assert not scoreMatrix[0].any() and not scoreMatrix[:, 0].any() and not dirsMatrix[0].any()
+    assert scoreMatrix[1:, 1:].any() and dirsMatrix[1:, 1:].any()
+
+def test_SharedBufferPoolSizeClasses(pool):
+    segment = pool.acquireSegment(SHARED_POOL_MIN_SEGMENT)
+    pool.releaseSegment(segment.name)
+    assert pool.acquireSegment(2 * SHARED_POOL_MIN_SEGMENT).name != segment.name
+    assert pool.acquireSegment(SHARED_POOL_MIN_SEGMENT // 2).name == segment.name
+
+def test_SharedBufferPoolBusy(pool):
+    segment = pool.acquireSegment(100)
+    assert pool.acquireSegment(100).name != segment.name # Never lent twice
+
+def test_SharedBufferPoolMaxIdle():
+    with closing(SharedBufferPool(maxIdleBytes = 2 * SHARED_POOL_MIN_SEGMENT)) as pool:
+        segments = [pool.acquireSegment(100) for _ in range(3)]
+        for segment in segments: pool.releaseSegment(segment.name)
+
+        # The least recently used segment is destroyed:
+        assert list(pool.idleSegments) == [segment.name for segment in segments[1:]]
+        assert pool.getIdleBytes() == 2 * SHARED_POOL_MIN_SEGMENT
+        assert isDestroyed(segments[0].name)
+
+def test_SharedBufferPoolMemoryPressure(pool, monkeypatch):
+    small, large = pool.acquireSegment(100), pool.acquireSegment(2 * SHARED_POOL_MIN_SEGMENT)
+    pool.releaseSegment(small.name)
+    pool.releaseSegment(large.name)
+
+    # Idle segments make room for a new one when the free memory can't fit it:
+    monkeypatch.setattr("para_seq.buffer_pool.getFreeMemory", lambda: 0)
+    newSegment = pool.acquireSegment(4 * SHARED_POOL_MIN_SEGMENT)
+    assert not pool.idleSegments and list(pool.busySegments) == [newSegment.name]
+    assert isDestroyed(small.name) and isDestroyed(large.name)
+
+def test_SharedBufferPoolClose():
+    pool = SharedBufferPool()
+    *_, names = pool.acquireMatrices((3, 4), uint32)
+    idleSegment = pool.acquireSegment(100)
+    pool.releaseSegment(idleSegment.name)
+    pool.close()
+
+    # The segments still in use are destroyed too:
+    assert all(isDestroyed(name) for name in (*names, idleSegment.name))
@@ -0,0 +1,98 @@
+from para_seq.local_alignment        import findLocalAlignments, createLocalMatrices, fillMatrices
+from para_seq.checkpointed_alignment import *
+from para_seq.progress               import FillCancelledErr, FillMonitor
+import pytest
+
+PARAMS = ("ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG", "AAAATTTAAAAA", 2, 2, 1)
+
+# getCheckpointInterval-------------------------------------------------------------------
+def test_getCheckpointInterval():
+    assert getCheckpointInterval(101) == 10
+
+def test_getCheckpointIntervalSmall():
+    assert getCheckpointInterval(2) == 1
+
+# estimateCheckpointedMemory--------------------------------------------------------------
+def test_estimateCheckpointedMemory():
+    # 10 checkpoint rows of 4-byte scores, plus 8 blocks of 11 rows of 5 bytes per cell:
+    assert estimateCheckpointedMemory((101, 100), 10, uint32) == 10 * 100 * 4 + 8 * 11 * 100 * 5
+
+def test_estimateCheckpointedMemoryAffine():
+    # Each checkpoint row also keeps its vertical gap scores:
+    assert estimateCheckpointedMemory((101, 100), 10, uint32, isAffine = True) == 2 * 10 * 100 * 4 + 8 * 11 * 100 * 5
+
+# fillCheckpoints-------------------------------------------------------------------------
+@pytest.mark.parametrize("interval", [1, 3, 5, 12])
+def test_fillCheckpoints(interval):
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    maxScore = fillMatrices(PARAMS, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    checkpointedMaxScore, checkpoints, maxCells = fillCheckpoints(PARAMS, interval)
+
+    assert checkpointedMaxScore == maxScore
+    assert (checkpoints == scoreMat[0:12:interval]).all()
+    assert maxCells == [(int(y), int(x)) for y, x in argwhere(scoreMat == maxScore)]
+
+def test_fillCheckpointsAffine():
+    params = (*PARAMS[:4], 3, 1)
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    maxScore = fillMatrices(params, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    checkpointedMaxScore, checkpoints, _ = fillCheckpoints(params, 5)
+
+    assert checkpointedMaxScore == maxScore
+    assert checkpoints.shape == (3, 2, len(PARAMS[0]) + 1)
+    assert (checkpoints[:, 0] == scoreMat[0:12:5]).all()
+
+# Every band of rows is a wave:
+def test_fillCheckpointsMonitor():
+    reports = []
+    fillCheckpoints(PARAMS, 5, monitor = FillMonitor(reports.append))
+    assert [report[:4] for report in reports] == [(5 * len(PARAMS[0]), 12 * len(PARAMS[0]), 1, 3),
+        (10 * len(PARAMS[0]), 12 * len(PARAMS[0]), 2, 3), (12 * len(PARAMS[0]), 12 * len(PARAMS[0]), 3, 3)]
+
+def test_findCheckpointedLocalAlignmentsCancel():
+    monitor = FillMonitor()
+    monitor.cancel()
+    with pytest.raises(FillCancelledErr): findCheckpointedLocalAlignments(PARAMS, interval = 5, monitor = monitor)
+
+# createBlockLoader-----------------------------------------------------------------------
+def test_createBlockLoader():
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    fillMatrices(PARAMS, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    _, checkpoints, _ = fillCheckpoints(PARAMS, 5)
+    loadBlock = createBlockLoader(PARAMS, checkpoints, 5)
+
+    # The last block is cut short at the end of the matrices:
+    scoreBlock, dirsBlock = loadBlock(2)
+    assert (scoreBlock == scoreMat[10:13]).all() and (dirsBlock[1:] == dirsMat[11:13]).all()
+    assert loadBlock(2) is loadBlock(2) # Not recomputed
+
+# BlockMatrixView-------------------------------------------------------------------------
+def test_BlockMatrixView():
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    fillMatrices(PARAMS, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    _, checkpoints, _ = fillCheckpoints(PARAMS, 5)
+    loadBlock = createBlockLoader(PARAMS, checkpoints, 5)
+    scoreView, dirsView = BlockMatrixView(loadBlock, 5, 0), BlockMatrixView(loadBlock, 5, 1)
+
+    assert all(scoreView[y, x] == scoreMat[y, x] and dirsView[y, x] == dirsMat[y, x]
+        for y in range(13) for x in range(0, len(PARAMS[0]) + 1, 7))
+
+# findCheckpointedLocalAlignments---------------------------------------------------------
+@pytest.mark.parametrize("params", [
+    PARAMS,
+    ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1),
+    ("AAAAAAAAAAAA", "AAAA", 1, 1, 0),
+    ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTGGACTTAAGCTG", 3, 3, 1),
+    (*PARAMS[:4], 3, 1),
+    ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTGGACTTAAGCTG", 3, 3, 5, 0)])
+def test_findCheckpointedLocalAlignments(params):
+    expected = findLocalAlignments(params, backend = Backend.Thread, workersAmt = 1)
+    assert findCheckpointedLocalAlignments(params, workersAmt = 1) == expected
+    assert findCheckpointedLocalAlignments(params, interval = 2, workersAmt = 1) == expected
+
+def test_findCheckpointedLocalAlignmentsStream():
+    maxScore, alignments = findCheckpointedLocalAlignments(PARAMS, workersAmt = 1, doStream = True)
+    assert (maxScore, list(alignments)) == findLocalAlignments(PARAMS, backend = Backend.Thread)
+
+def test_findCheckpointedLocalAlignmentsZeroScore():
+    assert findCheckpointedLocalAlignments(("AAAA", "CC", 2, 2, 1)) == (0, [])
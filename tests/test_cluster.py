@@ -0,0 +1,124 @@
+from para_seq.local_alignment    import findLocalAlignments
+from para_seq.windowed_alignment import getWindowParams
+from para_seq.cluster            import *
+from para_seq                    import Backend
+from multiprocessing             import Process
+from contextlib                  import closing
+from time                        import sleep
+from threading                   import Thread
+import pytest
+
+PARAMS = ("ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG", "AAAATTTAAAAA", 2, 2, 1)
+AUTHKEY = b"test key"
+
+@pytest.fixture
+def coordinator():
+    coordinator = ClusterCoordinator(AUTHKEY, host = "127.0.0.1", port = 0, workerTimeout = 0.5)
+    with closing(coordinator): yield coordinator
+
+def startWorkers(address:Address, workersAmt:int) -> list[Process]:
+    workers = [Process(target = runWorker, args = (address, AUTHKEY)) for _ in range(workersAmt)]
+    for worker in workers: worker.start()
+    return workers
+
+# TaskBoard-------------------------------------------------------------------------------
+def test_TaskBoard():
+    board = TaskBoard()
+    roundId = board.startRound("score", PARAMS, uint32, [(0, 4), (2, 6)])
+
+    # Only the first task of the round comes with the round info:
+    assert board.takeTask("a", 0) == (roundId, 0, (0, 4), ("score", PARAMS, uint32))
+    assert board.takeTask("a", roundId) == (roundId, 1, (2, 6), None)
+    assert board.takeTask("a", roundId) is None
+
+    board.putResult("a", roundId, 1, 5)
+    assert board.collectResults(roundId) == ("", None)
+    board.putResult("a", roundId, 0, 3)
+    assert board.collectResults(roundId) == ("", [3, 5])
+
+def test_TaskBoardLostWorker():
+    board = TaskBoard(workerTimeout = 0.05)
+    roundId = board.startRound("score", PARAMS, uint32, [(0, 4)])
+    board.takeTask("a", 0)
+    sleep(0.1)
+
+    # The silent worker's task is handed out again, and the first result wins:
+    assert board.takeTask("b", 0)[:3] == (roundId, 0, (0, 4))
+    board.putResult("a", roundId, 0, 3)
+    board.putResult("b", roundId, 0, 4)
+    assert board.collectResults(roundId) == ("", [3])
+
+def test_TaskBoardStaleRound():
+    board = TaskBoard()
+    roundId = board.startRound("score", PARAMS, uint32, [(0, 4)])
+    board.takeTask("a", 0)
+    newRoundId = board.startRound("align", PARAMS, uint32, [(0, 4, 4, 4)])
+
+    board.putResult("a", roundId, 0, 3)
+    assert board.collectResults(newRoundId) == ("", None)
+
+def test_TaskBoardError():
+    board = TaskBoard()
+    roundId = board.startRound("score", PARAMS, uint32, [(0, 4)])
+    board.takeTask("a", 0)
+    board.putResult("a", roundId, 0, None, "boom")
+    assert board.collectResults(roundId) == ("boom", [None])
+
+# getClusterKey---------------------------------------------------------------------------
+def test_getClusterKey(monkeypatch):
+    monkeypatch.setenv(CLUSTER_KEY_ENV_VAR, "secret")
+    assert getClusterKey() == b"secret"
+
+def test_getClusterKeyMissing(monkeypatch):
+    monkeypatch.delenv(CLUSTER_KEY_ENV_VAR, raising = False)
+    with pytest.raises(ClusterErr): getClusterKey()
+
+# address---------------------------------------------------------------------------------
+def test_address():
+    assert address("node1:52438") == ("node1", 52438)
+
+@pytest.mark.parametrize("value", ["node1", ":52438", "node1:port", "node1:-1"])
+def test_addressInvalid(value):
+    with pytest.raises(ValueError): address(value)
+
+# findDistributedLocalAlignments----------------------------------------------------------
+def test_findDistributedLocalAlignments(coordinator):
+    workers = startWorkers(coordinator.address, 3)
+    assert findDistributedLocalAlignments(PARAMS, 1, coordinator) == \
+        findLocalAlignments(PARAMS, backend = Backend.Thread)
+
+    # The workers exit once the coordinator is done:
+    coordinator.close()
+    for worker in workers:
+        worker.join(5)
+        assert worker.exitcode == 0
+
+def test_findDistributedLocalAlignmentsLostWorker(coordinator):
+    windows = getAnalysisWindows(PARAMS, 1)
+    results = []
+    thread = Thread(target = lambda: results.append(coordinator.runTasks("score", PARAMS, uint32, windows)))
+    thread.start()
+
+    # A worker takes the first window and is never heard from again:
+    while coordinator.board.takeTask("lost", 0) is None: sleep(0.01)
+    workers = startWorkers(coordinator.address, 2)
+    try: thread.join()
+    finally:
+        for worker in workers: worker.terminate()
+
+    windowParams = getWindowParams(PARAMS)
+    assert results == [[computeWindowMaxScore(*window, windowParams) for window in windows]]
+
+def test_findDistributedLocalAlignmentsError(coordinator):
+    workers = startWorkers(coordinator.address, 1)
+    try:
+        with pytest.raises(ClusterErr) as errInfo: coordinator.runTasks("score", PARAMS, uint32, [(0, "x")])
+        assert "a worker couldn't run its task" in str(errInfo.value)
+
+    finally:
+        for worker in workers: worker.terminate()
+
+# runWorker-------------------------------------------------------------------------------
+def test_runWorkerNoCoordinator():
+    with pytest.raises(ClusterErr) as errInfo: runWorker(("127.0.0.1", 1), AUTHKEY, connectTimeout = 0)
+    assert "127.0.0.1:1" in str(errInfo.value)
@@ -0,0 +1,94 @@
+from para_seq.differential    import *
+from para_seq.local_alignment import getGapExtension
+from numpy.random             import default_rng
+import pytest
+
+# The resumable engine keeps its fills in the user cache folder:
+@pytest.fixture(autouse = True)
+def cacheDir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+# The engines in this process, the pools of processes are much slower to start:
+IN_PROCESS_ENGINES = [engineName for engineName in DIFFERENTIAL_ENGINES if "process" not in engineName]
+
+# generateSeqPair-------------------------------------------------------------------------
+def test_generateSeqPair():
+    for _ in range(200):
+        targetSeq, querySeq = generateSeqPair(default_rng(0), 10)
+        assert 1 <= len(targetSeq) <= 10 and 1 <= len(querySeq) <= 10
+        assert set(targetSeq + querySeq) <= set(IUPAC_NUCLEOTIDES)
+
+def test_generateSeqPairSeed():
+    assert generateSeqPair(default_rng(7)) == generateSeqPair(default_rng(7))
+
+# generateAnalysisParams------------------------------------------------------------------
+# Every kind of scores shows up, and they're always valid:
+def test_generateAnalysisParams():
+    rng = default_rng(0)
+    analyses = [generateAnalysisParams(rng) for _ in range(100)]
+    assert any(len(params) == 5 for params in analyses)
+    assert any(getGapExtension(params) is not None for params in analyses)
+    assert any(len(params) == 7 for params in analyses)
+    for params in analyses:
+        assert all(score > 0 for score in params[2:6])
+        assert getGapExtension(params) is None or getGapExtension(params) <= params[4]
+
+# runEngine-------------------------------------------------------------------------------
+def test_runEngine():
+    assert runEngine("thread", ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1)) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
+
+# The batched kernel only knows linear gaps:
+def test_runEngineUnsupported():
+    assert runEngine("batched", ("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1)) is None
+
+# compareEngines--------------------------------------------------------------------------
+def test_compareEngines():
+    params = ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTG", 3, 3, 1)
+    reference, discrepancies = compareEngines(params)
+    assert discrepancies == {}
+    assert reference[0] == 8 and len(reference[1]) == 7
+
+def test_compareEnginesDiscrepancy(monkeypatch):
+    def dropFirstAlignment(params):
+        maxScore, alignments = DIFFERENTIAL_ENGINES["thread"](params)
+        return maxScore, alignments[1:]
+
+    monkeypatch.setitem(DIFFERENTIAL_ENGINES, "broken", dropFirstAlignment)
+    params = ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTG", 3, 3, 1)
+    reference, discrepancies = compareEngines(params, ["thread", "broken"])
+    assert list(discrepancies) == ["broken"]
+    maxScore, alignments = discrepancies["broken"]
+    assert maxScore == reference[0] and len(alignments) == len(reference[1]) - 1
+
+# fuzzEngines-----------------------------------------------------------------------------
+@pytest.mark.parametrize("seed", range(4))
+def test_fuzzEngines(seed):
+    assert list(fuzzEngines(50, seed = seed, engineNames = IN_PROCESS_ENGINES)) == []
+
+def test_fuzzEnginesProcesses():
+    assert list(fuzzEngines(15, seed = 4, engineNames = ["process", "windowed-process"])) == []
+
+# Longer sequences go through more tiles, windows and bands of rows:
+def test_fuzzEnginesLong():
+    assert list(fuzzEngines(5, seed = 5, maxSeqLen = 150, engineNames = IN_PROCESS_ENGINES)) == []
+
+# describeDiscrepancy---------------------------------------------------------------------
+def test_describeDiscrepancy():
+    params = ("ACGT", "CG", 1, 1, 1)
+    assert describeDiscrepancy(params, (2, [(2, 1, 3, 2, "2M")]), { "broken" : (1, []) }) == \
+        "ACGT CG 1, 1, 1\n  serial: score 2, 1 alignments, 2M@2,1\n  broken: score 1, 0 alignments, "
+
+# main------------------------------------------------------------------------------------
+def test_main(capsys):
+    main(("-n", '3', "-e", "thread", "batched"))
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert out == "Checking 2 engines against the serial one on 3 random analyses...\n" \
+        "All done! The engines agree on all the 3 analyses.\n"
+
+def test_mainDiscrepancy(capsys, monkeypatch):
+    monkeypatch.setitem(DIFFERENTIAL_ENGINES, "thread", lambda params: (0, []))
+    with pytest.raises(DiscrepancyErr) as errInfo: main(("-n", '3', "-s", '1', "-e", "thread"))
+    assert str(errInfo.value) == DISCREPANCY_PREFIX + \
+        ": they disagree on 3 of 3 analyses, rerun with seed 1 to reproduce them."
+    assert capsys.readouterr()[0].count("  thread: score 0, 0 alignments") == 3
@@ -3,4 +3,11 @@ from src.para_seq.__init__ import *
 # SeqName---------------------------------------------------------------------------------
 def test_SeqName():
     assert SeqName.Target.id == 't'
-    assert SeqName.Query.id  == 'q'
\ No newline at end of file
+    assert SeqName.Query.id  == 'q'
+
+# Backend---------------------------------------------------------------------------------
+def test_Backend():
+    assert Backend("thread")  == Backend.Thread
+    assert Backend("process") == Backend.Process
+    assert Backend("auto")    == Backend.Auto
+    assert Backend("serial")  == Backend.Serial
@@ -1,7 +1,22 @@
 from src.para_seq import UINT_ERR
 from para_seq.input_manager import *
+from os import chmod, listdir
+from gzip import open as gzipOpen
+from os.path import dirname
 import pytest
 
+# FASTA indexes are built in the user cache folder, every test gets its own:
+@pytest.fixture(autouse = True)
+def cacheDir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+@pytest.fixture
+def fastaPath(tmp_path):
+    path = tmp_path / "seqs.fa"
+    path.write_text(">first sample\nACGTAC\nGT\n>second\nggcc\n>third\nTTAA") # No trailing newline
+    return str(path)
+
 # isValidFastaFilePath--------------------------------------------------------------------
 def test_isValidFastaFilePathEmpty():
     assert not isValidFastaFilePath("")
@@ -18,6 +33,21 @@ def test_isValidFastaFilePathShort():
 def test_isValidFastaFilePathTechnically():
     assert isValidFastaFilePath(".fa")
 
+def test_isValidFastaFilePathGzip():
+    assert isValidFastaFilePath("file.FASTA.gz")
+
+def test_isValidFastaFilePathOtherGzip():
+    assert not isValidFastaFilePath("file.txt.gz")
+
+# encodeDNA-------------------------------------------------------------------------------
+def test_encodeDNA():
+    assert encodeDNA("ACgtN").tobytes() == b"ACGTN"
+
+def test_encodeDNALong():
+    seq = "acgtn" * 200_000 + "U" + "X" * 10
+    with pytest.raises(InvalidSeqErr) as errInfo: encodeDNA(seq)
+    assert errInfo.value.msg == "found \"U\" at position 1000001"
+
 # isValidDNA------------------------------------------------------------------------------
 def test_isValidDNAEmpty():
     assert not isValidDNA("")
@@ -31,6 +61,9 @@ def test_isValidDNAMixedCase():
 def test_isValidDNAInvalid():
     assert not isValidDNA("ACTFG")
 
+def test_isValidDNAAmbiguous():
+    assert isValidDNA("ACGTRYSWKMBDHVNrysw")
+
 # uint------------------------------------------------------------------------------------
 @pytest.mark.parametrize("value", ["", "d", "d3", "2.2", "-1", "2e04"])
 def test_uintInvalid(value):
@@ -40,6 +73,115 @@ def test_uintInvalid(value):
 def test_uint():
     assert uint("12345") == 12345
 
+# positiveInt-----------------------------------------------------------------------------
+@pytest.mark.parametrize("value", ["", "0", "d", "2.2", "-1", "2e04"])
+def test_positiveIntInvalid(value):
+    with pytest.raises(ValueError) as errInfo: positiveInt(value)
+    assert str(errInfo.value) == POSITIVE_INT_ERR.format(value)
+
+def test_positiveInt():
+    assert positiveInt("8") == 8
+
+# memorySize------------------------------------------------------------------------------
+@pytest.mark.parametrize("value", ["", "G", "d", "2.5G", "-1", "12X", "1GB"])
+def test_memorySizeInvalid(value):
+    with pytest.raises(ValueError) as errInfo: memorySize(value)
+    assert str(errInfo.value) == MEMORY_SIZE_ERR.format(value)
+
+@pytest.mark.parametrize("value, expected", [
+    ("12345", 12345),
+    ("2K", 2048),
+    ("512m", 512 * 2**20),
+    ("16G", 16 * 2**30),
+    ("1T", 2**40)])
+def test_memorySize(value, expected):
+    assert memorySize(value) == expected
+
+# fraction--------------------------------------------------------------------------------
+@pytest.mark.parametrize("value", ["", "d", "-0.1", "1.5", "nan", "inf"])
+def test_fractionInvalid(value):
+    with pytest.raises(ValueError) as errInfo: fraction(value)
+    assert str(errInfo.value) == FRACTION_ERR.format(value)
+
+@pytest.mark.parametrize("value, expected", [("0", 0), ("0.25", 0.25), ("1", 1)])
+def test_fraction(value, expected):
+    assert fraction(value) == expected
+
+# getGapPenalties-------------------------------------------------------------------------
+def test_getGapPenalties():
+    assert getGapPenalties(3, 1) == (3, 1)
+
+@pytest.mark.parametrize("gapExtension", [None, 3])
+def test_getGapPenaltiesLinear(gapExtension):
+    assert getGapPenalties(3, gapExtension) == (3,)
+
+def test_getGapPenaltiesInvalid():
+    with pytest.raises(InvalidScoresErr) as errInfo: getGapPenalties(1, 3)
+    assert str(errInfo.value) == INVALID_SCORES_PREFIX + ": the gap extension penalty (3) is higher than the gap penalty (1), it can be at most as high."
+
+# getSubstitutionScores-------------------------------------------------------------------
+def test_getSubstitutionScores():
+    substitutions = getSubstitutionScores(2, 3)
+    assert len(substitutions) == len(IUPAC_NUCLEOTIDES)
+    assert all(len(row) == len(IUPAC_NUCLEOTIDES) for row in substitutions)
+    assert [substitutions[i][i] for i in range(4)] == [2, 2, 2, 2]
+    assert substitutions[0][1] == substitutions[1][0] == -3
+
+@pytest.mark.parametrize("nucleotide", ['N', 'R', 'B'])
+def test_getSubstitutionScoresAmbiguous(nucleotide):
+    index = IUPAC_NUCLEOTIDES.index(nucleotide)
+    substitutions = getSubstitutionScores(2, 3)
+    assert substitutions[index][index] == -3
+    assert {substitutions[index][0], substitutions[0][index]} == {-3}
+
+# parseSubstitutionMatrix-----------------------------------------------------------------
+def test_parseSubstitutionMatrix():
+    substitutions = parseSubstitutionMatrix("# Comment\n\n   a  C  N\nA  5 -4  0\nn  0  0 -1\n", 2, 3)
+    a, c, n = (IUPAC_NUCLEOTIDES.index(nucleotide) for nucleotide in "ACN")
+    assert (substitutions[a][a], substitutions[a][c], substitutions[a][n]) == (5, -4, 0)
+    assert (substitutions[n][a], substitutions[n][c], substitutions[n][n]) == (0, 0, -1)
+    # vvv Left out by the matrix
+    assert (substitutions[c][c], substitutions[c][a], substitutions[a][2]) == (2, -3, -3)
+
+def test_parseSubstitutionMatrixDefault():
+    assert parseSubstitutionMatrix("A C\n", 2, 3) == getSubstitutionScores(2, 3)
+
+@pytest.mark.parametrize("matrix, details", [
+    ("# Only a comment\n", "the matrix is empty"),
+    ("A C\nA 1 2\nU 1 2", "found \"U\" at line 3, expected an IUPAC nucleotide code"),
+    ("A c C\nA 1 2 3", "repeated nucleotide at line 1"),
+    ("A C\nA 1 2\na 1 2", "repeated nucleotide at line 3"),
+    ("A C\nA 1", "found 1 scores at line 2, expected 2, one per column"),
+    ("A C\nA 1 2.5", "found \"2.5\" at line 2, expected an integer score")])
+def test_parseSubstitutionMatrixInvalid(matrix, details):
+    with pytest.raises(InvalidMatrixErr) as errInfo: parseSubstitutionMatrix(matrix, 2, 3)
+    assert str(errInfo.value) == INVALID_MATRIX_PREFIX + f": {details}."
+
+# readSubstitutionMatrix------------------------------------------------------------------
+def test_readSubstitutionMatrix(tmp_path):
+    path = tmp_path / "matrix.txt"
+    path.write_text("   N\nN  1\n")
+    substitutions = readSubstitutionMatrix(str(path), 2, 3)
+    assert substitutions[-1][-1] == 1
+
+def test_readSubstitutionMatrixMissing(tmp_path):
+    path = str(tmp_path / "missing.txt")
+    with pytest.raises(InvalidFileErr) as errInfo: readSubstitutionMatrix(path, 2, 3)
+    assert f"\"{path}\" is not a readable substitution matrix file" in str(errInfo.value)
+
+# getScores-------------------------------------------------------------------------------
+def test_getScores():
+    assert getScores(2, 3, 4) == (2, 3, 4)
+    assert getScores(2, 3, 4, 1) == (2, 3, 4, 1)
+
+def test_getScoresSubstitutions():
+    substitutions = parseSubstitutionMatrix("N\nN 1", 2, 3)
+    assert getScores(2, 3, 4, None, substitutions) == (2, 3, 4, 4, substitutions)
+    assert getScores(2, 3, 4, 1, substitutions) == (2, 3, 4, 1, substitutions)
+
+def test_getScoresDefaultSubstitutions():
+    assert getScores(2, 3, 4, None, getSubstitutionScores(2, 3)) == (2, 3, 4)
+
 # validateDNA-----------------------------------------------------------------------------
 def test_validateDNA():
     assert validateDNA("ACGT") == "ACGT"
@@ -47,10 +189,53 @@ def test_validateDNA():
 def test_validateDNALower():
     assert validateDNA("acGt") == "ACGT"
 
-@pytest.mark.parametrize("seq", ["", "QWERTY", "GA.TC"])
-def test_validateDNAInvalid(seq):
+@pytest.mark.parametrize("seq, details", [
+    ("", "the sequence is empty"),
+    ("QWERTY", "found \"Q\" at position 1"),
+    ("GA.TC", "found \".\" at position 3"),
+    ("acgtà", "found \"à\" at position 5")])
+def test_validateDNAInvalid(seq, details):
     with pytest.raises(InvalidSeqErr) as errInfo: validateDNA(seq)
-    assert str(errInfo.value) == INVALID_SEQ_PREFIX + ": ."
+    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": {details}."
+
+# seqRef----------------------------------------------------------------------------------
+def test_seqRef():
+    assert seqRef("12") == 12
+
+def test_seqRefId():
+    assert seqRef("chr1") == "chr1"
+
+# getFastaIndexPath-----------------------------------------------------------------------
+def test_getFastaIndexPath(fastaPath, cacheDir):
+    assert getFastaIndexPath(fastaPath).startswith(str(cacheDir))
+    assert getFastaIndexPath(fastaPath) == getFastaIndexPath(fastaPath)
+
+def test_getFastaIndexPathChanged(fastaPath):
+    indexPath = getFastaIndexPath(fastaPath)
+    with open(fastaPath, 'a') as fd: fd.write("\n")
+    assert getFastaIndexPath(fastaPath) != indexPath
+
+# openFasta-------------------------------------------------------------------------------
+def test_openFasta(fastaPath):
+    seqs = openFasta(fastaPath)
+    assert [seq.seq for seq in seqs] == ["ACGTACGT", "ggcc", "TTAA"]
+    assert openFasta(fastaPath) is seqs # Kept open
+    assert sorted(listdir(dirname(fastaPath))) == ["cache", "seqs.fa"] # No index next to the file
+
+def test_openFastaGzip(fastaPath):
+    gzipPath = fastaPath + ".gz"
+    with open(fastaPath, 'rb') as fd, gzipOpen(gzipPath, 'wb') as gzipFd: gzipFd.write(fd.read())
+    seqs = openFasta(gzipPath)
+    assert seqs.is_gzip and seqs["third"].seq == "TTAA"
+
+def test_openFastaReadOnly(fastaPath):
+    with open(fastaPath) as fd: content = fd.read()
+    chmod(fastaPath, 0o444)
+    chmod(dirname(fastaPath), 0o555)
+    try: assert openFasta(fastaPath)[2].seq == "TTAA"
+    finally: chmod(dirname(fastaPath), 0o755)
+
+    with open(fastaPath) as fd: assert fd.read() == content # Untouched
 
 # parseFastaSeq---------------------------------------------------------------------------
 def test_parseFastaSeqEmpty(): # This should never happen normally
@@ -98,18 +283,40 @@ def test_parseFastaSeqMultiline():
 def test_parseFastaSeqHeaderOnly():
     path = TEST_DATA_PATH.format("header")
     with pytest.raises(InvalidSeqErr) as errInfo: parseFastaSeq(path, 1)
-    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": sequence at position 1 in FASTA file \"{path}\" is not valid DNA."
+    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": sequence at position 1 in FASTA file \"{path}\" is not valid DNA, the sequence is empty."
 
 def test_parseFastaSeqInvalid():
     path = TEST_DATA_PATH.format("bad")
     with pytest.raises(InvalidSeqErr) as errInfo: parseFastaSeq(path, 1)
-    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": sequence at position 1 in FASTA file \"{path}\" is not valid DNA."
+    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": sequence at position 1 in FASTA file \"{path}\" is not valid DNA, found \"Q\" at position 1."
 
 def test_parseFastaSeqOOB():
     path = TEST_DATA_PATH.format("good")
     with pytest.raises(MissingSeqErr) as errInfo: parseFastaSeq(path, 45)
     assert str(errInfo.value) == MISSING_SEQ_PREFIX + f": FASTA file \"{path}\" doesn't contain a sequence at position 45."
 
+def test_parseFastaSeqId(fastaPath):
+    assert parseFastaSeq(fastaPath, "second", "first") == ("GGCC", "ACGTACGT")
+
+def test_parseFastaSeqGzip(fastaPath):
+    gzipPath = fastaPath + ".gz"
+    with open(fastaPath, 'rb') as fd, gzipOpen(gzipPath, 'wb') as gzipFd: gzipFd.write(fd.read())
+    assert parseFastaSeq(gzipPath, "second", 1) == ("GGCC", "ACGTACGT")
+
+def test_parseFastaSeqMissingId(fastaPath):
+    with pytest.raises(MissingSeqErr) as errInfo: parseFastaSeq(fastaPath, "fourth")
+    assert str(errInfo.value) == MISSING_SEQ_PREFIX + f": FASTA file \"{fastaPath}\" doesn't contain a sequence with ID \"fourth\"."
+
+# parseFastaRecords-----------------------------------------------------------------------
+def test_parseFastaRecords(fastaPath):
+    assert parseFastaRecords(fastaPath) == [("first", "ACGTACGT"), ("second", "GGCC"), ("third", "TTAA")]
+
+def test_parseFastaRecordsInvalid(tmp_path):
+    path = tmp_path / "bad.fa"
+    path.write_text(">ok\nACGT\n>bad\nACXT\n")
+    with pytest.raises(InvalidSeqErr) as errInfo: parseFastaRecords(str(path))
+    assert f"sequence at position 2 in FASTA file \"{path}\" is not valid DNA" in str(errInfo.value)
+
 # parseSeq--------------------------------------------------------------------------------
 # Coverage is lower here as this function just calls other functions
 def test_parseSeqRaw():
@@ -122,7 +329,7 @@ def test_parseSeq():
 def test_parseSeqBadPath():
     with pytest.raises(InvalidSeqErr) as errInfo: parseSeq("good.fsta", 1, SeqName.Target)
     # ^^^ Bad file ext leads to interpreting this as DNA
-    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": Your \"{SeqName.Target.value}\" sequence is not valid DNA."
+    assert str(errInfo.value) == INVALID_SEQ_PREFIX + f": Your \"{SeqName.Target.value}\" sequence is not valid DNA, found \"o\" at position 2."
 
 def test_parseSeqOOB():
     path = TEST_DATA_PATH.format("good")
@@ -164,6 +371,32 @@ def test_setupArgParser():
     assert args.gap_penalty      == 4
     assert args.target_pos       == 5
 
+def test_setupArgParserIds():
+    args = setupArgParser().parse_args(('0', "-m", '2', "-mm", '3', "-g", '4', '-tp', "chr2", "-qp", '3'))
+    assert args.target_pos == "chr2"
+    assert args.query_pos  == 3
+
+def test_setupArgParserDefaults():
+    args = setupArgParser().parse_args(('0', '1', "-m", '2', "-mm", '3', "-g", '4'))
+    assert args.backend     == Backend.Auto
+    assert args.window_size == 0
+    assert not args.retune
+    assert args.max_memory  == 0
+    assert args.jobs        == 0
+    assert args.gap_extension is None
+    assert args.substitution_matrix is None
+
+def test_setupArgParserBudget():
+    args = setupArgParser().parse_args(('0', '1', "-m", '2', "-mm", '3', "-g", '4', "-mem", "8G", "-j", '2'))
+    assert args.max_memory == 8 * 2**30
+    assert args.jobs       == 2
+
+def test_setupArgParserModes():
+    args = setupArgParser().parse_args(('0', '1', "-m", '2', "-mm", '3', "-g", '4', "-b", "thread", "-w", '100', "--retune"))
+    assert args.backend     == Backend.Thread
+    assert args.window_size == 100
+    assert args.retune
+
 @pytest.mark.parametrize("args", [
     (),
     ("-m", "2", "-mm", '3', "-g", '4'),
@@ -173,6 +406,7 @@ def test_setupArgParser():
     ('0', '1', "-m", "foo", "-mm", '3', "-g", '4'),
     ('0', '1', "-m", '2', "-mm", "foo", "-g", '4'),
     ('0', '1', "-m", '2', "-mm", '3', "-g", "foo"),
+    ('0', '1', "-m", '2', "-mm", '3', "-g", '4', "-b", "foo"),
 ])
 def test_setupArgParserInvalidOrMissingArgs(args):
     with pytest.raises(SystemExit): setupArgParser().parse_args(args)
@@ -191,6 +425,29 @@ def test_parseInputArgs():
     assert maxAlignments == 5
     assert maxSeqLen == 6
 
+def test_parseInputArgsAffine():
+    args = setupArgParser().parse_args(("ACG", "CGT", "-m", '2', "-mm", '3', "-g", '4', "-ge", '1'))
+    target, query, match, mismatch, gap, gapExtension, *_ = parseInputArgs(args)
+    assert (gap, gapExtension) == (4, 1)
+
+def test_parseInputArgsAffineInvalid():
+    args = setupArgParser().parse_args(("ACG", "CGT", "-m", '2', "-mm", '3', "-g", '1', "-ge", '4'))
+    with pytest.raises(InvalidScoresErr): parseInputArgs(args)
+
+def test_parseInputArgsMatrix(tmp_path):
+    path = tmp_path / "matrix.txt"
+    path.write_text("   N\nN  1\n")
+    args = setupArgParser().parse_args(("ACG", "CGT", "-m", '2', "-mm", '3', "-g", '4', "-sm", str(path)))
+    target, query, match, mismatch, gap, gapExtension, substitutions, *_ = parseInputArgs(args)
+    assert (gap, gapExtension) == (4, 4)
+    assert substitutions == readSubstitutionMatrix(str(path), 2, 3)
+
+def test_parseInputArgsMatrixInvalid(tmp_path):
+    path = tmp_path / "matrix.txt"
+    path.write_text("   N\nN  X\n")
+    args = setupArgParser().parse_args(("ACG", "CGT", "-m", '2', "-mm", '3', "-g", '4', "-sm", str(path)))
+    with pytest.raises(InvalidMatrixErr): parseInputArgs(args)
+
 def test_parseInputArgsSameDNA():
     args = setupArgParser().parse_args(("ACG", "ACG", "-m", '2', "-mm", '3', "-g", '4'))
     with pytest.raises(IdenticalSeqsErr) as errInfo: parseInputArgs(args)
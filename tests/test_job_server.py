@@ -0,0 +1,113 @@
+from para_seq.local_alignment import findLocalAlignments
+from para_seq.job_server      import *
+from para_seq.input_manager   import InvalidScoresErr, getSubstitutionScores, parseSubstitutionMatrix
+from threading                import Thread
+from asyncio                  import run
+from numpy                    import uint16
+import json
+import pytest
+
+PARAMS = ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTG", 3, 3, 1)
+
+@pytest.fixture
+def jobServer():
+    jobServer = JobServer(workersAmt = 2)
+    thread = Thread(target = lambda: run(jobServer.serve(port = 0)))
+    thread.start()
+    jobServer.isReady.wait()
+    yield jobServer
+    jobServer.stop()
+    thread.join()
+
+# MatrixBuffers---------------------------------------------------------------------------
+def test_MatrixBuffers():
+    buffers = MatrixBuffers()
+    scoreMat, dirsMat = buffers.getMatrices((3, 4), uint16)
+    assert scoreMat.shape == dirsMat.shape == (3, 4) and scoreMat.dtype == uint16
+    scoreMat[:] = 7
+    dirsMat[:]  = 7
+
+    # Smaller matrices reuse the buffers, with a clean first row and column:
+    scoreMat, dirsMat = buffers.getMatrices((2, 3), uint8)
+    assert scoreMat.base is not None and buffers.scoreBuffer.size == 3 * 4 * 2
+    assert not scoreMat[0].any() and not scoreMat[:, 0].any() and not dirsMat[:, 0].any()
+
+# parseJob--------------------------------------------------------------------------------
+def test_parseJob():
+    line = b'{"target": "acgt", "query": "CG", "match": 2, "mismatch": 1, "gap": 0}\n'
+    assert parseJob(line) == ("ACGT", "CG", 2, 1, 0)
+
+def test_parseJobAffine():
+    line = b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1, "gap": 3, "gapExtension": 1}'
+    assert parseJob(line) == ("ACGT", "CG", 2, 1, 3, 1)
+    # The same penalty for opening and extending gaps is just linear gaps:
+    line = b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1, "gap": 3, "gapExtension": 3}'
+    assert parseJob(line) == ("ACGT", "CG", 2, 1, 3)
+
+def test_parseJobAffineInvalid():
+    with pytest.raises(InvalidScoresErr): parseJob(
+        b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1, "gap": 1, "gapExtension": 3}')
+
+def test_parseJobSubstitutions():
+    substitutions = [[1] * 15] * 15
+    line = json.dumps({"target": "ACGN", "query": "CG", "match": 2, "mismatch": 1, "gap": 3,
+        "substitutions": substitutions}).encode()
+    assert parseJob(line) == ("ACGN", "CG", 2, 1, 3, 3, tuple(map(tuple, substitutions)))
+    # The default scores don't need a matrix:
+    line = json.dumps({"target": "ACGN", "query": "CG", "match": 2, "mismatch": 1, "gap": 3,
+        "substitutions": getSubstitutionScores(2, 1)}).encode()
+    assert parseJob(line) == ("ACGN", "CG", 2, 1, 3)
+
+@pytest.mark.parametrize("substitutions", [[[1] * 15] * 14, [[1] * 14] * 15, [[1.5] * 15] * 15, [[True] * 15] * 15, "ACGT"])
+def test_parseJobSubstitutionsInvalid(substitutions):
+    line = json.dumps({"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1, "gap": 3,
+        "substitutions": substitutions}).encode()
+    with pytest.raises(InvalidJobErr): parseJob(line)
+
+@pytest.mark.parametrize("line", [
+    b"foo",
+    b"[1, 2]",
+    b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1}',
+    b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": -1, "gap": 0}',
+    b'{"target": "ACGT", "query": 3, "match": 2, "mismatch": 1, "gap": 0}',
+    b'{"target": "ACGT", "query": "CG", "match": 2, "mismatch": 1, "gap": 3, "gapExtension": "1"}'])
+def test_parseJobInvalid(line):
+    with pytest.raises(InvalidJobErr): parseJob(line)
+
+# JobServer-------------------------------------------------------------------------------
+def test_JobServer(jobServer):
+    maxScore, alignments = submitJob(PARAMS, port = jobServer.port)
+    assert (maxScore, list(alignments)) == findLocalAlignments(PARAMS, backend = Backend.Thread)
+
+    # The next job reuses the warm threads and buffers:
+    params = ("A" * 12, "A" * 4, 1, 1, 0)
+    maxScore, alignments = submitJob(params, port = jobServer.port)
+    assert (maxScore, list(alignments)) == findLocalAlignments(params, backend = Backend.Thread)
+
+def test_JobServerAffine(jobServer):
+    params = ("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1)
+    maxScore, alignments = submitJob(params, port = jobServer.port)
+    assert (maxScore, list(alignments)) == (7, [(1, 1, 9, 6, "3M3D3M")])
+
+def test_JobServerSubstitutions(jobServer):
+    params = ("ACGTTACG", "ACNTTANG", 2, 2, 1, 1, parseSubstitutionMatrix("   A  C  G  T  N\nN  1  1  1  1  1", 2, 2))
+    maxScore, alignments = submitJob(params, port = jobServer.port)
+    assert (maxScore, list(alignments)) == (14, [(1, 1, 8, 8, "8M")])
+
+def test_JobServerBatch(jobServer):
+    results = []
+    def submit():
+        maxScore, alignments = submitJob(PARAMS, port = jobServer.port)
+        results.append((maxScore, list(alignments)))
+
+    threads = [Thread(target = submit) for _ in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert results == [findLocalAlignments(PARAMS, backend = Backend.Thread)] * 4
+
+def test_JobServerInvalid(jobServer):
+    with pytest.raises(JobFailedErr) as errInfo: submitJob(("ACGX", "AC", 1, 1, 1), port = jobServer.port)
+    assert "found \"X\" at position 4" in str(errInfo.value)
+
+    # The server keeps serving:
+    assert submitJob(PARAMS, port = jobServer.port)[0] == 8
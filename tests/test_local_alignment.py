@@ -1,5 +1,11 @@
-from numpy import any, shape, int64
+from numpy import any, array, shape, int64, zeros
+from para_seq import Backend
 from para_seq.local_alignment import *
+from para_seq.input_manager import parseSubstitutionMatrix
+from para_seq.progress import FillCancelledErr, FillMonitor
+from contextlib import closing
+from signal import SIGINT, SIG_IGN, getsignal
+import para_seq.local_alignment as localAlignment
 import pytest
 
 # getMatrixShape--------------------------------------------------------------------------
@@ -79,6 +85,60 @@ def test_createSharedMatrix():
 
     freeSharedMem(mem)
 
+# createLocalMatrices---------------------------------------------------------------------
+def test_createLocalMatrices():
+    scoreMat, dirsMat = createLocalMatrices((3, 4))
+    assert scoreMat.dtype == uint32
+    assert dirsMat.dtype  == uint8
+    assert shape(scoreMat) == shape(dirsMat) == (3, 4)
+    assert not any(scoreMat)
+    assert not any(dirsMat)
+
+# createPool------------------------------------------------------------------------------
+def test_createPoolThread():
+    with createPool(Backend.Thread, ("ACG", "CG", 1, 2, 3)) as pool:
+        assert isinstance(pool, ThreadPool)
+        assert pool.starmap(getMatrixShape, [("ACG", "CG")]) == [(3, 4)]
+
+def test_createPoolThreadKeepsConsts():
+    # Threads must not overwrite the constants of an analysis running in the same process:
+    localAlignment._setProcessTaskConsts(("ACG", "CG", 1, 2, 3), uint8)
+    with createPool(Backend.Thread, ("TTTT", "GG", 4, 5, 6)) as pool:
+        pool.starmap(getMatrixShape, [("ACG", "CG")])
+
+    assert (localAlignment.TARGET_SEQ, localAlignment.GAP_PENALTY, localAlignment.SCORE_TYPE) == \
+        ("ACG", 3, uint8)
+
+def test_createPoolProcess():
+    with createPool(Backend.Process, ("ACG", "CG", 1, 2, 3)) as pool:
+        assert not isinstance(pool, ThreadPool)
+        assert pool.starmap(getMatrixShape, [("ACG", "CG")]) == [(3, 4)]
+
+# Ctrl+C reaches the whole process group, the workers leave it to the main process:
+def test_createPoolProcessIgnoresInterrupts():
+    with createPool(Backend.Process, ("ACG", "CG", 1, 2, 3), workersAmt = 1) as pool:
+        assert pool.apply(getsignal, (SIGINT,)) == SIG_IGN
+
+# imapTasks-------------------------------------------------------------------------------
+def test_imapTasks():
+    with createPool(Backend.Thread, ("A", "C", 1, 1, 1), workersAmt = 2) as pool:
+        results = imapTasks(pool, divmod, [(7, 2), (9, 3), (1, 5)])
+        assert list(results) == [(3, 1), (3, 0), (0, 1)]
+
+def test_imapTasksBounded():
+    submittedAmt = 0
+    def countedTasks():
+        nonlocal submittedAmt
+        for x in range(100):
+            submittedAmt += 1
+            yield (x, 1)
+
+    with createPool(Backend.Thread, ("A", "C", 1, 1, 1), workersAmt = 2) as pool:
+        results = imapTasks(pool, divmod, countedTasks())
+        assert next(results) == (0, 0)
+        assert submittedAmt <= 2 * PENDING_TASKS_PER_WORKER + 1 # Not all submitted at once
+        assert list(results) == [(x, 0) for x in range(1, 100)]
+
 # computeAntidiagCoords-------------------------------------------------------------------
 def test_computeAntidiagCoords():
     rows, cols = 3, 5
@@ -116,6 +176,163 @@ def test_computeAntidiagCoordsEmpty():
 def test_computeAntidiagCoordsOOB():
     assert computeAntidiagCoords(3, 1, 1).tolist() == []
 
+# encodeSeq-------------------------------------------------------------------------------
+def test_encodeSeq():
+    assert encodeSeq("ACGTN").tolist() == [65, 67, 71, 84, 78]
+
+def test_encodeSeqEmpty():
+    assert encodeSeq("").tolist() == []
+
+# getGapExtension-------------------------------------------------------------------------
+def test_getGapExtension():
+    assert getGapExtension(("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1)) == 1
+
+def test_getGapExtensionLinear():
+    assert getGapExtension(("AAAGGGAAA", "AAAAAA", 2, 2, 3)) is None
+    # The same penalty for opening and extending gaps is just linear gaps:
+    assert getGapExtension(("AAAGGGAAA", "AAAAAA", 2, 2, 3, 3)) is None
+
+# getSubstitutions------------------------------------------------------------------------
+def test_getSubstitutions():
+    substitutions = getSubstitutionScores(1, 1)
+    assert getSubstitutions(("ACG", "CG", 2, 2, 3, 3, substitutions)) is substitutions
+
+def test_getSubstitutionsDefault():
+    assert getSubstitutions(("ACG", "CG", 2, 2, 3)) is None
+    assert getSubstitutions(("ACG", "CG", 2, 2, 3, 1)) is None
+
+# getTileScores---------------------------------------------------------------------------
+def test_getTileScores():
+    substitutions = getSubstitutionScores(1, 1)
+    assert getTileScores(("ACG", "CG", 2, 2, 3)) == (2, 2, 3, None, None)
+    assert getTileScores(("ACG", "CG", 2, 2, 3, 1)) == (2, 2, 3, 1, None)
+    # Linear gaps stay linear, even if the extension is always there with a matrix:
+    assert getTileScores(("ACG", "CG", 2, 2, 3, 3, substitutions)) == (2, 2, 3, None, substitutions)
+
+# getMaxSubstitutionScore-----------------------------------------------------------------
+def test_getMaxSubstitutionScore():
+    assert getMaxSubstitutionScore(("ACG", "CG", 2, 2, 3)) == 2
+
+def test_getMaxSubstitutionScoreMatrix():
+    substitutions = tuple(tuple(-1 if i != j else 5 for j in range(15)) for i in range(15))
+    assert getMaxSubstitutionScore(("ACG", "CG", 2, 2, 3, 3, substitutions)) == 5
+    # Never below 0, as no pair could ever be aligned then:
+    substitutions = tuple(tuple(-1 for _ in range(15)) for _ in range(15))
+    assert getMaxSubstitutionScore(("ACG", "CG", 2, 2, 3, 3, substitutions)) == 0
+
+# getSubstitutionTable--------------------------------------------------------------------
+def test_getSubstitutionTable():
+    table = getSubstitutionTable(2, 3)
+    assert table.shape == (15, 15)
+    assert table.tolist() == [list(row) for row in getSubstitutionScores(2, 3)]
+    assert not table.flags.writeable
+
+def test_getSubstitutionTableMatrix():
+    substitutions = tuple(tuple(i - j for j in range(15)) for i in range(15))
+    assert getSubstitutionTable(2, 3, substitutions).tolist() == [list(row) for row in substitutions]
+
+# createGapBorders------------------------------------------------------------------------
+def test_createGapBorders():
+    leftGaps, upperGaps = createGapBorders((7, 10), uint8)
+    assert leftGaps.tolist() == [0] * 7 and upperGaps.tolist() == [0] * 10
+    assert leftGaps.dtype == upperGaps.dtype == uint8
+
+# fillTile--------------------------------------------------------------------------------
+# The expected matrices are the ones computed by hand for test_example1 in test_main.py:
+def test_fillTile():
+    scoreMat, dirsMat = zeros((14, 7), dtype = uint32), zeros((14, 7), dtype = uint8)
+    assert fillTile(scoreMat, dirsMat, (1, 14, 1, 7),
+        encodeSeq("ACGGTC"), encodeSeq("TGGATCTCCAACG"), 2, 2, 1) == 7
+
+    assert scoreMat[6].tolist() == [0, 0, 3, 2, 1, 4, 7]
+    assert dirsMat[4].tolist()  == [0, 2, 4, 1, 1, 7, 7]
+    assert scoreMat[13].tolist() == [0, 0, 3, 6, 5, 4, 3]
+    assert dirsMat[13].tolist()  == [0, 0, 1, 2, 6, 4, 4]
+
+# Filling tile by tile must give the same result as filling everything at once:
+def test_fillTileSplit():
+    target, query = encodeSeq("ACGGTC"), encodeSeq("TGGATCTCCAACG")
+    scoreMat, dirsMat = zeros((14, 7), dtype = uint32), zeros((14, 7), dtype = uint8)
+    fillTile(scoreMat, dirsMat, (1, 14, 1, 7), target, query, 2, 2, 1)
+
+    tiledScoreMat, tiledDirsMat = zeros((14, 7), dtype = uint32), zeros((14, 7), dtype = uint8)
+    for tile in [(1, 6, 1, 4), (1, 6, 4, 7), (6, 14, 1, 4), (6, 14, 4, 7)]:
+        fillTile(tiledScoreMat, tiledDirsMat, tile, target, query, 2, 2, 1)
+
+    assert (tiledScoreMat == scoreMat).all()
+    assert (tiledDirsMat  == dirsMat).all()
+
+# A single gap of 3 only costs 3 + 1 + 1, so the 2 runs of A can be joined:
+def test_fillTileAffine():
+    scoreMat, dirsMat = zeros((7, 10), dtype = uint32), zeros((7, 10), dtype = uint8)
+    assert fillTile(scoreMat, dirsMat, (1, 7, 1, 10),
+        encodeSeq("AAAGGGAAA"), encodeSeq("AAAAAA"), 2, 2, 3, 1) == 7
+
+    assert scoreMat[3].tolist() == [0, 2, 4, 6, 3, 2, 1, 2, 4, 6]
+    # The horizontal gap is opened right after the 3rd A and then extended:
+    assert dirsMat[3].tolist()  == [0, 2, 10, 42, 36, 68, 68, 2, 10, 42]
+    assert scoreMat[6].tolist() == [0, 2, 4, 6, 4, 2, 1, 3, 5, 7]
+
+# The same penalty for opening and extending gaps is just linear gaps:
+def test_fillTileAffineLinear():
+    target, query = encodeSeq("ACGGTC"), encodeSeq("TGGATCTCCAACG")
+    scoreMat, dirsMat = zeros((14, 7), dtype = uint32), zeros((14, 7), dtype = uint8)
+    fillTile(scoreMat, dirsMat, (1, 14, 1, 7), target, query, 2, 2, 1)
+
+    affineScoreMat, affineDirsMat = zeros((14, 7), dtype = uint32), zeros((14, 7), dtype = uint8)
+    fillTile(affineScoreMat, affineDirsMat, (1, 14, 1, 7), target, query, 2, 2, 1, 1)
+    assert (affineScoreMat == scoreMat).all()
+    assert (affineDirsMat  == dirsMat).all()
+
+# The gap borders carry the gaps over to the next tiles:
+def test_fillTileAffineSplit():
+    target, query = encodeSeq("AAAGGGAAACCA"), encodeSeq("AAAAAATTAA")
+    scoreMat, dirsMat = zeros((11, 13), dtype = uint32), zeros((11, 13), dtype = uint8)
+    fillTile(scoreMat, dirsMat, (1, 11, 1, 13), target, query, 2, 2, 3, 1)
+
+    tiledScoreMat, tiledDirsMat = zeros((11, 13), dtype = uint32), zeros((11, 13), dtype = uint8)
+    gapBorders = createGapBorders((11, 13))
+    for tile in [(1, 4, 1, 5), (1, 4, 5, 13), (4, 11, 1, 5), (4, 11, 5, 13)]:
+        fillTile(tiledScoreMat, tiledDirsMat, tile, target, query, 2, 2, 3, 1, gapBorders = gapBorders)
+
+    assert (tiledScoreMat == scoreMat).all()
+    assert (tiledDirsMat  == dirsMat).all()
+
+# Ambiguous nucleotides never match by default, not even with themselves:
+def test_fillTileAmbiguous():
+    scoreMat, dirsMat = zeros((4, 4), dtype = uint32), zeros((4, 4), dtype = uint8)
+    assert fillTile(scoreMat, dirsMat, (1, 4, 1, 4), encodeSeq("ANA"), encodeSeq("ANA"), 2, 2, 1) == 2
+    # The N in the middle only takes away the score of the A before it:
+    assert scoreMat[2][2] == 0
+
+# With a matrix N pairs up with anything, so the whole sequences align:
+def test_fillTileSubstitutions():
+    substitutions = parseSubstitutionMatrix("   A  C  G  T  N\nN  1  1  1  1  1", 2, 2)
+    scoreMat, dirsMat = zeros((4, 4), dtype = uint32), zeros((4, 4), dtype = uint8)
+    assert fillTile(scoreMat, dirsMat, (1, 4, 1, 4),
+        encodeSeq("ACA"), encodeSeq("ANA"), 2, 2, 1, None, substitutions) == 5
+    assert scoreMat[3].tolist() == [0, 2, 2, 5]
+
+    affineScoreMat, affineDirsMat = zeros((4, 4), dtype = uint32), zeros((4, 4), dtype = uint8)
+    assert fillTile(affineScoreMat, affineDirsMat, (1, 4, 1, 4),
+        encodeSeq("ACA"), encodeSeq("ANA"), 2, 2, 3, 1, substitutions) == 5
+    assert affineScoreMat[3].tolist() == [0, 2, 0, 5]
+
+# computeTileWaves------------------------------------------------------------------------
+def test_computeTileWaves():
+    assert computeTileWaves(5, 8, 3) == [
+        [(1, 4, 1, 4)],
+        [(1, 4, 4, 7), (4, 5, 1, 4)],
+        [(1, 4, 7, 8), (4, 5, 4, 7)],
+        [(4, 5, 7, 8)]]
+
+def test_computeTileWavesSingle():
+    assert computeTileWaves(3, 4, 10) == [[(1, 3, 1, 4)]]
+
+# This in theory could never happen as empty seqs are stopped before.
+def test_computeTileWavesEmpty():
+    assert computeTileWaves(1, 1, 10) == []
+
 # fillMatrices----------------------------------------------------------------------------
 def test_fillMatrices():
     _, scoreMem, _, dirsMem = createMatrices((4, 7))
@@ -170,13 +387,140 @@ def test_fillMatricesIdenticalSeqs():
     freeSharedMem(scoreMem)
     freeSharedMem(dirsMem)
 
+def test_fillMatricesThread():
+    params = ("ACGGTC", "TGGATCTCCAACG", 2, 2, 1)
+    scoreMat, scoreMem, dirsMat, dirsMem = createMatrices((14, 7))
+    assert fillMatrices(params) == 7
+    expectedScoreMat, expectedDirsMat = scoreMat.copy(), dirsMat.copy()
+    freeSharedMem(scoreMem, isFreedCompletely = True)
+    freeSharedMem(dirsMem,  isFreedCompletely = True)
+
+    # Small tiles, so that there are many waves with many tiles:
+    matrices = createLocalMatrices((14, 7))
+    assert fillMatrices(params, backend = Backend.Thread, matrices = matrices, tileSize = 3) == 7
+    assert (matrices[0] == expectedScoreMat).all()
+    assert (matrices[1] == expectedDirsMat).all()
+
+# Without matrices the threads attach to the shared ones:
+def test_fillMatricesThreadShared():
+    scoreMat, scoreMem, dirsMat, dirsMem = createMatrices((4, 7))
+    assert fillMatrices(("ATTTCG", "TTT", 2, 2, 1), backend = Backend.Thread) == 6
+    assert scoreMat[3].tolist() == [0, 0, 2, 4, 6, 5, 4]
+
+    freeSharedMem(scoreMem)
+    freeSharedMem(dirsMem)
+
+# A running pool is used as it is, and left open for the next analysis:
+def test_fillMatricesThreadPool():
+    with createPool(Backend.Thread, ("A", "C", 1, 1, 1), workersAmt = 2) as pool:
+        for _ in range(2):
+            matrices = createLocalMatrices((4, 7))
+            assert fillMatrices(("ATTTCG", "TTT", 2, 2, 1), backend = Backend.Thread,
+                matrices = matrices, tileSize = 2, pool = pool) == 6
+
+# The per-cell tasks don't know affine gaps, the tiles fill the shared matrices instead:
+def test_fillMatricesAffine():
+    params = ("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1)
+    scoreMat, scoreMem, dirsMat, dirsMem = createMatrices((7, 10))
+    assert fillMatrices(params, backend = Backend.Process, workersAmt = 2, tileSize = 2) == 7
+
+    matrices = createLocalMatrices((7, 10))
+    assert fillMatrices(params, backend = Backend.Thread, matrices = matrices, workersAmt = 1) == 7
+    assert (matrices[0] == scoreMat).all()
+    assert (matrices[1] == dirsMat).all()
+
+    freeSharedMem(scoreMem)
+    freeSharedMem(dirsMem)
+
+# Reports every antidiagonal of cells, or every wave of tiles:
+@pytest.mark.parametrize("backend, wavesAmt, cellsAmt", [
+    (Backend.Process, 20, 98), (Backend.Thread, 3, 78), (Backend.Serial, 13, 78)])
+def test_fillMatricesMonitor(backend, wavesAmt, cellsAmt):
+    reports = []
+    monitor = FillMonitor(reports.append)
+    matrices = createLocalMatrices((14, 7))
+    scoreMat, scoreMem, dirsMat, dirsMem = createMatrices((14, 7))
+    assert fillMatrices(("ACGGTC", "TGGATCTCCAACG", 2, 2, 1), backend = backend, matrices = matrices,
+        tileSize = 6, workersAmt = 1, monitor = monitor) == 7
+
+    assert [report[:4] for report in reports][-1] == (cellsAmt, cellsAmt, wavesAmt, wavesAmt)
+    assert len(reports) == wavesAmt
+
+    freeSharedMem(scoreMem)
+    freeSharedMem(dirsMem)
+
+# The fill stops at the end of the wave it was cancelled in:
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_fillMatricesCancel(backend):
+    def cancelAtWave2(progress):
+        if progress[2] == 2: monitor.cancel()
+
+    monitor = FillMonitor(cancelAtWave2)
+    scoreMat, scoreMem, dirsMat, dirsMem = createMatrices((14, 7))
+    with pytest.raises(FillCancelledErr) as errInfo: fillMatrices(("ACGGTC", "TGGATCTCCAACG", 2, 2, 1),
+        backend = backend, tileSize = 2, workersAmt = 2, monitor = monitor)
+
+    assert "stopped after 2 of" in str(errInfo.value)
+    freeSharedMem(scoreMem)
+    freeSharedMem(dirsMem)
+
+# fillMatricesSerially--------------------------------------------------------------------
+# The expected matrices are the ones computed by hand for test_example1 in test_main.py:
+def test_fillMatricesSerially():
+    matrices = createLocalMatrices((14, 7))
+    assert fillMatricesSerially(("ACGGTC", "TGGATCTCCAACG", 2, 2, 1), matrices) == 7
+    assert matrices[0][6].tolist()  == [0, 0, 3, 2, 1, 4, 7]
+    assert matrices[1][4].tolist()  == [0, 2, 4, 1, 1, 7, 7]
+    assert matrices[0][13].tolist() == [0, 0, 3, 6, 5, 4, 3]
+    assert matrices[1][13].tolist() == [0, 0, 1, 2, 6, 4, 4]
+
+# The gap bits of the directions must be the same as the vectorized kernel's:
+@pytest.mark.parametrize("params", [
+    ("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1),
+    ("AAAGGGAAACCA", "AAAAAATTAA", 2, 2, 3, 2),
+    ("ACGTTACG", "ACNTTANG", 2, 2, 1, 1, parseSubstitutionMatrix("   A  C  G  T  N\nN  1  1  1  1  1", 2, 2))])
+def test_fillMatricesSeriallyKernel(params):
+    shape = getMatrixShape(*params[:2])
+    scoreMat, dirsMat = createLocalMatrices(shape)
+    fillTile(scoreMat, dirsMat, (1, shape[0], 1, shape[1]), encodeSeq(params[0]), encodeSeq(params[1]),
+        *getTileScores(params))
+
+    matrices = createLocalMatrices(shape)
+    assert fillMatricesSerially(params, matrices) == scoreMat.max()
+    assert (matrices[0] == scoreMat).all()
+    assert (matrices[1] == dirsMat).all()
+
+# Neither workers nor shared memory, the whole analysis runs in the calling thread:
+def test_findLocalAlignmentsSerialInProcess(monkeypatch):
+    def fail(*args, **kwargs): raise AssertionError("no pools nor shared memory expected")
+    monkeypatch.setattr(localAlignment, "createPool", fail)
+    monkeypatch.setattr(localAlignment, "SharedMemory", fail)
+    assert findLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1), backend = Backend.Serial,
+        workersAmt = 4) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
+
+# encodeCigar-----------------------------------------------------------------------------
+def test_encodeCigar():
+    assert encodeCigar("MMDMMMIIM") == "2M1D3M2I1M"
+
+def test_encodeCigarEmpty():
+    assert encodeCigar([]) == ""
+
+# materializeAlignment--------------------------------------------------------------------
+def test_materializeAlignment():
+    assert materializeAlignment((8, 1, 12, 5, "1M1D2M1I1M"), "TTTACATATCGGTGTC", "ACGCG") == \
+        (8, 1, "ATCG-G", "A-CGCG")
+
+def test_materializeAlignmentLongRuns():
+    assert materializeAlignment((2, 1, 13, 3, "1M10D2M"), "AACCCCCCCCCCGGA", "AGG") == \
+        (2, 1, "ACCCCCCCCCCGG", "A----------GG")
+
 # reconstructAlignments-------------------------------------------------------------------
 def test_reconstructAlignments():
     params = ("ATTTCG", "TTT", 2, 2, 1)
     scoreMat, scoreMem, _, dirsMem = createMatrices((4, 7))
     maxScore = fillMatrices(params)
     
-    expectedAlignments = [(2, 1, "TTT", "TTT")]
+    expectedAlignments = [(2, 1, 4, 3, "3M")]
     assert all(map(
         lambda alignment: alignment in expectedAlignments,
         reconstructAlignments(scoreMat, maxScore, params)))
@@ -192,14 +536,14 @@ def test_reconstructAlignmentsCommutative():
     params = (seq1, seq2, 2, 2, 1)
     scoreMat, scoreMem, _, dirsMem = createMatrices((len(params[1]) + 1, len(params[0]) + 1))
     maxScore = fillMatrices(params)
-    assert reconstructAlignments(scoreMat, maxScore, params) == [(8, 1, "ATCG-G", "A-CGCG")]
+    assert list(reconstructAlignments(scoreMat, maxScore, params)) == [(8, 1, 12, 5, "1M1D2M1I1M")]
     freeSharedMem(scoreMem)
     freeSharedMem(dirsMem)
     
     params = (seq2, seq1, 2, 2, 1)
     scoreMat, scoreMem, _, dirsMem = createMatrices((len(params[1]) + 1, len(params[0]) + 1))
     maxScore = fillMatrices(params)
-    assert reconstructAlignments(scoreMat, maxScore, params) == [(1, 8, "A-CGCG", "ATCG-G")]
+    assert list(reconstructAlignments(scoreMat, maxScore, params)) == [(1, 8, 5, 12, "1M1I2M1D1M")]
 
     freeSharedMem(scoreMem)
     freeSharedMem(dirsMem)
@@ -209,7 +553,7 @@ def test_reconstructAlignmentsMany():
     scoreMat, scoreMem, _, dirsMem = createMatrices((13, len(params[0]) + 1))
     maxScore = fillMatrices(params)
 
-    expectedAlignments = [(43, 4, "ATCGTTA", "AT--TTA"), (43, 4, "ATCGTTAGCA", "AT--TTA--A")]
+    expectedAlignments = [(43, 4, 49, 8, "2M2D3M"), (43, 4, 52, 9, "2M2D3M2D1M")]
     assert all(map(
         lambda alignment: alignment in expectedAlignments,
         reconstructAlignments(scoreMat, maxScore, params)))
@@ -217,23 +561,197 @@ def test_reconstructAlignmentsMany():
     freeSharedMem(scoreMem)
     freeSharedMem(dirsMem)
 
+def test_reconstructAlignmentsThread():
+    params = ("ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG", "AAAATTTAAAAA", 2, 2, 1)
+    scoreMat, dirsMat = createLocalMatrices((13, len(params[0]) + 1))
+    maxScore = fillMatrices(params, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+
+    assert sorted(reconstructAlignments(scoreMat, maxScore, params,
+        backend = Backend.Thread, dirsMatrix = dirsMat)) == [
+        (43, 4, 49, 8, "2M2D3M"), (43, 4, 52, 9, "2M2D3M2D1M")]
+
+def test_reconstructAlignmentsThreadSplit(monkeypatch):
+    # Even with the GIL, to check that the batches are put back together in order:
+    monkeypatch.setattr("para_seq.local_alignment.getTracebackThreadsAmt", lambda workersAmt: workersAmt)
+    params = ("A" * 12, "A" * 4, 1, 1, 0) # Free gaps, so plenty of co-optimal paths
+    scoreMat, dirsMat = createLocalMatrices((5, 13))
+    maxScore = fillMatrices(params, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    expected = list(reconstructAlignments(scoreMat, maxScore, params,
+        backend = Backend.Thread, dirsMatrix = dirsMat, workersAmt = 1))
+
+    assert len(expected) > 64
+    assert list(reconstructAlignments(scoreMat, maxScore, params,
+        backend = Backend.Thread, dirsMatrix = dirsMat, workersAmt = 4)) == expected
+
 def test_reconstructAlignmentsZeroScore():
     mat, mem = createSharedMatrix((1, 1), uint32, SCORE_MATRIX_SHMEM_NAME, isNew = True)
-    assert reconstructAlignments(mat, 0, ()) == []
+    assert list(reconstructAlignments(mat, 0, ())) == []
     freeSharedMem(mem)
 
+def test_reconstructAlignmentsLazy():
+    params = ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1)
+    scoreMat, dirsMat = createLocalMatrices((6, 17))
+    maxScore = fillMatrices(params, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+    alignments = reconstructAlignments(scoreMat, maxScore, params, backend = Backend.Thread,
+        dirsMatrix = dirsMat, workersAmt = 1)
+
+    assert next(alignments) == (8, 1, 12, 5, "1M1D2M1I1M")
+    assert next(alignments, None) is None
+
+# buildTracebackDag-----------------------------------------------------------------------
+def test_buildTracebackDag():
+    # Both starting cells backtrack to the same cell, which is only added once:
+    scoreMat = array([[0, 0, 0], [0, 2, 1], [0, 1, 0]], dtype = uint32)
+    dirsMat  = array([[0, 0, 0], [0, 2, 4], [0, 1, 0]], dtype = uint8)
+    assert buildTracebackDag(scoreMat, dirsMat, [(2, 1), (1, 2)]) == {
+        (2, 1) : ((1, 1, 'I'),),
+        (1, 2) : ((1, 1, 'D'),),
+        (1, 1) : ((0, 0, 'M'),)}
+
+def test_buildTracebackDagForks():
+    scoreMat = array([[0, 0, 0], [0, 0, 0], [0, 0, 2]], dtype = uint32)
+    dirsMat  = array([[0, 0, 0], [0, 0, 0], [0, 0, 7]], dtype = uint8)
+    assert buildTracebackDag(scoreMat, dirsMat, [(2, 2)]) == {
+        (2, 2) : ((1, 2, 'I'), (1, 1, 'M'), (2, 1, 'D'))}
+
+# Affine gaps are whole steps, back to every cell they might have been opened from:
+def test_buildTracebackDagAffine():
+    scoreMat = array([[0, 0, 0, 0], [0, 4, 1, 0], [0, 0, 0, 3]], dtype = uint32)
+    dirsMat  = array([[0, 0, 0, 0], [0, 2, 36, 0], [0, 0, 0, 2]], dtype = uint8)
+    dirsMat[1, 2] |= LEFT_EXTEND_DIR
+    dirsMat[1, 1] |= LEFT_OPEN_DIR
+    assert buildTracebackDag(scoreMat, dirsMat, [(2, 3)]) == {
+        (2, 3) : ((1, 2, 'M'),),
+        (1, 2) : ((1, 1, 'D'), (1, 0, 'DD')),
+        (1, 1) : ((0, 0, 'M'),)}
+
+# enumerateDagAlignments------------------------------------------------------------------
+def test_enumerateDagAlignments():
+    dag = { (2, 2) : ((1, 1, 'M'), (2, 1, 'D')), (2, 1) : ((1, 0, 'M'),) }
+    assert list(enumerateDagAlignments(dag, 2, 2)) == [(1, 2, 2, 2, "1M1D"), (2, 2, 2, 2, "1M")]
+
+def test_enumerateDagAlignmentsRuns():
+    dag = { (3, 3) : ((2, 2, 'M'),), (2, 2) : ((1, 1, 'M'),), (1, 1) : ((0, 1, 'I'),) }
+    assert list(enumerateDagAlignments(dag, 3, 3)) == [(2, 1, 3, 3, "1I2M")]
+
+def test_enumerateDagAlignmentsEmpty():
+    assert list(enumerateDagAlignments({}, 2, 2)) == []
+
+# 2 ways from each cell of the diagonal to the next one, so 2^8 paths from (8, 8):
+LADDER_DAG = { (k, k) : ((k - 1, k - 1, 'M'), (k - 1, k - 1, 'D')) for k in range(1, 9) }
+
+# countDagPaths---------------------------------------------------------------------------
+def test_countDagPaths():
+    pathsAmts = countDagPaths(LADDER_DAG, [(8, 8), (3, 3)])
+    assert pathsAmts[(8, 8)] == 256 and pathsAmts[(3, 3)] == 8 and pathsAmts[(0, 0)] == 1
+
+def test_countDagPathsShared():
+    dag = { (2, 1) : ((1, 1, 'I'),), (1, 2) : ((1, 1, 'D'),), (1, 1) : ((0, 0, 'M'), (1, 0, 'D')) }
+    assert countDagPaths(dag, [(2, 1), (1, 2)]) == {
+        (2, 1) : 2, (1, 2) : 2, (1, 1) : 2, (0, 0) : 1, (1, 0) : 1}
+
+# splitTracebackStates--------------------------------------------------------------------
+def test_splitTracebackStates():
+    # A single starting cell is split over all the tasks:
+    batches = splitTracebackStates(LADDER_DAG, [(8, 8)], 4)
+    assert len(batches) == 4
+    assert [sum(countDagPaths(LADDER_DAG, [state[2:4] for state in batch])[state[2:4]]
+        for state in batch) for batch in batches] == [64] * 4
+
+def test_splitTracebackStatesOrder():
+    batches = splitTracebackStates(LADDER_DAG, [(8, 8), (2, 2)], 8)
+    assert [alignment for batch in batches for alignment in enumerateDagStates(LADDER_DAG, batch)] == \
+        list(enumerateDagAlignments(LADDER_DAG, 8, 8)) + list(enumerateDagAlignments(LADDER_DAG, 2, 2))
+
+def test_splitTracebackStatesBatched():
+    # Tiny tracebacks are batched together instead of taking a task each:
+    startCells = [(k, k) for k in range(1, 6)]
+    assert splitTracebackStates(LADDER_DAG, startCells, 8) == [[(k, k, k, k, None) for k in range(1, 6)]]
+
+# traceAlignments-------------------------------------------------------------------------
+def test_traceAlignments():
+    target, query = "TTTACATATCGGTGTC", "ACGCG"
+    scoreMat, dirsMat = zeros((6, 17), dtype = uint32), zeros((6, 17), dtype = uint8)
+    fillTile(scoreMat, dirsMat, (1, 6, 1, 17), encodeSeq(target), encodeSeq(query), 2, 2, 1)
+    assert list(traceAlignments(scoreMat, dirsMat, 5, 12)) == [(8, 1, 12, 5, "1M1D2M1I1M")]
+
+def test_traceAlignmentsForks():
+    # Both co-optimal paths share the last 3 operations:
+    target, query = "ATCGTTAGCA", "AAAATTTAAAAA"
+    scoreMat, dirsMat = zeros((13, 11), dtype = uint32), zeros((13, 11), dtype = uint8)
+    fillTile(scoreMat, dirsMat, (1, 13, 1, 11), encodeSeq(target), encodeSeq(query), 2, 2, 1)
+    alignments = [materializeAlignment(alignment, target, query)
+        for alignment in traceAlignments(scoreMat, dirsMat, 9, 10)]
+
+    assert (1, 4, "ATCGTTAGCA", "AT--TTA--A") in alignments
+
 # findLocalAlignments---------------------------------------------------------------------
 def test_findLocalAlignments(capsys):
     assert findLocalAlignments(
-        ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1)) == (6, [(8, 1, "ATCG-G", "A-CGCG")])
+        ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1)) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
     
     out, err = capsys.readouterr()
     assert out == err == ""
 
+def test_findLocalAlignmentsThread(capsys):
+    assert findLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1),
+        backend = Backend.Thread) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
+
+    out, err = capsys.readouterr()
+    assert out == err == ""
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findLocalAlignmentsStream(backend):
+    maxScore, alignments = findLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1),
+        backend = backend, doStream = True)
+
+    assert not isinstance(alignments, list)
+    assert (maxScore, list(alignments)) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findLocalAlignmentsBufferPool(backend):
+    with closing(SharedBufferPool()) as bufferPool:
+        # Consecutive analyses of different sizes reuse the same segments:
+        for params, expected in [
+            (("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1), (6, [(8, 1, 12, 5, "1M1D2M1I1M")])),
+            (("ACGT", "CG", 1, 1, 1), (2, [(2, 1, 3, 2, "2M")]))]:
+            assert findLocalAlignments(params, backend = backend, workersAmt = 2, bufferPool = bufferPool) == expected
+            assert not bufferPool.busySegments and len(bufferPool.idleSegments) == 2
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findLocalAlignmentsAffine(backend):
+    assert findLocalAlignments(("AAAGGGAAA", "AAAAAA", 2, 2, 3, 1), backend = backend,
+        tileSize = 2, workersAmt = 2) == (7, [(1, 1, 9, 6, "3M3D3M")])
+
+    # With linear gaps joining the runs of A costs too much:
+    maxScore, alignments = findLocalAlignments(("AAAGGGAAA", "AAAAAA", 2, 2, 3), backend = backend)
+    assert maxScore == 6 and len(alignments) == 8 and all(cigar == "3M" for *_, cigar in alignments)
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findLocalAlignmentsSubstitutions(backend):
+    substitutions = parseSubstitutionMatrix("   A  C  G  T  N\nN  1  1  1  1  1", 2, 2)
+    assert findLocalAlignments(("ACGTTACG", "ACNTTANG", 2, 2, 1, 1, substitutions),
+        backend = backend, tileSize = 3, workersAmt = 2) == (14, [(1, 1, 8, 8, "8M")])
+
+    # By default both N are mismatches instead:
+    maxScore, alignments = findLocalAlignments(("ACGTTACG", "ACNTTANG", 2, 2, 3), backend = backend)
+    assert maxScore == 8 and (1, 1, 8, 8, "8M") in alignments
+
+# A cancelled analysis leaves no shared memory behind:
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findLocalAlignmentsCancel(backend):
+    monitor = FillMonitor()
+    monitor.cancel()
+    with pytest.raises(FillCancelledErr):
+        findLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1), backend = backend, monitor = monitor)
+
+    with pytest.raises(FileNotFoundError): SharedMemory(name = SCORE_MATRIX_SHMEM_NAME)
+    with pytest.raises(FileNotFoundError): SharedMemory(name = DIRS_MATRIX_SHMEM_NAME)
+
 def test_findLocalAlignmentsPrints(capsys):
     assert findLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1),
-        doLogProgress = True) == (6, [(8, 1, "ATCG-G", "A-CGCG")])
+        doLogProgress = True) == (6, [(8, 1, 12, 5, "1M1D2M1I1M")])
     
     out, err = capsys.readouterr()
     assert err == ""
-    assert out == "Filling score and directions matrices...\nReconstructing best local alignments...\n"
\ No newline at end of file
+    assert out == "Filling score and directions matrices...\nReconstructing best local alignments...\n"
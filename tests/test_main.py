@@ -1,6 +1,47 @@
+import sys
 import pytest
+from os import makedirs
+from json import dump
+from os import environ
+from sys import executable
+from time import perf_counter
+from os.path import dirname, join
+from subprocess import run as runCommand
 from src.para_seq.main import *
 from src.para_seq import ALIGNMENT_INFO
+from src.para_seq.autotuner import getAutotunePath, getMachineId
+from src.para_seq.job_server import JobServer
+from src.para_seq.cluster import CLUSTER_KEY_ENV_VAR, runWorker
+from para_seq.cluster import ClusterErr # The one raised by main, which imports the package without src
+from para_seq.resource_governor import ResourceBudgetErr # Same
+from multiprocessing import Process
+from threading import Thread
+from asyncio import run
+from socket import socket
+
+# The automatic backend reads its benchmarks from the user cache folder: every test gets
+# its own, seeded with fixed costs so that the tool never benchmarks the machine running
+# the tests nor writes to the real cache.
+@pytest.fixture(autouse = True)
+def cacheDir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = getAutotunePath()
+    makedirs(dirname(path))
+    with open(path, 'w') as fd: dump({
+        "machine"          : getMachineId(),
+        "kernelRowCost"    : 2e-5,
+        "kernelCellCost"   : 5e-8,
+        "threadEfficiency" : 0.9,
+        "processPoolCost"  : 5e-3,
+        "processRoundTrip" : 1e-3,
+        "processTaskCost"  : 1e-5,
+        "threadPoolCost"   : 1e-3,
+        "threadRoundTrip"  : 1e-4,
+        "threadTaskCost"   : 2e-7,
+        "serialCellCost"   : 1e-6,
+        "attachCost"       : 2e-5 }, fd)
+
+    return tmp_path
 
 # main------------------------------------------------------------------------------------
 OUT_INTRO = """Starting analysis...
@@ -35,6 +76,27 @@ def test_main(capsys):
 
     # The file output is tested elsewhere.
 
+def getCommandTime(*args:str) -> tuple[float, str]:
+    """Runs Python with the package importable, returns the best of 3 times and the errors."""
+    env = {**environ, "PYTHONPATH" : join(dirname(dirname(__file__)), "src")}
+    times = []
+    for _ in range(3):
+        start = perf_counter()
+        errors = runCommand((executable, *args), env = env, capture_output = True, text = True).stderr
+        times.append(perf_counter() - start)
+
+    return min(times), errors
+
+def test_mainStartup():
+    # Startup benchmark: the help and the argument errors don't wait for numpy, pyfastx and
+    # the engines, so they take less than importing numpy alone:
+    numpyTime, _ = getCommandTime("-c", "import numpy")
+    for args in (("--help",), ("ACGT",)):
+        startupTime, imports = getCommandTime("-X", "importtime", "-m", "para_seq.main", *args)
+        assert startupTime < numpyTime
+        assert not {"numpy", "pyfastx", "multiprocessing"} & {line.split('|')[-1].strip()
+            for line in imports.splitlines() if line.startswith("import time:")}
+
 # Whole tool tests: these tests precisely check the results of the tool against some local
 # alignment problems solved by hand:
 def test_example1(capsys):
@@ -190,4 +252,139 @@ directions matrix:
     assert ALIGNMENT_INFO.format(1,  7, "CT-G", "CTTG") in out
     assert ALIGNMENT_INFO.format(1,  1, "C-TG", "CTTG") in out
     assert ALIGNMENT_INFO.format(1,  1, "CT-G", "CTTG") in out
-    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
\ No newline at end of file
+    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
+
+# The other modes and backends must give the same results as the default one:
+@pytest.mark.parametrize("modeArgs", [
+    ("-b", "thread"), ("-b", "serial"), ("-w", '10'), ("-w", '10', "-b", "thread"), ("-w", '10', "-b", "serial"),
+    ("--checkpointed",)])
+def test_exampleModes(capsys, modeArgs):
+    main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1', *modeArgs))
+
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Best local alignment score: 8" in out
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out
+    assert ALIGNMENT_INFO.format(1,  1, "CT-G", "CTTG") in out
+    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
+
+# A single gap of 3 only costs 3 + 1 + 1, so the 2 runs of A are aligned together:
+def test_exampleAffine(capsys):
+    main(("AAAGGGAAA", "AAAAAA", "-m" '2', "-mm", '2', "-g", '3', "-ge", '1'))
+
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Best local alignment score: 7" in out
+    assert ALIGNMENT_INFO.format(1, 1, "AAAGGGAAA", "AAA---AAA") in out
+
+# N never matches by default, with the matrix it pairs up with T and the whole query aligns:
+def test_exampleSubstitutionMatrix(capsys, tmp_path):
+    args = ("CTGAACTGTT", "CNG", "-m", '3', "-mm", '3', "-g", '3')
+    main(args)
+    assert "Best local alignment score: 3" in capsys.readouterr()[0]
+
+    matrixPath = tmp_path / "matrix.txt"
+    matrixPath.write_text("# Only the pair to change\n   T\nN  3\n")
+    main((*args, "-sm", str(matrixPath)))
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Best local alignment score: 9" in out
+    assert ALIGNMENT_INFO.format(1, 1, "CTG", "CNG") in out
+
+# On a terminal the fill shows its progress on a single line:
+def test_exampleProgressLine(capsys, monkeypatch):
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+    main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m", '3', "-mm", '3', "-g", '1', "-b", "thread"))
+
+    out, _ = capsys.readouterr()
+    assert "Filling score and directions matrices...\n\r100.0% of the cells filled (wave " in out
+    assert "Best local alignment score: 8" in out
+
+def test_exampleOutputFormat(capsys, tmp_path):
+    outputPath = str(tmp_path / "output.sam")
+    main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1',
+        "-o", outputPath, "-of", "sam"))
+
+    out, _ = capsys.readouterr()
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out # The summary is still text
+    with open(outputPath) as fd: records = fd.read().splitlines()[3:]
+    assert [record.split('\t')[3:6] for record in records if "\t30S1M1I2M\t" in record] == [["1", "255", "30S1M1I2M"]]
+
+def test_exampleCache(capsys):
+    args = ("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1', "--cache")
+    main(args)
+    assert "in the cache" not in capsys.readouterr()[0]
+
+    main(args)
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Found the results of an identical analysis in the cache...\n" in out
+    assert "Filling score and directions matrices..." not in out
+    assert "Best local alignment score: 8" in out
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out
+
+def test_exampleCheckpointedBudget(capsys):
+    # Too small a budget even for the checkpointed mode:
+    with pytest.raises(ResourceBudgetErr) as errInfo: main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG",
+        "-m" '3', "-mm", '3', "-g", '1', "--checkpointed", "-mem", '10'))
+
+    assert "budget is 10 B" in str(errInfo.value)
+
+def test_exampleResume(capsys):
+    main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1', "--resume"))
+
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Filling score and directions matrices on disk..." in out
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out
+    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
+
+def test_exampleResumeBudget():
+    with pytest.raises(ResourceBudgetErr) as errInfo: main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG",
+        "-m" '3', "-mm", '3', "-g", '1', "--resume", "-mem", '1G'))
+
+    assert "kept on disk" in str(errInfo.value)
+
+def test_exampleServer(capsys):
+    jobServer = JobServer(workersAmt = 1)
+    thread = Thread(target = lambda: run(jobServer.serve(port = 0)))
+    thread.start()
+    jobServer.isReady.wait()
+    try: main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1',
+        "--server", str(jobServer.port)))
+
+    finally:
+        jobServer.stop()
+        thread.join()
+
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "Sending the analysis to the job server" in out
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out
+    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
+
+def test_exampleCluster(capsys, monkeypatch):
+    monkeypatch.setenv(CLUSTER_KEY_ENV_VAR, "test key")
+    with socket() as sock: # Finds a free port
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    # The worker waits for the coordinator to start listening:
+    worker = Process(target = runWorker, args = (("127.0.0.1", port), b"test key"))
+    worker.start()
+    try: main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "-m" '3', "-mm", '3', "-g", '1',
+        "--cluster", str(port), "-w", '10'))
+
+    finally: worker.join(5)
+
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert "waiting for cluster workers" in out
+    assert ALIGNMENT_INFO.format(1, 31, "C-TG", "CATG") in out
+    assert ALIGNMENT_INFO.format(1,  1, "CT-G", "CTTG") in out
+    assert out.endswith("All done! Check the full list of alignments at \"./output/output.txt\".\n")
+
+def test_exampleClusterNoKey(monkeypatch):
+    monkeypatch.delenv(CLUSTER_KEY_ENV_VAR, raising = False)
+    with pytest.raises(ClusterErr): main(("CTG", "CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG",
+        "-m" '3', "-mm", '3', "-g", '1', "--cluster", '1'))
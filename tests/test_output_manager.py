@@ -37,7 +37,7 @@ def test_saveOutputEmpty(tmp_path):
     path = tmp_path / "output.txt"
     saveOutput(path, 0, [])
     with open(path) as fd:
-        assert fd.read() == "Score: 0\nTotal alignments: 0\n"
+        assert fd.read() == "Score: 0\n\nTotal alignments: 0\n"
 
 def test_saveOutput(tmp_path):
     path = tmp_path / "output.txt"
@@ -46,7 +46,6 @@ def test_saveOutput(tmp_path):
 
     with open(path) as fd:
         assert fd.read() == """Score: 10
-Total alignments: 3
 
 Target start pos: 0
 Query start pos: 3
@@ -62,9 +61,101 @@ Target start pos: 1
 Query start pos: 1
 Target sequence: TT-TTT-T
 Query sequence:  -T
+
+Total alignments: 3
 """
 
+def test_saveOutputStream(tmp_path):
+    path = tmp_path / "output.txt"
+    alignments = ((x, 1, "AC", "AC") for x in range(1, 6))
+    assert saveOutput(path, 4, alignments, keptAlignmentsAmt = 2) == (5, [(1, 1, "AC", "AC"), (2, 1, "AC", "AC")])
+    with open(path) as fd:
+        output = fd.read()
+        assert output.startswith("Score: 4\n" + ALIGNMENT_INFO.format(1, 1, "AC", "AC"))
+        assert output.endswith(ALIGNMENT_INFO.format(5, 1, "AC", "AC") + "\nTotal alignments: 5\n")
+
+def test_saveOutputGzip(tmp_path):
+    path = tmp_path / "output.txt.gz"
+    saveOutput(path, 4, [(1, 1, "AC", "AC")])
+    with gzipOpen(path, "rt") as fd:
+        assert fd.read() == "Score: 4\n" + ALIGNMENT_INFO.format(1, 1, "AC", "AC") + "\nTotal alignments: 1\n"
+
 # Shouldn't happen, as invalid file paths are caught beforehand:
 def test_saveOutputInvalidPath():
     with pytest.raises(PermissionError) as errInfo: saveOutput("./output/", 0, [])
-    assert str(errInfo.value) == "[Errno 13] Permission denied: './output/'"
\ No newline at end of file
+    assert str(errInfo.value) == "[Errno 13] Permission denied: './output/'"
+
+PARAMS     = ("TTACGTAC", "ACTTCGG", 1, 1, 1)
+ALIGNMENTS = [(3, 1, 8, 5, "2M1D3M"), (4, 2, 5, 3, "2M")]
+
+# getAlignmentStats-----------------------------------------------------------------------
+def test_getAlignmentStats():
+    targetCodes, queryCodes = encodeSeq(PARAMS[0]), encodeSeq(PARAMS[1])
+    # TAC is aligned to TTC after the gap:
+    assert getAlignmentStats(ALIGNMENTS[0], targetCodes, queryCodes) == (6, 4, 1, 1)
+    assert getAlignmentStats(ALIGNMENTS[1], targetCodes, queryCodes) == (2, 1, 1, 0)
+    assert getAlignmentStats((1, 1, 4, 4, "1M1I1D1I1M1D"), targetCodes, queryCodes)[3] == 4
+
+# writeTabular----------------------------------------------------------------------------
+def test_writeTabular(tmp_path):
+    path = tmp_path / "output.tsv"
+    writeTabular(path, 3, ALIGNMENTS, PARAMS)
+    with open(path) as fd: assert fd.read() == \
+        "query-sequence\ttarget-sequence\t66.67\t6\t1\t1\t1\t5\t3\t8\t3\n" \
+        "query-sequence\ttarget-sequence\t50.00\t2\t1\t0\t2\t3\t4\t5\t3\n"
+
+# writeSam--------------------------------------------------------------------------------
+def test_writeSam(tmp_path):
+    path = tmp_path / "output.sam"
+    writeSam(path, 3, ALIGNMENTS, PARAMS)
+    with open(path) as fd: assert fd.read() == SAM_HEADER.format("target-sequence", 8) + \
+        "query-sequence\t0\ttarget-sequence\t3\t255\t2M1D3M2S\t*\t0\t0\tACTTCGG\t*\tAS:i:3\n" \
+        "query-sequence\t256\ttarget-sequence\t4\t255\t1S2M4S\t*\t0\t0\t*\t*\tAS:i:3\n"
+
+def test_writeSamGzip(tmp_path):
+    path = tmp_path / "output.sam.gz"
+    writeSam(path, 3, ALIGNMENTS[1:], PARAMS)
+    with gzipOpen(path, "rt") as fd: assert fd.read().endswith("\t1S2M4S\t*\t0\t0\tACTTCGG\t*\tAS:i:3\n")
+
+# writeNpz--------------------------------------------------------------------------------
+@pytest.mark.parametrize("fileName", ["output.npz", "output.npz.gz"])
+def test_writeNpz(tmp_path, fileName):
+    path = tmp_path / fileName
+    writeNpz(path, 3, iter(ALIGNMENTS), PARAMS)
+    with load(path) as archive:
+        assert archive["positions"].tolist() == [[3, 1, 8, 5], [4, 2, 5, 3]]
+        assert archive["cigars"].tobytes() == b"2M1D3M2M"
+        assert archive["cigarOffsets"].tolist() == [0, 6, 8]
+
+    maxScore, alignments = loadNpzOutput(path)
+    assert maxScore == 3 and list(alignments) == ALIGNMENTS
+
+def test_writeNpzChunks(tmp_path, monkeypatch):
+    monkeypatch.setattr("para_seq.output_manager.NPZ_CHUNK_ALIGNMENTS", 2)
+    alignments = [(x, 1, x + 9, 10, f"{x}M1I") for x in range(1, 6)]
+    writeNpz(tmp_path / "output.npz", 3, alignments, PARAMS)
+    assert list(loadNpzOutput(tmp_path / "output.npz")[1]) == alignments
+
+def test_writeNpzEmpty(tmp_path):
+    writeNpz(tmp_path / "output.npz", 0, [], PARAMS)
+    maxScore, alignments = loadNpzOutput(tmp_path / "output.npz")
+    assert maxScore == 0 and not list(alignments)
+
+# saveAlignments--------------------------------------------------------------------------
+def test_saveAlignments(tmp_path):
+    path = tmp_path / "output.txt"
+    assert saveAlignments(path, 3, iter(ALIGNMENTS), PARAMS, keptAlignmentsAmt = 1) == (2, ALIGNMENTS[:1])
+    with open(path) as fd: assert fd.read() == "Score: 3\n" + ALIGNMENT_INFO.format(3, 1, "ACGTAC", "AC-TTC") + \
+        ALIGNMENT_INFO.format(4, 2, "CG", "CT") + "\nTotal alignments: 2\n"
+
+@pytest.mark.parametrize("outputFormat", list(OutputFormat))
+def test_saveAlignmentsFormats(tmp_path, outputFormat):
+    path = tmp_path / "output"
+    assert saveAlignments(path, 3, iter(ALIGNMENTS), PARAMS, outputFormat = outputFormat) == (2, [])
+    if outputFormat == OutputFormat.Npz: # Archives have timestamps
+        maxScore, alignments = loadNpzOutput(path)
+        assert maxScore == 3 and list(alignments) == ALIGNMENTS
+        return
+
+    OUTPUT_WRITERS[outputFormat](tmp_path / "expected", 3, ALIGNMENTS, PARAMS)
+    assert path.read_bytes() == (tmp_path / "expected").read_bytes()
@@ -0,0 +1,110 @@
+from para_seq.progress import *
+from signal            import SIGINT, getsignal, raise_signal
+from threading         import Thread
+import sys
+import pytest
+
+# Records every progress report:
+class ProgressRecorder(list):
+    def __call__(self, progress:FillProgress) -> None:
+        self.append(progress)
+
+# FillMonitor-----------------------------------------------------------------------------
+def test_FillMonitor():
+    reports = ProgressRecorder()
+    monitor = FillMonitor(reports)
+    monitor.start(100, 3)
+    for cellsAmt in (10, 40, 50): monitor.completeWave(cellsAmt)
+
+    assert [report[:4] for report in reports] == [(10, 100, 1, 3), (50, 100, 2, 3), (100, 100, 3, 3)]
+    assert all(cellsPerSecond >= 0 for *_, cellsPerSecond, _ in reports)
+    assert reports[-1][-1] in (0, None) # Nothing left
+
+def test_FillMonitorInterval():
+    reports = ProgressRecorder()
+    monitor = FillMonitor(reports, reportInterval = 3600)
+    monitor.start(100, 4)
+    for _ in range(4): monitor.completeWave(25)
+
+    # Only the last wave is reported before the interval passes:
+    assert [report[:4] for report in reports] == [(100, 100, 4, 4)]
+
+# The throughput only counts the cells filled since the start, not the resumed ones:
+def test_FillMonitorResumed():
+    monitor = FillMonitor()
+    monitor.start(100, 4, cellsDone = 50, wavesDone = 2)
+    assert monitor.getProgress()[:5] == (50, 100, 2, 4, 0)
+    assert monitor.getProgress()[5] is None
+
+    monitor.completeWave(25)
+    cellsDone, _, wavesDone, _, cellsPerSecond, secondsLeft = monitor.getProgress()
+    assert (cellsDone, wavesDone) == (75, 3)
+    assert secondsLeft == pytest.approx(25 / cellsPerSecond)
+
+def test_FillMonitorCancel():
+    reports = ProgressRecorder()
+    monitor = FillMonitor(reports)
+    monitor.start(100, 4)
+    monitor.completeWave(25)
+    monitor.cancel()
+    assert monitor.isCancelled()
+
+    # The wave running when cancelled is still recorded:
+    with pytest.raises(FillCancelledErr) as errInfo: monitor.completeWave(25)
+    assert str(errInfo.value) == FILL_CANCELLED_PREFIX + ": stopped after 2 of 4 waves."
+    assert len(reports) == 2
+
+# printProgressLine-----------------------------------------------------------------------
+def test_printProgressLine(capsys):
+    printProgressLine((50, 200, 3, 10, 1234.5, 3725))
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert out.startswith("\r25.0% of the cells filled (wave 3/10), 1,234 cells/s, 1:02:05 left")
+    assert not out.endswith("\n")
+
+def test_printProgressLineDone(capsys):
+    printProgressLine((200, 200, 10, 10, 1000.0, 0))
+    assert capsys.readouterr()[0] == \
+        "\r100.0% of the cells filled (wave 10/10), 1,000 cells/s, 0:00:00 left".ljust(80) + "\n"
+
+def test_printProgressLineUnknown(capsys):
+    printProgressLine((0, 200, 0, 10, 0.0, None))
+    assert "unknown time left" in capsys.readouterr()[0]
+
+# cancelOnInterrupt-----------------------------------------------------------------------
+def test_cancelOnInterrupt():
+    previousHandler = getsignal(SIGINT)
+    with cancelOnInterrupt(FillMonitor()) as monitor:
+        raise_signal(SIGINT)
+        assert monitor.isCancelled()
+        # The fill didn't stop yet, so the next one interrupts right away:
+        with pytest.raises(KeyboardInterrupt): raise_signal(SIGINT)
+
+    assert getsignal(SIGINT) is previousHandler
+
+# Other threads can't handle signals, nothing changes:
+def test_cancelOnInterruptThread():
+    handlers = []
+    def run():
+        with cancelOnInterrupt(FillMonitor()): handlers.append(getsignal(SIGINT))
+
+    thread = Thread(target = run)
+    thread.start()
+    thread.join()
+    assert handlers == [getsignal(SIGINT)]
+
+# monitorFillInTerminal-------------------------------------------------------------------
+def test_monitorFillInTerminal(capsys):
+    with monitorFillInTerminal() as monitor:
+        assert monitor.onProgress is None # Not a terminal
+
+def test_monitorFillInTerminalCancel(capsys, monkeypatch):
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: True)
+    with pytest.raises(FillCancelledErr), monitorFillInTerminal() as monitor:
+        assert monitor.onProgress is printProgressLine
+        monitor.start(100, 4)
+        monitor.cancel()
+        monitor.completeWave(25)
+
+    # The progress line is ended before the error:
+    assert capsys.readouterr()[0].endswith("\n")
@@ -0,0 +1,79 @@
+from para_seq.resource_governor import *
+from numpy                      import dtype, uint8, uint16, uint32
+import pytest
+
+SMALL_PARAMS = ("ACGTACGT", "ACG", 2, 1, 1)
+LONG_PARAMS  = ("ACGT" * 25_000, "ACGTTGCA", 2, 1, 1)
+LONG_PAIR_PARAMS = ("ACGT" * 250, "TGCA" * 250, 2, 1, 0) # Free gaps, so no windows either
+
+# estimatePeakMemory----------------------------------------------------------------------
+def test_estimatePeakMemory():
+    assert estimatePeakMemory(SMALL_PARAMS, (Backend.Process, 0, 256, dtype(uint32), 4)) == 9 * 4 * 5
+
+def test_estimatePeakMemoryWindowed():
+    # Windows of 1000 target nucleotides, one for each of the 2 workers:
+    assert estimatePeakMemory(LONG_PARAMS, (Backend.Thread, 1000, 256, dtype(uint8), 2)) == 2 * 1001 * 9 * 2
+
+def test_estimatePeakMemoryWindowedFewWindows():
+    # A single window, no matter the amount of workers:
+    assert estimatePeakMemory(SMALL_PARAMS, (Backend.Thread, 1, 256, dtype(uint8), 8)) == 9 * 4 * 2
+
+def test_estimatePeakMemoryCheckpointed():
+    # 33 checkpoint rows one every 31, plus 8 blocks of 32 rows:
+    config = (Backend.Thread, CHECKPOINTED_WINDOW_SIZE, 256, dtype(uint8), 1)
+    assert estimatePeakMemory(LONG_PAIR_PARAMS, config) == 33 * 1001 + 8 * 32 * 1001 * 2
+
+# governResources-------------------------------------------------------------------------
+def test_governResources():
+    config = (Backend.Thread, 0, 256, dtype(uint32), None)
+    assert governResources(SMALL_PARAMS, config, 2, maxMemory = 2**20) == (Backend.Thread, 0, 256, dtype(uint32), 2)
+
+def test_governResourcesJobs():
+    config = (Backend.Thread, 0, 256, dtype(uint32), 8)
+    assert governResources(SMALL_PARAMS, config, 2, maxMemory = 2**20)[4] == 2
+
+def test_governResourcesScoreType():
+    # The uint32 matrices take 9 * 4 * 5 bytes, the uint8 ones 9 * 4 * 2:
+    config = (Backend.Thread, 0, 256, dtype(uint32), 1)
+    assert governResources(SMALL_PARAMS, config, 1, maxMemory = 100)[3] == uint8
+
+def test_governResourcesWindowed(capsys):
+    config = (Backend.Thread, 0, 256, dtype(uint32), 2)
+    backend, windowSize, tileSize, scoreType, workersAmt = governResources(
+        LONG_PARAMS, config, 2, maxMemory = 100_000, doLogProgress = True)
+
+    assert windowSize and scoreType == uint8
+    assert estimatePeakMemory(LONG_PARAMS, (backend, windowSize, tileSize, scoreType, workersAmt)) <= 100_000
+    assert "switching to a lower-memory mode" in capsys.readouterr()[0]
+
+def test_governResourcesFewerWorkers():
+    # Windows of the minimum size (24 nucleotides) take 25 * 9 * 2 bytes each:
+    config = (Backend.Thread, 0, 256, dtype(uint8), 4)
+    assert governResources(LONG_PARAMS, config, 4, maxMemory = 1000)[4] == 2
+
+def test_governResourcesCheckpointed():
+    # The full uint16 matrices take 1001 * 1001 * 3 bytes:
+    config = (Backend.Thread, 0, 256, dtype(uint32), 1)
+    assert governResources(LONG_PAIR_PARAMS, config, 1, maxMemory = 900_000)[1:4] == (
+        CHECKPOINTED_WINDOW_SIZE, 256, uint16)
+
+def test_governResourcesCheckpointedRequested():
+    config = (Backend.Thread, CHECKPOINTED_WINDOW_SIZE, 256, dtype(uint32), 1)
+    assert governResources(LONG_PAIR_PARAMS, config, 1, maxMemory = 900_000)[1:4] == (
+        CHECKPOINTED_WINDOW_SIZE, 256, uint16)
+
+    with pytest.raises(ResourceBudgetErr): governResources(LONG_PAIR_PARAMS, config, 1, maxMemory = 100_000)
+
+def test_governResourcesRefused():
+    config = (Backend.Thread, 0, 256, dtype(uint8), 1)
+    with pytest.raises(ResourceBudgetErr) as errInfo:
+        governResources(LONG_PARAMS, config, 1, maxMemory = 100)
+
+    assert "needs about 450 B" in str(errInfo.value)
+    assert "budget is 100 B" in str(errInfo.value)
+
+def test_governResourcesFreeGaps():
+    # Windows can't be used when alignments can stretch over the whole target:
+    config = (Backend.Thread, 0, 256, dtype(uint8), 1)
+    with pytest.raises(ResourceBudgetErr):
+        governResources(("ACGT" * 25_000, "ACGTTGCA", 2, 1, 0), config, 1, maxMemory = 100_000)
@@ -0,0 +1,78 @@
+from para_seq.result_cache import *
+from contextlib              import closing
+
+PARAMS     = ("CTTGTGCTTGGGACTAAAG", "CTG", 3, 3, 1)
+ALIGNMENTS = [(1, 1, 3, 4, "2M1I1M"), (1, 7, 3, 10, "1M1I2M")]
+
+def storeResult(cache, analysisParams, alignments, maxSize):
+    """Caches a result the way the tool does, passing the alignments through."""
+    for _ in cacheAlignments(cache, analysisParams, 8, iter(alignments), maxSize): pass
+
+# computeResultKey------------------------------------------------------------------------
+def test_computeResultKey():
+    assert computeResultKey(PARAMS) == computeResultKey(list(PARAMS))
+    assert len(computeResultKey(PARAMS)) == 32
+
+def test_computeResultKeyDifferent():
+    keys = {
+        computeResultKey(PARAMS),
+        computeResultKey(("CTTGTGCTTGGGACTAAAG", "CTG", 3, 3, 2)),
+        computeResultKey(("CTTGTGCTTGGGACTAAA", "GCTG", 3, 3, 1)),
+        computeResultKey(("CTG", "CTTGTGCTTGGGACTAAAG", 3, 3, 1))}
+
+    assert len(keys) == 4
+
+# getCachedResult-------------------------------------------------------------------------
+def test_getCachedResultMissing(tmp_path):
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        assert getCachedResult(cache, PARAMS) is None
+
+# cacheAlignments-------------------------------------------------------------------------
+def test_cacheAlignments(tmp_path):
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        alignments = cacheAlignments(cache, PARAMS, 8, iter(ALIGNMENTS), 2**20)
+        assert next(alignments) == ALIGNMENTS[0]
+        assert getCachedResult(cache, PARAMS) is None # Stored only once exhausted
+
+        assert list(alignments) == ALIGNMENTS[1:]
+        maxScore, cachedAlignments = getCachedResult(cache, PARAMS)
+        assert (maxScore, list(cachedAlignments)) == (8, ALIGNMENTS)
+
+def test_cacheAlignmentsTooLarge(tmp_path):
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        assert list(cacheAlignments(cache, PARAMS, 8, iter(ALIGNMENTS), 1)) == ALIGNMENTS
+        assert getCachedResult(cache, PARAMS) is None
+
+def test_cacheAlignmentsEmpty(tmp_path):
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        storeResult(cache, PARAMS, [], 2**20)
+        maxScore, alignments = getCachedResult(cache, PARAMS)
+        assert (maxScore, list(alignments)) == (8, [])
+
+def test_cacheAlignmentsMany(tmp_path):
+    # Spans several compressed chunks when unpacked:
+    alignments = [(x, x % 7, x + 12, x % 7 + 14, f"{x % 13}M2I1D") for x in range(20_000)]
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        storeResult(cache, PARAMS, alignments, 2**20)
+        assert list(getCachedResult(cache, PARAMS)[1]) == alignments
+
+def test_cacheAlignmentsOtherProcess(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with closing(openResultCache(path)) as cache: storeResult(cache, PARAMS, ALIGNMENTS, 2**20)
+    with closing(openResultCache(path)) as cache:
+        maxScore, alignments = getCachedResult(cache, PARAMS)
+        assert (maxScore, list(alignments)) == (8, ALIGNMENTS)
+
+def test_cacheAlignmentsEviction(tmp_path):
+    otherParams = [(PARAMS[0], PARAMS[1], 3, 3, gapPenalty) for gapPenalty in (2, 3)]
+    with closing(openResultCache(str(tmp_path / "cache.sqlite"))) as cache:
+        storeResult(cache, PARAMS, ALIGNMENTS, 2**20)
+        maxSize = 2 * cache.execute("SELECT LENGTH(alignments) FROM results").fetchone()[0]
+        # ^^^ Room for 2 results only
+        storeResult(cache, otherParams[0], ALIGNMENTS, maxSize)
+        getCachedResult(cache, PARAMS) # Now the most recently used one
+        storeResult(cache, otherParams[1], ALIGNMENTS, maxSize)
+
+        assert getCachedResult(cache, PARAMS) is not None
+        assert getCachedResult(cache, otherParams[0]) is None
+        assert getCachedResult(cache, otherParams[1]) is not None
@@ -0,0 +1,108 @@
+from para_seq.local_alignment import findLocalAlignments, createLocalMatrices, fillMatrices
+from para_seq.resumable_fill  import *
+from para_seq.progress        import FillCancelledErr, FillMonitor
+from os.path                  import isdir
+import para_seq.resumable_fill
+import pytest
+
+PARAMS = ("ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG", "AAAATTTAAAAA", 2, 2, 1)
+
+@pytest.fixture
+def statePath(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    return getFillStatePath(PARAMS)
+
+# getFillStatePath------------------------------------------------------------------------
+def test_getFillStatePath(statePath, tmp_path):
+    assert statePath.startswith(str(tmp_path))
+    assert getFillStatePath(PARAMS[:4] + (2,)) != statePath
+
+# openFillState---------------------------------------------------------------------------
+def test_openFillState(statePath):
+    scoreMat, dirsMat, progress = openFillState(PARAMS, statePath, tileSize = 4, scoreType = uint8)
+    assert scoreMat.shape == dirsMat.shape == (13, len(PARAMS[0]) + 1)
+    assert scoreMat.dtype == uint8 and not scoreMat.any()
+    assert progress == { "tileSize" : 4, "wavesDone" : 0, "maxScore" : 0 }
+
+def test_openFillStateExisting(statePath):
+    scoreMat, _, _ = openFillState(PARAMS, statePath, tileSize = 4, scoreType = uint8)
+    scoreMat[3, 3] = 7
+    scoreMat.flush()
+    # The original tile size and score type are kept:
+    scoreMat, _, progress = openFillState(PARAMS, statePath, tileSize = 8)
+    assert scoreMat[3, 3] == 7 and scoreMat.dtype == uint8 and progress["tileSize"] == 4
+
+# fillMatricesResumably-------------------------------------------------------------------
+def test_fillMatricesResumably(statePath):
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    maxScore = fillMatrices(PARAMS, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+
+    resumedMaxScore, resumedScoreMat, resumedDirsMat = fillMatricesResumably(
+        PARAMS, statePath, tileSize = 4, workersAmt = 2)
+
+    assert resumedMaxScore == maxScore
+    assert (resumedScoreMat == scoreMat).all() and (resumedDirsMat == dirsMat).all()
+
+# With affine gaps the interrupted wave already rolled some of the gap borders past the
+# checkpoint, the resumed fill must start from the saved ones:
+@pytest.mark.parametrize("params", [PARAMS, (*PARAMS[:2], 4, 2, 3, 1)])
+def test_fillMatricesResumablyInterrupted(params, statePath, monkeypatch):
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    maxScore = fillMatrices(params, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+
+    # The 30th tile is interrupted, after many checkpoints. A single worker fills the tiles
+    # in the main thread, where Ctrl+C would land too:
+    tilesAmt = 0
+    def interruptedFillTile(*args):
+        nonlocal tilesAmt
+        tilesAmt += 1
+        if tilesAmt == 30: raise KeyboardInterrupt
+        return fillTile(*args)
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(para_seq.resumable_fill, "fillTile", interruptedFillTile)
+        fillMatricesResumably(params, statePath, tileSize = 4, workersAmt = 1, checkpointInterval = 0)
+
+    _, _, progress = openFillState(params, statePath)
+    assert 0 < progress["wavesDone"] < len(computeTileWaves(13, len(PARAMS[0]) + 1, 4))
+
+    resumedMaxScore, resumedScoreMat, resumedDirsMat = fillMatricesResumably(
+        params, statePath, workersAmt = 1, doLogProgress = True)
+
+    assert resumedMaxScore == maxScore
+    assert (resumedScoreMat == scoreMat).all() and (resumedDirsMat == dirsMat).all()
+
+# A cancelled fill saves its progress right away, and the resumed one reports it:
+def test_fillMatricesResumablyCancel(statePath):
+    scoreMat, dirsMat = createLocalMatrices((13, len(PARAMS[0]) + 1))
+    maxScore = fillMatrices(PARAMS, backend = Backend.Thread, matrices = (scoreMat, dirsMat))
+
+    monitor = FillMonitor(lambda progress: progress[2] == 5 and monitor.cancel())
+    with pytest.raises(FillCancelledErr):
+        fillMatricesResumably(PARAMS, statePath, tileSize = 4, workersAmt = 2, monitor = monitor)
+
+    _, _, progress = openFillState(PARAMS, statePath)
+    assert progress["wavesDone"] == 5
+
+    reports = []
+    resumedMaxScore, resumedScoreMat, resumedDirsMat = fillMatricesResumably(
+        PARAMS, statePath, workersAmt = 2, monitor = FillMonitor(reports.append))
+
+    wavesAmt = len(computeTileWaves(13, len(PARAMS[0]) + 1, 4))
+    assert [wavesDone for _, _, wavesDone, *_ in reports] == list(range(6, wavesAmt + 1))
+    assert reports[-1][:2] == (12 * len(PARAMS[0]),) * 2
+    assert resumedMaxScore == maxScore
+    assert (resumedScoreMat == scoreMat).all() and (resumedDirsMat == dirsMat).all()
+
+# findResumableLocalAlignments------------------------------------------------------------
+def test_findResumableLocalAlignments(statePath):
+    assert findResumableLocalAlignments(PARAMS, tileSize = 4, workersAmt = 1) == \
+        findLocalAlignments(PARAMS, backend = Backend.Thread)
+
+    assert not isdir(statePath) # Done, nothing left to resume
+
+def test_findResumableLocalAlignmentsStream(statePath):
+    maxScore, alignments = findResumableLocalAlignments(PARAMS, workersAmt = 1, doStream = True)
+    assert isdir(statePath)
+    assert (maxScore, list(alignments)) == findLocalAlignments(PARAMS, backend = Backend.Thread)
+    assert not isdir(statePath)
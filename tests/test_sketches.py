@@ -0,0 +1,93 @@
+from para_seq.sketches import *
+from numpy             import uint64
+from os                import listdir
+from os.path           import basename, dirname
+import pytest
+
+TARGET = "ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG"
+
+@pytest.fixture(autouse = True)
+def cacheDir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+@pytest.fixture
+def queriesPath(tmp_path):
+    path = tmp_path / "queries.fa"
+    path.write_text(">inside\nCGATCGTTAGCATCG\n>outside\nTTTTTTTTTTTTTTT\n>short\nACG\n")
+    return str(path)
+
+# sketchSeq-------------------------------------------------------------------------------
+def test_sketchSeq():
+    # ACGT is found twice, along with CGTA, GTAC and TACG:
+    sketch = sketchSeq("ACGTACGT", 4)
+    assert len(sketch) == 4 and sketch.dtype == uint64
+    assert (sketch[1:] > sketch[:-1]).all() # Sorted and distinct
+
+def test_sketchSeqNs():
+    assert (sketchSeq("ACGTNACGT", 4) == sketchSeq("ACGT", 4)).all()
+    assert not len(sketchSeq("ACNGT", 4))
+
+def test_sketchSeqShort():
+    assert not len(sketchSeq("ACG", 4))
+
+def test_sketchSeqScale():
+    sketch, scaledSketch = sketchSeq(TARGET, 8), sketchSeq(TARGET, 8, 4)
+    # The scaled sketch keeps the smallest hashes, about a quarter of them:
+    assert (scaledSketch == sketch[:len(scaledSketch)]).all()
+    assert 0 < len(scaledSketch) < len(sketch) / 2
+
+# sketchSeqs------------------------------------------------------------------------------
+def test_sketchSeqs():
+    hashes, offsets = sketchSeqs(["ACGTACGT", "AC", "GGGGG"], 4)
+    assert offsets.tolist() == [0, 4, 4, 5]
+    assert (hashes[:4] == sketchSeq("ACGTACGT", 4)).all()
+
+def test_sketchSeqsEmpty():
+    hashes, offsets = sketchSeqs([])
+    assert not len(hashes) and offsets.tolist() == [0]
+
+# loadFastaSketches-----------------------------------------------------------------------
+def test_loadFastaSketches(queriesPath, cacheDir):
+    seqs = ["CGATCGTTAGCATCG", "TTTTTTTTTTTTTTT", "ACG"]
+    hashes, offsets = loadFastaSketches(queriesPath, seqs, 8)
+    expectedHashes, expectedOffsets = sketchSeqs(seqs, 8)
+    assert (hashes == expectedHashes).all() and (offsets == expectedOffsets).all()
+    sketchesPath = getSketchesPath(queriesPath, 8, 1)
+    assert sketchesPath.startswith(str(cacheDir))
+    assert listdir(dirname(sketchesPath)) == [basename(sketchesPath)] # Nothing left aside
+
+    # The cached sketches are used from now on, even if the sequences differ:
+    hashes, _ = loadFastaSketches(queriesPath, ["A", "C", "G"], 8)
+    assert (hashes == expectedHashes).all()
+
+def test_loadFastaSketchesCorrupted(queriesPath):
+    sketchesPath = getSketchesPath(queriesPath, 8, 1)
+    makedirs(dirname(sketchesPath))
+    with open(sketchesPath, 'w') as fd: fd.write("garbage")
+
+    hashes, _ = loadFastaSketches(queriesPath, ["CGATCGTTAGCATCG", "T" * 15, "ACG"], 8)
+    assert len(hashes) == 9
+    with load(sketchesPath) as sketchesFile: assert (sketchesFile["hashes"] == hashes).all()
+
+def test_getSketchesPath(queriesPath):
+    assert getSketchesPath(queriesPath, 8, 1) != getSketchesPath(queriesPath, 8, 2)
+    assert getSketchesPath(queriesPath, 8, 1) != getSketchesPath(queriesPath, 9, 1)
+
+# estimateContainments--------------------------------------------------------------------
+def test_estimateContainments():
+    sketches = sketchSeqs([TARGET[10:30], TARGET[10:20] + "T" * 10, "T" * 20, "ACG"], 8)
+    containments = estimateContainments(sketches, sketchSeq(TARGET, 8))
+    assert containments[0] == 1
+    assert 0 < containments[1] < 1
+    assert containments[2] == 0
+    assert containments[3] == 1 # Too short to be judged
+
+def test_estimateContainmentsEmptyTarget():
+    assert estimateContainments(sketchSeqs(["A" * 20, "ACG"], 8), sketchSeq("ACG", 8)).tolist() == [0, 1]
+
+# prefilterQueries------------------------------------------------------------------------
+def test_prefilterQueries(queriesPath):
+    seqs = ["CGATCGTTAGCATCG", "TTTTTTTTTTTTTTT", "ACG"]
+    assert prefilterQueries(TARGET, queriesPath, seqs, 0.5, 8).tolist() == [0, 2]
+    assert prefilterQueries(TARGET, queriesPath, seqs, 0, 8).tolist() == [0, 1, 2]
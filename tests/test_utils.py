@@ -1,4 +1,5 @@
 from src.para_seq.utils import *
+from multiprocessing    import get_all_start_methods
 
 # ellipsize-------------------------------------------------------------------------------
 def test_ellipsize():
@@ -14,6 +15,58 @@ def test_ellipsizeInvalidSize():
     assert ellipsize("", -1) == "..."
     assert ellipsize("foo", -10) == "..."
 
+# isGilEnabled----------------------------------------------------------------------------
+def test_isGilEnabled():
+    assert isinstance(isGilEnabled(), bool)
+
+# getUsableCpusAmt------------------------------------------------------------------------
+def test_getUsableCpusAmt():
+    assert getUsableCpusAmt() >= 1
+
+def test_getUsableCpusAmtCapped():
+    assert getUsableCpusAmt(1) == 1
+    assert getUsableCpusAmt(10_000) == getUsableCpusAmt()
+
+# getProcessContext-----------------------------------------------------------------------
+def test_getProcessContext():
+    context = getProcessContext()
+    assert context.get_start_method() in get_all_start_methods()
+    assert context.get_start_method() == "forkserver" or "forkserver" not in get_all_start_methods()
+
+# startProcessServer----------------------------------------------------------------------
+def test_startProcessServer():
+    startProcessServer()
+    startProcessServer() # Already running
+    with getProcessContext().Pool(1) as pool: assert pool.apply(abs, (-1,)) == 1
+
+# getAvailableMemory----------------------------------------------------------------------
+def test_getAvailableMemory():
+    availableMemory = getAvailableMemory()
+    assert availableMemory is None or availableMemory > 0
+
+# getSharedMemoryLimit--------------------------------------------------------------------
+def test_getSharedMemoryLimit():
+    sharedMemoryLimit = getSharedMemoryLimit()
+    assert sharedMemoryLimit is None or sharedMemoryLimit >= 0
+
+# getCacheDir-----------------------------------------------------------------------------
+def test_getCacheDir():
+    assert getCacheDir().endswith("para_seq")
+
+# formatSize------------------------------------------------------------------------------
+def test_formatSize():
+    assert formatSize(100) == "100 B"
+    assert formatSize(1536) == "1.5 KiB"
+    assert formatSize(3 * 2**30) == "3.0 GiB"
+    assert formatSize(2**41) == "2.0 TiB"
+
+# formatDuration--------------------------------------------------------------------------
+def test_formatDuration():
+    assert formatDuration(0) == "0:00:00"
+    assert formatDuration(59.6) == "0:01:00"
+    assert formatDuration(3725) == "1:02:05"
+    assert formatDuration(100 * 3600) == "100:00:00"
+
 # CustomErr-------------------------------------------------------------------------------
 class CustomErrExt(CustomErr):
     msgPrefix = "prefix"
@@ -0,0 +1,119 @@
+from para_seq.local_alignment    import findLocalAlignments
+from para_seq.windowed_alignment import *
+from para_seq.input_manager      import parseSubstitutionMatrix
+import para_seq.windowed_alignment as windowedAlignment
+import pytest
+
+# getMaxAlignmentSpan---------------------------------------------------------------------
+def test_getMaxAlignmentSpan():
+    assert getMaxAlignmentSpan(3, 2, 1) == 9
+
+def test_getMaxAlignmentSpanRounding():
+    assert getMaxAlignmentSpan(5, 2, 3) == 8
+
+def test_getMaxAlignmentSpanFreeGaps():
+    assert getMaxAlignmentSpan(3, 2, 0) is None
+
+def test_getMaxAlignmentSpanAffine():
+    # A single gap of 1 + (6 - 4) // 1 positions still scores above 0:
+    assert getMaxAlignmentSpan(3, 2, 4, 1) == 6
+
+def test_getMaxAlignmentSpanAffineNoGaps():
+    assert getMaxAlignmentSpan(3, 2, 8, 1) == 3
+
+def test_getMaxAlignmentSpanAffineFreeExtension():
+    assert getMaxAlignmentSpan(3, 2, 4, 0) is None
+
+# computeWindows--------------------------------------------------------------------------
+def test_computeWindows():
+    assert computeWindows(20, 8, 3) == [(0, 8), (5, 13), (10, 18), (15, 20)]
+
+def test_computeWindowsExact():
+    assert computeWindows(13, 8, 3) == [(0, 8), (5, 13)]
+
+def test_computeWindowsSingle():
+    assert computeWindows(5, 8, 3) == [(0, 5)]
+
+# getAnalysisWindows----------------------------------------------------------------------
+def test_getAnalysisWindows():
+    # The maximum span is 3 + 2 * 3 // 1 = 9, so windows of 9 overlapping by 8:
+    assert getAnalysisWindows(("A" * 12, "CTG", 2, 2, 1), 4) == [(0, 9), (1, 10), (2, 11), (3, 12)]
+
+def test_getAnalysisWindowsSubstitutions():
+    # The best pair scores 4, so the maximum span is 3 + 4 * 3 // 1 = 15:
+    params = ("A" * 16, "CTG", 2, 2, 1, 1, parseSubstitutionMatrix("   N\nN  4", 2, 2))
+    assert getAnalysisWindows(params, 4) == [(0, 15), (1, 16)]
+
+def test_getAnalysisWindowsFreeGaps():
+    assert getAnalysisWindows(("A" * 12, "CTG", 2, 2, 0), 4) == [(0, 12)]
+
+# findWindowedLocalAlignments-------------------------------------------------------------
+@pytest.mark.parametrize("params", [
+    ("TTTACATATCGGTGTCAAACGCGTTTACATATCGGTGTC", "ACGCG", 2, 2, 1),
+    ("AAAAAAATTCAAAAAAAAATTCAAAAAAAAATTC", "TTT", 2, 2, 1),
+    ("ATGCGTACGTAGCTAGCTAGCTAGCTAACGATCGATCGATCGATCGTTAGCATCGATCGATCGTACGTAGCTAGCTAGCTAACG", "AAAATTTAAAAA", 2, 2, 1),
+    ("CTTGTGCTTGGGACTAAAGACTAAAGCTTGCATG", "CTG", 3, 3, 1)])
+def test_findWindowedLocalAlignments(params):
+    maxScore, alignments = findLocalAlignments(params)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1)
+
+    assert windowedMaxScore == maxScore
+    assert sorted(windowedAlignments) == sorted(alignments) # No duplicates either
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findWindowedLocalAlignmentsAffine(backend):
+    params = ("AAAGGGAAACTTGTGCTTGGGAAAGGAAAACTAAAGCTTGCATG", "AAAAAA", 2, 2, 3, 1)
+    maxScore, alignments = findLocalAlignments(params, backend = Backend.Thread)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1, backend = backend)
+
+    assert windowedMaxScore == maxScore == 8 # The runs of A around the GG gap
+    assert sorted(windowedAlignments) == sorted(alignments)
+
+@pytest.mark.parametrize("backend", list(Backend)[1:])
+def test_findWindowedLocalAlignmentsSubstitutions(backend):
+    substitutions = parseSubstitutionMatrix("   A  C  G  T  N\nN  1  1  1  1  1\nR  2 -1  2 -1  1", 2, 2)
+    params = ("AAAGGGAAACTTGTGCTTGGGANAGGAAAACTAAAGCTTGCATG", "GGRNAG", 2, 2, 3, 3, substitutions)
+    maxScore, alignments = findLocalAlignments(params, backend = Backend.Thread)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1, backend = backend)
+
+    assert windowedMaxScore == maxScore
+    assert sorted(windowedAlignments) == sorted(alignments)
+
+# The serial backend aligns the windows one after the other, with no pool:
+def test_findWindowedLocalAlignmentsSerial(monkeypatch):
+    params = ("TTTACATATCGGTGTCAAACGCGTTTACATATCGGTGTC", "ACGCG", 2, 2, 1)
+    maxScore, alignments = findLocalAlignments(params)
+    def fail(*args, **kwargs): raise AssertionError("no pools expected")
+    monkeypatch.setattr(windowedAlignment, "createPool", fail)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1, backend = Backend.Serial)
+
+    assert windowedMaxScore == maxScore
+    assert sorted(windowedAlignments) == sorted(alignments)
+
+def test_findWindowedLocalAlignmentsFreeGaps():
+    params = ("TTTACATATCGGTGTC", "ACGCG", 2, 2, 0)
+    maxScore, alignments = findLocalAlignments(params)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1)
+
+    assert windowedMaxScore == maxScore
+    assert sorted(windowedAlignments) == sorted(alignments)
+
+def test_findWindowedLocalAlignmentsStream():
+    params = ("TTTACATATCGGTGTCAAACGCGTTTACATATCGGTGTC", "ACGCG", 2, 2, 1)
+    windowedMaxScore, windowedAlignments = findWindowedLocalAlignments(params, 1, doStream = True)
+    assert not isinstance(windowedAlignments, list)
+    maxScore, alignments = findLocalAlignments(params)
+    assert (windowedMaxScore, sorted(windowedAlignments)) == (maxScore, sorted(alignments))
+
+def test_findWindowedLocalAlignmentsNoneStream():
+    maxScore, alignments = findWindowedLocalAlignments(("TTTTTTTTTTTT", "AAA", 2, 2, 1), 4, doStream = True)
+    assert (maxScore, list(alignments)) == (0, [])
+
+def test_findWindowedLocalAlignmentsNone():
+    assert findWindowedLocalAlignments(("TTTTTTTTTTTT", "AAA", 2, 2, 1), 4) == (0, [])
+
+def test_findWindowedLocalAlignmentsPrints(capsys):
+    findWindowedLocalAlignments(("TTTACATATCGGTGTC", "ACGCG", 2, 2, 1), 20, doLogProgress = True)
+    out, err = capsys.readouterr()
+    assert err == ""
+    assert out == "Scoring 1 target windows...\nReconstructing best local alignments...\n"